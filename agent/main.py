@@ -6,7 +6,7 @@ Runs inside Kubernetes jobs and streams output via stdout.
 
 import asyncio
 import asyncio.subprocess
-import builtins
+import codecs
 import contextlib
 import json
 import logging
@@ -15,14 +15,57 @@ import shutil
 import subprocess
 import sys
 import tempfile
+import time
 from datetime import UTC, datetime
 from pathlib import Path
 from typing import Any
 
-import aiofiles
-import git
-from litellm import acompletion, completion_cost, stream_chunk_builder
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import AsyncRetrying, stop_after_attempt
+
+from agent.services.claude_stream import (
+    STREAM_READ_SIZE,
+    ClaudeDecodeError,
+    ClaudeResult,
+    ClaudeStreamDecoder,
+    ClaudeText,
+    ClaudeToolUse,
+)
+from agent.services.context_builder import (
+    DEFAULT_MAX_CONTEXT_TOKENS,
+    build_context,
+    context_budget,
+    trim_to_budget,
+)
+from agent.services.diff_engine import MAX_DIFF_FILE_BYTES, FileDiff, collect_diffs
+from agent.services.diff_store import MANIFEST_FORMAT, build_manifest
+from agent.services.diff_watcher import DEFAULT_INTERVAL as DEFAULT_WATCH_INTERVAL
+from agent.services.diff_watcher import DiffWatcher
+from agent.services.line_framer import LineFramer
+from agent.services.log_policy import LogPolicy
+from agent.services.output_sink import BoundSink, OutputSink
+from agent.services.process_fanout import ProcessFanOut
+from agent.services.repo_cache import DEFAULT_MAX_AGE, RepoCache
+from agent.services.repo_scanner import RepoManifest, scan_repository
+from agent.services.repo_snapshot import RepoSnapshot
+from agent.services.search_index import SearchIndex
+from agent.services.session_workspace import SessionWorkspace
+from agent.services.stream_accumulator import StreamAccumulator
+from agent.services.summary_cache import DEFAULT_MAX_ENTRIES, DEFAULT_TTL, SummaryCache
+from agent.services.variation_batch import VariationSpec, parse_variations
+from app.core.response_cache import DEFAULT_MAX_ENTRIES as RESPONSE_CACHE_MAX_ENTRIES
+from app.core.response_cache import (
+    DEFAULT_REPLAY_SPEED,
+    CachedResponse,
+    ResponseCache,
+    TranscriptRecorder,
+    replay,
+)
+from app.core.retry_policy import PREFILL_PROVIDERS, RetryWait
+from app.core.stream_coalescer import (
+    DEFAULT_FLUSH_BYTES,
+    DEFAULT_FLUSH_MS,
+    StreamCoalescer,
+)
 
 # Constants
 MIN_API_KEY_LENGTH = 10
@@ -31,10 +74,41 @@ MAX_RETRY_ATTEMPTS = 3
 RETRY_MIN_WAIT = 4
 RETRY_MAX_WAIT = 10
 DEFAULT_TEMPERATURE = 0.7
-MAX_KEY_FILE_SIZE = 50000
-MAX_KEY_FILES_TO_READ = 10
-MAX_FILE_PREVIEW_CHARS = 2000
-CHUNK_READ_SIZE = 1024
+API_KEYS_TIMEOUT = 10
+SNAPSHOT_POLL_INTERVAL = 1.0  # Seconds between checks for the prep snapshot
+CLI_TOOLS = {  # Code mode -> (command, label)
+    "claude-cli": ("claude", "🤖 Claude CLI"),
+    "gemini-cli": ("gemini", "💎 Gemini CLI"),
+    "openai-codex": ("codex", "🔥 OpenAI Codex CLI"),
+}
+
+
+# LiteLLM takes seconds to import and only chat mode uses it, so it is loaded
+# on first call instead of with the agent (CLI modes never pay for it)
+def _litellm():
+    import litellm
+
+    return litellm
+
+
+async def acompletion(*args, **kwargs):
+    """``litellm.acompletion``, importing LiteLLM on first use."""
+    return await _litellm().acompletion(*args, **kwargs)
+
+
+def completion_cost(*args, **kwargs):
+    """``litellm.completion_cost``, importing LiteLLM on first use."""
+    return _litellm().completion_cost(*args, **kwargs)
+
+
+def get_model_info(*args, **kwargs):
+    """``litellm.get_model_info``, importing LiteLLM on first use."""
+    return _litellm().get_model_info(*args, **kwargs)
+
+
+def token_counter(*args, **kwargs):
+    """``litellm.token_counter``, importing LiteLLM on first use."""
+    return _litellm().token_counter(*args, **kwargs)
 
 
 class DatabaseStreamWriter:
@@ -44,76 +118,62 @@ class DatabaseStreamWriter:
         self.original_stream = original_stream
         self.stream_type = stream_type  # 'stdout' or 'stderr'
         self.agent = agent
-        self.buffer = ""
-        self.line_buffer = []  # Buffer multiple lines before writing
+        self.framer = LineFramer()
+        self.line_buffer: list[str] = []  # Buffer multiple lines before writing
         self.max_lines = 10  # Batch up to 10 lines
-        self.last_write_time = datetime.now(UTC)
+        self.flush_interval = 1.0  # Seconds before a partial batch is written
+        self.last_write_time = time.monotonic()
 
     def write(self, text: str) -> int:
         """Write to both original stream and database."""
         # Write to original stream first
         result = self.original_stream.write(text)
 
-        # Buffer text and collect complete lines
-        self.buffer += text
-        while "\n" in self.buffer:
-            line, self.buffer = self.buffer.split("\n", 1)
-            if line.strip():
-                self.line_buffer.append(line)
+        lines = self.framer.feed(text)
+        if not lines:
+            return result
 
-                # Check if we should write batch
-                current_time = datetime.now(UTC)
-                time_elapsed = (current_time - self.last_write_time).total_seconds()
+        allow_line = self.agent.log_policy.allow_line
+        self.line_buffer.extend(
+            line for line in lines if line.strip() and allow_line(line)
+        )
 
-                if len(self.line_buffer) >= self.max_lines or time_elapsed > 1.0:
-                    self._write_batch()
-                    self.last_write_time = current_time
+        # One clock read per write() call, not per line
+        now = time.monotonic()
+        if (
+            len(self.line_buffer) >= self.max_lines
+            or now - self.last_write_time > self.flush_interval
+        ):
+            self._write_batch()
+            self.last_write_time = now
 
         return result
 
     def _write_batch(self):
-        """Write buffered lines as a single database entry."""
-        if not self.line_buffer or not self.agent.db_service:
+        """Hand buffered lines to the output sink, ``max_lines`` per row."""
+        if not self.line_buffer:
             return
 
-        # Combine lines into a single content block
-        combined_content = "\n".join(self.line_buffer)
-        line_count = len(self.line_buffer)
-        self.line_buffer = []
+        lines, self.line_buffer = self.line_buffer, []
+        sink = self.agent.output_sink
+        if not sink:
+            return
 
-        # Schedule async write in background
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                task = loop.create_task(
-                    self.agent.db_service.write_agent_output(
-                        run_id=self.agent.run_id,
-                        variation_id=int(self.agent.variation_id),
-                        content=combined_content,
-                        output_type=self.stream_type,
-                        metadata={"source": "python_print", "line_count": line_count},
-                    )
-                )
-                # Add to background tasks
-                if not hasattr(self.agent, "_bg_tasks"):
-                    self.agent._bg_tasks = set()
-                self.agent._bg_tasks.add(task)
-                task.add_done_callback(self.agent._bg_tasks.discard)
-        except Exception:
-            # Silently ignore if no event loop
-            pass
+        for start in range(0, len(lines), self.max_lines):
+            batch = lines[start : start + self.max_lines]
+            sink.record(
+                self.stream_type,
+                "\n".join(batch),
+                metadata={"source": "python_print", "line_count": len(batch)},
+            )
 
     def flush(self):
         """Flush the stream."""
-        # Flush any remaining complete lines
-        if self.line_buffer:
-            self._write_batch()
-
-        # Flush any remaining partial buffer
-        if self.buffer.strip():
-            self.line_buffer.append(self.buffer)
-            self._write_batch()
-            self.buffer = ""
+        # Include any remaining partial line
+        partial = self.framer.drain()
+        if partial.strip():
+            self.line_buffer.append(partial)
+        self._write_batch()
 
         return self.original_stream.flush()
 
@@ -125,8 +185,13 @@ class DatabaseStreamWriter:
 class AIdeatorAgent:
     """Main agent class for repository analysis and code generation."""
 
-    def __init__(self):
-        """Initialize agent with configuration from environment."""
+    def __init__(self, variation: VariationSpec | None = None):
+        """Initialize agent with configuration from environment.
+
+        Args:
+            variation: Settings of one variation of a batch, which take
+                precedence over the job-level environment
+        """
         self.run_id = os.getenv("RUN_ID", "local-test")
         self.variation_id = int(os.getenv("VARIATION_ID", "0"))
         self.repo_url = os.getenv("REPO_URL", "")
@@ -139,6 +204,20 @@ class AIdeatorAgent:
             "max_tokens": int(os.getenv("MAX_TOKENS", "4000")),
         }
 
+        # Codebase context budget: summaries are built once at the cap and
+        # trimmed to each model's context window (from the model catalog,
+        # else LiteLLM's model map) before generation
+        self.context_window = int(os.getenv("MODEL_CONTEXT_WINDOW") or 0) or None
+        self.max_context_tokens = int(
+            os.getenv("AGENT_CONTEXT_MAX_TOKENS") or DEFAULT_MAX_CONTEXT_TOKENS
+        )
+
+        # Streamed output coalescing (per-run knobs from agent_config)
+        self.stream_flush_ms = float(os.getenv("STREAM_FLUSH_MS") or DEFAULT_FLUSH_MS)
+        self.stream_flush_bytes = int(
+            os.getenv("STREAM_FLUSH_BYTES") or DEFAULT_FLUSH_BYTES
+        )
+
         # LiteLLM Gateway configuration
         self.gateway_url = os.getenv(
             "LITELLM_GATEWAY_URL", "http://aideator-litellm:4000"
@@ -151,6 +230,16 @@ class AIdeatorAgent:
             "ORCHESTRATOR_API_URL", "http://aideator-fastapi:8000/api/v1"
         )
 
+        if variation is not None:
+            self.variation_id = variation.variation_id
+            self.config["model"] = variation.model
+            if variation.temperature is not None:
+                self.config["temperature"] = variation.temperature
+            if variation.max_tokens is not None:
+                self.config["max_tokens"] = variation.max_tokens
+            self.context_window = variation.context_window
+            self.job_token = variation.job_token
+
         # API keys will be fetched from orchestrator
         self.api_keys = {}
 
@@ -158,14 +247,82 @@ class AIdeatorAgent:
         self.work_dir = Path(tempfile.mkdtemp(prefix="agent-workspace-"))
         self.repo_dir = self.work_dir / "repo"
 
+        # Shared bare mirrors of cloned repositories (disabled when unset)
+        self.repo_cache = RepoCache(
+            os.getenv("AGENT_REPO_CACHE_DIR") or None,
+            max_age=float(os.getenv("AGENT_REPO_CACHE_MAX_AGE", DEFAULT_MAX_AGE)),
+        )
+
+        # Run-level repository prep: the commit every variation checks out and
+        # the shared snapshot the prep job publishes ("prep") or variations
+        # restore from ("variation")
+        self.agent_task = os.getenv("AGENT_TASK") or "variation"
+        self.repo_sha = os.getenv("REPO_SHA") or None
+        snapshot_dir = os.getenv("AGENT_SNAPSHOT_DIR")
+        self.snapshot = (
+            RepoSnapshot(Path(snapshot_dir), self.run_id) if snapshot_dir else None
+        )
+        # Seconds to wait for a prep job running alongside (0 = none started)
+        self.snapshot_wait = float(os.getenv("AGENT_SNAPSHOT_WAIT") or 0)
+
+        # Working tree kept between the turns of a session (opt-in; unset
+        # starts every turn from a fresh checkout)
+        session_dir = os.getenv("AGENT_SESSION_WORKSPACE")
+        self.session_workspace = (
+            SessionWorkspace(Path(session_dir), int(self.variation_id))
+            if session_dir
+            else None
+        )
+
+        # Single scan of the workspace, shared by every codebase consumer, and
+        # the lexical index built from it
+        self.repo_manifest: RepoManifest | None = None
+        self.search_index: SearchIndex | None = None
+
+        # Codebase summaries cached in Redis per commit (TTL 0 disables);
+        # attached once Redis is connected
+        self.summary_cache_ttl = int(os.getenv("AGENT_SUMMARY_CACHE_TTL", DEFAULT_TTL))
+        self.summary_cache_max_entries = int(
+            os.getenv("AGENT_SUMMARY_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)
+        )
+        self.summary_cache: SummaryCache | None = None
+        self.workspace_commit: str | None = None  # Commit actually checked out
+
+        # LiteLLM completions cached in Redis by model, parameters, prompt and
+        # context (TTL 0 disables); hits are replayed at the configured speed
+        self.response_cache_ttl = int(os.getenv("AGENT_RESPONSE_CACHE_TTL") or 0)
+        self.response_cache_max_entries = int(
+            os.getenv("AGENT_RESPONSE_CACHE_MAX_ENTRIES") or RESPONSE_CACHE_MAX_ENTRIES
+        )
+        self.response_replay_speed = float(
+            os.getenv("AGENT_RESPONSE_REPLAY_SPEED") or DEFAULT_REPLAY_SPEED
+        )
+        self.response_cache: ResponseCache | None = None
+
+        # LLM text streamed by the current generation, which a retry on a
+        # PREFILL_PROVIDERS model continues, and the attempts that streamed it
+        self._partial_response = ""
+        self._streamed_attempts: list[int] = []
+
+        # Per-file cap on stored diff patches, and how often diffs are streamed
+        # while a CLI agent edits the workspace (seconds; 0 disables)
+        self.diff_max_file_bytes = int(
+            os.getenv("AGENT_DIFF_MAX_FILE_BYTES") or MAX_DIFF_FILE_BYTES
+        )
+        self.diff_watch_interval = float(
+            os.getenv("AGENT_DIFF_WATCH_INTERVAL") or DEFAULT_WATCH_INTERVAL
+        )
+        self.diff_watcher: DiffWatcher | None = None
+
+        # Verbosity policy (LOG_LEVEL, rate caps, sampling) for persisted logs
+        self.log_policy = LogPolicy.from_env()
+
         # Setup logging to file only (not stdout to avoid mixing with LLM output)
         self.log_file = self.work_dir / f"agent_{self.run_id}_{self.variation_id}.log"
         self._setup_file_logging()
 
-        # Fetch API keys from orchestrator before checking availability
-        self._fetch_api_keys_from_orchestrator()
-
-        # Check available API keys for graceful error handling
+        # Check available API keys for graceful error handling; recomputed
+        # once the orchestrator's keys are fetched during bootstrap
         self.available_api_keys = self._check_available_api_keys()
 
         # Redis setup (required for streaming)
@@ -206,6 +363,10 @@ class AIdeatorAgent:
 
         self.db_service = None  # Will be initialized in async context
 
+        # Single path for all streamed and persisted output; a BoundSink when
+        # variations of a batch share one sink
+        self.output_sink: OutputSink | BoundSink | None = None
+
     async def _init_redis(self):
         """Initialize Redis connection in async context."""
         try:
@@ -215,16 +376,6 @@ class AIdeatorAgent:
             await self.redis_client.ping()
             self.log(f"[REDIS-CONNECT] Connected to Redis at: {self.redis_url}", "INFO")
 
-            # Test stream access
-            test_stream = f"run:{self.run_id}:test"
-            test_id = await self.redis_client.xadd(test_stream, {"test": "connection"})
-            self.log(
-                f"[REDIS-CONNECT] Test stream write successful: {test_id}", "DEBUG"
-            )
-
-            # Clean up test stream
-            await self.redis_client.delete(test_stream)
-
         except Exception as e:
             self.log(f"[REDIS-CONNECT] Redis connection failed: {e}", "ERROR")
             raise RuntimeError(f"Failed to connect to Redis: {e}")
@@ -232,52 +383,11 @@ class AIdeatorAgent:
     async def _init_database(self):
         """Initialize database connection in async context."""
         try:
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": "🔧 About to import AgentDatabaseService",
-                    }
-                ),
-                flush=True,
-            )
             from agent.services.database_service import AgentDatabaseService
 
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": "🔧 About to create AgentDatabaseService instance",
-                    }
-                ),
-                flush=True,
-            )
-            self.db_service = AgentDatabaseService()
+            self.db_service = AgentDatabaseService(spool_dir=self.work_dir / "spool")
 
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": "🔧 About to call db_service.connect()",
-                    }
-                ),
-                flush=True,
-            )
             await self.db_service.connect()
-
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": "🔧 Database connection successful",
-                    }
-                ),
-                flush=True,
-            )
             self.log("[DB-CONNECT] Connected to database", "INFO")
 
         except Exception as e:
@@ -308,7 +418,8 @@ class AIdeatorAgent:
             import aiohttp
 
             # Make request to orchestrator API
-            async with aiohttp.ClientSession() as session:
+            timeout = aiohttp.ClientTimeout(total=API_KEYS_TIMEOUT)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
                 async with session.post(
                     f"{self.orchestrator_url}/jobs/keys",
                     json={"job_token": self.job_token},
@@ -318,9 +429,9 @@ class AIdeatorAgent:
                         data = await response.json()
                         self.api_keys = data.get("keys", {})
 
-                        # Set environment variables for compatibility
-                        for key, value in self.api_keys.items():
-                            os.environ[key] = value
+                        # Kept on the agent rather than in os.environ, so
+                        # variations sharing a process keep their own keys
+                        self.available_api_keys = self._check_available_api_keys()
 
                         self.log(
                             f"[API-KEYS] Successfully fetched {len(self.api_keys)} API keys",
@@ -343,82 +454,6 @@ class AIdeatorAgent:
         except Exception as e:
             self.log(f"[API-KEYS] Error fetching API keys: {e}", "ERROR")
 
-    def _fetch_api_keys_from_orchestrator(self):
-        """Fetch API keys from orchestrator using job token."""
-        if not self.job_token:
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "run_id": self.run_id,
-                        "variation_id": self.variation_id,
-                        "level": "WARNING",
-                        "message": "No job token provided, skipping API key retrieval",
-                    }
-                ),
-                flush=True,
-            )
-            return
-
-        try:
-            import requests
-
-            response = requests.post(
-                f"{self.orchestrator_url}/jobs/keys",
-                json={"job_token": self.job_token},
-                timeout=10,
-            )
-
-            if response.status_code == 200:
-                data = response.json()
-                self.api_keys = data.get("keys", {})
-
-                # Set environment variables for the API keys
-                for key_name, key_value in self.api_keys.items():
-                    os.environ[key_name] = key_value
-
-                # Update available API keys after setting environment variables
-                self.available_api_keys = self._check_available_api_keys()
-
-                print(
-                    json.dumps(
-                        {
-                            "timestamp": datetime.now(UTC).isoformat(),
-                            "run_id": self.run_id,
-                            "variation_id": self.variation_id,
-                            "level": "INFO",
-                            "message": f"✅ Successfully fetched {len(self.api_keys)} API keys from orchestrator",
-                        }
-                    ),
-                    flush=True,
-                )
-            else:
-                print(
-                    json.dumps(
-                        {
-                            "timestamp": datetime.now(UTC).isoformat(),
-                            "run_id": self.run_id,
-                            "variation_id": self.variation_id,
-                            "level": "ERROR",
-                            "message": f"Failed to fetch API keys: {response.status_code} - {response.text}",
-                        }
-                    ),
-                    flush=True,
-                )
-        except Exception as e:
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "run_id": self.run_id,
-                        "variation_id": self.variation_id,
-                        "level": "ERROR",
-                        "message": f"Error fetching API keys: {e!s}",
-                    }
-                ),
-                flush=True,
-            )
-
     def _setup_file_logging(self):
         """Setup file-only logging to avoid stdout pollution."""
         # Create a logger that only writes to file
@@ -443,7 +478,7 @@ class AIdeatorAgent:
         available_keys = {}
 
         # Check OpenAI API Key
-        openai_key = os.getenv("OPENAI_API_KEY")
+        openai_key = self._api_key("OPENAI_API_KEY")
         if (
             openai_key
             and openai_key.strip()
@@ -455,7 +490,7 @@ class AIdeatorAgent:
             available_keys["openai"] = False
 
         # Check Anthropic API Key
-        anthropic_key = os.getenv("ANTHROPIC_API_KEY")
+        anthropic_key = self._api_key("ANTHROPIC_API_KEY")
         if (
             anthropic_key
             and anthropic_key.strip()
@@ -466,7 +501,7 @@ class AIdeatorAgent:
             available_keys["anthropic"] = False
 
         # Check Gemini API Key
-        gemini_key = os.getenv("GEMINI_API_KEY")
+        gemini_key = self._api_key("GEMINI_API_KEY")
         if gemini_key and gemini_key.strip() and gemini_key.startswith("AIza"):
             available_keys["gemini"] = True
         else:
@@ -480,13 +515,21 @@ class AIdeatorAgent:
             ("perplexity", "PERPLEXITY_API_KEY"),
             ("deepseek", "DEEPSEEK_API_KEY"),
         ]:
-            key = os.getenv(env_var)
+            key = self._api_key(env_var)
             available_keys[provider] = bool(
                 key and key.strip() and len(key) > MIN_GENERIC_KEY_LENGTH
             )
 
         return available_keys
 
+    def _api_key(self, name: str) -> str | None:
+        """A provider API key: fetched for this agent, else from the environment."""
+        return self.api_keys.get(name) or os.getenv(name)
+
+    def _process_env(self) -> dict[str, str]:
+        """Environment for CLI subprocesses, including this agent's API keys."""
+        return {**os.environ, **self.api_keys}
+
     def _get_model_provider(self, model_name: str) -> str:
         """Get the provider for a given model name."""
         model_lower = model_name.lower()
@@ -569,13 +612,13 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
     def _validate_cli_credentials(self, agent_mode: str) -> None:
         """Validate credentials for CLI-based coding agents."""
         if agent_mode == "claude-cli":
-            if not os.getenv("ANTHROPIC_API_KEY"):
+            if not self._api_key("ANTHROPIC_API_KEY"):
                 raise RuntimeError("Missing ANTHROPIC_API_KEY for Claude CLI")
         elif agent_mode == "gemini-cli":
-            if not os.getenv("GEMINI_API_KEY"):
+            if not self._api_key("GEMINI_API_KEY"):
                 raise RuntimeError("Missing GEMINI_API_KEY for Gemini CLI")
         elif agent_mode == "openai-codex":
-            if not os.getenv("OPENAI_API_KEY"):
+            if not self._api_key("OPENAI_API_KEY"):
                 raise RuntimeError("Missing OPENAI_API_KEY for OpenAI Codex CLI")
 
         self.log(f"✅ CLI credentials validated for {agent_mode}", "INFO")
@@ -619,7 +662,13 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
     def log(self, message: str, level: str = "INFO", **kwargs):
         """
         Structured logging with JSON output to database.
+
+        Messages below ``LOG_LEVEL`` or over their rate cap are discarded by
+        ``self.log_policy`` before anything is formatted or queued.
         """
+        if not self.log_policy.allow(level, message):
+            return
+
         log_entry = {
             "timestamp": datetime.now(UTC).isoformat(),
             "run_id": self.run_id,
@@ -639,34 +688,9 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
             f"{message} | {json.dumps(kwargs) if kwargs else ''}",
         )
 
-        # Publish to database (async operation, fire and forget)
-        if hasattr(self, "db_service") and self.db_service:
-            import asyncio
-
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_running():
-                    # Include run_id and variation_id in kwargs for database
-                    db_kwargs = {
-                        "run_id": self.run_id,
-                        "variation_id": self.variation_id,
-                        **kwargs,
-                    }
-                    # Schedule as a task if loop is running
-                    task = loop.create_task(
-                        self.db_service.publish_log(message, level, **db_kwargs)
-                    )
-                    # Store task reference to avoid warning
-                    if not hasattr(self, "_bg_tasks"):
-                        self._bg_tasks = set()
-                    self._bg_tasks.add(task)
-                    task.add_done_callback(self._bg_tasks.discard)
-                else:
-                    # If no loop is running, this is likely during initialization
-                    pass
-            except RuntimeError:
-                # No event loop available, skip database logging
-                pass
+        # Persist through the output sink (queued, written in batches)
+        if getattr(self, "output_sink", None):
+            self.output_sink.log(message, level, metadata=kwargs)
 
     def log_progress(self, message: str, detail: str = ""):
         """Log progress updates for user visibility."""
@@ -678,6 +702,9 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
 
     async def log_async(self, message: str, level: str = "INFO", **kwargs):
         """Async structured logging with dual write to Redis Streams and PostgreSQL."""
+        if not self.log_policy.allow(level, message):
+            return
+
         log_entry = {
             "timestamp": datetime.now(UTC).isoformat(),
             "run_id": self.run_id,
@@ -693,192 +720,76 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
             f"{message} | {json.dumps(kwargs) if kwargs else ''}",
         )
 
-        # Dual write: Redis + Database
-        redis_success = False
-        db_success = False
-
-        # Publish to Redis Streams
-        try:
-            if self.redis_client:
-                stream_name = f"run:{self.run_id}:stdout"
-                fields = {
-                    "variation_id": str(self.variation_id),
-                    "content": json.dumps(log_entry),
-                    "level": level,
-                    "timestamp": log_entry["timestamp"],
-                }
-                await self.redis_client.xadd(stream_name, fields)
-                redis_success = True
-        except Exception as e:
-            self.file_logger.error(f"Failed to publish log to Redis Streams: {e}")
-
-        # Write to database
-        try:
-            if self.db_service:
-                await self.db_service.write_agent_output(
-                    run_id=self.run_id,
-                    variation_id=int(self.variation_id),
-                    content=message,
-                    output_type="logging",
-                    metadata={"level": level, **kwargs},
-                )
-                db_success = True
-        except Exception as e:
-            self.file_logger.error(f"Failed to write log to database: {e}")
-
-        # Log dual write status in debug mode
-        if os.getenv("DEBUG") == "true":
-            if redis_success and db_success:
-                self.file_logger.debug("[DUAL-WRITE] Log written to both Redis and DB")
-            elif redis_success:
-                self.file_logger.debug(
-                    "[DUAL-WRITE] Log written to Redis only (DB failed)"
-                )
-            elif db_success:
-                self.file_logger.debug(
-                    "[DUAL-WRITE] Log written to DB only (Redis failed)"
-                )
-            else:
-                self.file_logger.debug(
-                    "[DUAL-WRITE] Failed to write log to both Redis and DB"
-                )
+        # Redis stdout stream + database, both through the output sink
+        if self.output_sink:
+            self.output_sink.log(message, level, metadata=kwargs, publish=True)
+        else:
+            self.file_logger.error("Output sink not initialized, log not published")
 
         # Also print to stdout in debug mode
         if os.getenv("DEBUG") == "true":
             print(json.dumps(log_entry), flush=True)
 
-    async def publish_output(self, content: str):
-        """Publish agent output with dual write to Redis Streams and PostgreSQL."""
-        # Don't log LLM output as it creates duplicate content in logs
-
-        # Dual write: Write to both Redis and database
-        success_redis = False
-        success_db = False
-
-        # Write to Redis Streams (for real-time streaming)
-        try:
-            if self.redis_client:
-                stream_name = f"run:{self.run_id}:llm"
-                fields = {
-                    "variation_id": str(self.variation_id),
-                    "content": content,
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "metadata": json.dumps({"content_length": len(content)}),
-                }
+    async def publish_output(
+        self, content: str, metadata: dict[str, Any] | None = None
+    ):
+        """Publish agent output to Redis Streams and PostgreSQL via the output sink.
 
-                message_id = await self.redis_client.xadd(stream_name, fields)
-                self.log(
-                    f"[REDIS-STREAMS] Published LLM output to stream: {stream_name}, ID: {message_id}",
-                    "DEBUG",
-                )
-                success_redis = True
-            else:
-                self.log("[REDIS-STREAMS] Redis client not initialized", "ERROR")
+        The sink writes exactly one ``llm`` stream entry and one ``llm`` row per
+        call, so callers must not print the same content to stdout as well.
+        Waits while the sink is backed up so slow writes throttle the reader.
+        """
+        if not self.output_sink:
+            self.log("[OUTPUT-SINK] Output sink not initialized", "ERROR")
+            return
 
-        except Exception as e:
-            self.log(
-                f"[REDIS-STREAMS] Failed to publish output to Redis Streams: {e}",
-                "ERROR",
-            )
+        await self.output_sink.wait_for_capacity()
+        self.output_sink.llm(content, metadata)
 
-        # Write to database (for persistence)
+    def _echo(self, text: str, end: str = "") -> None:
+        """Mirror output to the container log without persisting it again."""
+        stream = getattr(sys.stdout, "original_stream", sys.stdout)
         try:
-            if self.db_service:
-                await self.db_service.write_agent_output(
-                    run_id=self.run_id,
-                    variation_id=int(self.variation_id),
-                    content=content,
-                    output_type="llm",
-                    metadata={"content_length": len(content)},
-                )
-                success_db = True
-            else:
-                self.log("[DB-WRITE] Database service not initialized", "ERROR")
+            stream.write(text + end)
+            stream.flush()
+        except Exception:
+            pass
 
-        except Exception as e:
-            self.log(
-                f"[DB-WRITE] Failed to write output to database: {e}",
-                "ERROR",
-            )
+    def _create_coalescer(
+        self, recorder: TranscriptRecorder | None = None
+    ) -> StreamCoalescer:
+        """Coalescer publishing streamed text under this run's latency budget.
 
-        # Log dual write status
-        if success_redis and success_db:
-            self.log(
-                "[DUAL-WRITE] Successfully wrote LLM output to both Redis and DB",
-                "DEBUG",
-            )
-        elif success_redis:
-            self.log(
-                "[DUAL-WRITE] LLM output written to Redis only (DB failed)",
-                "WARNING",
-            )
-        elif success_db:
-            self.log(
-                "[DUAL-WRITE] LLM output written to DB only (Redis failed)",
-                "WARNING",
-            )
-        else:
-            self.log(
-                "[DUAL-WRITE] Failed to write LLM output to both Redis and DB",
-                "ERROR",
-            )
+        Args:
+            recorder: Also record each published piece, for the response cache
+        """
+        publish = self._publish_stream_text
+        if recorder:
 
-    async def _publish_to_redis_only(self, content: str):
-        """Publish agent output to Redis Streams only (database handled by DatabaseStreamWriter)."""
-        try:
-            if self.redis_client:
-                stream_name = f"run:{self.run_id}:llm"
-                fields = {
-                    "variation_id": str(self.variation_id),
-                    "content": content,
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "metadata": json.dumps({"content_length": len(content)}),
-                }
+            async def publish(text: str) -> None:
+                recorder.add(text)
+                await self._publish_stream_text(text)
 
-                message_id = await self.redis_client.xadd(stream_name, fields)
-                self.log(
-                    f"[REDIS-ONLY] Published LLM output to stream: {stream_name}, ID: {message_id}",
-                    "DEBUG",
-                )
-            else:
-                self.log("[REDIS-ONLY] Redis client not initialized", "ERROR")
+        return StreamCoalescer(
+            publish,
+            max_latency_ms=self.stream_flush_ms,
+            max_bytes=self.stream_flush_bytes,
+        )
 
-        except Exception as e:
-            self.log(
-                f"[REDIS-ONLY] Failed to publish output to Redis Streams: {e}",
-                "ERROR",
-            )
+    async def _publish_stream_text(self, text: str) -> None:
+        """Echo and publish one coalesced piece of streamed LLM text."""
+        self._echo(text)
+        await self.publish_output(text)
 
     async def publish_status(self, status: str, metadata: dict[str, Any] | None = None):
-        """Publish status update with dual write to Redis Streams and PostgreSQL."""
-        # Dual write: Write to both Redis and database
-        success_redis = False
-        success_db = False
-
-        # Write to Redis Streams (for real-time streaming)
-        try:
-            if self.redis_client:
-                stream_name = f"run:{self.run_id}:status"
-                fields = {
-                    "status": status,
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "metadata": json.dumps(metadata or {}),
-                }
-                message_id = await self.redis_client.xadd(stream_name, fields)
-                self.log(
-                    f"[REDIS-STREAMS] Published status '{status}' to stream: {message_id}",
-                    "DEBUG",
-                )
-                success_redis = True
-            else:
-                self.log("[REDIS-STREAMS] Redis client not initialized", "ERROR")
-        except Exception as e:
-            self.log(
-                f"[REDIS-STREAMS] Failed to publish status to Redis Streams: {e}",
-                "ERROR",
-            )
+        """Publish status update to Redis Streams and the run record in PostgreSQL."""
+        # Redis status stream (flushed promptly by the sink)
+        if self.output_sink:
+            self.output_sink.status(status, metadata)
+        else:
+            self.log("[OUTPUT-SINK] Output sink not initialized", "ERROR")
 
-        # Write to database (for persistence)
+        # Update the run record (for persistence)
         try:
             if self.db_service:
                 await self.db_service.update_run_status(
@@ -886,7 +797,6 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
                     status=status,
                     metadata=metadata,
                 )
-                success_db = True
             else:
                 self.log("[DB-WRITE] Database service not initialized", "ERROR")
         except Exception as e:
@@ -895,28 +805,6 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
                 "ERROR",
             )
 
-        # Log dual write status
-        if success_redis and success_db:
-            self.log(
-                f"[DUAL-WRITE] Successfully wrote status '{status}' to both Redis and DB",
-                "DEBUG",
-            )
-        elif success_redis:
-            self.log(
-                f"[DUAL-WRITE] Status '{status}' written to Redis only (DB failed)",
-                "WARNING",
-            )
-        elif success_db:
-            self.log(
-                f"[DUAL-WRITE] Status '{status}' written to DB only (Redis failed)",
-                "WARNING",
-            )
-        else:
-            self.log(
-                f"[DUAL-WRITE] Failed to write status '{status}' to both Redis and DB",
-                "ERROR",
-            )
-
     def log_error(self, error: str, exception: Exception | None = None):
         """Log errors with details."""
         error_data = {"error": error}
@@ -927,43 +815,22 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
 
     async def run(self) -> None:
         """Main agent execution flow."""
-        print(
-            json.dumps(
-                {
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "level": "DEBUG",
-                    "message": "🔧 Entered agent.run() method",
-                }
-            ),
-            flush=True,
-        )
+        agent_mode = os.getenv("AGENT_MODE", "litellm")
 
+        # Start the output sink that every agent mode feeds. Output is queued
+        # from the start and written once Redis and the database are connected
+        self.output_sink = OutputSink(
+            run_id=self.run_id, variation_id=self.variation_id
+        )
         self.log("🚀 Starting AIdeator Agent", "INFO", config=self.config)
+        self.log(f"🎯 Agent mode: {agent_mode}", "INFO", agent_mode=agent_mode)
 
-        # Initialize Redis and Database connections
-        print(
-            json.dumps(
-                {
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "level": "DEBUG",
-                    "message": "🔧 About to initialize Redis",
-                }
-            ),
-            flush=True,
-        )
-        await self._init_redis()
+        # API keys, Redis, the database and the repository checkout in one go
+        codebase_summary = await self._bootstrap(agent_mode)
 
-        print(
-            json.dumps(
-                {
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "level": "DEBUG",
-                    "message": "🔧 About to initialize Database",
-                }
-            ),
-            flush=True,
-        )
-        await self._init_database()
+        self.output_sink.redis_client = self.redis_client
+        self.output_sink.db_service = self.db_service
+        await self.output_sink.start()
 
         # Install stdout/stderr interceptors to capture all output
         if self.db_service:
@@ -974,454 +841,461 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
                 "INFO",
             )
 
-        # Fetch API keys from orchestrator
-        print(
-            json.dumps(
-                {
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "level": "DEBUG",
-                    "message": "🔧 About to fetch API keys (async method)",
-                }
-            ),
-            flush=True,
-        )
-        await self._fetch_api_keys()
+        await self._execute(agent_mode, codebase_summary)
 
-        print(
-            json.dumps(
-                {
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "level": "DEBUG",
-                    "message": "🔧 API keys fetched, about to log availability",
-                }
-            ),
-            flush=True,
-        )
+    async def _execute(self, agent_mode: str, codebase_summary: str | None) -> None:
+        """Generate this variation's response, and its diffs in code mode.
 
-        # Log available API keys for debugging
+        Args:
+            agent_mode: Agent mode
+            codebase_summary: Summary that came with the bootstrap checkout
+        """
+        is_code_mode = agent_mode in CLI_TOOLS
         try:
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": "🔧 About to call log_async with available_keys",
-                    }
-                ),
-                flush=True,
-            )
-
+            # Log available API keys for debugging
             await self.log_async(
                 "🔑 API Key availability check",
                 "INFO",
                 available_keys=self.available_api_keys,
             )
 
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": "🔧 log_async completed successfully",
-                    }
-                ),
-                flush=True,
-            )
+            # Validate model credentials (skip for CLI-based coding agents)
+            if not is_code_mode:
+                is_valid, error_msg = self._validate_model_credentials(
+                    self.config["model"]
+                )
+                if not is_valid:
+                    # Output the user-friendly error message
+                    print(error_msg, flush=True)
+                    self.log_error(
+                        f"Missing API key for model {self.config['model']}", None
+                    )
+                    raise RuntimeError(
+                        f"Missing API key for model {self.config['model']}"
+                    )
+            else:
+                # For CLI-based agents, validate CLI-specific credentials
+                self._validate_cli_credentials(agent_mode)
 
-        except Exception as e:
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "ERROR",
-                        "message": f"🔧 log_async failed: {e!s}",
-                        "exception_type": type(e).__name__,
-                    }
-                ),
-                flush=True,
+            # Log LiteLLM Gateway configuration
+            self.log(
+                "🔧 Using LiteLLM Gateway",
+                "INFO",
+                gateway_url=self.gateway_url,
+                model=self.config["model"],
+                note="Routing through LiteLLM Gateway for unified API access",
             )
 
-        # Log agent mode
-        agent_mode = os.getenv("AGENT_MODE", "litellm")
-        print(
-            json.dumps(
-                {
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "level": "DEBUG",
-                    "message": f"🔧 About to log agent mode: {agent_mode}",
-                }
-            ),
-            flush=True,
-        )
+            # Log file location to file only, not stdout
+            self.log(f"Debug logs location: {self.log_file}", "INFO")
 
-        self.log(f"🎯 Agent mode: {agent_mode}", "INFO", agent_mode=agent_mode)
+            if is_code_mode:
+                # The repository was checked out during bootstrap; a summary
+                # cached for the pinned commit saves the analysis
+                if not codebase_summary:
+                    cached_summary = await self._cached_codebase_summary()
+                    codebase_summary = cached_summary or await self._analyze_codebase()
+
+                # Generate response with LLM, streaming diffs as files change
+                self._start_diff_watcher()
+                try:
+                    response = await self._generate_llm_response(codebase_summary)
+                finally:
+                    if self.diff_watcher:
+                        await self.diff_watcher.stop()
+            else:
+                self.log("🔧 Entering chat mode execution", "DEBUG")
 
-        print(
-            json.dumps(
-                {
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "level": "DEBUG",
-                    "message": "🔧 Agent mode logged, about to validate credentials",
-                }
-            ),
-            flush=True,
-        )
+                # Chat mode: Skip repository cloning. When the orchestrator
+                # pinned a commit (agent_chat_repo_context), a summary cached
+                # for it and this prompt is used; the commit is never
+                # resolved here
+                self.log("💬 Chat mode detected - skipping repository clone", "INFO")
+                codebase_summary = None
+                if self.repo_url and self.repo_sha:
+                    codebase_summary = await self._cached_codebase_summary()
+                response = await self._generate_llm_response(codebase_summary)
 
-        # Validate model credentials (skip for CLI-based coding agents)
-        if agent_mode not in ["claude-cli", "gemini-cli", "openai-codex"]:
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": "🔧 Using LiteLLM credential validation",
-                    }
-                ),
-                flush=True,
+            # Output final response
+            self.log(
+                "✅ Generation complete",
+                "INFO",
+                response_length=len(response),
+                status="success",
             )
 
-            is_valid, error_msg = self._validate_model_credentials(self.config["model"])
-            if not is_valid:
-                # Output the user-friendly error message
-                print(error_msg, flush=True)
-                self.log_error(
-                    f"Missing API key for model {self.config['model']}", None
-                )
-                raise RuntimeError(f"Missing API key for model {self.config['model']}")
-        else:
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": f"🔧 Using CLI credential validation for {agent_mode}",
-                    }
-                ),
-                flush=True,
-            )
+            # Generate and save diffs if in code mode
+            if is_code_mode and self.repo_dir.exists():
+                await self._generate_and_save_diffs()
+                await self._checkpoint_session_workspace(codebase_summary)
+
+        except Exception as e:
+            self.log_error("Agent execution failed", e)
+            raise
 
-            # For CLI-based agents, validate CLI-specific credentials
-            self._validate_cli_credentials(agent_mode)
+        finally:
+            if self.session_workspace:
+                self.session_workspace.release()
 
-        print(
-            json.dumps(
-                {
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "level": "DEBUG",
-                    "message": "🔧 Credential validation completed",
-                }
-            ),
-            flush=True,
-        )
+    async def _bootstrap(self, agent_mode: str) -> str | None:
+        """Fetch API keys, connect Redis and the database, and check out the repository.
 
-        # Check if this is a code mode that requires repository
-        is_code_mode = agent_mode in ["claude-cli", "gemini-cli", "openai-codex"]
+        These used to run one after another, with the keys fetched twice
+        (synchronously while constructing the agent, then again once
+        connected). Here they run concurrently; every step is awaited before a
+        failure is raised, so no checkout is left running behind the error.
 
-        print(
-            json.dumps(
-                {
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "level": "DEBUG",
-                    "message": f"🔧 is_code_mode: {is_code_mode}, agent_mode: {agent_mode}",
-                }
-            ),
-            flush=True,
-        )
+        Args:
+            agent_mode: Agent mode; code modes check out the repository
 
-        if is_code_mode:
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": f"🔧 About to check CLI tool version for {agent_mode}",
-                    }
-                ),
-                flush=True,
-            )
+        Returns:
+            The codebase summary that came with the checkout (a resumed
+            session workspace or the run's prep snapshot), or None
+        """
+        start = time.monotonic()
 
-            # Log CLI tool versions for code modes
-            if agent_mode == "claude-cli":
-                claude_version = self._get_cli_version("claude")
-                self.log(
-                    f"🤖 Claude CLI version: {claude_version}",
-                    "INFO",
-                    claude_version=claude_version,
-                )
-            elif agent_mode == "gemini-cli":
-                gemini_version = self._get_cli_version("gemini")
-                self.log(
-                    f"💎 Gemini CLI version: {gemini_version}",
-                    "INFO",
-                    gemini_version=gemini_version,
-                )
-            elif agent_mode == "openai-codex":
-                codex_version = self._get_cli_version("codex")
-                self.log(
-                    f"🔥 OpenAI Codex CLI version: {codex_version}",
-                    "INFO",
-                    codex_version=codex_version,
-                )
+        async def connect_redis() -> None:
+            await self._init_redis()
+            self._init_response_cache()
+            await self._init_summary_cache()
 
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": "🔧 CLI tool version check completed",
-                    }
-                ),
-                flush=True,
-            )
+        steps = [connect_redis(), self._init_database(), self._fetch_api_keys()]
+        if agent_mode in CLI_TOOLS:
+            steps += [self._checkout_workspace(), self._log_cli_version(agent_mode)]
 
-        # Log LiteLLM Gateway configuration
-        print(
-            json.dumps(
-                {
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "level": "DEBUG",
-                    "message": "🔧 About to log LiteLLM Gateway configuration",
-                }
-            ),
-            flush=True,
-        )
+        results = await asyncio.gather(*steps, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                if self.session_workspace:
+                    self.session_workspace.release()
+                raise result
 
         self.log(
-            "🔧 Using LiteLLM Gateway",
+            "⏱️ Bootstrap complete",
             "INFO",
-            gateway_url=self.gateway_url,
-            model=self.config["model"],
-            note="Routing through LiteLLM Gateway for unified API access",
+            bootstrap_ms=int((time.monotonic() - start) * 1000),
         )
+        return results[3] if agent_mode in CLI_TOOLS else None
 
-        print(
-            json.dumps(
-                {
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "level": "DEBUG",
-                    "message": "🔧 LiteLLM Gateway logged, about to log debug file location",
-                }
-            ),
-            flush=True,
-        )
+    async def _checkout_workspace(self) -> str | None:
+        """Check out the repository the code-mode agent works on.
 
-        # Log file location to file only, not stdout
-        self.log(f"Debug logs location: {self.log_file}", "INFO")
+        The previous turn's working tree is preferred, then the run's prep
+        snapshot, over a clone of our own.
 
-        print(
-            json.dumps(
-                {
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "level": "DEBUG",
-                    "message": "🔧 About to enter main execution try block",
-                }
-            ),
-            flush=True,
+        Returns:
+            The codebase summary that came with a resumed workspace or the
+            snapshot, or None when the repository was cloned
+        """
+        self.log("📁 Code mode detected - cloning repository", "INFO")
+        codebase_summary = await self._resume_session_workspace()
+        if codebase_summary is None:
+            codebase_summary = await self._restore_snapshot()
+        if codebase_summary is None:
+            await self._clone_repository()
+        return codebase_summary
+
+    async def _log_cli_version(self, agent_mode: str) -> None:
+        """Log the version of the CLI tool a code mode runs."""
+        command, label = CLI_TOOLS[agent_mode]
+        version = await asyncio.to_thread(self._get_cli_version, command)
+        self.log(
+            f"{label} version: {version}",
+            "INFO",
+            **{f"{command}_version": version},
         )
 
-        try:
-            if is_code_mode:
-                print(
-                    json.dumps(
-                        {
-                            "timestamp": datetime.now(UTC).isoformat(),
-                            "level": "DEBUG",
-                            "message": "🔧 Entering code mode execution",
-                        }
-                    ),
-                    flush=True,
-                )
-
-                # Code mode: Clone repository and analyze codebase
-                self.log("📁 Code mode detected - cloning repository", "INFO")
+    async def _clone_repository(self) -> None:
+        """Clone the repository to analyze."""
+        self.log_progress("Cloning repository", self.repo_url)
 
-                print(
-                    json.dumps(
-                        {
-                            "timestamp": datetime.now(UTC).isoformat(),
-                            "level": "DEBUG",
-                            "message": "🔧 About to clone repository",
-                        }
-                    ),
-                    flush=True,
-                )
+        try:
+            # Mirror-backed (or shallow) clone, run off the event loop
+            clone_metrics = await self.repo_cache.checkout(
+                self.repo_url, self.repo_dir, commit=self.repo_sha
+            )
 
-                await self._clone_repository()
+            self.workspace_commit = clone_metrics.get("commit")
+            self.log_progress(
+                "Repository cloned successfully",
+                f"Clone time: {clone_metrics['clone_ms']} ms",
+            )
+            self.log("📦 Repository checkout", "INFO", **clone_metrics)
 
-                print(
-                    json.dumps(
-                        {
-                            "timestamp": datetime.now(UTC).isoformat(),
-                            "level": "DEBUG",
-                            "message": "🔧 Repository cloned, about to analyze codebase",
-                        }
-                    ),
-                    flush=True,
-                )
+        except Exception as e:
+            self.log_error("Failed to clone repository", e)
+            raise RuntimeError(f"Repository clone failed: {e}") from e
 
-                # Analyze codebase
-                codebase_summary = await self._analyze_codebase()
+    async def prepare_snapshot(self) -> None:
+        """Run-level prep: clone and analyse once, publish the snapshot for variations."""
+        if not self.snapshot:
+            raise RuntimeError("AGENT_SNAPSHOT_DIR is required for the prep task")
 
-                print(
-                    json.dumps(
-                        {
-                            "timestamp": datetime.now(UTC).isoformat(),
-                            "level": "DEBUG",
-                            "message": "🔧 Codebase analyzed, about to generate LLM response",
-                        }
-                    ),
-                    flush=True,
-                )
+        self.log("📸 Preparing run workspace snapshot", "INFO", commit=self.repo_sha)
+        try:
+            await asyncio.gather(self._init_summary_cache(), self._clone_repository())
+            cached_summary = await self._cached_codebase_summary()
+            codebase_summary = cached_summary or await self._analyze_codebase()
+            manifest = await asyncio.to_thread(
+                self.snapshot.publish,
+                self.repo_dir,
+                repo_url=self.repo_url,
+                summary=codebase_summary,
+            )
+        except Exception as e:
+            # Variations waiting for the snapshot clone right away instead
+            await asyncio.to_thread(self.snapshot.mark_failed, str(e))
+            raise
+        self.log("📸 Workspace snapshot published", "INFO", **manifest)
 
-                # Generate response with LLM
-                response = await self._generate_llm_response(codebase_summary)
-            else:
-                print(
-                    json.dumps(
-                        {
-                            "timestamp": datetime.now(UTC).isoformat(),
-                            "level": "DEBUG",
-                            "message": "🔧 Entering chat mode execution",
-                        }
-                    ),
-                    flush=True,
-                )
+    async def _resume_session_workspace(self) -> str | None:
+        """Work in the session's persistent workspace, resuming the last turn.
 
-                # Chat mode: Skip repository cloning, just pass prompt directly
-                self.log("💬 Chat mode detected - skipping repository clone", "INFO")
-                response = await self._generate_llm_response(None)
+        Returns:
+            The codebase summary when the previous turn's working tree was
+            resumed (empty if none was stored), or None when the workspace
+            still needs a checkout
+        """
+        if not self.session_workspace:
+            return None
 
-            # Output final response
+        if not await asyncio.to_thread(self.session_workspace.acquire):
             self.log(
-                "✅ Generation complete",
-                "INFO",
-                response_length=len(response),
-                status="success",
+                "Session workspace is busy with another turn, using a fresh one",
+                "WARNING",
             )
+            self.session_workspace = None
+            return None
 
-            # Generate and save diffs if in code mode
-            if is_code_mode and self.repo_dir.exists():
-                await self._generate_and_save_diffs()
-
+        self.repo_dir = self.session_workspace.repo_dir
+        try:
+            resumed = await asyncio.to_thread(
+                self.session_workspace.resume, self.repo_url
+            )
         except Exception as e:
-            self.log_error("Agent execution failed", e)
-            raise
+            self.log(f"Session workspace unusable, checking out again: {e}", "WARNING")
+            resumed = None
+        if resumed is None:
+            return None
+
+        manifest, codebase_summary = resumed
+        self.workspace_commit = manifest["commit"]
+        self.log("🔁 Resumed session workspace", "INFO", **manifest)
+        return codebase_summary
+
+    async def _checkpoint_session_workspace(self, codebase_summary: str | None) -> None:
+        """Commit this turn's changes so the session's next turn starts from them."""
+        if not self.session_workspace:
+            return
+        try:
+            manifest = await asyncio.to_thread(
+                self.session_workspace.checkpoint,
+                repo_url=self.repo_url,
+                run_id=self.run_id,
+                summary=codebase_summary,
+            )
+            self.log("💾 Checkpointed session workspace", "INFO", **manifest)
+        except Exception as e:
+            self.log_error("Failed to checkpoint session workspace", e)
 
-    async def _clone_repository(self) -> None:
-        """Clone the repository to analyze."""
-        self.log_progress("Cloning repository", self.repo_url)
+    async def _restore_snapshot(self) -> str | None:
+        """Restore the run's prep snapshot into the workspace.
 
-        try:
-            if self.repo_dir.exists():
-                shutil.rmtree(self.repo_dir)
+        Returns:
+            The snapshot's codebase summary, or None when the agent should
+            clone and analyse the repository itself
+        """
+        if not self.snapshot:
+            return None
+        if not self.snapshot.ready and not await self._wait_for_snapshot():
+            return None
 
-            # Clone with minimal depth
-            git.Repo.clone_from(
-                self.repo_url, self.repo_dir, depth=1, single_branch=True
+        try:
+            manifest, codebase_summary = await asyncio.to_thread(
+                self.snapshot.restore, self.repo_dir
             )
+        except Exception as e:
+            self.log(f"Snapshot restore failed, cloning instead: {e}", "WARNING")
+            return None
 
-            self.log_progress(
-                "Repository cloned successfully",
-                f"Size: {self._get_directory_size(self.repo_dir)} MB",
+        if self.repo_sha and manifest["commit"] != self.repo_sha:
+            self.log(
+                "Snapshot is for a different commit, cloning instead",
+                "WARNING",
+                snapshot_commit=manifest["commit"],
+                expected_commit=self.repo_sha,
             )
+            return None
 
-        except Exception as e:
-            self.log_error("Failed to clone repository", e)
-            raise RuntimeError(f"Repository clone failed: {e}") from e
+        self.log("📸 Restored run workspace snapshot", "INFO", **manifest)
+        return codebase_summary
 
-    async def _analyze_codebase(self) -> str:
-        """Analyze the codebase structure and content."""
-        self.log_progress("Analyzing codebase structure")
+    async def _wait_for_snapshot(self) -> bool:
+        """Wait up to ``AGENT_SNAPSHOT_WAIT`` seconds for the prep job's snapshot.
 
-        analysis = {
-            "files": [],
-            "total_files": 0,
-            "total_size_mb": 0,
-            "languages": {},
-            "key_files": [],
-        }
+        Returns:
+            Whether the snapshot was published in time; False at once when no
+            prep job was started or it gave up
+        """
+        if self.snapshot_wait <= 0:
+            return False
+
+        start = time.monotonic()
+        while time.monotonic() - start < self.snapshot_wait:
+            if self.snapshot.failed:
+                break
+            await asyncio.sleep(SNAPSHOT_POLL_INTERVAL)
+            if self.snapshot.ready:
+                return True
+        self.log(
+            "Workspace snapshot not available, cloning instead",
+            "WARNING",
+            waited_ms=int((time.monotonic() - start) * 1000),
+            prep_failed=self.snapshot.failed,
+        )
+        return False
 
-        try:
-            # Walk through repository
-            for root, dirs, files in os.walk(self.repo_dir):
-                # Skip hidden and vendor directories
-                dirs[:] = [
-                    d
-                    for d in dirs
-                    if not d.startswith(".")
-                    and d not in ["node_modules", "vendor", "__pycache__"]
-                ]
+    async def _init_summary_cache(self) -> None:
+        """Attach the commit-addressed summary cache, connecting Redis if needed."""
+        if self.summary_cache_ttl <= 0 or self.summary_cache:
+            return
+        if self.redis_client is None:
+            try:
+                await self._init_redis()
+            except RuntimeError as e:
+                self.log(f"Summary cache disabled: {e}", "WARNING")
+                return
+        self.summary_cache = SummaryCache(
+            self.redis_client,
+            ttl=self.summary_cache_ttl,
+            max_entries=self.summary_cache_max_entries,
+        )
 
-                for file in files:
-                    if file.startswith("."):
-                        continue
+    def _init_response_cache(self) -> None:
+        """Attach the response cache, if enabled, to the connected Redis client."""
+        if self.response_cache_ttl <= 0 or self.response_cache or not self.redis_client:
+            return
+        self.response_cache = ResponseCache(
+            self.redis_client,
+            ttl=self.response_cache_ttl,
+            max_entries=self.response_cache_max_entries,
+        )
 
-                    file_path = Path(root) / file
-                    relative_path = file_path.relative_to(self.repo_dir)
+    async def _cached_codebase_summary(self) -> str | None:
+        """Codebase summary cached for the pinned commit and this prompt, if any."""
+        if not self.summary_cache or not self.repo_sha:
+            return None
+        summary = await self.summary_cache.get(
+            self.repo_url, self.repo_sha, self.prompt
+        )
+        self.log(
+            f"🧠 Codebase summary cache {'hit' if summary else 'miss'}",
+            "INFO",
+            commit=self.repo_sha,
+        )
+        return summary
 
-                    # Track file extension
-                    ext = file_path.suffix.lower()
-                    if ext:
-                        analysis["languages"][ext] = (
-                            analysis["languages"].get(ext, 0) + 1
-                        )
+    def _context_budget(self) -> int:
+        """Tokens of codebase context that fit this model's request."""
+        if self.context_window is None:
+            try:
+                info = get_model_info(self.config["model"])
+                self.context_window = info.get("max_input_tokens") or None
+            except Exception:
+                self.context_window = None  # Unknown: context_budget's default
+        return context_budget(
+            self.context_window,
+            max_output_tokens=self.config["max_tokens"],
+            prompt=self.prompt,
+            max_context_tokens=self.max_context_tokens,
+        )
 
-                    analysis["total_files"] += 1
+    async def _load_or_build_index(self, manifest: RepoManifest) -> SearchIndex:
+        """Search index of the workspace, reused from the snapshot volume if cached."""
+        commit = self.workspace_commit or self.repo_sha
+        path = self.snapshot.index_path(commit) if self.snapshot and commit else None
 
-                    # Add file info
-                    file_info = {
-                        "path": str(relative_path),
-                        "size": file_path.stat().st_size,
-                    }
-                    analysis["files"].append(file_info)
-
-            # Calculate total size
-            analysis["total_size_mb"] = self._get_directory_size(self.repo_dir)
-
-            # Identify key files
-            analysis["key_files"] = self._identify_key_files()
-
-            # Read key file contents
-            summary_parts = [
-                f"Repository: {self.repo_url}",
-                f"Total files: {analysis['total_files']}",
-                f"Total size: {analysis['total_size_mb']} MB",
-                f"Languages: {', '.join(f'{k}({v})' for k, v in sorted(analysis['languages'].items(), key=lambda x: x[1], reverse=True)[:5])}",
-                "",
-                "Key files:",
-            ]
+        if path and path.exists():
+            try:
+                index = await asyncio.to_thread(SearchIndex.load, path)
+                self.log("🔎 Search index loaded", "INFO", commit=commit, **index.stats)
+                return index
+            except Exception as e:
+                self.log(f"Cached search index unusable, rebuilding: {e}", "WARNING")
+
+        index = await asyncio.to_thread(SearchIndex.build, manifest)
+        self.log("🔎 Search index built", "INFO", commit=commit, **index.stats)
+        if path:
+            try:
+                await asyncio.to_thread(index.save, path)
+            except OSError as e:
+                self.log(f"Could not cache search index: {e}", "WARNING")
+        return index
 
-            # Read contents of key files
-            for key_file in analysis["key_files"][
-                :MAX_KEY_FILES_TO_READ
-            ]:  # Limit to top files
-                file_path = self.repo_dir / key_file
-                if (
-                    file_path.exists() and file_path.stat().st_size < MAX_KEY_FILE_SIZE
-                ):  # Skip large files
-                    try:
-                        async with aiofiles.open(
-                            file_path, encoding="utf-8", errors="ignore"
-                        ) as f:
-                            content = await f.read()
-                            summary_parts.extend(
-                                [
-                                    f"\n--- {key_file} ---",
-                                    content[:MAX_FILE_PREVIEW_CHARS],  # First chars
-                                    "..."
-                                    if len(content) > MAX_FILE_PREVIEW_CHARS
-                                    else "",
-                                    "",
-                                ]
-                            )
-                    except Exception as e:
-                        self.file_logger.warning(f"Failed to read {key_file}: {e}")
+    async def _analyze_codebase(self) -> str:
+        """Analyze the codebase structure and content."""
+        self.log_progress("Analyzing codebase structure")
 
-            summary = "\n".join(summary_parts)
+        try:
+            # One listing of the workspace, off the event loop; later consumers
+            # reuse self.repo_manifest instead of walking the tree again
+            manifest = await asyncio.to_thread(scan_repository, self.repo_dir)
+            self.repo_manifest = manifest
+            self.log(
+                "🗂️ Repository scanned",
+                "INFO",
+                files=manifest.total_files,
+                source=manifest.source,
+                scan_ms=manifest.scan_ms,
+            )
+
+            top_languages = manifest.languages.most_common(5)
+            header = "\n".join(
+                [
+                    f"Repository: {self.repo_url}",
+                    f"Total files: {manifest.total_files}",
+                    f"Total size: {manifest.total_size_mb} MB",
+                    f"Languages: {', '.join(f'{k}({v})' for k, v in top_languages)}",
+                    "",
+                    "Relevant files:",
+                ]
+            )
+
+            # Files and snippets ranked against the prompt, packed into the
+            # largest budget any model gets; each variation trims it to its
+            # own window
+            self.search_index = await self._load_or_build_index(manifest)
+            context = await build_context(
+                manifest,
+                self.prompt,
+                self.max_context_tokens,
+                header=header,
+                index=self.search_index,
+            )
+            summary = context.text
+            self.log(
+                "🧩 Codebase context built",
+                "INFO",
+                files=len(context.files),
+                snippets=context.snippets,
+                excerpts=len(context.excerpts),
+                candidates=context.candidates,
+                tokens=context.used_tokens,
+                budget=context.budget_tokens,
+                build_ms=context.build_ms,
+            )
+
+            # Later variations and runs of this prompt on this commit skip
+            # the analysis
+            commit = self.workspace_commit or self.repo_sha
+            if self.summary_cache and commit:
+                await self.summary_cache.put(
+                    self.repo_url, commit, self.prompt, summary
+                )
 
             self.log_progress(
                 "Codebase analysis complete",
-                f"Files: {analysis['total_files']}, Size: {analysis['total_size_mb']}MB",
+                f"Files: {manifest.total_files}, Size: {manifest.total_size_mb}MB",
             )
 
             return summary
@@ -1430,52 +1304,6 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
             self.log_error("Codebase analysis failed", e)
             raise RuntimeError(f"Failed to analyze codebase: {e}") from e
 
-    def _identify_key_files(self) -> list:
-        """Identify important files in the repository."""
-        key_patterns = [
-            "README*",
-            "readme*",
-            "package.json",
-            "requirements.txt",
-            "setup.py",
-            "Cargo.toml",
-            "go.mod",
-            "Dockerfile",
-            "docker-compose*",
-            ".github/workflows/*",
-            "main.*",
-            "app.*",
-            "index.*",
-            "config.*",
-            "settings.*",
-        ]
-
-        key_files = []
-        for pattern in key_patterns:
-            if "*" in pattern:
-                # Handle wildcards
-                import glob
-
-                matches = glob.glob(str(self.repo_dir / pattern), recursive=True)
-                for match in matches:
-                    try:
-                        rel_path = Path(match).relative_to(self.repo_dir)
-                        key_files.append(str(rel_path))
-                    except:
-                        pass
-            else:
-                # Direct file check
-                file_path = self.repo_dir / pattern
-                if file_path.exists():
-                    key_files.append(pattern)
-
-        return key_files
-
-    def _get_directory_size(self, path: Path) -> float:
-        """Get directory size in MB."""
-        total_size = sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
-        return round(total_size / (1024 * 1024), 2)
-
     def _get_cli_version(self, command: str) -> str:
         """Get version of a CLI tool."""
         try:
@@ -1496,21 +1324,74 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
         except Exception as e:
             return f"Error: {e!s}"
 
-    @retry(
-        stop=stop_after_attempt(MAX_RETRY_ATTEMPTS),
-        wait=wait_exponential(multiplier=1, min=RETRY_MIN_WAIT, max=RETRY_MAX_WAIT),
-    )
     async def _generate_llm_response(self, codebase_summary: str) -> str:
-        """Generate LLM response based on codebase analysis."""
+        """Generate LLM response based on codebase analysis.
+
+        Failed attempts are retried after a jittered wait that honours the
+        provider's Retry-After, without streaming the same output twice (see
+        ``_begin_retry``).
+        """
         agent_mode = os.getenv("AGENT_MODE", "litellm")
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(MAX_RETRY_ATTEMPTS),
+            wait=RetryWait(min_wait=RETRY_MIN_WAIT, max_wait=RETRY_MAX_WAIT),
+        )
 
-        if agent_mode == "claude-cli":
-            return await self._generate_claude_cli_response()
-        if agent_mode == "gemini-cli":
-            return await self._generate_gemini_cli_response()
-        if agent_mode == "openai-codex":
-            return await self._generate_openai_codex_response()
-        return await self._generate_litellm_response(codebase_summary)
+        async for attempt in retrying:
+            with attempt:
+                if attempt.retry_state.attempt_number > 1:
+                    self._begin_retry(attempt.retry_state.attempt_number, agent_mode)
+
+                if agent_mode == "claude-cli":
+                    return await self._generate_claude_cli_response()
+                if agent_mode == "gemini-cli":
+                    return await self._generate_gemini_cli_response()
+                if agent_mode == "openai-codex":
+                    return await self._generate_openai_codex_response()
+                return await self._generate_litellm_response(codebase_summary)
+        return ""  # Unreachable: the last failure raises RetryError
+
+    def _begin_retry(self, attempt: int, agent_mode: str) -> None:
+        """Start another attempt without re-streaming the failed ones' output.
+
+        LiteLLM retries on models that continue an assistant prefix resume
+        the partial response: its output stays and the new attempt streams
+        the rest. Otherwise the attempts that streamed output are marked
+        superseded on the status stream and in the database, and consumers
+        drop their llm output (numbered by attempt and seq).
+
+        Args:
+            attempt: Number of the attempt about to start
+            agent_mode: Agent mode of this variation
+        """
+        sink = self.output_sink
+        if sink and sink.seq:
+            self._streamed_attempts.append(sink.attempt)
+
+        resume = (
+            agent_mode not in CLI_TOOLS
+            and bool(self._partial_response)
+            and self._get_model_provider(self.config["model"]) in PREFILL_PROVIDERS
+        )
+        if not resume and self._streamed_attempts:
+            superseded = {
+                "variation_id": int(self.variation_id),
+                "attempts": self._streamed_attempts,
+            }
+            if sink:
+                sink.status("attempt_superseded", superseded)
+                sink.record("status", "attempt_superseded", superseded)
+            self._streamed_attempts = []
+            self._partial_response = ""
+
+        if sink:
+            sink.begin_attempt(attempt)
+        self.log(
+            f"🔁 Retrying generation (attempt {attempt})",
+            "WARNING",
+            attempt=attempt,
+            resumed_chars=len(self._partial_response),
+        )
 
     async def _generate_claude_cli_response(self) -> str:
         """Generate response using Claude CLI with real-time streaming."""
@@ -1520,10 +1401,6 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
         )
 
         try:
-            # Change to repository directory for context
-            original_dir = os.getcwd()
-            os.chdir(self.repo_dir)
-
             # Execute Claude CLI with streaming arguments (matching TypeScript version)
             self.log_progress(
                 "Executing Claude CLI", f"Working directory: {self.repo_dir}"
@@ -1548,7 +1425,8 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
                 stdin=asyncio.subprocess.PIPE,
-                env=os.environ,  # Includes ANTHROPIC_API_KEY
+                cwd=self.repo_dir,  # Repository directory for context
+                env=self._process_env(),  # Includes ANTHROPIC_API_KEY
             )
 
             # Close stdin immediately since we're using -p flag (like TypeScript version)
@@ -1556,101 +1434,52 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
 
             # Stream processing variables
             collected_output = []
-            buffer = ""
             data_chunks = 0
-            total_bytes = 0
+            decoder = ClaudeStreamDecoder()
+            result_event: ClaudeResult | None = None
+            request_start_time = datetime.now(UTC)
+            coalescer = self._create_coalescer()
 
             self.log_progress("Claude CLI process started", f"PID: {process.pid}")
 
             try:
-                # Read stdout in real-time chunks (like TypeScript version)
+                # Large reads; only complete stream-json lines are decoded
                 while True:
-                    # Read a chunk of data
-                    chunk = await process.stdout.read(CHUNK_READ_SIZE)
-                    if not chunk:
-                        break
-
-                    data_chunks += 1
-                    total_bytes += len(chunk)
-
-                    chunk_text = chunk.decode("utf-8", errors="ignore")
-                    self.log_progress(
-                        f"Received stdout chunk #{data_chunks}",
-                        f"({len(chunk)} bytes) - {chunk_text[:100]}{'...' if len(chunk_text) > 100 else ''}",
-                    )
+                    data = await process.stdout.read(STREAM_READ_SIZE)
+                    if data:
+                        data_chunks += 1
+                        events = decoder.feed(data)
+                    else:
+                        events = decoder.close()
+
+                    for event in events:
+                        if isinstance(event, ClaudeText):
+                            # Stream under the run's latency budget
+                            await coalescer.write(event.text)
+                            collected_output.append(event.text)
+                        elif isinstance(event, ClaudeToolUse):
+                            tool_info = f"🔧 Using tool: {event.name}\n"
+                            collected_output.append(tool_info)
+                            await coalescer.write(tool_info)
+                        elif isinstance(event, ClaudeResult):
+                            result_event = event
+                        elif isinstance(event, ClaudeDecodeError):
+                            # Should not happen with --output-format stream-json
+                            self.log(
+                                f"Undecodable Claude CLI line: {event.error}",
+                                "WARNING",
+                                line=event.line[:200],
+                            )
 
-                    # Process the chunk immediately (streaming approach)
-                    buffer += chunk_text
-                    lines = buffer.split("\n")
-                    buffer = lines.pop()  # Keep incomplete line in buffer
-
-                    for line in lines:
-                        if line.strip():
-                            try:
-                                # Try to parse as JSON first (Claude CLI stream format)
-                                json_data = json.loads(line)
-                                self.log_progress(
-                                    "Parsed JSON message",
-                                    f"Type: {json_data.get('type', 'unknown')}",
-                                )
+                    if not data:
+                        break
 
-                                # Extract content from JSON message
-                                if json_data.get(
-                                    "type"
-                                ) == "assistant" and json_data.get("message", {}).get(
-                                    "content"
-                                ):
-                                    for content_item in json_data["message"]["content"]:
-                                        if content_item.get(
-                                            "type"
-                                        ) == "text" and content_item.get("text"):
-                                            text_content = content_item["text"]
-                                            # Output immediately for streaming (like TypeScript)
-                                            print(text_content, end="", flush=True)
-                                            # Stream to Redis only (database handled by DatabaseStreamWriter)
-                                            await self._publish_to_redis_only(
-                                                text_content
-                                            )
-                                            # Note: stdout database writing is handled by DatabaseStreamWriter
-                                            collected_output.append(text_content)
-                                        elif content_item.get("type") == "tool_use":
-                                            tool_name = content_item.get(
-                                                "name", "unknown"
-                                            )
-                                            tool_info = f"🔧 Using tool: {tool_name}"
-                                            # Only print once - DatabaseStreamWriter will handle DB persistence
-                                            print(tool_info, flush=True)
-                                            collected_output.append(tool_info + "\n")
-
-                                            # Stream to Redis only (DB handled by DatabaseStreamWriter)
-                                            await self._publish_to_redis_only(tool_info)
-
-                            except json.JSONDecodeError as e:
-                                # This should NOT happen with --output-format stream-json
-                                self.log_progress(
-                                    "JSON DECODE ERROR - This should not happen!",
-                                    f"Line: '{line}' | Error: {str(e)[:100]}",
-                                )
-                                # Do NOT print the line - it's malformed and causes duplication
-                                # print(line, flush=True)  # REMOVED
-                                # collected_output.append(line + "\n")  # REMOVED
-
-                # Handle any remaining buffer content
-                if buffer.strip():
-                    self.log_progress(
-                        "Processing remaining buffer",
-                        f"{buffer[:50]}{'...' if len(buffer) > 50 else ''}",
-                    )
-                    # Buffer content was already processed in the streaming loop above
-                    # Do not print again to avoid duplication
-                    collected_output.append(buffer)
+                # Publish whatever is still held by the coalescer
+                await coalescer.close()
 
                 # Wait for process to complete
                 await process.wait()
 
-                # Change back to original directory
-                os.chdir(original_dir)
-
                 # Handle stderr if there were errors
                 if process.returncode != 0:
                     stderr_output = await process.stderr.read()
@@ -1662,12 +1491,10 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
                         f"Exit code: {process.returncode}, Error: {error_msg}",
                     )
                     # Persist stderr to database
-                    if self.db_service and error_msg:
-                        await self.db_service.write_agent_output(
-                            run_id=self.run_id,
-                            variation_id=int(self.variation_id),
-                            content=error_msg,
-                            output_type="stderr",
+                    if self.output_sink and error_msg:
+                        self.output_sink.record(
+                            "stderr",
+                            error_msg,
                             metadata={
                                 "source": "claude_cli",
                                 "exit_code": process.returncode,
@@ -1687,9 +1514,12 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
 
                 # Success case
                 response = "".join(collected_output)
+                total_bytes = decoder.stats["bytes"]
                 self.log_progress(
                     "Claude CLI streaming completed successfully",
-                    f"Total chunks: {data_chunks}, Total bytes: {total_bytes}, Response length: {len(response)} characters",
+                    f"Total reads: {data_chunks}, Total bytes: {total_bytes}, "
+                    f"Lines: {decoder.stats['lines']}, "
+                    f"Response length: {len(response)} characters",
                 )
 
                 # Write analytics data for Claude CLI
@@ -1701,9 +1531,10 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
                             "provider": "anthropic",
                             "stream": True,
                             "status": "success",
+                            "request_start_time": request_start_time,
                             "request_end_time": request_end_time,
                             "response_time_ms": int(
-                                (request_end_time - datetime.now(UTC)).total_seconds()
+                                (request_end_time - request_start_time).total_seconds()
                                 * 1000
                             ),
                             "metadata": {
@@ -1712,8 +1543,38 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
                                 "total_bytes": total_bytes,
                                 "response_length": len(response),
                                 "working_directory": str(self.repo_dir),
+                                "message_types": decoder.message_types,
                             },
                         }
+                        if result_event:
+                            # Totals reported by the CLI's final result message
+                            prompt_tokens = result_event.usage.get("input_tokens")
+                            completion_tokens = result_event.usage.get("output_tokens")
+                            total_tokens = None
+                            if (
+                                prompt_tokens is not None
+                                or completion_tokens is not None
+                            ):
+                                total_tokens = (prompt_tokens or 0) + (
+                                    completion_tokens or 0
+                                )
+                            analytics_data.update(
+                                {
+                                    "cost_usd": result_event.total_cost_usd,
+                                    "prompt_tokens": prompt_tokens,
+                                    "completion_tokens": completion_tokens,
+                                    "total_tokens": total_tokens,
+                                }
+                            )
+                            if result_event.is_error:
+                                analytics_data["status"] = "error"
+                            analytics_data["metadata"].update(
+                                {
+                                    "cli_duration_ms": result_event.duration_ms,
+                                    "num_turns": result_event.num_turns,
+                                    "session_id": result_event.session_id,
+                                }
+                            )
 
                         await self.db_service.write_litellm_analytics(
                             run_id=self.run_id,
@@ -1734,6 +1595,10 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
                 return response if response else "No output received from Claude CLI"
 
             except Exception as stream_error:
+                # Keep whatever streamed before the failure
+                with contextlib.suppress(Exception):
+                    await coalescer.close()
+
                 # Clean up process if still running
                 if process.returncode is None:
                     process.terminate()
@@ -1741,10 +1606,6 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
                 raise stream_error
 
         except Exception as e:
-            # Change back to original directory in case of error
-            with contextlib.suppress(builtins.BaseException):
-                os.chdir(original_dir)
-
             self.log_error("Claude CLI streaming execution failed", e)
             raise RuntimeError(f"Failed to generate Claude CLI response: {e}") from e
 
@@ -1755,61 +1616,67 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
         )
 
         try:
-            # Change to repository directory for context
-            original_dir = os.getcwd()
-            os.chdir(self.repo_dir)
-
             # Execute Gemini CLI
             self.log_progress(
                 "Executing Gemini CLI", f"Working directory: {self.repo_dir}"
             )
 
+            request_start_time = datetime.now(UTC)
             result = await asyncio.create_subprocess_exec(
                 "gemini",
                 "prompt",
                 self.prompt,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
-                env=os.environ,  # Includes GEMINI_API_KEY
+                cwd=self.repo_dir,  # Repository directory for context
+                env=self._process_env(),  # Includes GEMINI_API_KEY
             )
 
-            # Wait for completion with timeout
+            # Stream stdout as it arrives; the timeout applies to silence, not
+            # to the total run time
+            idle_timeout = float(os.getenv("GEMINI_IDLE_TIMEOUT", "30"))
+            stderr_task = asyncio.create_task(result.stderr.read())
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            collected_output = []
+            coalescer = self._create_coalescer()
             try:
-                stdout, stderr = await asyncio.wait_for(
-                    result.communicate(), timeout=30.0
-                )
-            except TimeoutError:
-                result.terminate()
-                await result.wait()
-                raise RuntimeError("Gemini CLI execution timed out after 30 seconds")
+                while True:
+                    try:
+                        data = await asyncio.wait_for(
+                            result.stdout.read(STREAM_READ_SIZE), timeout=idle_timeout
+                        )
+                    except TimeoutError:
+                        result.terminate()
+                        await result.wait()
+                        raise RuntimeError(
+                            f"Gemini CLI produced no output for {idle_timeout:g} seconds"
+                        ) from None
+                    text = decoder.decode(data, final=not data)
+                    if text:
+                        collected_output.append(text)
+                        await coalescer.write(text)
+                    if not data:
+                        break
+            except BaseException:
+                stderr_task.cancel()
+                raise
+            finally:
+                # Publish whatever is still held by the coalescer
+                await coalescer.close()
 
-            # Change back to original directory
-            os.chdir(original_dir)
+            stderr = await stderr_task
+            await result.wait()
 
             if result.returncode == 0:
                 # Gemini CLI returns plain text output
-                response = stdout.decode().strip()
+                response = "".join(collected_output).strip()
                 self.log(
                     "Gemini CLI response received",
                     "INFO",
                     response_length=len(response),
+                    entries=coalescer.stats["entries"],
                 )
 
-                # Persist stdout to database
-                if self.db_service and response:
-                    await self.db_service.write_agent_output(
-                        run_id=self.run_id,
-                        variation_id=int(self.variation_id),
-                        content=response,
-                        output_type="stdout",
-                        metadata={"source": "gemini_cli"},
-                    )
-
-                # Stream the response line by line
-                for line in response.split("\n"):
-                    if line.strip():
-                        print(f"🔸 {line}", flush=True)
-
                 # Write analytics data for Gemini CLI
                 if self.db_service:
                     try:
@@ -1817,11 +1684,12 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
                         analytics_data = {
                             "model": "gemini-cli",
                             "provider": "google",
-                            "stream": False,
+                            "stream": True,
                             "status": "success",
+                            "request_start_time": request_start_time,
                             "request_end_time": request_end_time,
                             "response_time_ms": int(
-                                (request_end_time - datetime.now(UTC)).total_seconds()
+                                (request_end_time - request_start_time).total_seconds()
                                 * 1000
                             ),
                             "metadata": {
@@ -1851,12 +1719,10 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
             error_msg = stderr.decode() if stderr else "Unknown error"
 
             # Persist stderr to database
-            if self.db_service and error_msg:
-                await self.db_service.write_agent_output(
-                    run_id=self.run_id,
-                    variation_id=int(self.variation_id),
-                    content=error_msg,
-                    output_type="stderr",
+            if self.output_sink and error_msg:
+                self.output_sink.record(
+                    "stderr",
+                    error_msg,
                     metadata={"source": "gemini_cli", "exit_code": result.returncode},
                 )
 
@@ -1870,33 +1736,13 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
 
     async def _generate_openai_codex_response(self) -> str:
         """Generate response using OpenAI Codex CLI."""
-        print(
-            json.dumps(
-                {
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "level": "DEBUG",
-                    "message": "🔧 Entered _generate_openai_codex_response()",
-                }
-            ),
-            flush=True,
-        )
+        self.log("🔧 Entered _generate_openai_codex_response()", "DEBUG")
 
         self.log_progress(
             "Generating response using OpenAI Codex CLI",
             "Executing codex in full-auto quiet mode for one-shot execution",
         )
 
-        print(
-            json.dumps(
-                {
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "level": "DEBUG",
-                    "message": "🔧 About to start OpenAI Codex execution try block",
-                }
-            ),
-            flush=True,
-        )
-
         try:
             # Track start time for analytics
             request_start_time = datetime.now(UTC)
@@ -1907,24 +1753,19 @@ The model '{model_name}' requires a {readable_provider} API key, but none was fo
             )
 
             # Use codex exec with verified flags for containerized non-interactive execution
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": f"🔧 About to execute: codex exec --dangerously-bypass-approvals-and-sandbox --model gpt-4o-mini '{self.prompt}'",
-                    }
-                ),
-                flush=True,
+            self.log(
+                "🔧 About to execute codex exec",
+                "DEBUG",
+                model="gpt-4o-mini",
+                prompt_length=len(self.prompt),
             )
 
             # Set up environment for containerized CI/CD with comprehensive debugging
-            codex_env = os.environ.copy()
+            codex_env = self._process_env()
             codex_env.update(
                 {
-                    "OPENAI_API_KEY": os.getenv(
-                        "OPENAI_API_KEY", ""
-                    ),  # Required for Codex
+                    "OPENAI_API_KEY": self._api_key("OPENAI_API_KEY")
+                    or "",  # Required for Codex
                     "DEBUG": "true",  # Enable verbose logging for debugging
                     "RUST_LOG": "debug",  # Enable Rust debug logging
                     "CODEX_LOG": "debug",  # Enable all Codex logging
@@ -1998,15 +1839,8 @@ approval_policy = "never"
                 env=codex_env,
             )
 
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": "🔧 Codex subprocess created, streaming output in real-time",
-                    }
-                ),
-                flush=True,
+            self.log(
+                "🔧 Codex subprocess created, streaming output in real-time", "DEBUG"
             )
 
             # Stream output in real-time instead of waiting for completion
@@ -2016,56 +1850,42 @@ approval_policy = "never"
                     stdout_chunks = []
                     stderr_chunks = []
 
-                    # Read stdout and stderr streams in real-time
-                    async def read_stdout():
-                        if result.stdout:
-                            async for line in result.stdout:
-                                line_text = line.decode("utf-8").rstrip()
-                                if line_text:
-                                    stdout_chunks.append(line_text)
-                                    # Stream to stdout with fire emoji prefix
-                                    print(f"🔥 {line_text}", flush=True)
-
-                                    # Also write to database/Redis for frontend streaming
-                                    if self.db_service:
-                                        await self.db_service.write_agent_output(
-                                            run_id=self.run_id,
-                                            variation_id=int(self.variation_id),
-                                            content=line_text,
-                                            output_type="llm",
-                                            metadata={
-                                                "source": "openai_codex_cli_stream"
-                                            },
-                                        )
-
-                                    # CRITICAL: Also publish to Redis for real-time WebSocket streaming
-                                    await self._publish_to_redis_only(line_text)
-
-                    async def read_stderr():
-                        if result.stderr:
-                            async for line in result.stderr:
-                                line_text = line.decode("utf-8").rstrip()
-                                if line_text:
-                                    stderr_chunks.append(line_text)
-                                    # Log stderr for debugging
-                                    print(
-                                        json.dumps(
-                                            {
-                                                "timestamp": datetime.now(
-                                                    UTC
-                                                ).isoformat(),
-                                                "level": "ERROR",
-                                                "message": f"🔧 Codex stderr: {line_text}",
-                                            }
-                                        ),
-                                        flush=True,
-                                    )
-
-                    # Run both readers concurrently
-                    await asyncio.gather(read_stdout(), read_stderr())
+                    async def publish_stdout(lines: list[str]):
+                        stdout_chunks.extend(lines)
+                        # Mirror to the container log with fire emoji prefix
+                        self._echo("".join(f"🔥 {line}\n" for line in lines))
+                        text = "\n".join(lines)
+                        # One write to Redis and database per batch of lines
+                        await self.publish_output(
+                            text, {"source": "openai_codex_cli_stream"}
+                        )
+
+                    async def log_stderr(lines: list[str]):
+                        stderr_chunks.extend(lines)
+                        # Log stderr for debugging
+                        for line_text in lines:
+                            print(
+                                json.dumps(
+                                    {
+                                        "timestamp": datetime.now(UTC).isoformat(),
+                                        "level": "ERROR",
+                                        "message": f"🔧 Codex stderr: {line_text}",
+                                    }
+                                ),
+                                flush=True,
+                            )
+
+                    # Readers only wait on the bounded queue, never on Redis or the DB
+                    fan_out = ProcessFanOut(
+                        {"stdout": publish_stdout, "stderr": log_stderr}
+                    )
+                    await fan_out.run(
+                        {"stdout": result.stdout, "stderr": result.stderr}
+                    )
 
                     # Wait for process to complete
                     await result.wait()
+                    self.log("Codex output fan-out finished", "DEBUG", **fan_out.stats)
 
                     return b"\n".join(
                         chunk.encode("utf-8") for chunk in stdout_chunks
@@ -2074,15 +1894,12 @@ approval_policy = "never"
                 # Run with timeout
                 stdout, stderr = await asyncio.wait_for(stream_output(), timeout=120.0)
 
-                print(
-                    json.dumps(
-                        {
-                            "timestamp": datetime.now(UTC).isoformat(),
-                            "level": "DEBUG",
-                            "message": f"🔧 Codex completed: exit_code={result.returncode}, stdout_len={len(stdout)}, stderr_len={len(stderr)}",
-                        }
-                    ),
-                    flush=True,
+                self.log(
+                    "🔧 Codex completed",
+                    "DEBUG",
+                    exit_code=result.returncode,
+                    stdout_len=len(stdout),
+                    stderr_len=len(stderr),
                 )
 
             except TimeoutError:
@@ -2103,23 +1920,7 @@ approval_policy = "never"
                     f"Generated {len(response_text)} characters",
                 )
 
-                # Stream the response line by line for consistency with other CLI tools
-                for line in response_text.split("\n"):
-                    if line.strip():
-                        print(f"🔥 {line}", flush=True)
-
-                # Persist output to database
-                if self.db_service:
-                    await self.db_service.write_agent_output(
-                        run_id=self.run_id,
-                        variation_id=int(self.variation_id),
-                        content=response_text,
-                        output_type="stdout",
-                        metadata={
-                            "source": "openai_codex_cli",
-                            "exit_code": result.returncode,
-                        },
-                    )
+                # Output was already streamed and persisted line by line above
 
                 # Write analytics data for OpenAI Codex CLI
                 if self.db_service:
@@ -2170,12 +1971,10 @@ approval_policy = "never"
                 f"Exit code: {result.returncode}, Error: {error_msg}",
             )
             # Persist stderr to database
-            if self.db_service and error_msg:
-                await self.db_service.write_agent_output(
-                    run_id=self.run_id,
-                    variation_id=int(self.variation_id),
-                    content=error_msg,
-                    output_type="stderr",
+            if self.output_sink and error_msg:
+                self.output_sink.record(
+                    "stderr",
+                    error_msg,
                     metadata={
                         "source": "openai_codex_cli",
                         "exit_code": result.returncode,
@@ -2191,6 +1990,56 @@ approval_policy = "never"
                 f"Failed to generate OpenAI Codex CLI response: {e}"
             ) from e
 
+    async def _replay_cached_response(self, cached: CachedResponse) -> str:
+        """Publish a cached completion and record the hit in the analytics."""
+        self.log(
+            "♻️ Replaying cached LLM response",
+            "INFO",
+            pieces=len(cached.pieces),
+            cached_at=cached.created_at,
+            replay_speed=self.response_replay_speed,
+        )
+        request_start_time = datetime.now(UTC)
+        await replay(cached, self._publish_stream_text, self.response_replay_speed)
+        request_end_time = datetime.now(UTC)
+
+        if self.db_service:
+            usage = cached.usage or {}
+            try:
+                await self.db_service.write_litellm_analytics(
+                    run_id=self.run_id,
+                    variation_id=int(self.variation_id),
+                    analytics_data={
+                        "model": self.config["model"],
+                        "provider": self._get_model_provider(self.config["model"]),
+                        "temperature": self.config.get("temperature"),
+                        "max_tokens": self.config.get("max_tokens"),
+                        "stream": True,
+                        "status": "cache_hit",
+                        "prompt_tokens": usage.get("prompt_tokens"),
+                        "completion_tokens": usage.get("completion_tokens"),
+                        "total_tokens": usage.get("total_tokens"),
+                        "cost_usd": 0.0,  # Nothing was spent on the provider
+                        "request_start_time": request_start_time,
+                        "request_end_time": request_end_time,
+                        "response_time_ms": int(
+                            (request_end_time - request_start_time).total_seconds()
+                            * 1000
+                        ),
+                        "metadata": {
+                            "agent_mode": "litellm",
+                            "cache_hit": True,
+                            "cached_at": cached.created_at,
+                            "saved_cost_usd": cached.cost_usd,
+                        },
+                    },
+                )
+            except Exception as analytics_error:
+                self.log(
+                    f"Failed to write LiteLLM analytics: {analytics_error}", "ERROR"
+                )
+        return cached.text
+
     async def _generate_litellm_response(self, codebase_summary: str | None) -> str:
         """Generate response using LiteLLM (original implementation)."""
         self.log(
@@ -2204,7 +2053,15 @@ approval_policy = "never"
         try:
             # Prepare the full prompt based on mode
             if codebase_summary is not None:
-                # Code mode: Include codebase analysis
+                # Code mode: Include codebase analysis, cut to the model's window
+                budget = self._context_budget()
+                codebase_summary = trim_to_budget(codebase_summary, budget)
+                self.log(
+                    "🧩 Codebase context fitted to model",
+                    "INFO",
+                    context_window=self.context_window,
+                    budget=budget,
+                )
                 full_prompt = f"""
 You are an expert software engineer analyzing a codebase. Here's the codebase analysis:
 
@@ -2224,41 +2081,49 @@ Be thorough but concise in your response.
                 # Chat mode: Direct prompt without codebase context
                 full_prompt = self.prompt
 
+            # A retry continues the response the failed attempts streamed
+            resume_from = self._partial_response
+            prefix = resume_from.rstrip()  # Providers reject trailing whitespace
+            messages = [{"role": "user", "content": full_prompt}]
+            if resume_from:
+                messages.append({"role": "assistant", "content": prefix})
+
+            # The same request was answered before: replay that response
+            cache_key = None
+            if self.response_cache and not resume_from:
+                cache_key = ResponseCache.key(
+                    self.config["model"],
+                    self.config["temperature"],
+                    self.config["max_tokens"],
+                    self.prompt,
+                    codebase_summary,
+                )
+                cached = await self.response_cache.get(cache_key)
+                if cached:
+                    return await self._replay_cached_response(cached)
+            recorder = TranscriptRecorder() if cache_key else None
+
             # Make API call via LiteLLM Gateway with streaming
             self.log("Starting LLM streaming", "INFO", step="streaming_start")
 
-            response_text = ""
-            chunk_count = 0
-            buffer = ""
-            collected_chunks = []  # Collect chunks for usage extraction
+            # Running text parts and usage; chunk objects are not kept. A
+            # resumed response drops a repeat of the whitespace stripped from
+            # its prefix, which was published already
+            stream = StreamAccumulator(skip_leading=resume_from[len(prefix) :])
+            coalescer = self._create_coalescer(recorder)
 
             # Call THROUGH the LiteLLM Gateway
             # The gateway will handle routing to the actual provider
             # Get the provider API key for this model
             provider = self._get_model_provider(self.config["model"])
             provider_key_env = f"{provider.upper()}_API_KEY"
-            api_key = os.getenv(provider_key_env)
-
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": f"🔧 Using provider={provider}, has_api_key={bool(api_key)}, gateway_key={self.gateway_key}",
-                    }
-                ),
-                flush=True,
-            )
+            api_key = self._api_key(provider_key_env)
 
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": "🔧 About to prepare completion kwargs",
-                    }
-                ),
-                flush=True,
+            self.log(
+                "🔧 Resolved provider credentials",
+                "DEBUG",
+                provider=provider,
+                has_api_key=bool(api_key),
             )
 
             # Use LiteLLM Gateway with clientside API key injection
@@ -2266,7 +2131,7 @@ Be thorough but concise in your response.
                 "model": self.config["model"],
                 "max_tokens": self.config["max_tokens"],
                 "temperature": self.config["temperature"],
-                "messages": [{"role": "user", "content": full_prompt}],
+                "messages": messages,
                 "stream": True,
                 "stream_options": {"include_usage": True},
                 "api_base": self.gateway_url,  # Point to LiteLLM Gateway
@@ -2277,117 +2142,43 @@ Be thorough but concise in your response.
             if api_key:
                 completion_kwargs["extra_body"] = {"api_key": api_key}
 
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": f"🔧 About to call acompletion with model={completion_kwargs['model']}",
-                    }
-                ),
-                flush=True,
+            self.log(
+                "🔧 Calling acompletion", "DEBUG", model=completion_kwargs["model"]
             )
-
             response = await acompletion(**completion_kwargs)
 
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": "🔧 acompletion call successful, starting to process stream",
-                    }
-                ),
-                flush=True,
-            )
-
-            # Debug: Verify response object
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": f"🔧 Response object type: {type(response)}",
-                    }
-                ),
-                flush=True,
-            )
-
-            # CRITICAL DEBUG: This should appear if we reach here
-            print(
-                json.dumps(
-                    {
-                        "timestamp": datetime.now(UTC).isoformat(),
-                        "level": "DEBUG",
-                        "message": "🔧 REACHED AFTER acompletion - about to enter streaming loop",
-                    }
-                ),
-                flush=True,
-            )
+            # Resolve once so the streaming loop never formats disabled DEBUG logs
+            debug_enabled = self.log_policy.enabled("DEBUG")
+            if debug_enabled:
+                self.log("🔧 About to enter async streaming loop", "DEBUG")
 
-            # Add debug logging before streaming loop
-            self.log("🔧 About to enter async streaming loop", "DEBUG")
-
-            async for chunk in response:
-                # Collect chunk for usage extraction
-                collected_chunks.append(chunk)
-
-                # Extract text from chunk
-                if chunk.choices and chunk.choices[0].delta.content:
-                    chunk_text = chunk.choices[0].delta.content
-                    response_text += chunk_text
-                    chunk_count += 1
+            try:
+                async for chunk in response:
+                    # Publish under the run's latency budget
+                    chunk_text = stream.add(chunk)
+                    await coalescer.write(chunk_text)
 
                     # Debug log for first few chunks
-                    if chunk_count <= 3:
+                    if debug_enabled and chunk_text and stream.chunk_count <= 3:
                         self.log(
-                            f"🔧 Processing chunk #{chunk_count}: '{chunk_text}'",
+                            f"🔧 Processing chunk #{stream.chunk_count}: '{chunk_text}'",
                             "DEBUG",
                         )
+            finally:
+                # Output any remaining buffer
+                await coalescer.close()
+                self._partial_response = resume_from + stream.text
 
-                    # Add to buffer
-                    buffer += chunk_text
-
-                    # Stream output in reasonable chunks
-                    # Wait for complete lines or reasonable amount of content
-                    while len(buffer) >= 200 or "\n" in buffer[:200]:
-                        # If we have a newline, output up to that
-                        newline_pos = buffer.find("\n")
-                        if newline_pos != -1 and newline_pos < 200:
-                            output_chunk = buffer[: newline_pos + 1]
-                        else:
-                            # Otherwise take a reasonable chunk
-                            chunk_size = min(200, len(buffer))
-                            output_chunk = buffer[:chunk_size]
-
-                            # Try to break at word boundary
-                            space_pos = output_chunk.rfind(" ")
-                            if (
-                                space_pos > 100
-                            ):  # Only adjust if we have substantial content
-                                output_chunk = buffer[: space_pos + 1]
-
-                        # Output to stdout (DatabaseStreamWriter handles database persistence)
-                        print(output_chunk, end="", flush=True)
-
-                        # Stream to Redis only (database handled by DatabaseStreamWriter)
-                        await self._publish_to_redis_only(output_chunk)
-                        buffer = buffer[len(output_chunk) :]
+            chunk_count = stream.chunk_count
+            response_text = self._partial_response
 
             # Add debug logging after streaming loop
-            self.log(
-                f"🔧 Streaming loop completed, processed {chunk_count} chunks", "DEBUG"
-            )
-
-            # Output any remaining buffer
-            if buffer.strip():
-                self.log(f"🔧 Outputting remaining buffer: '{buffer[:50]}...'", "DEBUG")
-
-                # Output remaining buffer
-                print(buffer, end="", flush=True)
-
-                # Stream to Redis only (database handled by DatabaseStreamWriter)
-                await self._publish_to_redis_only(buffer)
+            if debug_enabled:
+                self.log(
+                    f"🔧 Streaming loop completed, processed {chunk_count} chunks, "
+                    f"published {coalescer.stats['entries']} entries",
+                    "DEBUG",
+                )
 
             # Extract usage data from collected chunks and collect analytics
             tokens_used = None
@@ -2409,110 +2200,93 @@ Be thorough but concise in your response.
                     "gateway_url": self.gateway_url,
                     "agent_mode": "litellm",
                     "chunks_received": chunk_count,
+                    "resumed_chars": len(resume_from),
                 },
             }
 
             try:
-                # Try to build complete response from chunks to get usage data
-                if collected_chunks:
-                    # Check if the last chunk has usage information
-                    last_chunk = collected_chunks[-1] if collected_chunks else None
-                    if last_chunk and hasattr(last_chunk, "usage") and last_chunk.usage:
-                        tokens_used = last_chunk.usage.total_tokens
-                        prompt_tokens = getattr(last_chunk.usage, "prompt_tokens", None)
-                        completion_tokens = getattr(
-                            last_chunk.usage, "completion_tokens", None
+                usage = stream.usage
+                if usage:
+                    # Usage reported in the stream (stream_options.include_usage)
+                    tokens_used = usage.total_tokens
+                    prompt_tokens = getattr(usage, "prompt_tokens", None)
+                    completion_tokens = getattr(usage, "completion_tokens", None)
+
+                    # Update analytics data with token usage
+                    analytics_data.update(
+                        {
+                            "total_tokens": tokens_used,
+                            "prompt_tokens": prompt_tokens,
+                            "completion_tokens": completion_tokens,
+                        }
+                    )
+
+                    self.log(
+                        "Extracted token usage from stream",
+                        "INFO",
+                        tokens_used=tokens_used,
+                        prompt_tokens=prompt_tokens,
+                        completion_tokens=completion_tokens,
+                    )
+
+                    # Try to calculate cost
+                    try:
+                        # Create a mock response object for cost calculation
+                        mock_response = type(
+                            "obj",
+                            (object,),
+                            {"model": self.config["model"], "usage": usage},
+                        )()
+                        cost_usd = completion_cost(completion_response=mock_response)
+                        analytics_data["cost_usd"] = cost_usd
+
+                        self.log(
+                            "Calculated completion cost",
+                            "INFO",
+                            cost_usd=cost_usd,
+                            model=self.config["model"],
+                        )
+                    except Exception as cost_error:
+                        self.log(f"Failed to calculate cost: {cost_error}", "WARNING")
+
+                # If the stream carried no usage, count tokens from the text
+                elif chunk_count:
+                    try:
+                        messages = [{"role": "user", "content": full_prompt}]
+                        prompt_tokens = token_counter(
+                            model=self.config["model"], messages=messages
+                        )
+                        completion_tokens = token_counter(
+                            model=self.config["model"], text=response_text
+                        )
+                        tokens_used = prompt_tokens + completion_tokens
+                        cost_usd = completion_cost(
+                            model=self.config["model"],
+                            messages=messages,
+                            completion=response_text,
                         )
 
-                        # Update analytics data with token usage
+                        # Update analytics data
                         analytics_data.update(
                             {
                                 "total_tokens": tokens_used,
                                 "prompt_tokens": prompt_tokens,
                                 "completion_tokens": completion_tokens,
+                                "cost_usd": cost_usd,
                             }
                         )
 
                         self.log(
-                            "Extracted token usage from stream",
+                            "Estimated usage from response text",
                             "INFO",
                             tokens_used=tokens_used,
-                            prompt_tokens=prompt_tokens,
-                            completion_tokens=completion_tokens,
+                            cost_usd=cost_usd,
+                        )
+                    except Exception as count_error:
+                        self.log(
+                            f"Failed to estimate usage from text: {count_error}",
+                            "WARNING",
                         )
-
-                        # Try to calculate cost
-                        try:
-                            # Create a mock response object for cost calculation
-                            mock_response = type(
-                                "obj",
-                                (object,),
-                                {
-                                    "model": self.config["model"],
-                                    "usage": last_chunk.usage,
-                                },
-                            )()
-                            cost_usd = completion_cost(
-                                completion_response=mock_response
-                            )
-                            analytics_data["cost_usd"] = cost_usd
-
-                            self.log(
-                                "Calculated completion cost",
-                                "INFO",
-                                cost_usd=cost_usd,
-                                model=self.config["model"],
-                            )
-                        except Exception as cost_error:
-                            self.log(
-                                f"Failed to calculate cost: {cost_error}", "WARNING"
-                            )
-
-                    # If no usage in last chunk, try to rebuild complete response
-                    if tokens_used is None:
-                        try:
-                            complete_response = stream_chunk_builder(
-                                chunks=collected_chunks,
-                                messages=[{"role": "user", "content": full_prompt}],
-                            )
-                            if (
-                                hasattr(complete_response, "usage")
-                                and complete_response.usage
-                            ):
-                                tokens_used = complete_response.usage.total_tokens
-                                prompt_tokens = getattr(
-                                    complete_response.usage, "prompt_tokens", None
-                                )
-                                completion_tokens = getattr(
-                                    complete_response.usage, "completion_tokens", None
-                                )
-
-                                # Calculate cost from complete response
-                                cost_usd = completion_cost(
-                                    completion_response=complete_response
-                                )
-
-                                # Update analytics data
-                                analytics_data.update(
-                                    {
-                                        "total_tokens": tokens_used,
-                                        "prompt_tokens": prompt_tokens,
-                                        "completion_tokens": completion_tokens,
-                                        "cost_usd": cost_usd,
-                                    }
-                                )
-
-                                self.log(
-                                    "Extracted usage from rebuilt response",
-                                    "INFO",
-                                    tokens_used=tokens_used,
-                                    cost_usd=cost_usd,
-                                )
-                        except Exception as rebuild_error:
-                            self.log(
-                                f"Failed to rebuild response for usage: {rebuild_error}",
-                                "WARNING",
-                            )
 
             except Exception as usage_error:
                 self.log(f"Failed to extract usage data: {usage_error}", "WARNING")
@@ -2579,6 +2353,15 @@ Be thorough but concise in your response.
                         f"Failed to write LiteLLM analytics: {analytics_error}", "ERROR"
                     )
 
+            if recorder and analytics_data["status"] == "success":
+                cached_usage = {
+                    name: analytics_data.get(name)
+                    for name in ("prompt_tokens", "completion_tokens", "total_tokens")
+                }
+                await self.response_cache.put(
+                    cache_key, recorder.response(cached_usage, cost_usd)
+                )
+
             self.log(
                 "Streaming LLM response complete",
                 "INFO",
@@ -2684,107 +2467,108 @@ If the problem persists, contact support with the error details above.
             print(error_message, flush=True)
             raise RuntimeError(f"API request failed: {api_error}")
 
+    def _start_diff_watcher(self) -> None:
+        """Poll the workspace for edits and stream per-file diffs."""
+        if self.diff_watch_interval <= 0 or not self.repo_dir.exists():
+            return
+        self.diff_watcher = DiffWatcher(
+            self.repo_dir,
+            self._publish_diff_update,
+            interval=self.diff_watch_interval,
+            max_file_bytes=self.diff_max_file_bytes,
+        )
+        self.diff_watcher.start()
+
+    async def _publish_diff_update(
+        self, changed: list[FileDiff], removed: list[str]
+    ) -> None:
+        """Stream incremental diffs on the status stream (Redis only)."""
+        if not self.output_sink:
+            return
+        self.output_sink.status(
+            "diff_update",
+            {
+                "variation_id": int(self.variation_id),
+                "files": [diff.to_output() for diff in changed],
+                "removed": removed,
+            },
+        )
+
     async def _generate_and_save_diffs(self) -> None:
         """Generate diffs for all changed files and save to database."""
         try:
             self.log("🔍 Generating diffs for changed files", "INFO")
 
-            # Change to repository directory
-            os.chdir(self.repo_dir)
-
-            # Get list of unstaged changed files (Claude won't commit, so only check unstaged)
-            diff_result = subprocess.run(
-                ["git", "diff", "--name-only"],
-                check=False,
-                capture_output=True,
-                text=True,
-            )
-            self.log(f"🔍 Git diff output: {diff_result.stdout!r}", "DEBUG")
-
-            # Parse git diff --name-only output (unstaged changes only)
-            changed_files = []
-            for line in diff_result.stdout.strip().split("\n"):
-                if line.strip():
-                    changed_files.append(line.strip())
-
-            self.log(f"🔍 Detected unstaged changed files: {changed_files}", "DEBUG")
-
-            if not changed_files:
+            if self.diff_watcher:
+                # The watcher already holds every settled file's diff; one
+                # last poll picks up the files changed since
+                await self.diff_watcher.poll(settle=False)
+                diffs = self.diff_watcher.diffs
+                self.log(
+                    "[DIFF-WATCH] Final diff from the watcher snapshot",
+                    "DEBUG",
+                    **self.diff_watcher.stats,
+                )
+            else:
+                # One pass of git over tracked and untracked changes
+                diffs = await asyncio.to_thread(
+                    collect_diffs,
+                    self.repo_dir,
+                    max_file_bytes=self.diff_max_file_bytes,
+                )
+            if not diffs:
                 self.log("📝 No file changes detected", "INFO")
                 return
 
             self.log(
-                f"📂 Found {len(changed_files)} changed files",
+                f"📂 Found {len(diffs)} changed files",
                 "INFO",
-                changed_files=changed_files,
+                changed_files=[diff.path for diff in diffs],
+                additions=sum(diff.additions for diff in diffs),
+                deletions=sum(diff.deletions for diff in diffs),
+                truncated=[diff.path for diff in diffs if diff.truncated],
             )
 
-            # Build diff array using the same format as the Python script
-            diff_array = []
-            for file in changed_files:
-                try:
-                    # Get old content from HEAD
-                    old_content = ""
-                    try:
-                        old_result = subprocess.run(
-                            ["git", "show", f"HEAD:{file}"],
-                            capture_output=True,
-                            text=True,
-                            check=True,
-                        )
-                        old_content = old_result.stdout
-                    except subprocess.CalledProcessError:
-                        # File is new and not in HEAD
-                        old_content = ""
-
-                    # Get new content from working directory
-                    new_content = ""
-                    try:
-                        new_content = Path(file).read_text(encoding="utf-8")
-                    except FileNotFoundError:
-                        # File has been deleted
-                        new_content = ""
-
-                    diff_array.append(
-                        {
-                            "oldFile": {"name": file, "content": old_content},
-                            "newFile": {"name": file, "content": new_content},
-                        }
-                    )
-
-                except Exception as e:
-                    self.log(f"⚠️ Error processing file {file}: {e}", "WARNING")
-                    continue
-
-            if diff_array:
-                # Save diffs to database
-                await self._save_diffs_to_database(diff_array)
-                self.log(
-                    f"✅ Generated and saved diffs for {len(diff_array)} files", "INFO"
-                )
-            else:
-                self.log("📝 No valid diffs generated", "INFO")
+            await self._save_diffs_to_database(diffs)
+            self.log(f"✅ Generated and saved diffs for {len(diffs)} files", "INFO")
 
         except Exception as e:
             self.log_error("Failed to generate diffs", e)
 
-    async def _save_diffs_to_database(self, diff_array: list) -> None:
-        """Save diff array to database as agent output."""
+    async def _save_diffs_to_database(self, diffs: list[FileDiff]) -> None:
+        """Save diffs to database as content-addressed blobs plus a manifest."""
         try:
+            # Blobs go in first so the manifest never references missing
+            # ones; without them the hunks are stored inline as before
+            diff_array, blobs = build_manifest(diffs)
+            diff_format = MANIFEST_FORMAT
+            stored_blobs = 0
+            try:
+                if not self.db_service:
+                    raise RuntimeError("Database service not initialized")
+                stored_blobs = await self.db_service.write_diff_blobs(
+                    list(blobs.values())
+                )
+            except Exception as e:
+                self.log(f"⚠️ Storing diff blobs failed, inlining hunks: {e}", "WARNING")
+                diff_array = [diff.to_output() for diff in diffs]
+                diff_format = "unified"
+
             # Convert diff array to JSON string for storage
-            diff_json = json.dumps(diff_array, indent=2)
+            diff_json = json.dumps(diff_array, separators=(",", ":"))
 
             # Save as agent output with type 'diffs'
-            if self.db_service:
-                await self.db_service.write_agent_output(
-                    run_id=self.run_id,
-                    variation_id=int(self.variation_id),
-                    content=diff_json,
-                    output_type="diffs",
+            if self.output_sink:
+                self.output_sink.record(
+                    "diffs",
+                    diff_json,
                     metadata={
                         "source": "diff_generator",
                         "file_count": len(diff_array),
                         "format": "json",
+                        "diff_format": diff_format,
+                        "blobs": len(blobs),
+                        "stored_blobs": stored_blobs,
                     },
                 )
                 self.log("💾 Diffs saved to database successfully", "INFO")
@@ -2807,61 +2591,136 @@ If the problem persists, contact support with the error details above.
             self.log_error("Failed to save diffs to database", e)
 
 
+async def run_batch(specs: list[VariationSpec]) -> bool:
+    """Run several chat-mode variations concurrently in this process.
+
+    The first variation's agent connects Redis and the database for all of
+    them while every variation fetches its own API keys. Each variation then
+    streams its completion into one shared output sink, bound to its
+    variation ID. Captured stdout/stderr can't be told apart per variation,
+    so it is not intercepted.
+
+    Args:
+        specs: Variations to run
+
+    Returns:
+        Whether every variation succeeded
+    """
+    agent_mode = os.getenv("AGENT_MODE", "litellm")
+    if agent_mode in CLI_TOOLS:
+        raise RuntimeError(f"Batch agents only run chat-mode variations: {agent_mode}")
+
+    agents = [AIdeatorAgent(spec) for spec in specs]
+    lead = agents[0]
+    sink = OutputSink(run_id=lead.run_id, variation_id=lead.variation_id)
+    for agent in agents:
+        agent.output_sink = sink.bind(agent.variation_id)
+    lead.log(
+        "🚀 Starting AIdeator batch agent",
+        "INFO",
+        agent_mode=agent_mode,
+        variations=[agent.variation_id for agent in agents],
+    )
+
+    try:
+        await asyncio.gather(
+            lead._bootstrap(agent_mode),
+            *(agent._fetch_api_keys() for agent in agents[1:]),
+        )
+        for agent in agents[1:]:
+            agent.redis_client = lead.redis_client
+            agent.db_service = lead.db_service
+            agent.summary_cache = lead.summary_cache
+            agent.response_cache = lead.response_cache
+        sink.redis_client = lead.redis_client
+        sink.db_service = lead.db_service
+        await sink.start()
+
+        results = await asyncio.gather(
+            *(agent._execute(agent_mode, None) for agent in agents),
+            return_exceptions=True,
+        )
+
+        drain_metrics = await sink.drain(
+            timeout=float(os.getenv("AGENT_FLUSH_TIMEOUT", "20"))
+        )
+        lead.log(f"🚰 Output drained in {drain_metrics['drain_ms']}ms", "INFO")
+        for agent, result in zip(agents, results, strict=True):
+            if isinstance(result, BaseException):
+                agent.log(
+                    f"💥 Fatal error: {result!s}",
+                    "ERROR",
+                    exception_type=type(result).__name__,
+                )
+                agent.log("❌ Agent failed", "INFO", status="failed")
+            else:
+                agent.log("📉 Log policy summary", "INFO", **agent.log_policy.summary())
+                await agent.publish_status(
+                    "variation_completed",
+                    {
+                        "variation_id": agent.variation_id,
+                        "success": True,
+                        "drain": drain_metrics,
+                    },
+                )
+        await sink.close()
+        return not any(isinstance(result, BaseException) for result in results)
+    finally:
+        if lead.redis_client:
+            await lead.redis_client.close()
+        if lead.db_service:
+            await lead.db_service.disconnect()
+        for agent in agents:
+            shutil.rmtree(agent.work_dir, ignore_errors=True)
+
+
 async def main():
     """Main entry point."""
-    print(
-        json.dumps(
-            {
-                "timestamp": datetime.now(UTC).isoformat(),
-                "level": "DEBUG",
-                "message": "🔧 Starting main() function",
-            }
-        ),
-        flush=True,
-    )
+    if os.getenv("AGENT_TASK") == "batch":
+        # Chat-mode variations of a run, all in this process
+        specs = parse_variations(os.getenv("AGENT_VARIATIONS", ""))
+        sys.exit(0 if await run_batch(specs) else 1)
 
     agent = AIdeatorAgent()
-    print(
-        json.dumps(
-            {
-                "timestamp": datetime.now(UTC).isoformat(),
-                "level": "DEBUG",
-                "message": "🔧 Agent initialized successfully",
-            }
-        ),
-        flush=True,
-    )
+    agent.log("🔧 Agent initialized successfully", "DEBUG")
 
     try:
         # Run the agent
-        print(
-            json.dumps(
-                {
-                    "timestamp": datetime.now(UTC).isoformat(),
-                    "level": "DEBUG",
-                    "message": "🔧 About to call agent.run()",
-                }
-            ),
-            flush=True,
-        )
-        await agent.run()
+        if agent.agent_task == "prep":
+            # Run-level prep job: no LLM call and no variation output
+            await agent.prepare_snapshot()
+            if agent.redis_client:
+                await agent.redis_client.close()
+            sys.exit(0)
 
-        # Publish completion status
-        await agent.publish_status(
-            "variation_completed", {"variation_id": agent.variation_id, "success": True}
-        )
+        await agent.run()
 
-        # Sleep for 30 seconds before exit on success (to allow final logs to flush)
-        agent.log("⏱️ Sleeping for 30 seconds before exit", "INFO")
-        await asyncio.sleep(30)
+        # Report what the verbosity policy filtered out
+        agent.log("📉 Log policy summary", "INFO", **agent.log_policy.summary())
 
-        # Wait for any background tasks to complete
-        if hasattr(agent, "_bg_tasks") and agent._bg_tasks:
+        # Flush barrier: wait until every queued Redis/DB write is acknowledged
+        drain_metrics = {}
+        if agent.output_sink:
+            drain_metrics = await agent.output_sink.drain(
+                timeout=float(os.getenv("AGENT_FLUSH_TIMEOUT", "20"))
+            )
             agent.log(
-                f"⏳ Waiting for {len(agent._bg_tasks)} background tasks to complete",
+                f"🚰 Output drained in {drain_metrics['drain_ms']}ms",
                 "INFO",
+                **drain_metrics,
             )
-            await asyncio.gather(*agent._bg_tasks, return_exceptions=True)
+
+        # Publish completion status once all output is persisted
+        await agent.publish_status(
+            "variation_completed",
+            {
+                "variation_id": agent.variation_id,
+                "success": True,
+                "drain": drain_metrics,
+            },
+        )
+        if agent.output_sink:
+            await agent.output_sink.close()
 
         # Clean up connections
         if agent.redis_client:
@@ -2885,10 +2744,12 @@ async def main():
             sys.stderr.flush()
             sys.stderr = sys.stderr.original_stream
 
-        # Wait for any remaining background tasks
-        if hasattr(agent, "_bg_tasks") and agent._bg_tasks:
+        # Drain any output still queued (best effort, bounded)
+        if agent.output_sink:
             try:
-                await asyncio.gather(*agent._bg_tasks, return_exceptions=True)
+                await agent.output_sink.drain(
+                    timeout=float(os.getenv("AGENT_FLUSH_TIMEOUT", "20"))
+                )
             except Exception:
                 pass  # Best effort
 
@@ -0,0 +1,144 @@
+"""Incremental decoder for Claude CLI ``--output-format stream-json`` output.
+
+The CLI writes one JSON object per line. ``ClaudeStreamDecoder`` accepts raw
+``bytes`` from arbitrarily sized pipe reads, parses complete lines only and
+turns the messages the agent cares about into typed events:
+
+- ``assistant`` text blocks -> ``ClaudeText``
+- ``assistant`` ``tool_use`` blocks -> ``ClaudeToolUse``
+- the final ``result`` message -> ``ClaudeResult``
+
+Other message types (``system``, ``user`` tool results) are counted but not
+surfaced. Undecodable lines become ``ClaudeDecodeError`` events.
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import Any
+
+# Read size for the CLI's stdout pipe; large reads keep syscalls and
+# event-loop wakeups proportional to output volume, not line count
+STREAM_READ_SIZE = 64 * 1024
+
+
+@dataclass(slots=True)
+class ClaudeText:
+    """Assistant text to stream to the user."""
+
+    text: str
+
+
+@dataclass(slots=True)
+class ClaudeToolUse:
+    """The assistant invoked a tool."""
+
+    name: str
+    tool_id: str | None = None
+    input: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class ClaudeResult:
+    """Final ``result`` message with run totals."""
+
+    subtype: str | None = None
+    is_error: bool = False
+    result: str | None = None
+    duration_ms: int | None = None
+    num_turns: int | None = None
+    total_cost_usd: float | None = None
+    usage: dict[str, Any] = field(default_factory=dict)
+    session_id: str | None = None
+
+
+@dataclass(slots=True)
+class ClaudeDecodeError:
+    """A line that was not valid JSON."""
+
+    line: str
+    error: str
+
+
+ClaudeEvent = ClaudeText | ClaudeToolUse | ClaudeResult | ClaudeDecodeError
+
+
+class ClaudeStreamDecoder:
+    """Turns stream-json bytes into ``ClaudeEvent`` objects."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.stats = {"bytes": 0, "lines": 0, "events": 0, "decode_errors": 0}
+        self.message_types: dict[str, int] = {}
+
+    def feed(self, data: bytes) -> list[ClaudeEvent]:
+        """Consume a read from the pipe and return events for complete lines."""
+        self.stats["bytes"] += len(data)
+        end = data.rfind(b"\n")
+        if end == -1:
+            self._buffer.extend(data)
+            return []
+
+        # Only the bytes up to the last newline are parsed; the rest waits
+        if self._buffer:
+            self._buffer.extend(data[: end + 1])
+            complete = bytes(self._buffer)
+            self._buffer.clear()
+        else:
+            complete = data[: end + 1]
+        self._buffer.extend(data[end + 1 :])
+
+        events: list[ClaudeEvent] = []
+        for line in complete.splitlines():
+            if line.strip():
+                events.extend(self._decode_line(line))
+        return events
+
+    def close(self) -> list[ClaudeEvent]:
+        """Parse a final line that was not newline-terminated."""
+        line = bytes(self._buffer)
+        self._buffer.clear()
+        return self._decode_line(line) if line.strip() else []
+
+    def _decode_line(self, line: bytes) -> list[ClaudeEvent]:
+        self.stats["lines"] += 1
+        try:
+            message = json.loads(line)
+        except ValueError as e:
+            self.stats["decode_errors"] += 1
+            return [ClaudeDecodeError(line.decode("utf-8", errors="replace"), str(e))]
+        if not isinstance(message, dict):
+            return []
+
+        message_type = message.get("type", "unknown")
+        self.message_types[message_type] = self.message_types.get(message_type, 0) + 1
+
+        events: list[ClaudeEvent] = []
+        if message_type == "assistant":
+            for block in (message.get("message") or {}).get("content") or []:
+                block_type = block.get("type")
+                if block_type == "text" and block.get("text"):
+                    events.append(ClaudeText(block["text"]))
+                elif block_type == "tool_use":
+                    events.append(
+                        ClaudeToolUse(
+                            name=block.get("name", "unknown"),
+                            tool_id=block.get("id"),
+                            input=block.get("input") or {},
+                        )
+                    )
+        elif message_type == "result":
+            events.append(
+                ClaudeResult(
+                    subtype=message.get("subtype"),
+                    is_error=bool(message.get("is_error")),
+                    result=message.get("result"),
+                    duration_ms=message.get("duration_ms"),
+                    num_turns=message.get("num_turns"),
+                    total_cost_usd=message.get("total_cost_usd"),
+                    usage=message.get("usage") or {},
+                    session_id=message.get("session_id"),
+                )
+            )
+
+        self.stats["events"] += len(events)
+        return events
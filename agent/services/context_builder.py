@@ -0,0 +1,246 @@
+"""Token-budgeted codebase context for LLM prompts.
+
+The codebase summary used to be the first couple of thousand characters of
+up to ten files matched by fixed patterns, whatever the prompt asked and
+however small the model's context window. ``build_context`` instead:
+
+- ranks the workspace against the prompt: key files such as the README
+  first, then the best BM25 snippets from the ``SearchIndex`` when one is
+  given, then files whose path terms match the prompt;
+- packs them greedily, in that order, into a token budget derived from the
+  model's context window (``context_budget``); an item that no longer fits
+  whole is included as an excerpt if enough budget is left;
+- reads the selected files concurrently.
+
+Token counts are estimated from sizes (``CHARS_PER_TOKEN``), which errs on
+the side of overestimating code tokens, so no tokenizer runs per file.
+``trim_to_budget`` cuts an existing summary (from a snapshot or the summary
+cache, possibly built for a larger model) down to a smaller budget.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import aiofiles
+
+from agent.services.repo_scanner import FileEntry, RepoManifest
+from agent.services.search_index import SearchIndex, identifier_terms, query_terms
+
+CHARS_PER_TOKEN = 3  # Conservative for source code
+DEFAULT_CONTEXT_WINDOW = 8192  # Assumed when the model's window is unknown
+DEFAULT_MAX_CONTEXT_TOKENS = 24000  # Cap even for very large windows
+PROMPT_OVERHEAD_TOKENS = 256  # Instructions around the context
+MIN_EXCERPT_TOKENS = 200
+MAX_SNIPPETS = 40
+READ_CONCURRENCY = 16
+SECTION_MARKER = "\n--- "
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a text."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def context_budget(
+    context_window: int | None,
+    *,
+    max_output_tokens: int,
+    prompt: str,
+    max_context_tokens: int = DEFAULT_MAX_CONTEXT_TOKENS,
+) -> int:
+    """Tokens available for codebase context in one request.
+
+    Args:
+        context_window: Model context window; ``DEFAULT_CONTEXT_WINDOW`` if unknown
+        max_output_tokens: Tokens reserved for the completion
+        prompt: User prompt sent alongside the context
+        max_context_tokens: Upper bound regardless of the window
+
+    Returns:
+        The context budget in tokens (0 if nothing fits)
+    """
+    window = context_window or DEFAULT_CONTEXT_WINDOW
+    available = (
+        window - max_output_tokens - estimate_tokens(prompt) - PROMPT_OVERHEAD_TOKENS
+    )
+    return max(0, min(available, max_context_tokens))
+
+
+def score_file(entry: FileEntry, terms: set[str]) -> float:
+    """Relevance of a file to the prompt terms; 0 for unrelated files."""
+    score = 0.0
+    if entry.key_rank is not None:
+        score += 10.0 - entry.key_rank * 0.1
+    if terms:
+        *directories, name = entry.path.split("/")
+        stem_words = set(identifier_terms(name.split(".")[0]))
+        dir_words = set(identifier_terms(" ".join(directories)))
+        score += 4.0 * len(terms & stem_words) + 2.0 * len(terms & dir_words)
+        if score == 0 and any(term in entry.path.lower() for term in terms):
+            score += 1.0  # Partial match, e.g. "auth" in "oauth_client.py"
+    if score:
+        score -= 0.05 * entry.path.count("/")  # Prefer top-level files
+    return max(score, 0.0)
+
+
+def rank_files(manifest: RepoManifest, prompt: str) -> list[FileEntry]:
+    """Files relevant to the prompt by path, most relevant first."""
+    terms = query_terms(prompt)
+    scored = [
+        (score, entry)
+        for entry in manifest.files
+        if entry.readable and (score := score_file(entry, terms)) > 0
+    ]
+    scored.sort(key=lambda item: (-item[0], item[1].size, item[1].path))
+    return [entry for _, entry in scored]
+
+
+@dataclass
+class CodebaseContext:
+    """Packed context and what went into it."""
+
+    text: str
+    budget_tokens: int
+    used_tokens: int = 0
+    files: list[str] = field(default_factory=list)  # Section labels, in order
+    snippets: int = 0  # Sections that are index snippets rather than files
+    excerpts: list[str] = field(default_factory=list)  # Sections cut to fit
+    candidates: int = 0
+    build_ms: int = 0
+
+
+@dataclass(slots=True)
+class _Item:
+    path: str
+    label: str
+    chars: int
+    lines: tuple[int, int] | None = None  # Snippet line range, 1-based
+    limit: int | None = None  # Excerpt length in characters
+
+
+async def build_context(
+    manifest: RepoManifest,
+    prompt: str,
+    budget_tokens: int,
+    *,
+    header: str = "",
+    index: SearchIndex | None = None,
+) -> CodebaseContext:
+    """Pack the files and snippets most relevant to ``prompt`` into a budget.
+
+    Args:
+        manifest: Scan of the workspace
+        prompt: User prompt the workspace is ranked against
+        budget_tokens: Token budget, including the header
+        header: Text placed before the files (repository overview)
+        index: Search index of the workspace, for snippet retrieval
+
+    Returns:
+        The packed context
+    """
+    start = time.monotonic()
+    ranked = rank_files(manifest, prompt)
+    key_files = [entry for entry in ranked if entry.key_rank is not None]
+    items = [_Item(entry.path, entry.path, entry.size) for entry in key_files]
+    whole = {entry.path for entry in key_files}
+    if index is not None:
+        for chunk, _ in index.search(prompt, k=MAX_SNIPPETS):
+            if chunk.path not in whole:
+                label = f"{chunk.path}:{chunk.start}-{chunk.end}"
+                lines = (chunk.start, chunk.end)
+                items.append(_Item(chunk.path, label, chunk.chars, lines))
+    items.extend(
+        _Item(entry.path, entry.path, entry.size)
+        for entry in ranked
+        if entry.key_rank is None
+    )
+
+    # Plan on sizes (an upper bound on characters), then read only what was
+    # selected
+    remaining = budget_tokens - estimate_tokens(header)
+    plan: list[_Item] = []
+    planned = set()  # Labels, plus the paths that already have snippets
+    for item in items:
+        if item.label in planned or (item.lines is None and item.path in planned):
+            continue
+        cost = estimate_tokens(SECTION_MARKER + item.label) + 2
+        tokens = item.chars // CHARS_PER_TOKEN + 1
+        if cost + tokens <= remaining:
+            remaining -= cost + tokens
+        elif remaining - cost >= MIN_EXCERPT_TOKENS:
+            item.limit = (remaining - cost - 1) * CHARS_PER_TOKEN
+            remaining = 0
+        else:
+            continue
+        plan.append(item)
+        planned.update((item.label, item.path))
+        if remaining <= 0:
+            break
+
+    semaphore = asyncio.Semaphore(READ_CONCURRENCY)
+    paths = list(dict.fromkeys(item.path for item in plan))
+    texts = dict(
+        zip(
+            paths,
+            await asyncio.gather(
+                *(_read(manifest.root / path, semaphore) for path in paths)
+            ),
+            strict=True,
+        )
+    )
+
+    context = CodebaseContext(
+        text="", budget_tokens=budget_tokens, candidates=len(items)
+    )
+    parts = [header] if header else []
+    for item in plan:
+        content = texts[item.path]
+        if content is None:
+            continue
+        if item.lines:
+            first, last = item.lines
+            content = "".join(content.splitlines(keepends=True)[first - 1 : last])
+            context.snippets += 1
+        ellipsis = ""
+        if item.limit is not None:
+            content = content[: item.limit]
+            ellipsis = "\n..."
+            context.excerpts.append(item.label)
+        parts.append(f"{SECTION_MARKER}{item.label} ---\n{content}{ellipsis}\n")
+        context.files.append(item.label)
+
+    context.text = "\n".join(parts)
+    context.used_tokens = estimate_tokens(context.text)
+    context.build_ms = int((time.monotonic() - start) * 1000)
+    return context
+
+
+def trim_to_budget(summary: str, budget_tokens: int) -> str:
+    """Drop trailing file sections of a summary until it fits the budget.
+
+    Sections are ordered by relevance, so the least relevant go first.
+    """
+    if estimate_tokens(summary) <= budget_tokens:
+        return summary
+    header, *sections = summary.split(SECTION_MARKER)
+    kept = header[: budget_tokens * CHARS_PER_TOKEN]
+    for section in sections:
+        candidate = kept + SECTION_MARKER + section
+        if estimate_tokens(candidate) > budget_tokens:
+            break
+        kept = candidate
+    return kept
+
+
+async def _read(path: Path, semaphore: asyncio.Semaphore) -> str | None:
+    async with semaphore:
+        try:
+            async with aiofiles.open(path, encoding="utf-8", errors="replace") as f:
+                content = await f.read()
+        except OSError:
+            return None
+    if "\0" in content:
+        return None  # Binary despite its extension
+    return content
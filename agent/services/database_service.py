@@ -1,23 +1,75 @@
 """Database service for agent dual-write functionality."""
 
 import asyncio
+import json
 import logging
 import os
+from collections import deque
 from datetime import datetime
+from pathlib import Path
 from typing import Any
 
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlmodel import select
 
+from agent.services.spool import DiskSpool
+
 logger = logging.getLogger(__name__)
 
+# Column order used for bulk ingest into agent_outputs
+AGENT_OUTPUT_COLUMNS = (
+    "run_id",
+    "variation_id",
+    "content",
+    "timestamp",
+    "output_type",
+    "output_metadata",
+)
+
+# Overflow policies applied per output_type when the write queue is full:
+#   block  - wait for the writer to make room (spill to disk after a timeout)
+#   sample - keep one in every AGENT_DB_SAMPLE_RATE items, drop the rest
+#   drop   - discard new items until there is room again
+QUEUE_POLICIES = ("block", "sample", "drop")
+DEFAULT_QUEUE_POLICIES = {"logging": "sample"}
+
+
+def parse_queue_policies(spec: str | None) -> dict[str, str]:
+    """Parse ``output_type=policy`` pairs such as ``"llm=block,logging=drop"``.
+
+    Args:
+        spec: Comma-separated policy overrides, may be empty
+
+    Returns:
+        Policies by output type, merged over the defaults
+    """
+    policies = dict(DEFAULT_QUEUE_POLICIES)
+    for pair in (spec or "").split(","):
+        output_type, _, policy = pair.partition("=")
+        output_type, policy = output_type.strip(), policy.strip().lower()
+        if not output_type:
+            continue
+        if policy not in QUEUE_POLICIES:
+            logger.warning(
+                f"[DB-QUEUE] Unknown queue policy {policy!r} for {output_type}, using block"
+            )
+            policy = "block"
+        policies[output_type] = policy
+    return policies
+
 
 class AgentDatabaseService:
     """Database service for agent to write outputs to PostgreSQL."""
 
-    def __init__(self):
-        """Initialize the database service."""
+    def __init__(self, spool_dir: Path | None = None):
+        """Initialize the database service.
+
+        Args:
+            spool_dir: Directory for spilling batches to disk when the queue is
+                full or the database is unavailable. Without it producers block.
+        """
         self.database_url = os.getenv("DATABASE_URL_ASYNC")
         if not self.database_url:
             raise RuntimeError("DATABASE_URL_ASYNC environment variable not set")
@@ -43,13 +95,43 @@ class AgentDatabaseService:
         )
 
         # Batching configuration
-        self._write_queue: list[dict[str, Any]] = []
+        self._write_queue: deque[dict[str, Any]] = deque()
         self._write_lock = asyncio.Lock()
         self._batch_task: asyncio.Task | None = None
-        self._batch_size = 50  # Write in batches of 50
-        self._batch_interval = 1.0  # Write every 1 second
+        self._batch_size = int(os.getenv("AGENT_DB_BATCH_SIZE", "500"))
+        self._batch_interval = 1.0  # Write at least every 1 second
+        self._queue_ready = asyncio.Event()  # Set when a full batch is queued
         self._shutdown = False
 
+        # Bounded queue with per-output-type overflow policy
+        self._max_queue_size = int(os.getenv("AGENT_DB_MAX_QUEUE", "10000"))
+        self._queue_policies = parse_queue_policies(os.getenv("AGENT_DB_QUEUE_POLICY"))
+        self._sample_rate = max(1, int(os.getenv("AGENT_DB_SAMPLE_RATE", "10")))
+        self._block_timeout = float(os.getenv("AGENT_DB_BLOCK_TIMEOUT", "5"))
+        self._space_available = asyncio.Event()
+        self._space_available.set()
+        self._overflow_counts: dict[str, int] = {}
+
+        # On-disk spool for bursts and database outages
+        self.spool = DiskSpool(spool_dir) if spool_dir else None
+
+        # Counters for diagnostics
+        self.queue_stats = {
+            "queued": 0,
+            "written": 0,
+            "blocked": 0,
+            "dropped": 0,
+            "sampled_out": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "failed": 0,
+        }
+
+        # Bulk ingest mode: COPY for asyncpg, multi-row INSERT otherwise
+        self._ingest_mode = os.getenv("AGENT_DB_INGEST_MODE") or (
+            "copy" if self.engine.dialect.driver == "asyncpg" else "insert"
+        )
+
     async def connect(self) -> None:
         """Connect to database and test connection."""
         # Test connection using a temporary session
@@ -66,14 +148,13 @@ class AgentDatabaseService:
         # Stop accepting new writes
         self._shutdown = True
 
-        # Flush any remaining items
-        async with self._write_lock:
-            if self._write_queue:
-                logger.info(
-                    f"[DB-FLUSH] Flushing {len(self._write_queue)} pending writes"
-                )
-                await self._write_batch(self._write_queue)
-                self._write_queue = []
+        # Flush before cancelling so an in-flight batch is never cut off
+        if not await self.flush():
+            logger.error(
+                f"[DB-FLUSH] Outputs left unwritten: {self.pending} queued, "
+                f"{self.spooled} spool segments"
+            )
+        logger.info(f"[DB-FLUSH] Write queue stats: {self.queue_stats}")
 
         # Cancel batch task
         if self._batch_task and not self._batch_task.done():
@@ -85,6 +166,37 @@ class AgentDatabaseService:
 
         await self.engine.dispose()
 
+    @property
+    def pending(self) -> int:
+        """Number of outputs queued in memory and not yet written."""
+        return len(self._write_queue)
+
+    @property
+    def spooled(self) -> int:
+        """Number of spool segments waiting to be replayed."""
+        return len(self.spool) if self.spool is not None else 0
+
+    async def flush(self) -> bool:
+        """Write everything queued so far, then replay the disk spool.
+
+        Waits for a batch the writer already has in flight, so when this
+        returns every output queued before the call has been acknowledged by
+        the database or spilled to disk.
+
+        Returns:
+            True if nothing is left in memory or in the spool
+        """
+        async with self._write_lock:
+            if self._write_queue:
+                logger.info(
+                    f"[DB-FLUSH] Flushing {len(self._write_queue)} pending writes"
+                )
+                while self._write_queue:
+                    await self._write_or_spill(self._take_batch())
+            await self._replay_spool(limit=None)
+
+        return not self._write_queue and not self.spooled
+
     async def write_agent_output(
         self,
         run_id: str,
@@ -102,9 +214,8 @@ class AgentDatabaseService:
             output_type: Type of output (llm, stdout, status, etc.)
             metadata: Optional metadata
         """
-        # Add to queue
-        async with self._write_lock:
-            self._write_queue.append(
+        await self.write_agent_outputs(
+            [
                 {
                     "run_id": run_id,
                     "variation_id": variation_id,
@@ -113,70 +224,241 @@ class AgentDatabaseService:
                     "timestamp": datetime.utcnow(),
                     "metadata": metadata,
                 }
+            ]
+        )
+
+    async def write_agent_outputs(self, items: list[dict[str, Any]]) -> None:
+        """Queue several agent outputs for batched writing in one step.
+
+        Args:
+            items: Output records with run_id, variation_id, content,
+                output_type, timestamp and metadata keys
+        """
+        if not items:
+            return
+
+        # Start batch writer if not running
+        if not self._shutdown and (self._batch_task is None or self._batch_task.done()):
+            self._batch_task = asyncio.create_task(self._batch_writer())
+
+        overflow: list[dict[str, Any]] = []
+        for item in items:
+            if len(self._write_queue) >= self._max_queue_size and not self._shutdown:
+                if not await self._make_room(item, overflow):
+                    continue
+            self._write_queue.append(item)
+            self.queue_stats["queued"] += 1
+
+        if overflow:
+            self._spill(overflow)
+
+        # Wake the writer early once a full batch is waiting
+        if len(self._write_queue) >= self._batch_size:
+            self._queue_ready.set()
+
+    async def _make_room(
+        self, item: dict[str, Any], overflow: list[dict[str, Any]]
+    ) -> bool:
+        """Apply the overflow policy for an item arriving at a full queue.
+
+        Returns:
+            True if the item should be queued, False if it was dropped or
+            diverted to ``overflow`` for spilling
+        """
+        output_type = item.get("output_type", "")
+        policy = self._queue_policies.get(output_type, "block")
+
+        if policy == "drop":
+            self.queue_stats["dropped"] += 1
+            return False
+
+        if policy == "sample":
+            seen = self._overflow_counts.get(output_type, 0)
+            self._overflow_counts[output_type] = seen + 1
+            if seen % self._sample_rate:
+                self.queue_stats["sampled_out"] += 1
+                return False
+            # Sampled survivors are treated like blocking writes
+
+        # block: wait for the writer to drain, spilling if it stays full
+        self.queue_stats["blocked"] += 1
+        while len(self._write_queue) >= self._max_queue_size and not self._shutdown:
+            self._space_available.clear()
+            self._queue_ready.set()
+            try:
+                await asyncio.wait_for(
+                    self._space_available.wait(), timeout=self._block_timeout
+                )
+            except TimeoutError:
+                if self.spool is not None:
+                    overflow.append(item)
+                    return False
+                logger.warning(
+                    f"[DB-QUEUE] Write queue full ({self._max_queue_size}) for "
+                    f"{self._block_timeout}s, still waiting"
+                )
+        return True
+
+    def _take_batch(self) -> list[dict[str, Any]]:
+        """Pop up to one batch from the front of the queue."""
+        count = min(self._batch_size, len(self._write_queue))
+        batch = [self._write_queue.popleft() for _ in range(count)]
+        if len(self._write_queue) < self._max_queue_size:
+            self._space_available.set()
+        return batch
+
+    def _spill(self, items: list[dict[str, Any]]) -> None:
+        """Move items to the disk spool, counting them as lost if that fails."""
+        if self.spool is not None and self.spool.append(items):
+            self.queue_stats["spilled"] += len(items)
+        else:
+            self.queue_stats["failed"] += len(items)
+            logger.error(f"[DB-QUEUE] Lost {len(items)} outputs (no spool space)")
+
+    async def _write_or_spill(self, items: list[dict[str, Any]]) -> bool:
+        """Write a batch, spilling it to disk if the database rejects it.
+
+        Returns:
+            True if the batch reached the database
+        """
+        try:
+            await self._write_batch(items)
+            self.queue_stats["written"] += len(items)
+            return True
+        except Exception as e:
+            logger.error(
+                f"[DB-BATCH] Failed to write batch of {len(items)} outputs: {e}"
             )
+            if self.spool is not None:
+                self._spill(items)
+            else:
+                self.queue_stats["failed"] += len(items)
+            return False
 
-            # Start batch writer if not running
-            if self._batch_task is None or self._batch_task.done():
-                self._batch_task = asyncio.create_task(self._batch_writer())
+    async def _replay_spool(self, limit: int | None = 1) -> None:
+        """Write spooled segments back to the database, oldest first.
+
+        Args:
+            limit: Maximum number of segments to replay, None for all
+        """
+        if self.spool is None:
+            return
+
+        for segment in self.spool.segments()[:limit]:
+            try:
+                items = self.spool.read(segment)
+                await self._write_batch(items)
+            except Exception as e:
+                logger.warning(f"[SPOOL] Replay of {segment.name} deferred: {e}")
+                return
+            self.spool.remove(segment)
+            self.queue_stats["replayed"] += len(items)
+            self.queue_stats["written"] += len(items)
+            logger.info(f"[SPOOL] Replayed {len(items)} outputs from {segment.name}")
 
     async def _batch_writer(self):
-        """Background task that writes batched outputs to database."""
+        """Background task that writes batched outputs to database.
+
+        Drains on whichever comes first: the batch interval elapsing or a full
+        batch being queued. While a backlog remains it keeps draining without
+        sleeping. Spooled segments are replayed whenever the queue is idle.
+        """
         while not self._shutdown:
             try:
-                # Wait for batch interval or until we have enough items
-                await asyncio.sleep(self._batch_interval)
-
-                # Get items to write
+                if len(self._write_queue) < self._batch_size:
+                    try:
+                        await asyncio.wait_for(
+                            self._queue_ready.wait(), timeout=self._batch_interval
+                        )
+                    except TimeoutError:
+                        pass
+                self._queue_ready.clear()
+
+                if not self._write_queue:
+                    await self._replay_spool()
+                    continue
+
+                # Write batch to database (spilled to disk on failure)
                 async with self._write_lock:
-                    if not self._write_queue:
-                        continue
-
-                    # Take up to batch_size items
-                    items_to_write = self._write_queue[: self._batch_size]
-                    self._write_queue = self._write_queue[self._batch_size :]
-
-                # Write batch to database
-                await self._write_batch(items_to_write)
+                    written = await self._write_or_spill(self._take_batch())
+                if not written:
+                    await asyncio.sleep(self._batch_interval)  # Back off
 
             except Exception as e:
                 logger.error(f"[BATCH-WRITER] Error in batch writer: {e}")
                 await asyncio.sleep(1)  # Brief pause before retrying
 
     async def _write_batch(self, items: list[dict[str, Any]]) -> None:
-        """Write a batch of outputs to the database."""
+        """Write a batch of outputs to the database in a single round trip.
+
+        Raises:
+            Exception: If the batch could not be written
+        """
         if not items:
             return
 
+        rows = [self._to_row(item) for item in items]
+
+        if self._ingest_mode == "copy":
+            try:
+                await self._copy_rows(rows)
+                logger.debug(f"[DB-BATCH] Copied batch of {len(rows)} outputs")
+                return
+            except Exception as e:
+                logger.warning(f"[DB-BATCH] COPY failed, falling back to INSERT: {e}")
+
+        await self._insert_rows(rows)
+
+    @staticmethod
+    def _to_row(item: dict[str, Any]) -> dict[str, Any]:
+        """Convert a queued item to an agent_outputs row."""
+        metadata = item.get("metadata")
+        if metadata is not None:
+            # Round-trip so non-JSON values (datetimes, etc.) become strings
+            metadata = json.loads(json.dumps(metadata, default=str))
+        return {
+            "run_id": item["run_id"],
+            "variation_id": item["variation_id"],
+            "content": item["content"],
+            "timestamp": item.get("timestamp") or datetime.utcnow(),
+            "output_type": item["output_type"],
+            "output_metadata": metadata,
+        }
+
+    async def _copy_rows(self, rows: list[dict[str, Any]]) -> None:
+        """Bulk load rows with asyncpg ``copy_records_to_table``."""
+        records = [
+            tuple(
+                json.dumps(row[col])
+                if col == "output_metadata" and row[col] is not None
+                else row[col]
+                for col in AGENT_OUTPUT_COLUMNS
+            )
+            for row in rows
+        ]
+        async with self.engine.connect() as conn:
+            raw_connection = await conn.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                "agent_outputs", records=records, columns=list(AGENT_OUTPUT_COLUMNS)
+            )
+
+    async def _insert_rows(self, rows: list[dict[str, Any]]) -> None:
+        """Write rows with one multi-row ``INSERT ... VALUES`` statement."""
         async with self.async_session_maker() as session:
             try:
                 # Import here to avoid circular imports
                 from app.models.run import AgentOutput
 
-                # Create all output objects
-                outputs = [
-                    AgentOutput(
-                        run_id=item["run_id"],
-                        variation_id=item["variation_id"],
-                        content=item["content"],
-                        output_type=item["output_type"],
-                        timestamp=item["timestamp"],
-                    )
-                    for item in items
-                ]
-
-                # Add all at once
-                session.add_all(outputs)
+                await session.execute(insert(AgentOutput.__table__).values(rows))
                 await session.commit()
 
                 logger.debug(
-                    f"[DB-BATCH] Wrote batch of {len(items)} outputs to database"
+                    f"[DB-BATCH] Wrote batch of {len(rows)} outputs to database"
                 )
 
-            except Exception as e:
-                logger.error(
-                    f"[DB-BATCH] Failed to write batch of {len(items)} outputs: {e}"
-                )
+            except Exception:
                 await session.rollback()
+                raise
 
     async def update_run_status(
         self,
@@ -398,3 +680,64 @@ class AgentDatabaseService:
                 logger.error(f"[DB-WRITE] Failed to write LiteLLM analytics: {e}")
                 await session.rollback()
                 # Don't raise - agent should continue even if DB write fails
+
+    async def write_diff_blobs(self, blobs: list[Any]) -> int:
+        """Store diff blobs that are not in the database yet.
+
+        Blobs are content-addressed, so hashes already present (from another
+        variation or run) are skipped rather than uploaded again.
+
+        Args:
+            blobs: ``DiffBlobRecord``-like objects (hash, codec, size, data)
+
+        Returns:
+            Number of blobs actually written
+
+        Raises:
+            Exception: If the blobs could not be written
+        """
+        if not blobs:
+            return 0
+
+        async with self.async_session_maker() as session:
+            try:
+                # Import here to avoid circular imports
+                from app.models.run import DiffBlob
+
+                hashes = [blob.hash for blob in blobs]
+                result = await session.execute(
+                    select(DiffBlob.hash).where(DiffBlob.hash.in_(hashes))
+                )
+                existing = set(result.scalars().all())
+                rows = [
+                    {
+                        "hash": blob.hash,
+                        "codec": blob.codec,
+                        "size": blob.size,
+                        "data": blob.data,
+                        "created_at": datetime.utcnow(),
+                    }
+                    for blob in blobs
+                    if blob.hash not in existing
+                ]
+                if rows:
+                    # Another variation may store the same blob concurrently
+                    dialect = self.engine.dialect.name
+                    if dialect == "postgresql":
+                        from sqlalchemy.dialects.postgresql import insert as upsert
+                    else:
+                        from sqlalchemy.dialects.sqlite import insert as upsert
+                    await session.execute(
+                        upsert(DiffBlob.__table__).values(rows).on_conflict_do_nothing()
+                    )
+                    await session.commit()
+
+                logger.info(
+                    f"[DB-WRITE] Stored {len(rows)} new diff blobs, "
+                    f"{len(existing)} already present"
+                )
+                return len(rows)
+
+            except Exception:
+                await session.rollback()
+                raise
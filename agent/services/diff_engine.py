@@ -0,0 +1,200 @@
+"""Workspace diffs in one pass of git.
+
+The agent used to list changed files with ``git diff --name-only``, run
+``git show HEAD:<file>`` once per file and store complete old and new file
+contents. ``collect_diffs`` asks git for every change at once instead:
+
+- untracked (non-ignored) files are marked intent-to-add in a throwaway
+  copy of the index, so new files show up without touching the real index;
+- ``git diff HEAD --numstat`` gives per-file line stats (and flags binary
+  files), ``git diff HEAD --patch`` the unified hunks, both with rename
+  detection and in the same file order;
+- each file's patch is capped at ``max_file_bytes``; larger patches keep
+  their header and stats only and are marked ``truncated``.
+
+Passing ``paths`` limits all of this to those files, which is how the diff
+watcher re-diffs only what changed since its last poll.
+
+Diffs are stored in the shape the frontend already renders (``oldFile`` /
+``newFile`` names plus ``hunks``), without file contents. Everything here
+is blocking; call ``collect_diffs`` through ``asyncio.to_thread``.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+MAX_DIFF_FILE_BYTES = 256 * 1024
+TRUNCATED_NOTE = "@@ diff truncated: {size} bytes exceeds the {limit} byte limit @@\n"
+
+
+@dataclass(slots=True)
+class FileDiff:
+    """Changes to one file of the workspace."""
+
+    path: str
+    old_path: str
+    status: str  # "added", "deleted", "modified" or "renamed"
+    additions: int
+    deletions: int
+    patch: str
+    binary: bool = False
+    truncated: bool = False
+
+    def to_output(self) -> dict[str, Any]:
+        """Entry of the ``diffs`` agent output."""
+        return {
+            "oldFile": {"name": self.old_path, "content": ""},
+            "newFile": {"name": self.path, "content": ""},
+            "hunks": [self.patch] if self.patch else [],
+            "status": self.status,
+            "additions": self.additions,
+            "deletions": self.deletions,
+            "binary": self.binary,
+            "truncated": self.truncated,
+        }
+
+
+def collect_diffs(
+    repo_dir: Path,
+    *,
+    paths: list[str] | None = None,
+    max_file_bytes: int = MAX_DIFF_FILE_BYTES,
+) -> list[FileDiff]:
+    """Diff the working tree, untracked files included, against ``HEAD``.
+
+    Args:
+        repo_dir: Git workspace
+        paths: Only diff these files (both sides of a rename); None for all
+        max_file_bytes: Largest patch kept per file
+
+    Returns:
+        One entry per changed file, in git's order
+    """
+    if paths is not None and not paths:
+        return []
+    repo_dir = Path(repo_dir)
+    pathspec = ("--", *paths) if paths else ()
+    index = Path(_git(repo_dir, "rev-parse", "--git-path", "index").strip())
+    if not index.is_absolute():
+        index = repo_dir / index
+
+    with tempfile.TemporaryDirectory(prefix="agent-diff-") as tmp:
+        env = {**os.environ, "GIT_INDEX_FILE": str(Path(tmp) / "index")}
+        if index.exists():
+            shutil.copyfile(index, env["GIT_INDEX_FILE"])
+
+        untracked = _git(
+            repo_dir,
+            "ls-files",
+            "-z",
+            "--others",
+            "--exclude-standard",
+            *pathspec,
+            env=env,
+        )
+        if untracked:
+            _git(
+                repo_dir,
+                "add",
+                "--intent-to-add",
+                "--pathspec-from-file=-",
+                "--pathspec-file-nul",
+                env=env,
+                stdin=untracked,
+            )
+
+        diff_args = ("diff", "HEAD", "-M", "--no-color", "--no-ext-diff")
+        numstat = _git(repo_dir, *diff_args, "--numstat", "-z", *pathspec, env=env)
+        patch = _git(repo_dir, *diff_args, "--patch", *pathspec, env=env)
+
+    stats = _parse_numstat(numstat)
+    patches = _split_patch(patch)
+    if len(stats) != len(patches):
+        raise RuntimeError(
+            f"git reported {len(stats)} changed files but {len(patches)} patches"
+        )
+
+    diffs = []
+    for (additions, deletions, old_path, path), file_patch in zip(
+        stats, patches, strict=True
+    ):
+        diff = FileDiff(
+            path=path,
+            old_path=old_path,
+            status=_status(file_patch, old_path, path),
+            additions=additions or 0,
+            deletions=deletions or 0,
+            patch=file_patch,
+            binary=additions is None,
+        )
+        size = len(file_patch.encode())
+        if size > max_file_bytes:
+            header = file_patch.split("\n@@", 1)[0] + "\n"
+            diff.patch = header + TRUNCATED_NOTE.format(size=size, limit=max_file_bytes)
+            diff.truncated = True
+        diffs.append(diff)
+    return diffs
+
+
+def _git(
+    repo_dir: Path,
+    *args: str,
+    env: dict[str, str] | None = None,
+    stdin: str | None = None,
+) -> str:
+    result = subprocess.run(
+        # Paths are file names, never globs
+        ["git", "--literal-pathspecs", "-C", str(repo_dir), *args],
+        input=stdin.encode("utf-8", errors="surrogateescape") if stdin else None,
+        capture_output=True,
+        check=True,
+        env=env,
+    )
+    return result.stdout.decode("utf-8", errors="surrogateescape")
+
+
+def _parse_numstat(output: str) -> list[tuple[int | None, int | None, str, str]]:
+    """``(additions, deletions, old path, path)``; counts are None for binaries."""
+    stats = []
+    fields = output.split("\0")
+    i = 0
+    while i < len(fields) and fields[i]:
+        added, deleted, path = fields[i].split("\t", 2)
+        if path:
+            old_path = path
+            i += 1
+        else:  # Rename: old and new paths follow as separate fields
+            old_path, path = fields[i + 1], fields[i + 2]
+            i += 3
+        stats.append(
+            (
+                None if added == "-" else int(added),
+                None if deleted == "-" else int(deleted),
+                old_path,
+                path,
+            )
+        )
+    return stats
+
+
+def _split_patch(patch: str) -> list[str]:
+    if not patch:
+        return []
+    parts = patch.split("\ndiff --git ")
+    return [parts[0] + "\n"] + [f"diff --git {part}\n" for part in parts[1:]]
+
+
+def _status(patch: str, old_path: str, path: str) -> str:
+    header = patch.split("\n@@", 1)[0]
+    if "\nnew file mode" in header:
+        return "added"
+    if "\ndeleted file mode" in header:
+        return "deleted"
+    if old_path != path:
+        return "renamed"
+    return "modified"
@@ -0,0 +1,63 @@
+"""Content-addressed storage for workspace diffs.
+
+Each file's unified diff becomes a blob keyed by the SHA-256 of the diff
+text and compressed with ``app.core.diff_codec``, which the API decompresses
+it with.
+Blobs live in the ``diff_blobs`` table, so identical diffs produced by
+several variations or runs are stored once. The ``diffs`` output of a
+variation is then only a manifest: the usual per-file entries with a
+``blob`` reference in place of their hunks.
+"""
+
+import hashlib
+from dataclasses import dataclass
+from typing import Any
+
+from agent.services.diff_engine import FileDiff
+from app.core.diff_codec import compress
+
+MANIFEST_FORMAT = "cas"
+
+
+@dataclass(slots=True)
+class DiffBlobRecord:
+    """Row of the ``diff_blobs`` table."""
+
+    hash: str
+    codec: str
+    size: int
+    data: bytes
+
+
+def encode_blob(text: str) -> DiffBlobRecord:
+    """Hash and compress one file's diff."""
+    raw = text.encode("utf-8", errors="surrogateescape")
+    codec, data = compress(raw)
+    return DiffBlobRecord(
+        hash=hashlib.sha256(raw).hexdigest(), codec=codec, size=len(raw), data=data
+    )
+
+
+def build_manifest(
+    diffs: list[FileDiff],
+) -> tuple[list[dict[str, Any]], dict[str, DiffBlobRecord]]:
+    """Split diffs into manifest entries and the blobs they reference.
+
+    Args:
+        diffs: Changed files of the workspace
+
+    Returns:
+        Manifest entries (``hunks`` replaced by ``blob``) and blobs by hash
+    """
+    entries = []
+    blobs: dict[str, DiffBlobRecord] = {}
+    for diff in diffs:
+        entry = diff.to_output()
+        del entry["hunks"]
+        entry["blob"] = None
+        if diff.patch:
+            blob = encode_blob(diff.patch)
+            blobs.setdefault(blob.hash, blob)
+            entry["blob"] = blob.hash
+        entries.append(entry)
+    return entries, blobs
@@ -0,0 +1,199 @@
+"""Progressive diffs of a workspace while an agent edits it.
+
+CLI agents can edit files for minutes before they exit, and diffs used to be
+generated only afterwards. ``DiffWatcher`` polls the workspace instead:
+
+- every ``interval`` seconds, ``git status`` (without taking the index lock
+  the agent itself may need) lists the files that differ from ``HEAD``;
+- each listed file's ``(mtime, size)`` signature is compared with the one
+  it had when it was last diffed, so unchanged files are never re-diffed;
+- a changed file is diffed once its signature has held for a whole poll
+  (debounce), together with every other settled file, in one
+  ``collect_diffs`` call;
+- the resulting per-file diffs, and the files that no longer differ, are
+  handed to ``publish``; patches identical to the last published one are
+  dropped.
+
+The watcher keeps the latest diff of every changed file. After a final
+unsettled ``poll``, ``diffs`` is the workspace's complete diff.
+"""
+
+import asyncio
+import contextlib
+import logging
+import subprocess
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from agent.services.diff_engine import MAX_DIFF_FILE_BYTES, FileDiff, collect_diffs
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 2.0
+MAX_PATHSPEC = 256  # Above this, diff everything and pick the settled files
+
+Signature = tuple[int, int] | None  # (mtime_ns, size); None once deleted
+Publisher = Callable[[list[FileDiff], list[str]], Awaitable[None]]
+
+_UNSEEN = object()
+
+
+class DiffWatcher:
+    """Polls a git workspace and publishes per-file diffs as files settle."""
+
+    def __init__(
+        self,
+        repo_dir: Path,
+        publish: Publisher,
+        *,
+        interval: float = DEFAULT_INTERVAL,
+        max_file_bytes: int = MAX_DIFF_FILE_BYTES,
+    ):
+        """Initialize the watcher.
+
+        Args:
+            repo_dir: Git workspace to watch
+            publish: Called with changed diffs and paths no longer changed
+            interval: Seconds between polls
+            max_file_bytes: Largest patch kept per file
+        """
+        self.repo_dir = Path(repo_dir)
+        self.publish = publish
+        self.interval = interval
+        self.max_file_bytes = max_file_bytes
+
+        self._diffs: dict[str, FileDiff] = {}
+        self._diffed: dict[str, Signature] = {}  # Signature when last diffed
+        self._seen: dict[str, Signature] = {}  # Signature at the previous poll
+        self._task: asyncio.Task | None = None
+
+        self.stats = {"polls": 0, "files_diffed": 0, "updates": 0, "errors": 0}
+
+    @property
+    def diffs(self) -> list[FileDiff]:
+        """Latest diff of every changed file, by path."""
+        return [self._diffs[path] for path in sorted(self._diffs)]
+
+    def start(self) -> None:
+        """Start polling in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop polling; an in-flight poll is cancelled."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def poll(self, *, settle: bool = True) -> bool:
+        """Diff the files that changed since they were last diffed.
+
+        Args:
+            settle: Skip files whose signature changed since the previous poll
+
+        Returns:
+            Whether anything was published
+        """
+        self.stats["polls"] += 1
+        changed, renamed_from = await asyncio.to_thread(_changed_paths, self.repo_dir)
+        signatures = {path: _signature(self.repo_dir / path) for path in changed}
+
+        ready = [
+            path
+            for path, signature in signatures.items()
+            if self._diffed.get(path, _UNSEEN) != signature
+            and (not settle or self._seen.get(path, _UNSEEN) == signature)
+        ]
+        self._seen = signatures
+
+        removed = [path for path in self._diffs if path not in signatures]
+        for path in removed:
+            del self._diffs[path]
+        for path in [path for path in self._diffed if path not in signatures]:
+            del self._diffed[path]
+
+        updated = []
+        if ready:
+            diffs = await asyncio.to_thread(self._collect, ready, renamed_from)
+            self.stats["files_diffed"] += len(ready)
+            for path in ready:
+                self._diffed[path] = signatures[path]
+                diff = diffs.get(path)
+                if diff is None:
+                    if self._diffs.pop(path, None) is not None:
+                        removed.append(path)  # No longer differs after all
+                elif path not in self._diffs or self._diffs[path].patch != diff.patch:
+                    self._diffs[path] = diff
+                    updated.append(diff)
+
+        if not updated and not removed:
+            return False
+        self.stats["updates"] += 1
+        await self.publish(updated, removed)
+        return True
+
+    def _collect(
+        self, ready: list[str], renamed_from: dict[str, str]
+    ) -> dict[str, FileDiff]:
+        paths = [
+            *ready,
+            *(renamed_from[path] for path in ready if path in renamed_from),
+        ]
+        if len(paths) > MAX_PATHSPEC:
+            paths = None  # One full pass beats an oversized command line
+        diffs = collect_diffs(
+            self.repo_dir, paths=paths, max_file_bytes=self.max_file_bytes
+        )
+        wanted = set(ready)
+        return {diff.path: diff for diff in diffs if diff.path in wanted}
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"[DIFF-WATCH] Poll failed: {e}")
+
+
+def _changed_paths(repo_dir: Path) -> tuple[list[str], dict[str, str]]:
+    """Paths that differ from ``HEAD``, and the sources of renamed paths."""
+    result = subprocess.run(
+        [
+            "git",
+            "--no-optional-locks",
+            "-C",
+            str(repo_dir),
+            "status",
+            "--porcelain=v1",
+            "-z",
+            "--untracked-files=all",
+        ],
+        capture_output=True,
+        check=True,
+    )
+    fields = result.stdout.decode("utf-8", errors="surrogateescape").split("\0")
+    paths = []
+    renamed_from = {}
+    i = 0
+    while i < len(fields) and fields[i]:
+        code, path = fields[i][:2], fields[i][3:]
+        paths.append(path)
+        if "R" in code or "C" in code:
+            renamed_from[path] = fields[i + 1]  # The source follows the entry
+            i += 1
+        i += 1
+    return paths, renamed_from
+
+
+def _signature(path: Path) -> Signature:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,52 @@
+"""Incremental line framing for captured stdout/stderr.
+
+``LineFramer`` turns arbitrary ``write()`` fragments into complete lines in
+time linear in the input size: each fragment is split once and only the
+trailing partial line is carried over, in an ``io.StringIO``.
+"""
+
+import io
+
+
+class LineFramer:
+    """Splits a stream of text fragments into complete lines."""
+
+    def __init__(self):
+        self._partial = io.StringIO()
+        self._has_partial = False
+
+    def feed(self, text: str) -> list[str]:
+        """Consume a fragment and return the lines it completed.
+
+        Args:
+            text: Text as passed to ``write()``
+
+        Returns:
+            Complete lines (without the trailing newline), possibly empty
+        """
+        if "\n" not in text:
+            if text:
+                self._partial.write(text)
+                self._has_partial = True
+            return []
+
+        lines = text.split("\n")
+        tail = lines.pop()
+        if self._has_partial:
+            self._partial.write(lines[0])
+            lines[0] = self._take_partial()
+        if tail:
+            self._partial.write(tail)
+            self._has_partial = True
+        return lines
+
+    def drain(self) -> str:
+        """Return and clear the incomplete trailing line, if any."""
+        return self._take_partial() if self._has_partial else ""
+
+    def _take_partial(self) -> str:
+        value = self._partial.getvalue()
+        self._partial.seek(0)
+        self._partial.truncate(0)
+        self._has_partial = False
+        return value
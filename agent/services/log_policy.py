@@ -0,0 +1,158 @@
+"""Verbosity policy for agent logs.
+
+Decides which log calls are persisted as ``logging`` rows and published to
+the stdout stream. Driven by environment variables set on the agent job:
+
+- ``LOG_LEVEL``: minimum persisted level (``DEBUG=true`` forces DEBUG)
+- ``AGENT_LOG_RATE_LIMITS``: per-level token bucket rates in messages per
+  second, e.g. ``"DEBUG=10,INFO=50"``; each message kind gets its own bucket
+- ``AGENT_LOG_SAMPLE_RATE``: once a bucket is empty, keep one in N messages
+  of that kind instead of all of them
+"""
+
+import os
+import time
+from typing import Any
+
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+DEFAULT_RATE_LIMITS = {"DEBUG": 10.0, "INFO": 50.0}
+MAX_KIND_LENGTH = 40
+MAX_TRACKED_KINDS = 1000
+
+
+def parse_rate_limits(spec: str | None) -> dict[str, float]:
+    """Parse ``LEVEL=rate`` pairs, merged over the defaults."""
+    limits = dict(DEFAULT_RATE_LIMITS)
+    for pair in (spec or "").split(","):
+        level, _, rate = pair.partition("=")
+        level = level.strip().upper()
+        if level in LOG_LEVELS and rate.strip():
+            limits[level] = float(rate)
+    return limits
+
+
+class TokenBucket:
+    """Token bucket allowing ``rate`` events per second with bursts of ``capacity``."""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        """Consume one token if available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class LogPolicy:
+    """Level gate, per-kind rate caps and sampling for agent logs."""
+
+    def __init__(
+        self,
+        min_level: str = "INFO",
+        rate_limits: dict[str, float] | None = None,
+        sample_rate: int = 20,
+    ):
+        """Initialize the policy.
+
+        Args:
+            min_level: Lowest level that is persisted
+            rate_limits: Messages per second allowed per kind, by level;
+                levels without an entry are never rate limited
+            sample_rate: Keep one in this many messages once a kind is over
+                its rate
+        """
+        self.min_level = min_level.upper()
+        self.min_levelno = LOG_LEVELS.get(self.min_level, LOG_LEVELS["INFO"])
+        self.rate_limits = DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits
+        self.sample_rate = max(1, sample_rate)
+
+        self._buckets: dict[str, TokenBucket] = {}
+        self._overflow: dict[str, int] = {}
+        # Markers of JSON log lines below the minimum level (see allow_line)
+        self._disabled_markers = tuple(
+            f'"level": "{level}"'
+            for level, levelno in LOG_LEVELS.items()
+            if levelno < self.min_levelno
+        )
+
+        self.stats = {"allowed": 0, "below_level": 0, "rate_limited": 0}
+
+    @classmethod
+    def from_env(cls) -> "LogPolicy":
+        """Build the policy from the agent job environment."""
+        min_level = os.getenv("LOG_LEVEL", "INFO")
+        if os.getenv("DEBUG") == "true":
+            min_level = "DEBUG"
+        return cls(
+            min_level=min_level,
+            rate_limits=parse_rate_limits(os.getenv("AGENT_LOG_RATE_LIMITS")),
+            sample_rate=int(os.getenv("AGENT_LOG_SAMPLE_RATE", "20")),
+        )
+
+    def enabled(self, level: str) -> bool:
+        """Cheap level check for guarding expensive log formatting."""
+        return LOG_LEVELS.get(level, LOG_LEVELS["INFO"]) >= self.min_levelno
+
+    def allow(self, level: str, message: str) -> bool:
+        """Decide whether a log message should be persisted.
+
+        Messages are grouped into kinds by level and their leading token
+        (``[DB-BATCH]``, ``⚡``, ...). Each kind has its own token bucket;
+        once it runs dry only every ``sample_rate``-th message gets through.
+        """
+        if not self.enabled(level):
+            self.stats["below_level"] += 1
+            return False
+
+        rate = self.rate_limits.get(level)
+        if not rate:
+            self.stats["allowed"] += 1
+            return True
+
+        kind = f"{level}:{message.split(' ', 1)[0][:MAX_KIND_LENGTH]}"
+        bucket = self._buckets.get(kind)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_KINDS:
+                self._buckets.clear()
+                self._overflow.clear()
+            bucket = self._buckets[kind] = TokenBucket(rate, capacity=rate * 2)
+
+        if bucket.take():
+            self.stats["allowed"] += 1
+            return True
+
+        overflow = self._overflow.get(kind, 0)
+        self._overflow[kind] = overflow + 1
+        if overflow % self.sample_rate == 0:
+            self.stats["allowed"] += 1
+            return True
+
+        self.stats["rate_limited"] += 1
+        return False
+
+    def allow_line(self, line: str) -> bool:
+        """Decide whether a captured stdout line should be persisted.
+
+        Filters structured ``print(json.dumps({...}))`` lines whose level is
+        below the minimum; any other line is kept.
+        """
+        if not self._disabled_markers or not line.startswith("{"):
+            return True
+        if any(marker in line for marker in self._disabled_markers):
+            self.stats["below_level"] += 1
+            return False
+        return True
+
+    def summary(self) -> dict[str, Any]:
+        """Counters describing what the policy filtered out."""
+        return {"min_level": self.min_level, **self.stats}
@@ -0,0 +1,456 @@
+"""Unified output sink for agent streaming and persistence.
+
+Every piece of agent output (LLM text, logs, status updates, captured
+stdout/stderr) is handed to a single ``OutputSink``. The sink coalesces
+events and writes them as pipelined Redis ``XADD`` batches plus one batched
+database path, so each output is written exactly once per destination.
+
+The two destinations are flushed by separate tasks: rows for the database
+are handed to their own queue once published, so a database that applies
+backpressure slows the producers (through ``wait_for_capacity``) but never
+the Redis stream.
+
+Variations that run in one process share a sink: each queues its output
+through a ``BoundSink`` returned by ``bind``, which numbers its own output
+and delegates everything else to the sink, and every event records the
+variation it belongs to.
+
+LLM output carries the generation ``attempt`` and a ``seq`` number within
+it, so consumers can drop duplicates and the output of superseded attempts.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class OutputEvent:
+    """A single piece of agent output bound for Redis and/or the database."""
+
+    variation_id: int = 0
+    stream: str | None = None  # Redis stream suffix: llm, stdout, status
+    fields: dict[str, str] | None = None
+    output_type: str | None = None  # agent_outputs.output_type, None = Redis only
+    content: str = ""
+    metadata: dict[str, Any] | None = None
+    timestamp: datetime = field(default_factory=lambda: datetime.now(UTC))
+
+
+class _Producer:
+    """Builds one variation's output events and queues them with ``emit``."""
+
+    run_id: str
+    variation_id: int
+    attempt: int
+    seq: int
+
+    def emit(self, event: OutputEvent, urgent: bool = False) -> None:
+        raise NotImplementedError
+
+    def begin_attempt(self, attempt: int) -> None:
+        """Number the following llm output as ``attempt``, from sequence 0."""
+        self.attempt = attempt
+        self.seq = 0
+
+    def llm(self, content: str, metadata: dict[str, Any] | None = None) -> None:
+        """Queue LLM output for the llm stream and an ``llm`` row."""
+        metadata = {
+            "content_length": len(content),
+            "attempt": self.attempt,
+            "seq": self.seq,
+            **(metadata or {}),
+        }
+        self.seq += 1
+        event = OutputEvent(
+            variation_id=self.variation_id,
+            stream="llm",
+            output_type="llm",
+            content=content,
+            metadata=metadata,
+        )
+        event.fields = {
+            "variation_id": str(self.variation_id),
+            "content": content,
+            "timestamp": event.timestamp.isoformat(),
+            "metadata": json.dumps(metadata, default=str),
+        }
+        self.emit(event)
+
+    def log(
+        self,
+        message: str,
+        level: str = "INFO",
+        metadata: dict[str, Any] | None = None,
+        publish: bool = False,
+    ) -> None:
+        """Queue a ``logging`` row, optionally mirrored to the stdout stream.
+
+        Args:
+            message: Log message
+            level: Log level (INFO, DEBUG, WARNING, ERROR)
+            metadata: Additional structured fields
+            publish: Also publish the log entry to ``run:{id}:stdout``
+        """
+        metadata = metadata or {}
+        event = OutputEvent(
+            variation_id=self.variation_id,
+            output_type="logging",
+            content=message,
+            metadata={"level": level, **metadata},
+        )
+        if publish:
+            log_entry = {
+                "timestamp": event.timestamp.isoformat(),
+                "run_id": self.run_id,
+                "variation_id": self.variation_id,
+                "level": level,
+                "message": message,
+                **metadata,
+            }
+            event.stream = "stdout"
+            event.fields = {
+                "variation_id": str(self.variation_id),
+                "content": json.dumps(log_entry, default=str),
+                "level": level,
+                "timestamp": log_entry["timestamp"],
+            }
+        self.emit(event)
+
+    def status(self, status: str, metadata: dict[str, Any] | None = None) -> None:
+        """Queue a status update for the status stream and flush promptly."""
+        event = OutputEvent(variation_id=self.variation_id, stream="status")
+        event.fields = {
+            "status": status,
+            "timestamp": event.timestamp.isoformat(),
+            "metadata": json.dumps(metadata or {}, default=str),
+        }
+        self.emit(event, urgent=True)
+
+    def record(
+        self,
+        output_type: str,
+        content: str,
+        metadata: dict[str, Any] | None = None,
+    ) -> None:
+        """Queue a database-only output row (stdout, stderr, diffs, ...)."""
+        self.emit(
+            OutputEvent(
+                variation_id=self.variation_id,
+                output_type=output_type,
+                content=content,
+                metadata=metadata,
+            )
+        )
+
+
+class OutputSink(_Producer):
+    """Coalesces agent output into pipelined Redis and batched DB writes."""
+
+    def __init__(
+        self,
+        run_id: str,
+        variation_id: int,
+        redis_client: Any = None,
+        db_service: Any = None,
+        *,
+        flush_interval: float = 0.05,
+        max_batch_size: int = 200,
+        max_pending: int = 5000,
+    ):
+        """Initialize the sink.
+
+        Args:
+            run_id: The run ID
+            variation_id: The variation ID
+            redis_client: Async Redis client used for stream writes
+            db_service: AgentDatabaseService used for persistence
+            flush_interval: Maximum seconds an event waits before being flushed
+            max_batch_size: Maximum events written per Redis pipeline / DB batch
+            max_pending: Queue depth at which ``wait_for_capacity`` blocks
+        """
+        self.run_id = run_id
+        self.variation_id = int(variation_id)
+        self.redis_client = redis_client
+        self.db_service = db_service
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self.max_pending = max_pending
+
+        self._pending: deque[OutputEvent] = deque()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._drained = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+        # Rows already published, waiting for the database flusher
+        self._db_pending: deque[dict[str, Any]] = deque()
+        self._db_wakeup = asyncio.Event()
+        self._db_lock = asyncio.Lock()
+        self._db_task: asyncio.Task | None = None
+        self._closed = False
+
+        # Numbering of llm output: generation attempt and sequence within it
+        self.attempt = 1
+        self.seq = 0
+
+        # Counters for diagnostics
+        self.stats = {
+            "events": 0,
+            "redis_batches": 0,
+            "redis_entries": 0,
+            "redis_errors": 0,
+            "db_batches": 0,
+            "db_rows": 0,
+            "db_errors": 0,
+        }
+
+    def bind(self, variation_id: int) -> "BoundSink":
+        """View of this sink that queues output for another variation."""
+        return BoundSink(self, variation_id)
+
+    async def start(self) -> None:
+        """Start the background Redis and database flushers."""
+        if self._task is None or self._task.done():
+            self._closed = False
+            self._task = asyncio.create_task(self._flusher())
+        if self._db_task is None or self._db_task.done():
+            self._db_task = asyncio.create_task(self._db_flusher())
+
+    async def close(self) -> None:
+        """Stop the background flushers and write everything still queued."""
+        self._closed = True
+        self._wakeup.set()
+        self._db_wakeup.set()
+        # Let in-flight batches finish instead of cancelling mid-write
+        if self._task and not self._task.done():
+            await self._task
+        await self._publish()
+        if self._db_task and not self._db_task.done():
+            await self._db_task
+        await self._persist()
+
+    async def drain(self, timeout: float = 20.0) -> dict[str, Any]:
+        """Flush barrier: resolve once every queued write is acknowledged.
+
+        Closes the sink, waits for Redis pipelines to return, then waits for
+        the database service to write (or spool) every row handed to it.
+
+        Args:
+            timeout: Hard limit in seconds before giving up on the barrier
+
+        Returns:
+            Time-to-drain metrics for this variation
+        """
+        pending_events = self.pending
+        pending_rows = getattr(self.db_service, "pending", 0)
+        start = time.monotonic()
+        drained = False
+        timed_out = False
+
+        try:
+            drained = await asyncio.wait_for(self._drain(), timeout=timeout)
+        except TimeoutError:
+            timed_out = True
+            logger.error(f"[OUTPUT-SINK] Flush barrier timed out after {timeout}s")
+        except Exception as e:
+            logger.error(f"[OUTPUT-SINK] Flush barrier failed: {e}")
+
+        return {
+            "drained": drained,
+            "timed_out": timed_out,
+            "drain_ms": round((time.monotonic() - start) * 1000, 1),
+            "pending_events": pending_events,
+            "pending_rows": pending_rows,
+            "redis_entries": self.stats["redis_entries"],
+            "db_rows": self.stats["db_rows"],
+            "errors": self.stats["redis_errors"] + self.stats["db_errors"],
+        }
+
+    async def _drain(self) -> bool:
+        """Close the sink and flush the database service behind it."""
+        await self.close()
+        flush = getattr(self.db_service, "flush", None)
+        if flush is not None:
+            return bool(await flush())
+        return True
+
+    @property
+    def pending(self) -> int:
+        """Number of events and database rows waiting to be flushed."""
+        return len(self._pending) + len(self._db_pending)
+
+    async def wait_for_capacity(self) -> None:
+        """Wait until the queues hold fewer than ``max_pending`` items.
+
+        Producers that can afford to slow down (the LLM stream readers) await
+        this so a slow database pushes back on them instead of growing memory.
+        """
+        while self.pending >= self.max_pending and not self._closed:
+            self._drained.clear()
+            self._wakeup.set()
+            self._db_wakeup.set()
+            await self._drained.wait()
+
+    def emit(self, event: OutputEvent, urgent: bool = False) -> None:
+        """Queue an event without blocking the caller.
+
+        Args:
+            event: The event to queue
+            urgent: Flush as soon as possible instead of waiting for the interval
+        """
+        self._pending.append(event)
+        self.stats["events"] += 1
+        if urgent or len(self._pending) >= self.max_batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        """Write every event queued so far, preserving emission order."""
+        await self._publish()
+        await self._persist()
+
+    async def _publish(self) -> None:
+        """Publish queued events to Redis and hand their rows to the DB queue."""
+        async with self._flush_lock:
+            while self._pending:
+                batch = []
+                while self._pending and len(batch) < self.max_batch_size:
+                    batch.append(self._pending.popleft())
+                await self._write(batch)
+                self._drained.set()
+
+    async def _persist(self) -> None:
+        """Write the rows handed to the DB queue, in batches."""
+        async with self._db_lock:
+            while self._db_pending:
+                rows = []
+                while self._db_pending and len(rows) < self.max_batch_size:
+                    rows.append(self._db_pending.popleft())
+                await self._write_rows(rows)
+                self._drained.set()
+
+    async def _flusher(self) -> None:
+        """Background task that publishes on interval, size or urgency."""
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self._publish()
+            except Exception as e:
+                logger.error(f"[OUTPUT-SINK] Flush failed: {e}")
+
+    async def _db_flusher(self) -> None:
+        """Background task that writes handed-off rows, however slowly."""
+        while not self._closed:
+            try:
+                await asyncio.wait_for(
+                    self._db_wakeup.wait(), timeout=self.flush_interval
+                )
+            except TimeoutError:
+                pass
+            self._db_wakeup.clear()
+            try:
+                await self._persist()
+            except Exception as e:
+                logger.error(f"[OUTPUT-SINK] Database flush failed: {e}")
+
+    async def _write(self, batch: list[OutputEvent]) -> None:
+        """Publish one batch to Redis (pipelined) and queue its database rows."""
+        redis_events = [e for e in batch if e.stream and e.fields]
+        if redis_events and self.redis_client:
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for event in redis_events:
+                    pipe.xadd(f"run:{self.run_id}:{event.stream}", event.fields)
+                await pipe.execute()
+                self.stats["redis_batches"] += 1
+                self.stats["redis_entries"] += len(redis_events)
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.error(
+                    f"[OUTPUT-SINK] Failed to publish {len(redis_events)} entries to Redis: {e}"
+                )
+
+        if not self.db_service:
+            return
+        self._db_pending.extend(
+            {
+                "run_id": self.run_id,
+                "variation_id": e.variation_id,
+                "content": e.content,
+                "output_type": e.output_type,
+                "timestamp": e.timestamp.replace(tzinfo=None),
+                "metadata": e.metadata,
+            }
+            for e in batch
+            if e.output_type
+        )
+        if len(self._db_pending) >= self.max_batch_size:
+            self._db_wakeup.set()
+
+    async def _write_rows(self, rows: list[dict[str, Any]]) -> None:
+        """Hand one batch of rows to the database service."""
+        try:
+            await self.db_service.write_agent_outputs(rows)
+            self.stats["db_batches"] += 1
+            self.stats["db_rows"] += len(rows)
+        except Exception as e:
+            self.stats["db_errors"] += 1
+            logger.error(
+                f"[OUTPUT-SINK] Failed to queue {len(rows)} rows for database: {e}"
+            )
+
+
+class BoundSink(_Producer):
+    """One variation's view of a shared ``OutputSink``.
+
+    Only the variation ID and the llm numbering belong to the view. Queueing,
+    backpressure, the clients and the counters are the sink's, read when
+    used, so a view bound before the sink is connected or closed sees both;
+    ``start``, ``close`` and ``drain`` are left to the sink itself.
+    """
+
+    def __init__(self, sink: OutputSink, variation_id: int):
+        self.sink = sink
+        self.variation_id = int(variation_id)
+        self.attempt = 1
+        self.seq = 0
+
+    @property
+    def run_id(self) -> str:
+        return self.sink.run_id
+
+    @property
+    def redis_client(self) -> Any:
+        return self.sink.redis_client
+
+    @property
+    def db_service(self) -> Any:
+        return self.sink.db_service
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return self.sink.stats
+
+    @property
+    def pending(self) -> int:
+        """Number of events waiting to be flushed."""
+        return self.sink.pending
+
+    async def wait_for_capacity(self) -> None:
+        """Wait until the sink's queue is below ``max_pending``."""
+        await self.sink.wait_for_capacity()
+
+    def emit(self, event: OutputEvent, urgent: bool = False) -> None:
+        """Queue an event on the sink without blocking the caller."""
+        self.sink.emit(event, urgent)
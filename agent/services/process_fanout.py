@@ -0,0 +1,131 @@
+"""Bounded fan-out from subprocess pipes to the output pipeline.
+
+Awaiting Redis or the database from inside a pipe reader stalls the reader
+while the write is slow; the pipe buffer then fills and the child process
+blocks on its next write. ``ProcessFanOut`` separates the two:
+
+- one reader task per pipe does large reads, frames lines and puts them on a
+  bounded ``asyncio.Queue`` (a full queue is the only thing a reader waits
+  for);
+- a single consumer drains everything queued, groups consecutive lines from
+  the same pipe and hands each group to that pipe's handler in one call.
+
+The queue bound keeps memory flat when the handlers fall behind for longer
+than the queue can absorb.
+"""
+
+import asyncio
+import codecs
+import logging
+from collections.abc import Awaitable, Callable
+
+from agent.services.claude_stream import STREAM_READ_SIZE
+from agent.services.line_framer import LineFramer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_QUEUED_LINES = 2000
+DEFAULT_MAX_BATCH_LINES = 200
+
+LineHandler = Callable[[list[str]], Awaitable[None]]
+
+
+class ProcessFanOut:
+    """Reads subprocess pipes concurrently and publishes their lines in batches."""
+
+    def __init__(
+        self,
+        handlers: dict[str, LineHandler],
+        *,
+        max_queued_lines: int = DEFAULT_MAX_QUEUED_LINES,
+        max_batch_lines: int = DEFAULT_MAX_BATCH_LINES,
+    ):
+        """Initialize the fan-out.
+
+        Args:
+            handlers: Coroutine per pipe name, called with a batch of lines
+            max_queued_lines: Lines buffered before readers wait for the consumer
+            max_batch_lines: Largest batch handed to a handler in one call
+        """
+        self._handlers = handlers
+        self._queue: asyncio.Queue[tuple[str, str] | None] = asyncio.Queue(
+            maxsize=max(1, max_queued_lines)
+        )
+        self.max_batch_lines = max(1, max_batch_lines)
+        self.stats = {
+            "lines": 0,
+            "batches": 0,
+            "reader_waits": 0,
+            "max_queued": 0,
+            "handler_errors": 0,
+        }
+
+    async def run(self, streams: dict[str, asyncio.StreamReader | None]) -> None:
+        """Pump every stream until EOF and wait for all lines to be handled.
+
+        Args:
+            streams: Pipe name (a key of ``handlers``) to its reader
+        """
+        consumer = asyncio.create_task(self._consume())
+        try:
+            await asyncio.gather(
+                *(
+                    self._read(name, stream)
+                    for name, stream in streams.items()
+                    if stream is not None
+                )
+            )
+            await self._queue.put(None)
+            await consumer
+        finally:
+            if not consumer.done():
+                consumer.cancel()
+
+    async def _read(self, name: str, stream: asyncio.StreamReader) -> None:
+        framer = LineFramer()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while True:
+            data = await stream.read(STREAM_READ_SIZE)
+            text = decoder.decode(data, final=not data)
+            lines = framer.feed(text)
+            if not data:
+                lines.append(framer.drain())
+            for raw in lines:
+                line = raw.rstrip()
+                if line:
+                    await self._put((name, line))
+            if not data:
+                return
+
+    async def _put(self, item: tuple[str, str]) -> None:
+        if self._queue.full():
+            self.stats["reader_waits"] += 1
+        await self._queue.put(item)
+        self.stats["max_queued"] = max(self.stats["max_queued"], self._queue.qsize())
+
+    async def _consume(self) -> None:
+        done = False
+        while not done:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch_lines and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+
+            # Consecutive lines from one pipe are handled as one group
+            start = 0
+            for i in range(1, len(batch) + 1):
+                if i == len(batch) or batch[i][0] != batch[start][0]:
+                    name = batch[start][0]
+                    await self._handle(name, [line for _, line in batch[start:i]])
+                    start = i
+
+    async def _handle(self, name: str, lines: list[str]) -> None:
+        self.stats["lines"] += len(lines)
+        self.stats["batches"] += 1
+        try:
+            await self._handlers[name](lines)
+        except Exception as e:
+            self.stats["handler_errors"] += 1
+            logger.error(f"[FAN-OUT] {name} handler failed: {e}")
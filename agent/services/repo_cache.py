@@ -0,0 +1,217 @@
+"""Shared bare-mirror cache for agent repository checkouts.
+
+Every variation of every run used to download its repository from scratch.
+``RepoCache`` keeps one bare mirror per repository URL under a node-local or
+PVC-backed directory:
+
+- a cache miss creates the mirror with ``git clone --mirror``;
+- a hit refreshes it with ``git remote update --prune``, unless it was
+  refreshed less than ``max_age`` seconds ago (variations of one run start
+  together and share a single fetch);
+- workspaces are ``--shared`` clones of the mirror, which borrow its objects
+  through ``alternates`` instead of copying or downloading them;
+- a ``commit`` pins the workspace to that exact revision (a mirror missing
+  it is fetched regardless of ``max_age``).
+
+Mirror updates are serialized across processes with ``flock`` on a lock file
+next to the mirror. Automatic gc is disabled in mirrors so objects that
+workspaces borrow are never pruned underneath them. Without a cache
+directory, checkouts fall back to a shallow single-branch clone.
+
+All git work is blocking; ``checkout`` runs it in a worker thread so the
+event loop keeps streaming while a clone is in progress. GitPython is
+imported by that first checkout, so agents that never clone don't load it.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import re
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    import git
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_AGE = 60.0  # Seconds a fresh mirror is reused without fetching
+
+
+class RepoCache:
+    """Bare mirrors keyed by repository URL, shared by agent workspaces."""
+
+    def __init__(self, root: Path | None, max_age: float = DEFAULT_MAX_AGE):
+        """Initialize the cache.
+
+        Args:
+            root: Directory holding the mirrors; ``None`` disables caching
+            max_age: Seconds after a refresh during which a mirror is not fetched
+        """
+        self.root = Path(root) if root else None
+        self.max_age = max_age
+
+    def mirror_path(self, url: str) -> Path:
+        """Mirror location for a repository URL."""
+        if self.root is None:
+            raise RuntimeError("Repository cache is disabled")
+        name = url.rstrip("/").rsplit("/", 1)[-1].removesuffix(".git")
+        slug = re.sub(r"[^A-Za-z0-9_.-]", "-", name)[:40] or "repo"
+        digest = hashlib.sha256(url.encode()).hexdigest()[:16]
+        return self.root / f"{slug}-{digest}.git"
+
+    async def checkout(
+        self,
+        url: str,
+        dest: Path,
+        branch: str | None = None,
+        commit: str | None = None,
+    ) -> dict[str, Any]:
+        """Create a workspace for ``url`` at ``dest`` without blocking the loop.
+
+        Args:
+            url: Repository URL
+            dest: Workspace directory (replaced if it exists)
+            branch: Branch to check out; the remote's default if omitted
+            commit: Exact commit to detach the workspace at
+
+        Returns:
+            Metrics: ``cache`` (hit, miss or disabled), ``fetched``,
+            ``clone_ms``, the checked-out ``commit`` and, when caching, the
+            cache-wide ``hit_rate``
+        """
+        return await asyncio.to_thread(self._checkout, url, Path(dest), branch, commit)
+
+    def stats(self) -> dict[str, Any]:
+        """Cache-wide hit/miss counters shared by every process using ``root``."""
+        if self.root is None:
+            return {"hits": 0, "misses": 0, "hit_rate": None}
+        return self._read_stats()
+
+    def _checkout(
+        self, url: str, dest: Path, branch: str | None, commit: str | None
+    ) -> dict[str, Any]:
+        import git
+
+        start = time.monotonic()
+        if dest.exists():
+            shutil.rmtree(dest)
+
+        if self.root is None:
+            options = {"depth": 1, "single_branch": True}
+            if branch:
+                options["branch"] = branch
+            repo = git.Repo.clone_from(url, dest, **options)
+            if commit:
+                self._pin(repo, commit)
+            return {
+                "cache": "disabled",
+                "fetched": True,
+                "clone_ms": int((time.monotonic() - start) * 1000),
+                "commit": repo.head.commit.hexsha,
+            }
+
+        mirror = self.mirror_path(url)
+        with self._locked(mirror.with_suffix(".lock")):
+            hit = mirror.exists()
+            fetched = self._update_mirror(url, mirror, commit) if hit else True
+            if not hit:
+                self._create_mirror(url, mirror)
+
+        options = {"shared": True, "single_branch": True}
+        if branch:
+            options["branch"] = branch
+        workspace = git.Repo.clone_from(str(mirror), dest, **options)
+        # Point the workspace at the real remote; objects still come from the mirror
+        workspace.remotes.origin.set_url(url)
+        if commit:
+            self._pin(workspace, commit)
+
+        stats = self._record(hit)
+        metrics = {
+            "cache": "hit" if hit else "miss",
+            "fetched": fetched,
+            "clone_ms": int((time.monotonic() - start) * 1000),
+            "commit": workspace.head.commit.hexsha,
+            "hit_rate": stats["hit_rate"],
+        }
+        logger.info(f"[REPO-CACHE] {metrics['cache']} for {mirror.name}: {metrics}")
+        return metrics
+
+    def _create_mirror(self, url: str, mirror: Path) -> None:
+        import git
+
+        partial = mirror.with_suffix(".partial")
+        if partial.exists():
+            shutil.rmtree(partial)
+        repo = git.Repo.clone_from(url, partial, mirror=True)
+        repo.git.config("gc.auto", "0")
+        partial.rename(mirror)
+        self._touch(mirror)
+
+    def _update_mirror(self, url: str, mirror: Path, commit: str | None) -> bool:
+        import git
+
+        repo = git.Repo(mirror)
+        stamp = mirror / "aideator-fetched"
+        fresh = stamp.exists() and time.time() - stamp.stat().st_mtime < self.max_age
+        if fresh and (commit is None or self._has_commit(repo, commit)):
+            return False
+        repo.remotes.origin.set_url(url)
+        repo.git.remote("update", "--prune")
+        self._touch(mirror)
+        return True
+
+    @staticmethod
+    def _has_commit(repo: "git.Repo", commit: str) -> bool:
+        import git
+
+        try:
+            repo.git.cat_file("-e", f"{commit}^{{commit}}")
+        except git.GitCommandError:
+            return False
+        return True
+
+    @classmethod
+    def _pin(cls, repo: "git.Repo", commit: str) -> None:
+        """Detach the workspace at ``commit``, fetching it if the clone lacks it."""
+        if not cls._has_commit(repo, commit):
+            repo.git.fetch("--depth", "1", "origin", commit)
+        repo.git.checkout("--detach", commit)
+
+    @staticmethod
+    def _touch(mirror: Path) -> None:
+        (mirror / "aideator-fetched").touch()
+
+    def _record(self, hit: bool) -> dict[str, Any]:
+        with self._locked(self.root / "stats.lock"):
+            stats = self._read_stats()
+            stats["hits" if hit else "misses"] += 1
+            stats["hit_rate"] = round(
+                stats["hits"] / (stats["hits"] + stats["misses"]), 3
+            )
+            tmp = self.root / "stats.json.tmp"
+            tmp.write_text(json.dumps(stats))
+            tmp.replace(self.root / "stats.json")
+        return stats
+
+    def _read_stats(self) -> dict[str, Any]:
+        try:
+            return json.loads((self.root / "stats.json").read_text())
+        except (OSError, ValueError):
+            return {"hits": 0, "misses": 0, "hit_rate": None}
+
+    @contextmanager
+    def _locked(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
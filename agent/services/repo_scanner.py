@@ -0,0 +1,219 @@
+"""Single-pass repository scanner shared by every codebase consumer.
+
+``scan_repository`` lists the workspace once and returns a ``RepoManifest``
+with path, size, extension and key-file rank for every file. Codebase
+analysis, context building and search reuse the manifest instead of walking
+the tree again.
+
+In a git checkout the file list comes from ``git ls-files -co
+--exclude-standard``, so ``.gitignore`` (and ``.git/info/exclude``) rules
+apply exactly as git applies them and ``.git`` itself is never visited.
+Outside git, the tree is walked with ``os.scandir``. Either way hidden
+paths (except ``.github``) and vendored directories are skipped, and sizes
+come from one ``lstat`` per file.
+
+The scan is blocking; call it through ``asyncio.to_thread``.
+"""
+
+import os
+import stat
+import subprocess
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from pathlib import Path
+
+SKIP_DIRS = frozenset({"node_modules", "vendor", "__pycache__"})
+VISIBLE_HIDDEN_DIRS = frozenset({".github"})
+
+# Files that describe a project, most important first
+KEY_FILE_PATTERNS = (
+    "README*",
+    "readme*",
+    "package.json",
+    "requirements.txt",
+    "setup.py",
+    "pyproject.toml",
+    "Cargo.toml",
+    "go.mod",
+    "Dockerfile",
+    "docker-compose*",
+    ".github/workflows/*",
+    "main.*",
+    "app.*",
+    "index.*",
+    "config.*",
+    "settings.*",
+)
+
+# Files never read as text: binary formats, and anything large enough to be
+# generated or data
+BINARY_EXTENSIONS = frozenset(
+    {
+        ".png", ".jpg", ".jpeg", ".gif", ".ico", ".webp", ".bmp", ".pdf",
+        ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".jar", ".war", ".whl",
+        ".so", ".dylib", ".dll", ".exe", ".bin", ".o", ".a", ".class", ".pyc",
+        ".woff", ".woff2", ".ttf", ".otf", ".eot", ".mp3", ".mp4", ".mov",
+        ".wav", ".db", ".sqlite", ".lock",
+    }
+)  # fmt: skip
+MAX_TEXT_FILE_BYTES = 512 * 1024
+
+
+@dataclass(slots=True)
+class FileEntry:
+    """One file of the workspace."""
+
+    path: str  # Relative, forward slashes
+    size: int
+    extension: str  # Lower-cased suffix including the dot, "" if none
+    key_rank: int | None = None  # Index into KEY_FILE_PATTERNS
+
+    @property
+    def readable(self) -> bool:
+        """Whether the file is worth reading as text."""
+        return (
+            self.extension not in BINARY_EXTENSIONS
+            and 0 < self.size <= MAX_TEXT_FILE_BYTES
+        )
+
+
+@dataclass
+class RepoManifest:
+    """Result of one scan of a workspace."""
+
+    root: Path
+    files: list[FileEntry] = field(default_factory=list)
+    source: str = "walk"  # "git" or "walk"
+    scan_ms: int = 0
+
+    @property
+    def total_files(self) -> int:
+        return len(self.files)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(entry.size for entry in self.files)
+
+    @property
+    def total_size_mb(self) -> float:
+        return round(self.total_bytes / (1024 * 1024), 2)
+
+    @property
+    def languages(self) -> Counter:
+        """File count per extension."""
+        return Counter(entry.extension for entry in self.files if entry.extension)
+
+    @property
+    def key_files(self) -> list[FileEntry]:
+        """Key files ordered by pattern importance, then path."""
+        keyed = [entry for entry in self.files if entry.key_rank is not None]
+        return sorted(keyed, key=lambda entry: (entry.key_rank, entry.path))
+
+
+def classify_key_file(path: str) -> int | None:
+    """Rank of the first key-file pattern matching a relative path."""
+    # Patterns are anchored at the repository root; skip the matching for
+    # the vast majority of paths that can't match any of them
+    if "/" in path and not path.startswith(".github/workflows/"):
+        return None
+    for rank, pattern in enumerate(KEY_FILE_PATTERNS):
+        if pattern.count("/") == path.count("/") and fnmatchcase(path, pattern):
+            return rank
+    return None
+
+
+def scan_repository(root: Path) -> RepoManifest:
+    """List, stat and classify every file of a workspace in one pass.
+
+    Args:
+        root: Workspace directory
+
+    Returns:
+        The workspace manifest
+    """
+    start = time.monotonic()
+    root = Path(root)
+    manifest = RepoManifest(root=root)
+
+    paths = _git_paths(root)
+    if paths is None:
+        paths = _walk_paths(root)
+    else:
+        manifest.source = "git"
+
+    root_prefix = str(root) + os.sep
+    for path in paths:
+        if _skipped(path):
+            continue
+        try:
+            info = os.lstat(root_prefix + path)
+        except OSError:
+            continue  # Listed by git but deleted in the worktree
+        if not stat.S_ISREG(info.st_mode):
+            continue  # Symlinks, submodules
+        name = path.rsplit("/", 1)[-1]
+        dot = name.rfind(".")
+        manifest.files.append(
+            FileEntry(
+                path=path,
+                size=info.st_size,
+                extension=name[dot:].lower() if dot > 0 else "",
+                key_rank=classify_key_file(path),
+            )
+        )
+
+    manifest.scan_ms = int((time.monotonic() - start) * 1000)
+    return manifest
+
+
+def _git_paths(root: Path) -> list[str] | None:
+    """Tracked and untracked, non-ignored files; None outside a git checkout."""
+    if not (root / ".git").exists():
+        return None
+    try:
+        result = subprocess.run(
+            ["git", "-C", str(root), "ls-files", "-z", "-co", "--exclude-standard"],
+            capture_output=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return [
+        path
+        for path in result.stdout.decode("utf-8", errors="surrogateescape").split("\0")
+        if path
+    ]
+
+
+def _walk_paths(root: Path) -> list[str]:
+    paths = []
+    stack = [("", str(root))]
+    while stack:
+        prefix, directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            relative = prefix + entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if not _skipped_dir(entry.name):
+                    stack.append((relative + "/", entry.path))
+            else:
+                paths.append(relative)
+    return paths
+
+
+def _skipped_dir(name: str) -> bool:
+    if name in SKIP_DIRS:
+        return True
+    return name.startswith(".") and name not in VISIBLE_HIDDEN_DIRS
+
+
+def _skipped(path: str) -> bool:
+    *directories, name = path.split("/")
+    if name.startswith("."):
+        return True
+    return any(_skipped_dir(directory) for directory in directories)
@@ -0,0 +1,134 @@
+"""Per-run workspace snapshots shared by every variation of a run.
+
+A run's prep job clones the repository once at the commit resolved by the
+orchestrator, analyses it, and publishes a snapshot under
+``<root>/<run_id>/``:
+
+- ``workspace.tar.gz``: a self-contained depth-1 clone of that commit (no
+  alternates, no history), with ``origin`` pointing at the real remote;
+- ``summary.md``: the ``_analyze_codebase`` summary;
+- ``manifest.json``: repository URL, commit and sizes, written last so its
+  presence means the snapshot is complete;
+- ``failed``: the prep job's error instead, when it gave up.
+
+Variations start alongside the prep job, wait a bounded time for the
+snapshot and restore from it instead of cloning and walking the repository
+themselves; once it has failed or the wait is over they clone on their own.
+Search indexes are kept per commit under ``<root>/indexes/``, so later runs
+on the same commit skip re-indexing. All methods are blocking and meant to
+be called through ``asyncio.to_thread``.
+"""
+
+import json
+import shutil
+import tarfile
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+ARCHIVE = "workspace.tar.gz"
+SUMMARY = "summary.md"
+MANIFEST = "manifest.json"
+FAILED = "failed"
+
+
+class RepoSnapshot:
+    """Snapshot of one run's workspace on a volume shared with its variations."""
+
+    def __init__(self, root: Path, run_id: str):
+        """Initialize the snapshot location.
+
+        Args:
+            root: Shared snapshot directory (``AGENT_SNAPSHOT_DIR``)
+            run_id: Run the snapshot belongs to
+        """
+        self.root = Path(root)
+        self.directory = self.root / run_id
+
+    def index_path(self, commit: str) -> Path:
+        """Location of the search index of a commit, shared by every run."""
+        return self.root / "indexes" / f"{commit}.json.gz"
+
+    @property
+    def ready(self) -> bool:
+        """Whether a complete snapshot has been published."""
+        return (self.directory / MANIFEST).exists()
+
+    @property
+    def failed(self) -> bool:
+        """Whether the prep job gave up on publishing the snapshot."""
+        return (self.directory / FAILED).exists()
+
+    def mark_failed(self, error: str) -> None:
+        """Tell waiting variations that no snapshot is coming."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / FAILED).write_text(error)
+
+    def publish(self, repo_dir: Path, *, repo_url: str, summary: str) -> dict[str, Any]:
+        """Archive ``repo_dir`` at its current ``HEAD`` together with its summary.
+
+        Args:
+            repo_dir: Checked-out workspace
+            repo_url: Remote the restored workspaces should point at
+            summary: Codebase summary handed to the variations
+
+        Returns:
+            The manifest that was written
+        """
+        import git
+
+        start = time.monotonic()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        staging = self.directory / "staging"
+        if staging.exists():
+            shutil.rmtree(staging)
+
+        try:
+            # Depth-1 copy of HEAD: independent of the source's alternates
+            repo = git.Repo.clone_from(
+                f"file://{Path(repo_dir).resolve()}", staging, depth=1
+            )
+            repo.remotes.origin.set_url(repo_url)
+            commit = repo.head.commit.hexsha
+
+            archive = self.directory / ARCHIVE
+            with tarfile.open(archive.with_suffix(".tmp"), "w:gz") as tar:
+                tar.add(staging, arcname=".")
+            archive.with_suffix(".tmp").replace(archive)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        (self.directory / SUMMARY).write_text(summary)
+        manifest = {
+            "repo_url": repo_url,
+            "commit": commit,
+            "archive_bytes": archive.stat().st_size,
+            "created_at": datetime.now(UTC).isoformat(),
+            "snapshot_ms": int((time.monotonic() - start) * 1000),
+        }
+        tmp = self.directory / f"{MANIFEST}.tmp"
+        tmp.write_text(json.dumps(manifest))
+        tmp.replace(self.directory / MANIFEST)
+        return manifest
+
+    def restore(self, repo_dir: Path) -> tuple[dict[str, Any], str]:
+        """Extract the snapshot into ``repo_dir``.
+
+        Args:
+            repo_dir: Workspace directory (replaced if it exists)
+
+        Returns:
+            The snapshot manifest (plus ``restore_ms``) and the codebase summary
+        """
+        start = time.monotonic()
+        manifest = json.loads((self.directory / MANIFEST).read_text())
+        repo_dir = Path(repo_dir)
+        if repo_dir.exists():
+            shutil.rmtree(repo_dir)
+        repo_dir.mkdir(parents=True)
+        with tarfile.open(self.directory / ARCHIVE, "r:gz") as tar:
+            tar.extractall(repo_dir, filter="data")
+        summary = (self.directory / SUMMARY).read_text()
+        manifest["restore_ms"] = int((time.monotonic() - start) * 1000)
+        return manifest, summary
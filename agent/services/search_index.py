@@ -0,0 +1,235 @@
+"""In-memory lexical retrieval over a workspace.
+
+``SearchIndex`` splits every readable file of a ``RepoManifest`` into chunks
+of ``CHUNK_LINES`` lines and indexes the identifiers in each chunk, plus the
+file's path, for BM25 ranking. Identifiers are indexed whole and split on
+``snake_case``/``camelCase`` boundaries, so a prompt mentioning "user
+session" finds ``UserSession`` and ``get_user_session`` alike.
+
+Files are read and tokenized in batches on a thread pool. A built index is
+plain data and can be saved as gzipped JSON, which lets runs on the same
+commit reuse it instead of re-indexing.
+"""
+
+import gzip
+import heapq
+import json
+import math
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import astuple, dataclass
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import Any
+
+from agent.services.repo_scanner import FileEntry, RepoManifest
+
+CHUNK_LINES = 30
+INDEX_WORKERS = 4
+INDEX_BATCH_FILES = 256
+INDEX_FORMAT = 1
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Prompt words that say nothing about where in the code to look
+STOPWORDS = frozenset(
+    {
+        "the", "and", "for", "with", "this", "that", "from", "into", "please",
+        "add", "make", "use", "using", "code", "file", "files", "should",
+        "would", "could", "can", "all", "any", "are", "was", "how", "what",
+        "why", "when", "where", "which", "does", "not", "you", "your",
+    }
+)  # fmt: skip
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_PART = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+
+
+def identifier_terms(text: str) -> list[str]:
+    """Lower-cased identifiers of a text, whole and split into their parts."""
+    terms = []
+    for identifier in _IDENTIFIER.findall(text):
+        if len(identifier) > 1:
+            terms.extend(_split_identifier(identifier))
+    return terms
+
+
+@lru_cache(maxsize=65536)
+def _split_identifier(identifier: str) -> tuple[str, ...]:
+    # Identifiers repeat heavily across a codebase; split each one once
+    parts = _PART.findall(identifier)
+    if len(parts) < 2:
+        return (identifier.lower(),)
+    return (identifier.lower(), *(part.lower() for part in parts if len(part) > 1))
+
+
+def query_terms(query: str) -> set[str]:
+    """Search terms of a natural-language query."""
+    return {
+        term
+        for term in identifier_terms(query)
+        if len(term) >= 3 and term not in STOPWORDS
+    }
+
+
+@dataclass(slots=True)
+class Chunk:
+    """A run of lines of one file."""
+
+    path: str
+    start: int  # First line, 1-based
+    end: int  # Last line, inclusive
+    chars: int
+
+
+class SearchIndex:
+    """BM25 index over the chunks of a workspace."""
+
+    def __init__(
+        self,
+        chunks: list[Chunk],
+        lengths: list[int],
+        postings: dict[str, list[tuple[int, int]]],
+        build_ms: int = 0,
+    ):
+        """Initialize from built or loaded index data.
+
+        Args:
+            chunks: Indexed chunks; their position is their id
+            lengths: Number of terms in each chunk
+            postings: Term to ``(chunk id, term frequency)`` pairs
+            build_ms: Time it took to build the index
+        """
+        self.chunks = chunks
+        self.lengths = lengths
+        self.postings = postings
+        self.build_ms = build_ms
+        self.avg_length = sum(lengths) / len(lengths) if lengths else 0.0
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return {
+            "files": len({chunk.path for chunk in self.chunks}),
+            "chunks": len(self.chunks),
+            "terms": len(self.postings),
+            "build_ms": self.build_ms,
+        }
+
+    @classmethod
+    def build(
+        cls,
+        manifest: RepoManifest,
+        *,
+        workers: int = INDEX_WORKERS,
+        batch_files: int = INDEX_BATCH_FILES,
+    ) -> "SearchIndex":
+        """Index every readable file of a workspace (blocking).
+
+        Args:
+            manifest: Scan of the workspace
+            workers: Threads reading and tokenizing files
+            batch_files: Files handed to a thread at a time
+
+        Returns:
+            The built index
+        """
+        start = time.monotonic()
+        entries = [entry for entry in manifest.files if entry.readable]
+        batches = [
+            entries[i : i + batch_files] for i in range(0, len(entries), batch_files)
+        ]
+
+        chunks: list[Chunk] = []
+        lengths: list[int] = []
+        postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # map() keeps batch order, so chunk ids are deterministic
+            for batch in pool.map(partial(_index_batch, manifest.root), batches):
+                for chunk, counts in batch:
+                    chunk_id = len(chunks)
+                    chunks.append(chunk)
+                    lengths.append(sum(counts.values()))
+                    for term, frequency in counts.items():
+                        postings[term].append((chunk_id, frequency))
+
+        build_ms = int((time.monotonic() - start) * 1000)
+        return cls(chunks, lengths, dict(postings), build_ms)
+
+    def search(self, query: str, k: int = 10) -> list[tuple[Chunk, float]]:
+        """Chunks most relevant to ``query``, best first."""
+        total = len(self.chunks)
+        scores: dict[int, float] = defaultdict(float)
+        for term in query_terms(query):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, frequency in postings:
+                norm = K1 * (1 - B + B * self.lengths[chunk_id] / self.avg_length)
+                scores[chunk_id] += idf * frequency * (K1 + 1) / (frequency + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.chunks[chunk_id], score) for chunk_id, score in best]
+
+    def save(self, path: Path) -> None:
+        """Write the index as gzipped JSON, atomically."""
+        data = {
+            "format": INDEX_FORMAT,
+            "chunks": [astuple(chunk) for chunk in self.chunks],
+            "lengths": self.lengths,
+            "postings": self.postings,
+        }
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")  # Agents may race
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=5) as f:
+            json.dump(data, f, separators=(",", ":"))
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "SearchIndex":
+        """Read an index written by ``save``."""
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != INDEX_FORMAT:
+            raise ValueError(f"Unsupported search index format in {path}")
+        return cls(
+            [Chunk(*fields) for fields in data["chunks"]],
+            data["lengths"],
+            {
+                term: [tuple(pair) for pair in pairs]
+                for term, pairs in data["postings"].items()
+            },
+        )
+
+
+def _index_batch(
+    root: Path, entries: list[FileEntry]
+) -> list[tuple[Chunk, Counter[str]]]:
+    indexed = []
+    for entry in entries:
+        try:
+            text = (root / entry.path).read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            continue
+        if "\0" in text:
+            continue  # Binary despite its extension
+        path_terms = identifier_terms(entry.path)
+        lines = text.splitlines(keepends=True)
+        for offset in range(0, max(len(lines), 1), CHUNK_LINES):
+            body = "".join(lines[offset : offset + CHUNK_LINES])
+            counts = Counter(identifier_terms(body))
+            counts.update(path_terms)
+            chunk = Chunk(
+                path=entry.path,
+                start=offset + 1,
+                end=min(offset + CHUNK_LINES, len(lines)),
+                chars=len(body),
+            )
+            indexed.append((chunk, counts))
+    return indexed
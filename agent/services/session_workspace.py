@@ -0,0 +1,161 @@
+"""Working trees that persist across the turns of a session.
+
+Every turn used to clone and analyse the repository into a fresh temporary
+workspace, even when the user was iterating on the same code. With session
+workspaces enabled, each variation of a session keeps its working tree on
+the shared volume under ``<root>/<session_id>/variation-<n>/``:
+
+- ``repo/``: the git workspace the agent edits;
+- ``summary.md``: the codebase summary from the turn that created it;
+- ``session.json``: repository URL, checkpoint commit and turn count,
+  written last so its presence means the workspace is usable.
+
+A turn ends with a checkpoint: the working tree is committed locally, so the
+next turn starts from it and its diffs show only that turn's changes.
+Workspaces that borrow objects from a repository mirror are made
+self-contained first, since the mirror may be pruned between turns. A
+``flock`` keeps two concurrent turns out of the same workspace.
+
+All methods are blocking and meant to be called through
+``asyncio.to_thread``.
+"""
+
+import fcntl
+import json
+import shutil
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+SUMMARY = "summary.md"
+MANIFEST = "session.json"
+LOCK = ".lock"
+CHECKPOINT_AUTHOR = "AIdeator"
+CHECKPOINT_EMAIL = "agent@aideator.local"
+
+
+class SessionWorkspace:
+    """A variation's working tree kept between the turns of a session."""
+
+    def __init__(self, root: Path, variation_id: int):
+        """Initialize the workspace location.
+
+        Args:
+            root: The session's directory on the shared volume
+            variation_id: Variation whose working tree this is
+        """
+        self.directory = Path(root) / f"variation-{variation_id}"
+        self.repo_dir = self.directory / "repo"
+        self._lock_handle = None
+
+    def acquire(self) -> bool:
+        """Take the workspace for this turn; False if another turn holds it."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        handle = (self.directory / LOCK).open("a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return False
+        self._lock_handle = handle
+        return True
+
+    def release(self) -> None:
+        """Let the next turn take the workspace."""
+        if self._lock_handle is not None:
+            fcntl.flock(self._lock_handle, fcntl.LOCK_UN)
+            self._lock_handle.close()
+            self._lock_handle = None
+
+    def resume(self, repo_url: str) -> tuple[dict[str, Any], str] | None:
+        """The previous turn's state, or None to start from a fresh checkout.
+
+        A workspace for another repository, or one left incomplete by a
+        crashed first turn, is discarded.
+
+        Args:
+            repo_url: Repository this turn works on
+
+        Returns:
+            The workspace manifest and the stored codebase summary
+        """
+        manifest_path = self.directory / MANIFEST
+        try:
+            manifest = json.loads(manifest_path.read_text())
+        except (OSError, ValueError):
+            manifest = None
+
+        if (
+            manifest is None
+            or manifest.get("repo_url") != repo_url
+            or not (self.repo_dir / ".git").exists()
+        ):
+            manifest_path.unlink(missing_ok=True)
+            shutil.rmtree(self.repo_dir, ignore_errors=True)
+            return None
+
+        try:
+            summary = (self.directory / SUMMARY).read_text()
+        except OSError:
+            summary = ""
+        return manifest, summary
+
+    def checkpoint(
+        self, *, repo_url: str, run_id: str, summary: str | None = None
+    ) -> dict[str, Any]:
+        """Commit the working tree so the next turn starts from it.
+
+        Args:
+            repo_url: Repository the workspace belongs to
+            run_id: Run whose changes are being checkpointed
+            summary: Codebase summary to keep, if the turn built one
+
+        Returns:
+            The manifest that was written
+        """
+        import git
+
+        start = time.monotonic()
+        repo = git.Repo(self.repo_dir)
+        alternates = self.repo_dir / ".git" / "objects" / "info" / "alternates"
+        if alternates.exists():
+            # Copy borrowed objects in before the mirror can drop them
+            repo.git.repack("-a", "-d", "-q")
+            alternates.unlink()
+
+        repo.git.add("-A")
+        changed = repo.is_dirty(index=True, working_tree=False)
+        if changed:
+            repo.git.commit(
+                "-q",
+                "--no-verify",
+                "-m",
+                f"AIdeator checkpoint for {run_id}",
+                author=f"{CHECKPOINT_AUTHOR} <{CHECKPOINT_EMAIL}>",
+                env={
+                    "GIT_COMMITTER_NAME": CHECKPOINT_AUTHOR,
+                    "GIT_COMMITTER_EMAIL": CHECKPOINT_EMAIL,
+                },
+            )
+
+        manifest_path = self.directory / MANIFEST
+        try:
+            turns = json.loads(manifest_path.read_text()).get("turns", 0)
+        except (OSError, ValueError):
+            turns = 0
+        if summary:
+            (self.directory / SUMMARY).write_text(summary)
+        manifest = {
+            "repo_url": repo_url,
+            "commit": repo.head.commit.hexsha,
+            "run_id": run_id,
+            "turns": turns + 1,
+            "changed": changed,
+            "updated_at": datetime.now(UTC).isoformat(),
+            "checkpoint_ms": int((time.monotonic() - start) * 1000),
+        }
+        tmp = self.directory / f"{MANIFEST}.tmp"
+        tmp.write_text(json.dumps(manifest))
+        tmp.replace(manifest_path)
+        return manifest
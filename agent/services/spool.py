@@ -0,0 +1,101 @@
+"""On-disk spool for agent outputs that could not be written to the database.
+
+Batches are appended as JSON Lines segment files under the agent work
+directory. When the database is reachable again the segments are replayed
+oldest-first and deleted once written, so bursts and outages are bounded by
+disk rather than by the pod's memory limit.
+"""
+
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class DiskSpool:
+    """Append-only JSONL spool of queued agent output records."""
+
+    def __init__(self, directory: Path, max_bytes: int = 256 * 1024 * 1024):
+        """Initialize the spool.
+
+        Args:
+            directory: Directory holding the spool segments (created on demand)
+            max_bytes: Upper bound on total spool size; further spills are dropped
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        # Continue numbering after segments left by an earlier process
+        existing = self.segments()
+        self._sequence = int(existing[-1].stem.split("-")[1]) if existing else 0
+
+    def __len__(self) -> int:
+        """Number of segments waiting to be replayed."""
+        return len(self.segments())
+
+    def segments(self) -> list[Path]:
+        """Spool segments, oldest first."""
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob("segment-*.jsonl"))
+
+    def size_bytes(self) -> int:
+        """Total size of all spool segments."""
+        return sum(path.stat().st_size for path in self.segments())
+
+    def append(self, items: list[dict[str, Any]]) -> bool:
+        """Write a batch of records as a new segment.
+
+        Returns:
+            True if the batch was spooled, False if the spool is full
+        """
+        if not items:
+            return True
+
+        payload = "".join(
+            json.dumps(self._encode(item), default=str) + "\n" for item in items
+        )
+        if self.size_bytes() + len(payload) > self.max_bytes:
+            logger.error(
+                f"[SPOOL] Spool full ({self.max_bytes} bytes), dropping {len(items)} records"
+            )
+            return False
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._sequence += 1
+        final_path = self.directory / f"segment-{self._sequence:08d}.jsonl"
+        tmp_path = final_path.with_suffix(".tmp")
+        tmp_path.write_text(payload, encoding="utf-8")
+        tmp_path.replace(final_path)
+
+        logger.warning(f"[SPOOL] Spilled {len(items)} records to {final_path.name}")
+        return True
+
+    def read(self, segment: Path) -> list[dict[str, Any]]:
+        """Load the records stored in a segment."""
+        items = []
+        with segment.open(encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    items.append(self._decode(json.loads(line)))
+        return items
+
+    def remove(self, segment: Path) -> None:
+        """Delete a segment after its records were written."""
+        segment.unlink(missing_ok=True)
+
+    @staticmethod
+    def _encode(item: dict[str, Any]) -> dict[str, Any]:
+        timestamp = item.get("timestamp")
+        if isinstance(timestamp, datetime):
+            item = {**item, "timestamp": timestamp.isoformat()}
+        return item
+
+    @staticmethod
+    def _decode(item: dict[str, Any]) -> dict[str, Any]:
+        timestamp = item.get("timestamp")
+        if isinstance(timestamp, str):
+            item["timestamp"] = datetime.fromisoformat(timestamp)
+        return item
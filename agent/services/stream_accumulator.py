@@ -0,0 +1,70 @@
+"""Constant-memory accumulation of streamed LLM completions.
+
+``StreamAccumulator`` consumes LiteLLM stream chunks one at a time and keeps
+only what the agent needs afterwards: the text parts (joined once at the
+end), a chunk count and the most recent usage block. Chunk objects are never
+retained, so memory stays flat however long the response is. Deciding how
+the text is published is left to ``StreamCoalescer``.
+"""
+
+from typing import Any
+
+
+class StreamAccumulator:
+    """Running state for one streamed completion."""
+
+    def __init__(self, skip_leading: str = ""):
+        """Initialize the accumulator.
+
+        Args:
+            skip_leading: Text already published that the completion may
+                start with again (a resumed response repeating the whitespace
+                stripped from its prefix); a matching start is dropped
+        """
+        self.chunk_count = 0
+        self.length = 0
+        self.usage: Any = None
+        self._parts: list[str] = []
+        self._skip = skip_leading
+
+    def add(self, chunk: Any) -> str:
+        """Consume one stream chunk.
+
+        Args:
+            chunk: A LiteLLM ``ModelResponseStream`` (or compatible) object
+
+        Returns:
+            The text delta carried by the chunk, empty if none
+        """
+        usage = getattr(chunk, "usage", None)
+        if usage:
+            self.usage = usage
+
+        choices = getattr(chunk, "choices", None)
+        if not choices:
+            return ""
+        text = choices[0].delta.content
+        if text and self._skip:
+            matched = 0
+            while (
+                matched < min(len(text), len(self._skip))
+                and text[matched] == self._skip[matched]
+            ):
+                matched += 1
+            # Keep skipping only while the whole delta matched
+            self._skip = self._skip[matched:] if matched == len(text) else ""
+            text = text[matched:]
+        if not text:
+            return ""
+
+        self.chunk_count += 1
+        self.length += len(text)
+        self._parts.append(text)
+        return text
+
+    @property
+    def text(self) -> str:
+        """The full response text, joined once and then cached."""
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
@@ -0,0 +1,105 @@
+"""Commit-addressed cache of codebase summaries in Redis.
+
+The summary ``_analyze_codebase`` builds depends on the repository, the
+commit it was built from and the prompt its files and snippets are ranked
+against, yet every variation of every run used to clone and analyse the
+repository again. ``SummaryCache`` stores each summary under
+``codebase_summary:<commit>:<url digest>:<prompt digest>`` so any agent that
+knows the resolved commit can skip the analysis for the same prompt, and
+chat turns can skip the clone altogether. A different prompt on the same
+commit misses and builds its own summary.
+
+Entries live in an ``LRUStore``, which expires and evicts them; summaries
+larger than ``max_bytes`` are not stored.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import UTC, datetime
+from typing import Any
+
+from app.core.lru_store import LRUStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 24 * 3600  # Seconds an unused summary is kept
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_BYTES = 256 * 1024
+
+# Bump when the summary format changes so stale entries are never served
+SUMMARY_FORMAT = 3
+
+KEY_PREFIX = f"codebase_summary:v{SUMMARY_FORMAT}"
+
+
+class SummaryCache:
+    """Codebase summaries keyed by ``(repository URL, commit, prompt)``."""
+
+    def __init__(
+        self,
+        redis_client: Any,
+        *,
+        ttl: int = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        """Initialize the cache.
+
+        Args:
+            redis_client: ``redis.asyncio`` client with ``decode_responses``
+            ttl: Seconds after the last access before an entry expires
+            max_entries: Entries kept before the least recently used is evicted
+            max_bytes: Largest summary that is stored
+        """
+        self.store = LRUStore(
+            redis_client,
+            KEY_PREFIX,
+            ttl=ttl,
+            max_entries=max_entries,
+            name="SUMMARY-CACHE",
+        )
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(repo_url: str, commit: str, prompt: str) -> str:
+        """Cache key of a repository at a commit, ranked for a prompt."""
+        url = repo_url.strip().rstrip("/").removesuffix(".git")
+        url_digest = hashlib.sha256(url.encode()).hexdigest()[:16]
+        prompt_digest = hashlib.sha256(prompt.strip().encode()).hexdigest()[:16]
+        return f"{KEY_PREFIX}:{commit}:{url_digest}:{prompt_digest}"
+
+    async def get(self, repo_url: str, commit: str, prompt: str) -> str | None:
+        """Cached summary of ``repo_url`` at ``commit`` for ``prompt``, or None."""
+        key = self.key(repo_url, commit, prompt)
+        raw = await self.store.get(key)
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)["summary"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"[SUMMARY-CACHE] Discarding malformed entry {key}")
+            return None
+
+    async def put(self, repo_url: str, commit: str, prompt: str, summary: str) -> bool:
+        """Store a summary and evict entries beyond ``max_entries``.
+
+        Returns:
+            Whether the summary was stored
+        """
+        key = self.key(repo_url, commit, prompt)
+        if len(summary.encode()) > self.max_bytes:
+            logger.info(f"[SUMMARY-CACHE] Not caching {key}: summary too large")
+            return False
+
+        entry = {
+            "repo_url": repo_url,
+            "commit": commit,
+            "created_at": datetime.now(UTC).isoformat(),
+            "summary": summary,
+        }
+        return await self.store.put(key, json.dumps(entry))
+
+    async def stats(self) -> dict[str, Any]:
+        """Shared hit/miss counters and the number of indexed entries."""
+        return await self.store.stats()
@@ -0,0 +1,63 @@
+"""Chat-mode variations run together by one agent process.
+
+A chat-mode variation does nothing but stream one completion over the
+network, yet each used to get its own Kubernetes job: a pod, an image pull,
+a database pool and a Redis connection per variation. A ``batch`` agent
+runs every variation of the run in one asyncio process instead.
+``AGENT_VARIATIONS`` lists them as JSON objects:
+
+- ``variation_id`` and ``model`` (required);
+- ``job_token``: the variation's own token, since API keys can be
+  model-specific;
+- ``temperature``, ``max_tokens`` and ``context_window`` (optional; the
+  job-level settings apply otherwise).
+
+Each variation is an ``AIdeatorAgent`` carrying its own settings and API
+keys, and all of them share one Redis client, one database pool and one
+output sink.
+"""
+
+import json
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class VariationSpec:
+    """What one variation of a batch runs."""
+
+    variation_id: int
+    model: str
+    job_token: str | None = None
+    temperature: float | None = None
+    max_tokens: int | None = None
+    context_window: int | None = None
+
+
+def parse_variations(raw: str) -> list[VariationSpec]:
+    """Variations of a batch from the ``AGENT_VARIATIONS`` JSON list.
+
+    Raises:
+        ValueError: If the list is malformed, empty or repeats a variation
+    """
+    try:
+        entries = json.loads(raw)
+        specs = [
+            VariationSpec(
+                variation_id=int(entry["variation_id"]),
+                model=str(entry["model"]),
+                job_token=entry.get("job_token"),
+                temperature=entry.get("temperature"),
+                max_tokens=entry.get("max_tokens"),
+                context_window=entry.get("context_window"),
+            )
+            for entry in entries
+        ]
+    except (TypeError, KeyError, ValueError, AttributeError) as e:
+        raise ValueError(f"Invalid AGENT_VARIATIONS: {e}") from e
+
+    if not specs:
+        raise ValueError("AGENT_VARIATIONS lists no variations")
+    ids = [spec.variation_id for spec in specs]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"AGENT_VARIATIONS repeats a variation: {ids}")
+    return specs
@@ -0,0 +1,35 @@
+"""Add output_metadata column to agent_outputs
+
+Revision ID: 015
+Revises: 014
+Create Date: 2025-07-14 10:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "015"
+down_revision: str | None = "014"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Add output_metadata column to agent_outputs table."""
+    op.add_column(
+        "agent_outputs",
+        sa.Column(
+            "output_metadata", postgresql.JSON(astext_type=sa.Text()), nullable=True
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Remove output_metadata column from agent_outputs table."""
+    op.drop_column("agent_outputs", "output_metadata")
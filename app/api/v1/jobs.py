@@ -84,44 +84,11 @@ async def get_job_keys(
                 detail="User not found or inactive",
             )
 
-        # Get user's API keys
+        # Decrypt the user's API keys, the model's own key taking precedence
         provider_service = ProviderKeyService(db)
-        user_keys = await provider_service.get_user_provider_keys(user_id)
-
-        # Decrypt and organize keys by provider
-        decrypted_keys = {}
-        for key in user_keys:
-            if key.is_active:
-                try:
-                    decrypted_key = await provider_service.decrypt_api_key(
-                        db, user, key.id
-                    )
-                    provider_name = key.provider.upper()
-                    decrypted_keys[f"{provider_name}_API_KEY"] = decrypted_key
-                    logger.info(
-                        f"✅ Retrieved {provider_name} API key for job {run_id}"
-                    )
-                except Exception as e:
-                    logger.warning(
-                        f"❌ Failed to decrypt {key.provider} key for user {user_id}: {e}"
-                    )
-
-        # Add model-specific keys if configured
-        model_name = payload.get("model_name")
-        if model_name:
-            model_key = await provider_service.get_key_for_model(db, user, model_name)
-            if model_key and model_key.is_active:
-                try:
-                    decrypted_key = await provider_service.decrypt_api_key(
-                        db, user, model_key.id
-                    )
-                    provider_name = model_key.provider.upper()
-                    decrypted_keys[f"{provider_name}_API_KEY"] = decrypted_key
-                    logger.info(
-                        f"✅ Retrieved model-specific {provider_name} key for {model_name}"
-                    )
-                except Exception as e:
-                    logger.warning(f"❌ Failed to decrypt model-specific key: {e}")
+        decrypted_keys = await provider_service.get_job_keys(
+            db, user, payload.get("model_name")
+        )
 
         expires_at = datetime.fromtimestamp(payload.get("exp", 0), tz=UTC).isoformat()
 
@@ -1,4 +1,5 @@
 import json
+import re
 import uuid
 from datetime import datetime
 
@@ -23,12 +24,15 @@ from app.schemas.runs import (
     SelectWinnerRequest,
 )
 from app.services.agent_orchestrator import AgentOrchestrator
+from app.services.diff_store import inline_hunks, load_diffs
 from app.services.model_catalog import model_catalog
 
 settings = get_settings()
 logger = get_logger(__name__)
 router = APIRouter()
 
+BLOB_HASH = re.compile(r"[0-9a-f]{64}")  # SHA-256 of a stored diff
+
 
 @router.post(
     "",
@@ -399,6 +403,10 @@ async def cancel_run(
     - Use `output_type` to filter by message type ('llm', 'stdout', 'status')
     - Use `since` to get only outputs after a specific timestamp
 
+    **Retries:**
+    - `llm` outputs carry `attempt` and `seq` in their metadata
+    - Output of generation attempts a retry superseded is left out
+
     **Performance:**
     - Results are limited to 1000 outputs per request
     - Outputs are ordered by timestamp (oldest first)
@@ -454,6 +462,17 @@ async def get_agent_outputs(
     result = await db.execute(outputs_query)
     outputs = result.scalars().all()
 
+    # Drop llm output of attempts a retry superseded
+    if any(output.output_type == "llm" for output in outputs):
+        superseded = await _superseded_attempts(db, run_id, variation_id)
+        outputs = [
+            output
+            for output in outputs
+            if output.output_type != "llm"
+            or (output.variation_id, (output.output_metadata or {}).get("attempt"))
+            not in superseded
+        ]
+
     # Convert to response format
     return [
         {
@@ -463,11 +482,32 @@ async def get_agent_outputs(
             "content": output.content,
             "timestamp": output.timestamp.isoformat(),
             "output_type": output.output_type,
+            "metadata": output.output_metadata,
         }
         for output in outputs
     ]
 
 
+async def _superseded_attempts(
+    db: AsyncSession, run_id: str, variation_id: int | None
+) -> set[tuple[int, int]]:
+    """(variation, attempt) pairs whose output a retry superseded."""
+    query = select(AgentOutput).where(
+        AgentOutput.run_id == run_id,
+        AgentOutput.output_type == "status",
+        AgentOutput.content == "attempt_superseded",
+    )
+    if variation_id is not None:
+        query = query.where(AgentOutput.variation_id == variation_id)
+
+    result = await db.execute(query)
+    return {
+        (row.variation_id, attempt)
+        for row in result.scalars().all()
+        for attempt in (row.output_metadata or {}).get("attempts", [])
+    }
+
+
 @router.get(
     "/{run_id}/diffs",
     response_model=list[dict],
@@ -476,7 +516,13 @@ async def get_agent_outputs(
     Get the diff information for all changed files in a run.
 
     Returns an array of objects with the structure:
-    { oldFile: { name, content }, newFile: { name, content } }
+    { oldFile: { name, content }, newFile: { name, content }, hunks, blob,
+      status, additions, deletions, binary, truncated }
+
+    ``hunks`` holds the file's unified diff; ``content`` is empty for diffs
+    stored that way (older outputs carry full contents and no hunks).
+    ``blob`` is the hash of the stored diff: pass ``hunks=false`` to get the
+    file list only and fetch each file from ``/diffs/blobs/{blob}`` on demand.
 
     This endpoint retrieves the diffs that were generated and saved
     by the agent during code execution.
@@ -485,6 +531,7 @@ async def get_agent_outputs(
 async def get_run_diffs(
     run_id: str,
     variation_id: int | None = Query(None, description="Filter by variation ID"),
+    hunks: bool = Query(True, description="Include each file's diff"),
     db: AsyncSession = Depends(get_session),
     current_user: User | None = Depends(get_current_user_from_api_key),
 ) -> list[dict]:
@@ -530,9 +577,80 @@ async def get_run_diffs(
 
     try:
         # Parse the JSON content
-        return json.loads(diff_output.content)
+        diffs = json.loads(diff_output.content)
     except json.JSONDecodeError:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Invalid diff data format",
         )
+
+    # Manifests reference content-addressed blobs instead of carrying hunks
+    if hunks:
+        await inline_hunks(db, diffs)
+    return diffs
+
+
+@router.get(
+    "/{run_id}/diffs/blobs/{blob_hash}",
+    response_model=dict,
+    summary="Get one file's diff",
+)
+async def get_run_diff_blob(
+    run_id: str,
+    blob_hash: str,
+    db: AsyncSession = Depends(get_session),
+    current_user: User | None = Depends(get_current_user_from_api_key),
+) -> dict:
+    """
+    Get the unified diff of one changed file of a run.
+
+    The blob must be referenced by one of the run's diff manifests.
+    """
+    if not BLOB_HASH.fullmatch(blob_hash):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid blob hash",
+        )
+
+    query = select(Run).where(Run.id == run_id)
+    if current_user:
+        query = query.where(Run.user_id == current_user.id)
+
+    result = await db.execute(query)
+    if not result.scalar_one_or_none():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Run not found",
+        )
+
+    referenced = blob_hash in await _referenced_blobs(db, run_id)
+    diffs = await load_diffs(db, [blob_hash]) if referenced else {}
+    if blob_hash not in diffs:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Diff not found",
+        )
+    return {"blob": blob_hash, "hunks": [diffs[blob_hash]]}
+
+
+async def _referenced_blobs(db: AsyncSession, run_id: str) -> set[str]:
+    """Blob hashes referenced by the run's diff manifests."""
+    result = await db.execute(
+        select(AgentOutput.content).where(
+            AgentOutput.run_id == run_id,
+            AgentOutput.output_type == "diffs",
+        )
+    )
+    referenced = set()
+    for content in result.scalars():
+        try:
+            entries = json.loads(content)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(entries, list):
+            referenced.update(
+                entry["blob"]
+                for entry in entries
+                if isinstance(entry, dict) and entry.get("blob")
+            )
+    return referenced
@@ -590,6 +590,7 @@ async def execute_code(
             "agent_mode": model_variants_config[0]["agent_mode"]
             if model_variants_config
             else "code",
+            "persist_workspace": request.persist_workspace,
         },
         user_id=current_user.id,
         session_id=session_id,
@@ -0,0 +1,8 @@
+"""Core configuration and infrastructure of the API.
+
+Some modules here are shared with the agent: the agent image copies
+``config.py``, ``diff_codec.py``, ``lru_store.py``, ``response_cache.py``,
+``retry_policy.py`` and ``stream_coalescer.py`` (see ``agent/Dockerfile``)
+without the rest of the package, so those modules import only the standard
+library, their own third-party dependencies and each other.
+"""
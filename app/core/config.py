@@ -50,6 +50,49 @@ class Settings(BaseSettings):
     default_agent_model: str = "gpt-4o-mini"
     debug_agent_container: bool = False  # Enable debug logs for agent containers
 
+    # Run-level repository prep: one job clones and analyses the repository and
+    # publishes a snapshot the variations restore from. Needs a volume shared
+    # with the agent jobs; unset disables the prep job. Variations start with
+    # the prep job and wait at most agent_snapshot_wait seconds for the
+    # snapshot before cloning themselves.
+    agent_snapshot_dir: str | None = None
+    agent_snapshot_wait: int = Field(default=60, ge=1, le=600)
+
+    # Session workspaces: variations of sessions that opt in keep their working
+    # tree on the shared volume, so follow-up turns resume it instead of
+    # cloning. Unset disables them.
+    agent_session_workspace_dir: str | None = None
+
+    # Chat-mode variations of runs on a repository answer with the codebase
+    # summary cached for the run's commit and prompt, if there is one. The
+    # orchestrator resolves the commit once per run (git ls-remote), so this
+    # is opt-in; chat variations never resolve it themselves.
+    agent_chat_repo_context: bool = False
+
+    # Batch agents: chat-mode variations of a run share one job, streaming
+    # their completions concurrently from one process instead of one pod each
+    agent_batch_chat_variations: bool = False
+
+    # In-process chat: the API streams chat-mode variations itself, at most
+    # agent_chat_workers at a time, instead of starting agent jobs for them.
+    # Missing provider keys fail the variation and failed streams are retried
+    # as in the agent, except that a retry always restarts the completion and
+    # supersedes the failed attempt's output (it never resumes a prefix).
+    agent_inprocess_chat: bool = False
+    agent_chat_workers: int = Field(default=8, ge=1, le=100)
+
+    # Exact-match cache of in-process chat completions in Redis (seconds an
+    # unused response is kept; 0 disables). Hits are replayed at
+    # agent_response_replay_speed times the original pace (0 = at once).
+    # Agent jobs take AGENT_RESPONSE_CACHE_TTL / AGENT_RESPONSE_REPLAY_SPEED.
+    agent_response_cache_ttl: int = Field(default=0, ge=0)
+    agent_response_cache_max_entries: int = Field(default=5000, ge=1)
+    agent_response_replay_speed: float = Field(default=0.0, ge=0.0)
+
+    # LiteLLM Gateway, as configured for the agent jobs
+    litellm_gateway_url: str = "http://chart-aideator-litellm:4000"
+    litellm_gateway_key: str = "sk-1234"
+
     # Concurrency limits
     max_concurrent_runs: int = Field(default=10, ge=1, le=50)
     max_concurrent_jobs: int = Field(
@@ -0,0 +1,44 @@
+"""Compression of stored diffs.
+
+Diff blobs are compressed with zstd, or zlib when ``zstandard`` is not
+installed, and store the codec they were written with.
+"""
+
+import zlib
+
+try:
+    import zstandard
+
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None  # type: ignore[assignment]
+    ZSTD_AVAILABLE = False
+
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+
+
+def compress(raw: bytes) -> tuple[str, bytes]:
+    """Compress a diff with the best available codec.
+
+    Returns:
+        The codec name and the compressed data
+    """
+    if ZSTD_AVAILABLE:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return "zlib", zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    """Decompress a diff written with ``codec``.
+
+    Raises:
+        ValueError: If the codec is unknown or unavailable
+    """
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise ValueError("zstandard is required to read zstd diff blobs")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown diff blob codec: {codec}")
@@ -0,0 +1,108 @@
+"""Bounded, expiring key-value store in Redis.
+
+``LRUStore`` keeps string values under caller-chosen keys that share a
+prefix:
+
+- entries expire ``ttl`` seconds after they were last read or written;
+- an LRU index (``<prefix>:index``, a sorted set scored by last access) keeps
+  at most ``max_entries`` values, evicting the least recently used ones;
+- hit/miss counters (``<prefix>:stats``) are kept in Redis so they are shared
+  by every reader.
+
+Caches built on it decide what their keys and entries look like. A store is
+an optimization only: Redis errors are logged and reported as a miss, never
+raised.
+"""
+
+import logging
+import time
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class LRUStore:
+    """String values in Redis with a TTL and least-recently-used eviction."""
+
+    def __init__(
+        self,
+        redis_client: Any,
+        prefix: str,
+        *,
+        ttl: int,
+        max_entries: int,
+        name: str = "CACHE",
+    ):
+        """Initialize the store.
+
+        Args:
+            redis_client: ``redis.asyncio`` client with ``decode_responses``
+            prefix: Prefix of the keys, the index and the counters
+            ttl: Seconds after the last access before an entry expires
+            max_entries: Entries kept before the least recently used is evicted
+            name: Tag of the store's log lines
+        """
+        self.redis = redis_client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.index_key = f"{prefix}:index"
+        self.stats_key = f"{prefix}:stats"
+        self._tag = f"[{name}]"
+
+    async def get(self, key: str) -> str | None:
+        """Value under ``key``, refreshing its TTL and LRU position, or None."""
+        try:
+            raw = await self.redis.get(key)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                if raw is None:
+                    pipe.zrem(self.index_key, key)  # Expired but still indexed
+                    pipe.hincrby(self.stats_key, "misses", 1)
+                else:
+                    pipe.expire(key, self.ttl)
+                    pipe.zadd(self.index_key, {key: time.time()})
+                    pipe.hincrby(self.stats_key, "hits", 1)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"{self._tag} Lookup of {key} failed: {e}")
+            return None
+        return raw
+
+    async def put(self, key: str, value: str) -> bool:
+        """Store a value and evict entries beyond ``max_entries``.
+
+        Returns:
+            Whether the value was stored
+        """
+        now = time.time()
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(key, value, ex=self.ttl)
+                pipe.zadd(self.index_key, {key: now})
+                pipe.zremrangebyscore(self.index_key, "-inf", now - self.ttl)
+                pipe.zcard(self.index_key)
+                *_, size = await pipe.execute()
+
+            if size > self.max_entries:
+                evicted = await self.redis.zpopmin(
+                    self.index_key, size - self.max_entries
+                )
+                if evicted:
+                    await self.redis.delete(*(member for member, _ in evicted))
+                    logger.info(f"{self._tag} Evicted {len(evicted)} entries")
+        except Exception as e:
+            logger.warning(f"{self._tag} Storing {key} failed: {e}")
+            return False
+        return True
+
+    async def stats(self) -> dict[str, Any]:
+        """Shared hit/miss counters and the number of indexed entries."""
+        counters = await self.redis.hgetall(self.stats_key)
+        hits = int(counters.get("hits", 0))
+        misses = int(counters.get("misses", 0))
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "entries": await self.redis.zcard(self.index_key),
+        }
@@ -0,0 +1,186 @@
+"""Exact-match cache of streamed LLM responses in Redis.
+
+Users often re-run a prompt on the same repository and models to compare
+results, and paid for (and waited on) the same completion every time.
+``ResponseCache`` stores a streamed completion - the pieces that were
+published, when they were published, usage and cost - under a digest of
+everything that determines it: model, temperature, max tokens, the normalized
+prompt and a digest of the codebase context. On a hit the transcript is
+replayed into the run's streams instead of calling the provider.
+
+Entries live in an ``LRUStore``, which expires and evicts them; transcripts
+larger than ``max_bytes`` are not stored.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import unicodedata
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime
+from typing import Any
+
+from app.core.lru_store import LRUStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 0  # Seconds an unused response is kept; 0 disables the cache
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_BYTES = 512 * 1024
+DEFAULT_REPLAY_SPEED = 0.0  # Multiple of the original pace; 0 replays at once
+
+# Bump when the entry format changes so stale entries are never served
+RESPONSE_FORMAT = 1
+
+KEY_PREFIX = f"llm_response:v{RESPONSE_FORMAT}"
+
+
+@dataclass(slots=True)
+class CachedResponse:
+    """A streamed completion as it was published."""
+
+    pieces: list[str]
+    offsets_ms: list[int]  # When each piece was published, from the request
+    usage: dict[str, int | None] | None = None
+    cost_usd: float | None = None
+    created_at: str = field(default_factory=lambda: datetime.now(UTC).isoformat())
+
+    @property
+    def text(self) -> str:
+        """The full response text."""
+        return "".join(self.pieces)
+
+
+class TranscriptRecorder:
+    """Records published pieces of a completion for the cache."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._start = clock()
+        self.pieces: list[str] = []
+        self.offsets_ms: list[int] = []
+
+    def add(self, text: str) -> None:
+        """Record one published piece."""
+        self.pieces.append(text)
+        self.offsets_ms.append(int((self._clock() - self._start) * 1000))
+
+    def response(
+        self, usage: dict[str, int | None] | None, cost_usd: float | None
+    ) -> CachedResponse:
+        """The recorded transcript with the completion's usage and cost."""
+        return CachedResponse(
+            pieces=self.pieces,
+            offsets_ms=self.offsets_ms,
+            usage=usage,
+            cost_usd=cost_usd,
+        )
+
+
+async def replay(
+    cached: CachedResponse,
+    publish: Callable[[str], Awaitable[Any]],
+    speed: float = DEFAULT_REPLAY_SPEED,
+) -> None:
+    """Publish a cached transcript piece by piece.
+
+    Args:
+        cached: Transcript to replay
+        publish: Coroutine called with each piece
+        speed: Multiple of the original pace (2 = twice as fast); 0 or less
+            publishes every piece at once
+    """
+    start = time.monotonic()
+    for piece, offset_ms in zip(cached.pieces, cached.offsets_ms, strict=True):
+        if speed > 0:
+            delay = offset_ms / 1000 / speed - (time.monotonic() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await publish(piece)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Prompt with Unicode, line endings and surrounding whitespace normalized."""
+    text = unicodedata.normalize("NFC", prompt).replace("\r\n", "\n")
+    return "\n".join(line.rstrip() for line in text.strip().split("\n"))
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Streamed completions keyed by model, parameters, prompt and context."""
+
+    def __init__(
+        self,
+        redis_client: Any,
+        *,
+        ttl: int,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        """Initialize the cache.
+
+        Args:
+            redis_client: ``redis.asyncio`` client with ``decode_responses``
+            ttl: Seconds after the last access before an entry expires
+            max_entries: Entries kept before the least recently used is evicted
+            max_bytes: Largest transcript that is stored
+        """
+        self.store = LRUStore(
+            redis_client,
+            KEY_PREFIX,
+            ttl=ttl,
+            max_entries=max_entries,
+            name="RESPONSE-CACHE",
+        )
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(
+        model: str,
+        temperature: float | None,
+        max_tokens: int | None,
+        prompt: str,
+        context: str | None = None,
+    ) -> str:
+        """Cache key of a completion request."""
+        fields = [
+            model,
+            None if temperature is None else float(temperature),
+            max_tokens,
+            _digest(normalize_prompt(prompt)),
+            _digest(context) if context else None,
+        ]
+        return f"{KEY_PREFIX}:{_digest(json.dumps(fields))}"
+
+    async def get(self, key: str) -> CachedResponse | None:
+        """Cached response under ``key``, or None on a miss."""
+        raw = await self.store.get(key)
+        if raw is None:
+            return None
+        try:
+            return CachedResponse(**json.loads(raw))
+        except (ValueError, TypeError):
+            logger.warning(f"[RESPONSE-CACHE] Discarding malformed entry {key}")
+            return None
+
+    async def put(self, key: str, response: CachedResponse) -> bool:
+        """Store a response and evict entries beyond ``max_entries``.
+
+        Returns:
+            Whether the response was stored
+        """
+        entry = json.dumps(asdict(response))
+        if not response.pieces or len(entry.encode()) > self.max_bytes:
+            logger.info(f"[RESPONSE-CACHE] Not caching {key}: empty or too large")
+            return False
+        return await self.store.put(key, entry)
+
+    async def stats(self) -> dict[str, Any]:
+        """Shared hit/miss counters and the number of indexed entries."""
+        return await self.store.stats()
@@ -0,0 +1,117 @@
+"""Retry waits for LLM generation.
+
+Failed generations are retried, and used to wait a plain exponential 4-10
+seconds: variations rate-limited together retried together, and a provider
+asking for a longer pause was retried before it allowed. ``RetryWait`` draws
+a jittered exponential wait instead and never waits less than the provider
+asked for in ``Retry-After`` (capped at ``MAX_RETRY_AFTER``).
+
+Output a failed attempt already streamed is not streamed again; how a retry
+avoids that depends on the provider (see ``PREFILL_PROVIDERS``).
+"""
+
+import logging
+import random
+import time
+from collections.abc import Mapping
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+from tenacity import RetryCallState
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_WAIT = 4
+DEFAULT_MAX_WAIT = 10
+MAX_RETRY_AFTER = 60  # Longest provider-requested pause that is honoured
+
+# Providers that continue a trailing assistant message instead of answering
+# anew: a retry passes the partial response back and streams the rest.
+# Retries on other providers mark the failed attempt superseded.
+PREFILL_PROVIDERS = frozenset({"anthropic"})
+
+
+def _seconds(value: Any) -> float | None:
+    """Delay from a number of seconds or an HTTP date."""
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(parsedate_to_datetime(str(value)).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _header_delay(headers: Any) -> float | None:
+    """Delay from ``retry-after-ms`` or ``Retry-After`` response headers."""
+    if not isinstance(headers, Mapping) and not hasattr(headers, "items"):
+        return None
+    lowered = {str(name).lower(): value for name, value in headers.items()}
+    if "retry-after-ms" in lowered:
+        delay = _seconds(lowered["retry-after-ms"])
+        if delay is not None:
+            return delay / 1000
+    if "retry-after" in lowered:
+        return _seconds(lowered["retry-after"])
+    return None
+
+
+def retry_after(error: BaseException | None) -> float | None:
+    """Seconds the provider asked to wait before retrying, if it said.
+
+    Checks the error and the errors it was raised from for a ``retry_after``
+    attribute or ``Retry-After`` headers on the provider response.
+    """
+    seen: set[int] = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        value = getattr(error, "retry_after", None)
+        if value is not None:
+            delay = _seconds(value)
+        else:
+            response = getattr(error, "response", None)
+            delay = _header_delay(getattr(response, "headers", None))
+            if delay is None:
+                delay = _header_delay(getattr(error, "headers", None))
+        if delay is not None:
+            return delay
+        error = error.__cause__ or error.__context__
+    return None
+
+
+class RetryWait:
+    """Jittered exponential wait that honours the provider's Retry-After."""
+
+    def __init__(
+        self,
+        *,
+        min_wait: float = DEFAULT_MIN_WAIT,
+        max_wait: float = DEFAULT_MAX_WAIT,
+        max_retry_after: float = MAX_RETRY_AFTER,
+    ):
+        """Initialize the wait.
+
+        Args:
+            min_wait: Shortest wait in seconds
+            max_wait: Upper bound of the jittered exponential wait
+            max_retry_after: Longest Retry-After that is honoured
+        """
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.max_retry_after = max_retry_after
+
+    def __call__(self, retry_state: RetryCallState) -> float:
+        """Seconds to wait before the next attempt."""
+        # Uniform between the minimum and an exponentially growing ceiling
+        ceiling = min(self.max_wait, self.min_wait * 2**retry_state.attempt_number)
+        wait = random.uniform(self.min_wait, max(ceiling, self.min_wait))  # noqa: S311
+        outcome = retry_state.outcome
+        requested = retry_after(outcome.exception()) if outcome else None
+        if requested is not None:
+            wait = max(wait, min(requested, self.max_retry_after))
+        logger.info(
+            f"[RETRY] Attempt {retry_state.attempt_number} failed, retrying in "
+            f"{wait:.1f}s (Retry-After: {requested})"
+        )
+        return wait
@@ -0,0 +1,140 @@
+"""Latency-budgeted coalescing of streamed LLM text.
+
+Every published piece of text becomes one ``run:{id}:llm`` entry and one
+``agent_outputs`` row. ``StreamCoalescer`` merges small deltas into larger
+pieces while keeping a bounded delay:
+
+- the first text of a response is published immediately;
+- after that, pending text is flushed once it is ``max_latency_ms`` old or
+  reaches the byte target, whichever comes first;
+- the byte target follows the observed text rate (rate x latency budget,
+  clamped to ``[min_bytes, max_bytes]``), so fast models produce fewer,
+  larger entries while slow models flush after a handful of tokens.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_MS = 150
+DEFAULT_FLUSH_BYTES = 4096
+DEFAULT_MIN_BYTES = 32
+RATE_SMOOTHING = 0.2  # EWMA weight of the newest rate sample
+
+
+class StreamCoalescer:
+    """Buffers streamed text and publishes it under a latency budget."""
+
+    def __init__(
+        self,
+        publish: Callable[[str], Awaitable[Any]],
+        *,
+        max_latency_ms: float = DEFAULT_FLUSH_MS,
+        max_bytes: int = DEFAULT_FLUSH_BYTES,
+        min_bytes: int = DEFAULT_MIN_BYTES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Initialize the coalescer.
+
+        Args:
+            publish: Coroutine called with each coalesced piece of text
+            max_latency_ms: Longest time text may wait before being published
+            max_bytes: Largest piece published in one go
+            min_bytes: Smallest adaptive byte target
+            clock: Monotonic time source in seconds
+        """
+        self._publish = publish
+        self.max_latency = max_latency_ms / 1000
+        self.max_bytes = max(1, max_bytes)
+        self.min_bytes = min(max(1, min_bytes), self.max_bytes)
+        self._clock = clock
+
+        self._parts: list[str] = []
+        self._size = 0
+        self._pending_since: float | None = None
+        self._last_arrival: float | None = None
+        self._rate: float | None = None  # Smoothed characters per second
+        self._published_first = False
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+
+        self.stats = {"writes": 0, "entries": 0, "chars": 0}
+
+    @property
+    def target_bytes(self) -> int:
+        """Byte count that triggers a flush at the current text rate."""
+        if self._rate is None:
+            return self.min_bytes
+        target = int(self._rate * self.max_latency)
+        return max(self.min_bytes, min(self.max_bytes, target))
+
+    async def write(self, text: str) -> None:
+        """Add streamed text, publishing when the budget says so."""
+        if not text:
+            return
+
+        now = self._clock()
+        self._observe_rate(len(text), now)
+        self.stats["writes"] += 1
+
+        self._parts.append(text)
+        self._size += len(text)
+        if self._pending_since is None:
+            self._pending_since = now
+
+        if (
+            not self._published_first
+            or self._size >= self.target_bytes
+            or now - self._pending_since >= self.max_latency
+        ):
+            await self.flush()
+        else:
+            self._arm_timer(now)
+
+    async def flush(self) -> None:
+        """Publish everything pending as one piece."""
+        async with self._lock:
+            if not self._parts:
+                return
+            text = "".join(self._parts)
+            self._parts = []
+            self._size = 0
+            self._pending_since = None
+            self._published_first = True
+            self.stats["entries"] += 1
+            self.stats["chars"] += len(text)
+            await self._publish(text)
+
+    async def close(self) -> None:
+        """Cancel the pending timer and publish the remaining text."""
+        if self._timer and not self._timer.done():
+            self._timer.cancel()
+        await self.flush()
+
+    def _observe_rate(self, size: int, now: float) -> None:
+        if self._last_arrival is not None:
+            elapsed = max(now - self._last_arrival, 1e-3)
+            sample = size / elapsed
+            if self._rate is None:
+                self._rate = sample
+            else:
+                self._rate += RATE_SMOOTHING * (sample - self._rate)
+        self._last_arrival = now
+
+    def _arm_timer(self, now: float) -> None:
+        """Make sure pending text is flushed when its latency budget expires."""
+        if self._timer is None or self._timer.done():
+            delay = self.max_latency - (now - self._pending_since)
+            self._timer = asyncio.create_task(self._flush_after(delay))
+
+    async def _flush_after(self, delay: float) -> None:
+        await asyncio.sleep(max(0.0, delay))
+        try:
+            # Shielded so close() can cancel the wait without cutting a publish
+            await asyncio.shield(self.flush())
+        except Exception as e:
+            logger.error(f"[COALESCER] Timed flush failed: {e}")
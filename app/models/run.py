@@ -2,7 +2,7 @@ from datetime import datetime
 from enum import Enum
 from typing import Any
 
-from sqlalchemy import JSON, Column
+from sqlalchemy import JSON, Column, LargeBinary
 from sqlalchemy import Enum as SQLEnum
 from sqlmodel import Field, SQLModel
 
@@ -84,6 +84,9 @@ class AgentOutput(SQLModel, table=True):
     output_type: str = Field(
         default="stdout"
     )  # stdout, stderr, system, status, summary, diffs, logging, addinfo
+    output_metadata: dict[str, Any] | None = Field(
+        default=None, sa_column=Column(JSON)
+    )
 
     class Config:
         """Pydantic config."""
@@ -100,6 +103,22 @@ class AgentOutput(SQLModel, table=True):
         }
 
 
+class DiffBlob(SQLModel, table=True):
+    """Compressed unified diff of one file, keyed by the diff's content hash.
+
+    Identical diffs from different variations and runs share one row; the
+    ``diffs`` agent output of each variation is a manifest referencing them.
+    """
+
+    __tablename__ = "diff_blobs"
+
+    hash: str = Field(primary_key=True, max_length=64)  # SHA-256 of the raw diff
+    codec: str = Field(default="zstd", max_length=16)  # zstd or zlib
+    size: int  # Uncompressed bytes
+    data: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 class LiteLLMAnalytics(SQLModel, table=True):
     """Database model for LiteLLM analytics data."""
 
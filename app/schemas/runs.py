@@ -38,6 +38,18 @@ class AgentConfig(BaseModel):
         None,
         description="Stop sequences for generation",
     )
+    stream_flush_ms: int | None = Field(
+        None,
+        ge=0,
+        le=5000,
+        description="Maximum delay in milliseconds before streamed output is published",
+    )
+    stream_flush_bytes: int | None = Field(
+        None,
+        ge=1,
+        le=65536,
+        description="Maximum size in bytes of one published output chunk",
+    )
 
     model_config = {
         "json_schema_extra": {
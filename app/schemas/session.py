@@ -193,6 +193,10 @@ class CodeRequest(BaseModel):
     max_models: int = Field(
         default=5, ge=1, le=5, description="Maximum number of models to run"
     )
+    persist_workspace: bool = Field(
+        default=False,
+        description="Keep each variation's working tree for the session's next turn",
+    )
 
 
 class CodeResponse(BaseModel):
@@ -3,6 +3,7 @@ Agent orchestrator using Kubernetes jobs with Redis Streams.
 """
 
 import asyncio
+import os
 from datetime import datetime
 from typing import Any
 
@@ -13,12 +14,17 @@ from app.core.config import get_settings
 from app.core.logging import get_logger
 from app.models.run import Run, RunStatus
 from app.schemas.runs import AgentConfig
+from app.services.chat_executor import ChatExecutor
 from app.services.kubernetes_service import KubernetesService
+from app.services.model_catalog import model_catalog
 from app.services.redis_service import redis_service
 
 logger = get_logger(__name__)
 settings = get_settings()
 
+# Agent modes that work on a checkout of the run's repository
+CODE_AGENT_MODES = ("claude-cli", "gemini-cli", "openai-codex")
+
 
 class AgentOrchestrator:
     """Orchestrates LLM agents using Kubernetes jobs."""
@@ -32,6 +38,13 @@ class AgentOrchestrator:
         self.active_runs: dict[str, dict[str, Any]] = {}
         self._job_count_lock = asyncio.Lock()
         self._total_active_jobs = 0
+        # Chat-mode variations streamed by the API itself, if opted in
+        self.chat_executor = (
+            ChatExecutor(settings.agent_chat_workers)
+            if settings.agent_inprocess_chat
+            else None
+        )
+        self._chat_tasks: dict[str, list[asyncio.Task]] = {}
 
     async def _check_concurrency_limits(self, requested_jobs: int) -> bool:
         """Check if we can create the requested number of jobs.
@@ -160,6 +173,7 @@ class AgentOrchestrator:
         """Execute agents using individual jobs."""
         # Get model variants from the run record if not in agent_config
         model_variants = []
+        session_workspace = None
         if db_session:
             logger.info(f"Fetching run record for {run_id}")
             run = await db_session.get(Run, run_id)
@@ -168,15 +182,15 @@ class AgentOrchestrator:
                 if run.agent_config and "model_variants" in run.agent_config:
                     model_variants = run.agent_config["model_variants"]
                     logger.info(f"Model variants from DB: {model_variants}")
+                session_workspace = self._session_workspace(run)
             else:
                 logger.warning(f"Run {run_id} not found in database")
         else:
             logger.warning("No database session provided to fetch model variants")
 
-        # Create individual jobs with secure job tokens
-        jobs = []
+        # Get model name and agent mode for each variation
+        variation_specs = []
         for i in range(variations):
-            # Get model name and agent mode for this variation
             litellm_model_name = None
             variant_agent_mode = agent_mode  # Default fallback
             if i < len(model_variants):
@@ -186,6 +200,45 @@ class AgentOrchestrator:
                 variant_agent_mode = model_variants[i].get("agent_mode", agent_mode)
             elif agent_config:
                 litellm_model_name = agent_config.model
+            variation_specs.append((litellm_model_name, variant_agent_mode))
+
+        # Pin every code-mode variation to one commit and start the prep job
+        # for the shared workspace snapshot; variations start right away and
+        # code-mode agents wait for the snapshot themselves. Chat-mode
+        # variations get the commit only to look up its cached summary.
+        has_code_mode = any(mode in CODE_AGENT_MODES for _, mode in variation_specs)
+        repo_sha = None
+        prep_job = None
+        if repo_url and (has_code_mode or settings.agent_chat_repo_context):
+            repo_sha = await self._resolve_repo_sha(repo_url)
+            if repo_sha and has_code_mode and settings.agent_snapshot_dir:
+                prep_job = await self._start_prep_job(
+                    run_id, repo_url, repo_sha, prompt
+                )
+        chat_repo_sha = repo_sha if settings.agent_chat_repo_context else None
+        snapshot_wait = settings.agent_snapshot_wait if prep_job else 0
+
+        # Create individual jobs with secure job tokens; chat-mode variations
+        # may run in-process or share one batch job instead
+        jobs = []
+        chat_tasks = []
+        batched_ids = self._batched_variations(variation_specs)
+        batched = []
+        for i, (litellm_model_name, variant_agent_mode) in enumerate(variation_specs):
+            if self.chat_executor and variant_agent_mode not in CODE_AGENT_MODES:
+                chat_tasks.append(
+                    asyncio.create_task(
+                        self.chat_executor.run_variation(
+                            run_id,
+                            i,
+                            user_id,
+                            prompt,
+                            model=litellm_model_name,
+                            agent_config=agent_config,
+                        )
+                    )
+                )
+                continue
 
             # Log the model and agent mode being used
             logger.info(
@@ -201,6 +254,19 @@ class AgentOrchestrator:
                 expires_minutes=120,  # 2 hours for job completion
             )
 
+            if i in batched_ids:
+                batched.append(
+                    {
+                        "variation_id": i,
+                        "model": litellm_model_name,
+                        "job_token": job_token,
+                        "context_window": self._model_context_window(
+                            litellm_model_name
+                        ),
+                    }
+                )
+                continue
+
             job_name = await self.kubernetes.create_agent_job(
                 run_id=run_id,
                 variation_id=i,
@@ -208,20 +274,64 @@ class AgentOrchestrator:
                 prompt=prompt,
                 job_token=job_token,
                 model=litellm_model_name,
+                agent_config=agent_config.model_dump() if agent_config else None,
                 agent_mode=variant_agent_mode,
+                repo_sha=repo_sha
+                if variant_agent_mode in CODE_AGENT_MODES
+                else chat_repo_sha,
+                context_window=self._model_context_window(litellm_model_name),
+                session_workspace=session_workspace,
+                snapshot_wait=snapshot_wait
+                if variant_agent_mode in CODE_AGENT_MODES
+                else 0,
             )
             jobs.append((job_name, i))
 
-        self.active_runs[run_id]["jobs"] = [job[0] for job in jobs]
+        if batched:
+            job_name = await self.kubernetes.create_batch_job(
+                run_id=run_id,
+                repo_url=repo_url,
+                prompt=prompt,
+                variations=batched,
+                agent_config=agent_config.model_dump() if agent_config else None,
+                repo_sha=chat_repo_sha,
+            )
+            jobs.append((job_name, batched[0]["variation_id"]))
+
+        prep_jobs = [prep_job] if prep_job else []
+        self.active_runs[run_id]["jobs"] = prep_jobs + [job[0] for job in jobs]
         self.active_runs[run_id]["status"] = "running"
+        self._chat_tasks[run_id] = chat_tasks
 
         # Send start event to Redis
-        logger.info(f"Starting {len(jobs)} agent jobs for run {run_id}")
-        await self.redis.add_status_update(run_id, "running", {"job_count": len(jobs)})
+        logger.info(
+            f"Starting {len(jobs)} agent jobs and {len(chat_tasks)} in-process "
+            f"chat variations for run {run_id}"
+        )
+        await self.redis.add_status_update(
+            run_id,
+            "running",
+            {"job_count": len(jobs), "inprocess_variations": len(chat_tasks)},
+        )
 
-        # Agents now handle their own streaming to Redis Streams
-        # Just wait for all jobs to complete
-        await self._wait_for_jobs_completion(run_id, [job_name for job_name, _ in jobs])
+        # Agents and the chat executor handle their own streaming to Redis
+        # Streams; just wait for all of them to complete
+        try:
+            await asyncio.gather(
+                self._wait_for_jobs_completion(
+                    run_id, [job_name for job_name, _ in jobs]
+                ),
+                *chat_tasks,
+                return_exceptions=True,
+            )
+        finally:
+            self._chat_tasks.pop(run_id, None)
+
+        # The variations no longer need a prep job that is still running
+        if prep_job:
+            prep_status = await self.kubernetes.get_job_status(prep_job)
+            if prep_status.get("status") not in ("completed", "failed"):
+                await self.kubernetes.delete_job(prep_job)
 
         # Send run completion status to Redis
         await self.redis.add_status_update(run_id, "completed")
@@ -230,6 +340,89 @@ class AgentOrchestrator:
         if db_session:
             await self._update_run_status(db_session, run_id, RunStatus.COMPLETED)
 
+    async def _resolve_repo_sha(self, repo_url: str) -> str | None:
+        """Resolve the commit at the remote's HEAD, or None if it can't be reached."""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "git",
+                "ls-remote",
+                repo_url,
+                "HEAD",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
+            )
+        except OSError as e:
+            logger.warning(f"Could not run git ls-remote for {repo_url}: {e}")
+            return None
+
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=30)
+        except TimeoutError:
+            process.kill()
+            await process.wait()
+            logger.warning(f"git ls-remote timed out for {repo_url}")
+            return None
+
+        fields = stdout.split()
+        if process.returncode != 0 or not fields:
+            logger.warning(
+                f"Could not resolve HEAD of {repo_url}: {stderr.decode(errors='replace')}"
+            )
+            return None
+        return fields[0].decode()
+
+    def _batched_variations(
+        self, variation_specs: list[tuple[str | None, str | None]]
+    ) -> set[int]:
+        """Variations to run in one batch job: the chat-mode ones, if several."""
+        if not settings.agent_batch_chat_variations:
+            return set()
+        chat = {
+            i
+            for i, (_, mode) in enumerate(variation_specs)
+            if mode not in CODE_AGENT_MODES
+        }
+        return chat if len(chat) > 1 else set()
+
+    def _session_workspace(self, run: Run) -> str | None:
+        """Shared-volume directory of the run's session workspaces, if opted in."""
+        if not (
+            settings.agent_session_workspace_dir
+            and run.session_id
+            and (run.agent_config or {}).get("persist_workspace")
+        ):
+            return None
+        return f"{settings.agent_session_workspace_dir.rstrip('/')}/{run.session_id}"
+
+    def _model_context_window(self, model_name: str | None) -> int | None:
+        """Context window of a catalog model, None when unknown."""
+        if not model_name:
+            return None
+        model_info = model_catalog.get_model_by_litellm_name(model_name)
+        return model_info.context_window if model_info else None
+
+    async def _start_prep_job(
+        self, run_id: str, repo_url: str, repo_sha: str, prompt: str = ""
+    ) -> str | None:
+        """Start the prep job that publishes the shared workspace snapshot.
+
+        The prep job is not waited for: code-mode variations start alongside
+        it and wait up to ``agent_snapshot_wait`` seconds for the snapshot,
+        then clone the pinned commit themselves.
+
+        Returns:
+            The prep job name, or None when it could not be created
+        """
+        await self.redis.add_status_update(run_id, "preparing", {"repo_sha": repo_sha})
+        try:
+            return await self.kubernetes.create_prep_job(
+                run_id, repo_url, repo_sha, prompt=prompt
+            )
+        except Exception as e:
+            logger.warning(f"Prep job for run {run_id} could not be created: {e}")
+            return None
+
     async def _wait_for_jobs_completion(
         self, run_id: str, job_names: list[str]
     ) -> None:
@@ -297,6 +490,10 @@ class AgentOrchestrator:
             if not deleted:
                 success = False
 
+        # Stop in-process chat variations
+        for task in self._chat_tasks.get(run_id, []):
+            task.cancel()
+
         # Update run status
         run_data["status"] = "cancelled"
 
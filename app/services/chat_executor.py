@@ -0,0 +1,456 @@
+"""
+In-process executor for chat-mode variations.
+
+A chat-mode variation is a single streaming completion, yet as an agent job it
+waits for pod scheduling, an image pull and a container start before its first
+token. With ``agent_inprocess_chat`` enabled the orchestrator hands chat-mode
+variations to this executor instead: each runs as an asyncio task inside the
+API, at most ``agent_chat_workers`` at a time, and writes what the agent would
+have written - coalesced text on ``run:{id}:llm``, ``variation_completed`` on
+``run:{id}:status``, ``llm`` rows in ``agent_outputs`` and a
+``litellm_analytics`` row - so clients can't tell the difference. Failed streams are retried as in the agent, though a
+retry always restarts the completion and marks the failed attempt superseded.
+With ``agent_response_cache_ttl`` set, a request answered before is replayed
+from the shared response cache instead. Follow-up turns don't get a cached
+codebase summary here; that context stays with the agent jobs.
+"""
+
+import asyncio
+from datetime import datetime
+from itertools import count
+from typing import Any
+
+from sqlalchemy import func, update
+from tenacity import AsyncRetrying, stop_after_attempt
+
+from app.core.config import get_settings
+from app.core.database import async_session_maker
+from app.core.logging import get_logger
+from app.core.response_cache import (
+    CachedResponse,
+    ResponseCache,
+    TranscriptRecorder,
+    replay,
+)
+from app.core.retry_policy import RetryWait
+from app.core.stream_coalescer import (
+    DEFAULT_FLUSH_BYTES,
+    DEFAULT_FLUSH_MS,
+    StreamCoalescer,
+)
+from app.models.run import AgentOutput, LiteLLMAnalytics, Run
+from app.models.user import User
+from app.schemas.runs import AgentConfig
+from app.services.provider_key_service import ProviderKeyService
+from app.services.redis_service import redis_service
+
+logger = get_logger(__name__)
+settings = get_settings()
+
+# Generation retries, as in the agent jobs
+MAX_RETRY_ATTEMPTS = 3
+RETRY_MIN_WAIT = 4
+RETRY_MAX_WAIT = 10
+
+
+def _litellm() -> Any:
+    """LiteLLM, imported on first use (it takes seconds to import)."""
+    import litellm
+
+    return litellm
+
+
+class ChatExecutor:
+    """Runs chat-mode variations as asyncio tasks in a bounded worker pool."""
+
+    def __init__(self, workers: int, session_maker: Any = async_session_maker):
+        self._slots = asyncio.Semaphore(workers)
+        self._session_maker = session_maker
+        self.redis = redis_service
+
+    async def run_variation(
+        self,
+        run_id: str,
+        variation_id: int,
+        user_id: str,
+        prompt: str,
+        *,
+        model: str | None = None,
+        agent_config: AgentConfig | None = None,
+    ) -> bool:
+        """Stream one variation's completion once a worker slot is free.
+
+        Returns:
+            Whether the variation succeeded; failures are reported on the
+            status stream rather than raised
+        """
+        config = agent_config or AgentConfig()
+        model = model or config.model
+        async with self._slots:
+            try:
+                await self._run(
+                    run_id, variation_id, user_id, prompt, model=model, config=config
+                )
+            except Exception as e:
+                logger.error(
+                    f"In-process chat variation {variation_id} of run {run_id} "
+                    f"failed: {e}"
+                )
+                await self.redis.add_status_update(
+                    run_id,
+                    "variation_completed",
+                    {"variation_id": variation_id, "success": False, "error": str(e)},
+                )
+                return False
+
+        await self.redis.add_status_update(
+            run_id,
+            "variation_completed",
+            {"variation_id": variation_id, "success": True},
+        )
+        return True
+
+    async def _run(
+        self,
+        run_id: str,
+        variation_id: int,
+        user_id: str,
+        prompt: str,
+        *,
+        model: str,
+        config: AgentConfig,
+    ) -> None:
+        """Stream the completion to Redis, then persist it with the run stats.
+
+        Missing provider keys fail the variation up front, as in the agent.
+        Failed streams are retried after a jittered wait that honours the
+        provider's Retry-After; a retry supersedes the output the failed
+        attempt published rather than resuming it.
+        """
+        api_key = await self._provider_key(user_id, model)
+        if not api_key:
+            # Checked before the cache, as the agent validates before generating
+            raise RuntimeError(f"Missing API key for model {model}")
+
+        # The same request was answered before: replay that response
+        cache = self._response_cache()
+        cache_key = None
+        if cache:
+            cache_key = ResponseCache.key(
+                model, config.temperature, config.max_tokens, prompt
+            )
+            cached = await cache.get(cache_key)
+            if cached:
+                await self._replay(run_id, variation_id, model, config, cached)
+                return
+
+        completion_kwargs: dict[str, Any] = {
+            "model": model,
+            "max_tokens": config.max_tokens,
+            "temperature": config.temperature,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True,
+            "stream_options": {"include_usage": True},
+            "api_base": settings.litellm_gateway_url,
+            "api_key": settings.litellm_gateway_key,
+            # Provider key via extra_body (clientside auth), as the agent sends it
+            "extra_body": {"api_key": api_key},
+        }
+
+        # Retried like the agent's generation; a retry restarts the
+        # completion and supersedes the output of the failed attempt
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(MAX_RETRY_ATTEMPTS),
+            wait=RetryWait(min_wait=RETRY_MIN_WAIT, max_wait=RETRY_MAX_WAIT),
+            reraise=True,
+        )
+        recorder = TranscriptRecorder()
+        superseded: list[dict[str, Any]] = []
+        start = datetime.utcnow()
+        async for attempt in retrying:
+            with attempt:
+                number = attempt.retry_state.attempt_number
+                if recorder.pieces:
+                    status = {"variation_id": variation_id, "attempts": [number - 1]}
+                    await self.redis.add_status_update(
+                        run_id, "attempt_superseded", status
+                    )
+                    superseded.append(status)
+                recorder = TranscriptRecorder()
+                usage = await self._stream(
+                    run_id,
+                    variation_id,
+                    completion_kwargs,
+                    config,
+                    recorder,
+                    attempt=number,
+                )
+        end = datetime.utcnow()
+
+        tokens_used = usage.total_tokens if usage else None
+        cost_usd = None
+        if usage:
+            try:
+                prompt_cost, completion_cost = _litellm().cost_per_token(
+                    model=model,
+                    prompt_tokens=usage.prompt_tokens,
+                    completion_tokens=usage.completion_tokens,
+                )
+                cost_usd = prompt_cost + completion_cost
+            except Exception as e:
+                logger.warning(f"Failed to calculate cost for {model}: {e}")
+
+        analytics = LiteLLMAnalytics(
+            run_id=run_id,
+            variation_id=variation_id,
+            model=model,
+            provider=ProviderKeyService.infer_provider_from_model(model),
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+            total_tokens=tokens_used,
+            cost_usd=cost_usd,
+            response_time_ms=int((end - start).total_seconds() * 1000),
+            temperature=config.temperature,
+            max_tokens=config.max_tokens,
+            stream=True,
+            status="success",
+            request_start_time=start,
+            request_end_time=end,
+            litellm_metadata={
+                "agent_mode": "litellm",
+                "gateway_url": settings.litellm_gateway_url,
+                "attempts": number,
+                "executor": "inprocess",
+            },
+        )
+        await self._persist(
+            run_id,
+            variation_id,
+            recorder.pieces,
+            tokens_used,
+            cost_usd,
+            attempt=number,
+            superseded=superseded,
+            analytics=analytics,
+        )
+        if cache_key:
+            cached_usage = {
+                name: getattr(usage, name, None)
+                for name in ("prompt_tokens", "completion_tokens", "total_tokens")
+            }
+            await cache.put(cache_key, recorder.response(cached_usage, cost_usd))
+        logger.info(
+            f"In-process chat variation {variation_id} of run {run_id} complete: "
+            f"{len(recorder.pieces)} entries, {tokens_used} tokens, "
+            f"{number} attempt(s)"
+        )
+
+    async def _stream(
+        self,
+        run_id: str,
+        variation_id: int,
+        completion_kwargs: dict[str, Any],
+        config: AgentConfig,
+        recorder: TranscriptRecorder,
+        *,
+        attempt: int,
+    ) -> Any:
+        """Stream one attempt of the completion to Redis.
+
+        Args:
+            run_id: The run ID
+            variation_id: The variation ID
+            completion_kwargs: Arguments for ``litellm.acompletion``
+            config: The variation's agent config
+            recorder: Records every piece this attempt publishes
+            attempt: Number of the attempt, published with its output
+
+        Returns:
+            The completion's usage block, if the stream sent one
+        """
+
+        async def publish(text: str) -> None:
+            await self._publish(
+                run_id, variation_id, text, attempt=attempt, seq=len(recorder.pieces)
+            )
+            recorder.add(text)
+
+        # Publish under the run's latency budget, like the agent
+        coalescer = StreamCoalescer(
+            publish,
+            max_latency_ms=DEFAULT_FLUSH_MS
+            if config.stream_flush_ms is None
+            else config.stream_flush_ms,
+            max_bytes=config.stream_flush_bytes or DEFAULT_FLUSH_BYTES,
+        )
+        response = await _litellm().acompletion(**completion_kwargs)
+        usage = None
+        try:
+            async for chunk in response:
+                usage = getattr(chunk, "usage", None) or usage
+                choices = getattr(chunk, "choices", None)
+                await coalescer.write(choices[0].delta.content if choices else "")
+        finally:
+            await coalescer.close()
+        return usage
+
+    def _response_cache(self) -> ResponseCache | None:
+        """The response cache on the API's Redis connection, if enabled."""
+        if settings.agent_response_cache_ttl <= 0:
+            return None
+        return ResponseCache(
+            self.redis.client,
+            ttl=settings.agent_response_cache_ttl,
+            max_entries=settings.agent_response_cache_max_entries,
+        )
+
+    async def _replay(
+        self,
+        run_id: str,
+        variation_id: int,
+        model: str,
+        config: AgentConfig,
+        cached: CachedResponse,
+    ) -> None:
+        """Publish a cached completion and record the hit in the analytics."""
+        start = datetime.utcnow()
+        seq = count()
+
+        async def publish(text: str) -> None:
+            await self._publish(run_id, variation_id, text, seq=next(seq))
+
+        await replay(cached, publish, settings.agent_response_replay_speed)
+        end = datetime.utcnow()
+
+        usage = cached.usage or {}
+        analytics = LiteLLMAnalytics(
+            run_id=run_id,
+            variation_id=variation_id,
+            model=model,
+            provider=ProviderKeyService.infer_provider_from_model(model),
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+            total_tokens=usage.get("total_tokens"),
+            cost_usd=0.0,  # Nothing was spent on the provider
+            response_time_ms=int((end - start).total_seconds() * 1000),
+            temperature=config.temperature,
+            max_tokens=config.max_tokens,
+            stream=True,
+            status="cache_hit",
+            request_start_time=start,
+            request_end_time=end,
+            litellm_metadata={
+                "agent_mode": "litellm",
+                "cache_hit": True,
+                "cached_at": cached.created_at,
+                "saved_cost_usd": cached.cost_usd,
+                "executor": "inprocess",
+            },
+        )
+        await self._persist(run_id, variation_id, cached.pieces, analytics=analytics)
+        logger.info(
+            f"In-process chat variation {variation_id} of run {run_id} replayed "
+            f"from the response cache: {len(cached.pieces)} entries"
+        )
+
+    async def _publish(
+        self,
+        run_id: str,
+        variation_id: int,
+        content: str,
+        *,
+        attempt: int = 1,
+        seq: int = 0,
+    ) -> None:
+        """Publish one piece of text as a ``run:{id}:llm`` entry.
+
+        Entries are numbered by attempt and seq, as the agent numbers them,
+        so consumers can drop the output of superseded attempts.
+        """
+        await self.redis.add_llm_output(
+            run_id,
+            str(variation_id),
+            content,
+            metadata={"content_length": len(content), "attempt": attempt, "seq": seq},
+        )
+
+    async def _provider_key(self, user_id: str, model: str) -> str | None:
+        """The user's decrypted key for the model's provider, if any."""
+        async with self._session_maker() as session:
+            user = await session.get(User, user_id)
+            if not user or not user.is_active:
+                raise RuntimeError(f"User {user_id} not found or inactive")
+            keys = await ProviderKeyService(session).get_job_keys(session, user, model)
+            # Keep the usage tracking of the model's key
+            await session.commit()
+        provider = ProviderKeyService.infer_provider_from_model(model)
+        return keys.get(f"{provider.upper()}_API_KEY")
+
+    async def _persist(
+        self,
+        run_id: str,
+        variation_id: int,
+        published: list[str],
+        tokens_used: int | None = None,
+        cost_usd: float | None = None,
+        *,
+        attempt: int = 1,
+        superseded: list[dict[str, Any]] | None = None,
+        analytics: LiteLLMAnalytics | None = None,
+    ) -> None:
+        """Write the published entries as ``llm`` rows and add to the run stats.
+
+        Args:
+            run_id: The run ID
+            variation_id: The variation ID
+            published: Entries the successful attempt published on the llm
+                stream
+            tokens_used: Tokens to add to the run's total
+            cost_usd: Cost to add to the run's total
+            attempt: Number of the successful attempt
+            superseded: ``attempt_superseded`` status updates published by
+                retries, written as ``status`` rows
+            analytics: Analytics row to write with them
+        """
+        async with self._session_maker() as session:
+            session.add_all(
+                [
+                    AgentOutput(
+                        run_id=run_id,
+                        variation_id=variation_id,
+                        content="attempt_superseded",
+                        output_type="status",
+                        output_metadata=status,
+                    )
+                    for status in superseded or []
+                ]
+                + [
+                    AgentOutput(
+                        run_id=run_id,
+                        variation_id=variation_id,
+                        content=content,
+                        output_type="llm",
+                        output_metadata={
+                            "content_length": len(content),
+                            "attempt": attempt,
+                            "seq": seq,
+                        },
+                    )
+                    for seq, content in enumerate(published)
+                ]
+            )
+            if tokens_used is not None or cost_usd is not None:
+                # Atomic increments: variations of one run finish concurrently
+                await session.execute(
+                    update(Run)
+                    .where(Run.id == run_id)
+                    .values(
+                        total_tokens_used=func.coalesce(Run.total_tokens_used, 0)
+                        + (tokens_used or 0),
+                        total_cost_usd=func.coalesce(Run.total_cost_usd, 0.0)
+                        + (cost_usd or 0.0),
+                    )
+                )
+            if analytics:
+                session.add(analytics)
+            await session.commit()
@@ -0,0 +1,52 @@
+"""
+Read side of the content-addressed diff store.
+
+Agents store each changed file's unified diff once in ``diff_blobs``, keyed
+by its SHA-256 and compressed with ``app.core.diff_codec``, and save a
+manifest of the variation's files as its ``diffs`` output. Manifest entries carry a
+``blob`` hash where older outputs carry ``hunks``.
+"""
+
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from app.core.diff_codec import decompress
+from app.models.run import DiffBlob
+
+
+def decode_blob(codec: str, data: bytes) -> str:
+    """Decompress a stored diff.
+
+    Raises:
+        ValueError: If the codec is unknown or unavailable
+    """
+    return decompress(codec, data).decode("utf-8", errors="replace")
+
+
+async def load_diffs(db: AsyncSession, hashes: list[str]) -> dict[str, str]:
+    """Fetch and decompress diff blobs in one query.
+
+    Args:
+        db: Database session
+        hashes: Blob hashes to load
+
+    Returns:
+        Diff text by hash; hashes that are not stored are left out
+    """
+    if not hashes:
+        return {}
+    result = await db.execute(select(DiffBlob).where(DiffBlob.hash.in_(set(hashes))))
+    return {blob.hash: decode_blob(blob.codec, blob.data) for blob in result.scalars()}
+
+
+async def inline_hunks(db: AsyncSession, entries: list[dict[str, Any]]) -> None:
+    """Fill in the ``hunks`` of manifest entries from their blobs, in place."""
+    diffs = await load_diffs(
+        db, [entry["blob"] for entry in entries if entry.get("blob")]
+    )
+    for entry in entries:
+        if entry.get("blob"):
+            diff = diffs.get(entry["blob"])
+            entry["hunks"] = [diff] if diff is not None else []
@@ -48,17 +48,26 @@ class KubernetesService:
         model: str,
         agent_config: dict[str, Any] | None = None,
         agent_mode: str | None = None,
+        repo_sha: str | None = None,
+        context_window: int | None = None,
+        session_workspace: str | None = None,
+        *,
+        snapshot_wait: int = 0,
     ) -> str:
-        """Create a Kubernetes job for an agent variation."""
+        """Create a Kubernetes job for an agent variation.
+
+        ``snapshot_wait`` is how long the variation waits for the snapshot of
+        a prep job started alongside it (0 when none was started).
+        """
         job_name = f"agent-{run_id}-{variation_id}"
 
-        # Load job template
-        template_path = self.job_templates_dir / "agent-job-template.yaml"
-        with open(template_path) as f:
-            job_yaml = f.read()
+        # Per-run streaming knobs (unset values fall back to agent defaults)
+        agent_config = agent_config or {}
+        stream_flush_ms = agent_config.get("stream_flush_ms")
+        stream_flush_bytes = agent_config.get("stream_flush_bytes")
 
-        # Replace placeholders
-        job_yaml = job_yaml.format(
+        job_yaml = self._render_job_manifest(
+            job_name=job_name,
             run_id=run_id,
             variation_id=variation_id,
             repo_url=repo_url,
@@ -66,8 +75,128 @@ class KubernetesService:
             job_token=self._escape_yaml_string(job_token),  # Secure job token
             model=model,  # Model name for LLM
             agent_mode=agent_mode or "litellm",  # Default to litellm
+            stream_flush_ms="" if stream_flush_ms is None else stream_flush_ms,
+            stream_flush_bytes="" if stream_flush_bytes is None else stream_flush_bytes,
+            agent_task="variation",
+            repo_sha=repo_sha or "",
+            snapshot_wait=snapshot_wait,
+            context_window=context_window or "",
+            session_workspace=session_workspace or "",
+            variations=self._escape_yaml_string(""),
+        )
+        await self._apply_job_manifest(job_name, job_yaml)
+
+        logger.info(
+            f"Created job {job_name} for run {run_id}, variation {variation_id}"
+        )
+
+        # Start log watcher for this job (only in dev mode)
+        if settings.debug or os.getenv("AIDEATOR_DEV_MODE") == "true":
+            try:
+                await log_watcher_service.start_log_watcher(run_id, job_name)
+                logger.info(f"Started log watcher for job {job_name}")
+            except Exception as e:
+                logger.error(f"Failed to start log watcher: {e}")
+                # Don't fail the job creation if log watcher fails
+
+        return job_name
+
+    async def create_prep_job(
+        self, run_id: str, repo_url: str, repo_sha: str, prompt: str = ""
+    ) -> str:
+        """Create the run-level job that publishes the shared workspace snapshot."""
+        job_name = f"agent-{run_id}-prep"
+
+        job_yaml = self._render_job_manifest(
+            job_name=job_name,
+            run_id=run_id,
+            variation_id=0,
+            repo_url=repo_url,
+            prompt=self._escape_yaml_string(prompt),  # Ranks the snapshot's files
+            job_token=self._escape_yaml_string(""),  # Prep needs no API keys
+            model="",
+            agent_mode="prep",
+            stream_flush_ms="",
+            stream_flush_bytes="",
+            agent_task="prep",
+            repo_sha=repo_sha,
+            snapshot_wait=0,
+            context_window="",
+            session_workspace="",
+            variations=self._escape_yaml_string(""),
+        )
+        await self._apply_job_manifest(job_name, job_yaml)
+
+        logger.info(f"Created prep job {job_name} for run {run_id} at {repo_sha}")
+        return job_name
+
+    async def create_batch_job(
+        self,
+        run_id: str,
+        repo_url: str,
+        prompt: str,
+        variations: list[dict[str, Any]],
+        agent_config: dict[str, Any] | None = None,
+        *,
+        repo_sha: str | None = None,
+    ) -> str:
+        """Create one job that runs several chat-mode variations of a run.
+
+        Args:
+            run_id: The run ID
+            repo_url: Repository the run is about
+            prompt: Prompt shared by the variations
+            variations: ``variation_id``, ``model`` and ``job_token`` (plus
+                optional ``context_window``) of each variation
+            agent_config: Per-run agent settings
+            repo_sha: Commit whose cached codebase summary the variations may
+                answer with
+
+        Returns:
+            The job name
+        """
+        job_name = f"agent-{run_id}-batch"
+
+        agent_config = agent_config or {}
+        stream_flush_ms = agent_config.get("stream_flush_ms")
+        stream_flush_bytes = agent_config.get("stream_flush_bytes")
+
+        job_yaml = self._render_job_manifest(
+            job_name=job_name,
+            run_id=run_id,
+            variation_id=variations[0]["variation_id"],
+            repo_url=repo_url,
+            prompt=self._escape_yaml_string(prompt),
+            job_token=self._escape_yaml_string(""),  # Each variation has its own
+            model="",
+            agent_mode="litellm",
+            stream_flush_ms="" if stream_flush_ms is None else stream_flush_ms,
+            stream_flush_bytes="" if stream_flush_bytes is None else stream_flush_bytes,
+            agent_task="batch",
+            repo_sha=repo_sha or "",
+            snapshot_wait=0,
+            context_window="",
+            session_workspace="",
+            variations=self._escape_yaml_string(json.dumps(variations)),
+        )
+        await self._apply_job_manifest(job_name, job_yaml)
+
+        logger.info(
+            f"Created batch job {job_name} for run {run_id}, "
+            f"variations {[v['variation_id'] for v in variations]}"
         )
+        return job_name
 
+    def _render_job_manifest(self, **fields: Any) -> str:
+        """Fill the agent job template's placeholders."""
+        template_path = self.job_templates_dir / "agent-job-template.yaml"
+        with open(template_path) as f:
+            job_yaml = f.read()
+
+        return job_yaml.format(snapshot_dir=settings.agent_snapshot_dir or "", **fields)
+
+    async def _apply_job_manifest(self, job_name: str, job_yaml: str) -> None:
+        """Apply a rendered job manifest with kubectl."""
         # Create temporary file for job manifest
         with tempfile.NamedTemporaryFile(mode="w", suffix=".yaml", delete=False) as f:
             f.write(job_yaml)
@@ -88,22 +217,6 @@ class KubernetesService:
                     else result.stderr
                 )
                 raise RuntimeError(f"Failed to create job: {stderr_str}")
-
-            logger.info(
-                f"Created job {job_name} for run {run_id}, variation {variation_id}"
-            )
-
-            # Start log watcher for this job (only in dev mode)
-            if settings.debug or os.getenv("AIDEATOR_DEV_MODE") == "true":
-                try:
-                    await log_watcher_service.start_log_watcher(run_id, job_name)
-                    logger.info(f"Started log watcher for job {job_name}")
-                except Exception as e:
-                    logger.error(f"Failed to start log watcher: {e}")
-                    # Don't fail the job creation if log watcher fails
-
-            return job_name
-
         finally:
             # Clean up temporary file
             os.unlink(job_file)
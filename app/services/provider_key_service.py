@@ -160,7 +160,7 @@ class ProviderKeyService:
             Provider key or None if not found
         """
         # Infer provider from model name
-        provider = self._infer_provider_from_model(model)
+        provider = self.infer_provider_from_model(model)
 
         # First try model-specific key
         model_key = await self._get_active_key(session, user.id, provider, model)
@@ -616,6 +616,46 @@ class ProviderKeyService:
 
         return self.encryption.decrypt_api_key(key.encrypted_key)
 
+    async def get_job_keys(
+        self,
+        session: Session | AsyncSession,
+        user: User,
+        model_name: str | None = None,
+    ) -> dict[str, str]:
+        """Decrypted keys an agent runs with, as ``{PROVIDER}_API_KEY`` names.
+
+        Every active key of the user is included; the key configured for
+        ``model_name`` (model-specific, else provider-level) takes precedence
+        for its provider. Keys that fail to decrypt are skipped.
+
+        Args:
+            session: Database session
+            user: User owning the keys
+            model_name: Optional model the agent runs
+
+        Returns:
+            Mapping of environment variable names to decrypted keys
+        """
+        keys = await self.list_user_keys(session, user)
+        if model_name:
+            model_key = await self.get_key_for_model(session, user, model_name)
+            if model_key and model_key.is_active:
+                keys.append(model_key)
+
+        decrypted_keys = {}
+        for key in keys:
+            if not key.is_active:
+                continue
+            try:
+                decrypted_key = await self.decrypt_api_key(session, user, key.id)
+            except Exception as e:
+                logger.warning(
+                    f"❌ Failed to decrypt {key.provider} key for user {user.id}: {e}"
+                )
+                continue
+            decrypted_keys[f"{key.provider.upper()}_API_KEY"] = decrypted_key
+        return decrypted_keys
+
     async def get_provider_key_for_user(
         self,
         session: Session | AsyncSession,
@@ -631,7 +671,8 @@ class ProviderKeyService:
             return None
         return key
 
-    def _infer_provider_from_model(self, model_name: str) -> str:
+    @staticmethod
+    def infer_provider_from_model(model_name: str) -> str:
         """Infer provider from model name.
 
         Args:
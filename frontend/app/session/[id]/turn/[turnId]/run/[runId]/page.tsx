@@ -8,13 +8,36 @@ import { Badge } from "@/components/ui/badge"
 import { ArrowLeft, Terminal, GitPullRequest } from "lucide-react"
 import Link from "next/link"
 import { WebSocketClient, useAuthenticatedApiClient } from "@/lib/api"
-import { Session, Turn, Run, AgentOutput } from "@/lib/types"
+import { Session, Turn, Run, AgentOutput, RunDiff } from "@/lib/types"
 import { useAuthenticatedWebSocket } from "@/lib/api"
 import { useAuth } from "@/lib/auth-context"
 import { DebugWindow } from "@/components/debug-window"
 import { DiffViewer } from "@/diffs/DiffViewer"
 import type { DiffData } from "@/diffs/data"
 
+function toDiffData(diff: RunDiff): DiffData {
+  return {
+    oldFile: {
+      fileName: diff.oldFile.name,
+      content: diff.oldFile.content
+    },
+    newFile: {
+      fileName: diff.newFile.name,
+      content: diff.newFile.content
+    },
+    hunks: diff.hunks?.length ? diff.hunks : undefined
+  }
+}
+
+// Agents number llm output by generation attempt and seq within it, so the
+// same piece loaded from the database and replayed by the stream is kept once
+function outputKey(variationId: number, metadata: Record<string, any> | undefined, fallback: string) {
+  if (metadata?.attempt === undefined || metadata?.seq === undefined) {
+    return fallback
+  }
+  return `${variationId}:${metadata.attempt}:${metadata.seq}`
+}
+
 export default function RunPage() {
   const params = useParams()
   const router = useRouter()
@@ -46,6 +69,7 @@ export default function RunPage() {
   const [diffsReady, setDiffsReady] = useState<Record<number, boolean>>({})
   const messageIdCounter = useRef(0)
   const seenMessageIds = useRef(new Set<string>())
+  const supersededAttempts = useRef(new Set<string>())  // "variation:attempt"
   
   // Ref for auto-scrolling
   const outputsEndRef = useRef<HTMLDivElement>(null)
@@ -103,7 +127,7 @@ export default function RunPage() {
       // Clear seen message IDs and add existing outputs
       seenMessageIds.current.clear()
       const formattedOutputs = outputs.map((output, index) => {
-        const messageId = `existing-${output.id || index}`
+        const messageId = outputKey(output.variation_id, output.metadata, `existing-${output.id || index}`)
         seenMessageIds.current.add(messageId)
         return {
           ...output,
@@ -143,16 +167,7 @@ export default function RunPage() {
       const newDiffMap = new Map<number, DiffData[]>()
       results.forEach(({ variation, diffs }) => {
         if (diffs && diffs.length > 0) {
-          const diffData: DiffData[] = diffs.map(diff => ({
-            oldFile: {
-              fileName: diff.oldFile.name,
-              content: diff.oldFile.content
-            },
-            newFile: {
-              fileName: diff.newFile.name,
-              content: diff.newFile.content
-            }
-          }))
+          const diffData: DiffData[] = diffs.map(toDiffData)
           newDiffMap.set(variation, diffData)
         }
       })
@@ -172,16 +187,7 @@ export default function RunPage() {
       const diffs = await apiClient.getRunDiffs(runId, { variation_id: variationId })
       
       if (diffs.length > 0) {
-        const diffData: DiffData[] = diffs.map(diff => ({
-          oldFile: {
-            fileName: diff.oldFile.name,
-            content: diff.oldFile.content
-          },
-          newFile: {
-            fileName: diff.newFile.name,
-            content: diff.newFile.content
-          }
-        }))
+        const diffData: DiffData[] = diffs.map(toDiffData)
         
         setDiffDataByVariation(prev => {
           const newMap = new Map(prev)
@@ -214,11 +220,21 @@ export default function RunPage() {
           // Handle incoming WebSocket messages
           // Accept LLM output messages
           if (message.type === "llm") {
+            const variationId = parseInt(message.data.variation_id) ?? 0
+            const metadata = message.data.metadata
+
             // Generate or use existing message ID
-            const messageId = message.message_id || `msg-${Date.now()}-${Math.random()}`
+            const messageId = outputKey(
+              variationId,
+              metadata,
+              message.message_id || `msg-${Date.now()}-${Math.random()}`
+            )
             
-            // Skip if we've already processed this message
-            if (seenMessageIds.current.has(messageId)) {
+            // Skip if we've already processed this message or a retry superseded it
+            if (
+              seenMessageIds.current.has(messageId) ||
+              supersededAttempts.current.has(`${variationId}:${metadata?.attempt}`)
+            ) {
               console.log('Skipping duplicate message:', messageId)
               return
             }
@@ -227,14 +243,47 @@ export default function RunPage() {
             const newOutput: AgentOutput = {
               id: messageIdCounter.current++,
               run_id: runId,
-              variation_id: parseInt(message.data.variation_id) ?? 0,
+              variation_id: variationId,
               content: message.data.content || "",
               timestamp: message.data.timestamp,
               output_type: message.type,
+              metadata,
             }
             setOutputs(prev => [...prev, newOutput])
           }
           
+          // A retry restarted generation: drop the output of the failed attempts
+          if (message.type === "status" && message.data.status === "attempt_superseded") {
+            const variationId = message.data.metadata?.variation_id
+            const attempts: number[] = message.data.metadata?.attempts ?? []
+            attempts.forEach(attempt => supersededAttempts.current.add(`${variationId}:${attempt}`))
+            setOutputs(prev => prev.filter(output =>
+              !supersededAttempts.current.has(`${output.variation_id}:${output.metadata?.attempt}`)
+            ))
+          }
+
+          // Progressive diffs while the agent is still editing
+          if (message.type === "status" && message.data.status === "diff_update") {
+            const update = message.data.metadata
+            if (update?.variation_id !== undefined) {
+              setDiffDataByVariation(prev => {
+                const stale = new Set<string>([
+                  ...(update.removed ?? []),
+                  ...(update.files ?? []).map((diff: RunDiff) => diff.newFile.name),
+                ])
+                const current = (prev.get(update.variation_id) ?? []).filter(
+                  diff => !stale.has(diff.newFile.fileName ?? "")
+                )
+                const newMap = new Map(prev)
+                newMap.set(update.variation_id, [
+                  ...current,
+                  ...(update.files ?? []).map(toDiffData),
+                ])
+                return newMap
+              })
+            }
+          }
+
           // Handle status messages for diffs
           if (message.type === "status" && message.data.status === "diffs_ready") {
             const variationId = message.data.metadata?.variation_id
@@ -9,6 +9,7 @@ import {
   CreateRunRequest,
   CreateRunResponse,
   AgentOutput,
+  RunDiff,
   Preference,
   PreferenceCreate,
   PaginatedResponse,
@@ -332,8 +333,9 @@ class APIClient {
     runId: string,
     params: {
       variation_id?: number
+      hunks?: boolean
     } = {}
-  ): Promise<Array<{ oldFile: { name: string; content: string }; newFile: { name: string; content: string } }>> {
+  ): Promise<RunDiff[]> {
     const searchParams = new URLSearchParams()
     Object.entries(params).forEach(([key, value]) => {
       if (value !== undefined) {
@@ -341,7 +343,11 @@ class APIClient {
       }
     })
     const query = searchParams.toString()
-    return this.request<Array<{ oldFile: { name: string; content: string }; newFile: { name: string; content: string } }>>(`/api/v1/runs/${runId}/diffs${query ? `?${query}` : ''}`)
+    return this.request<RunDiff[]>(`/api/v1/runs/${runId}/diffs${query ? `?${query}` : ''}`)
+  }
+
+  async getRunDiffBlob(runId: string, blob: string): Promise<{ blob: string; hunks: string[] }> {
+    return this.request<{ blob: string; hunks: string[] }>(`/api/v1/runs/${runId}/diffs/blobs/${blob}`)
   }
 
   async selectWinner(runId: string, winningVariationId: number): Promise<Run> {
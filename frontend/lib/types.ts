@@ -116,6 +116,21 @@ export interface AgentOutput {
   content: string
   timestamp: string
   output_type: OutputType
+  metadata?: Record<string, any>  // llm output: attempt and seq within it
+}
+
+// Changed file of a variation; agents store unified hunks and line stats
+// (older outputs carry full file contents instead)
+export interface RunDiff {
+  oldFile: { name: string; content: string }
+  newFile: { name: string; content: string }
+  hunks?: string[]
+  blob?: string | null  // Stored diff, fetchable on its own
+  status?: 'added' | 'deleted' | 'modified' | 'renamed'
+  additions?: number
+  deletions?: number
+  binary?: boolean
+  truncated?: boolean
 }
 
 // Preference types
@@ -295,6 +310,7 @@ export interface CodeRequest {
   context?: string
   model_variants: ModelVariantRequest[]
   max_models: number
+  persist_workspace?: boolean  // Resume this session's working trees next turn
 }
 
 export interface CodeResponse {
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""Benchmark for agent startup: time to first output per agent mode.
+
+Each mode runs in a fresh interpreter, so module imports are part of the
+measurement. Redis, the database and the orchestrator's key endpoint are
+stood in for by steps that take ``--latency`` ms; the repository is a real
+local git repository with ``--files`` files, so code modes really clone and
+analyse it. Generation is replaced by a first output (chat mode loads
+LiteLLM first, as its first completion call would).
+
+Reported per mode: ``import_ms`` (``agent.main``), ``bootstrap_ms`` (wall
+time of the concurrent bootstrap), ``steps_ms`` (the same steps one after
+another, as startup used to run them) and ``first_output_ms`` (process start
+to the first output handed to the sink).
+
+Usage:
+    python scripts/bench_agent_startup.py [--latency 100] [--files 500]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+MODES = ("litellm", "claude-cli", "gemini-cli", "openai-codex")
+
+
+class FakePipeline:
+    def xadd(self, name, fields):
+        return self
+
+    async def execute(self):
+        return []
+
+
+class FakeRedis:
+    def pipeline(self, transaction=True):
+        return FakePipeline()
+
+    async def close(self):
+        pass
+
+
+def build_repo(root: Path, files: int) -> None:
+    """Commit ``files`` small Python files spread over packages."""
+    for i in range(files):
+        path = root / f"pkg{i // 50}" / f"module_{i}.py"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f'"""Module {i}."""\n\n\ndef f{i}():\n    return {i}\n')
+    (root / "README.md").write_text("# Benchmark repository\n")
+
+    def git(*args: str) -> None:
+        subprocess.run(["git", "-C", str(root), *args], check=True, capture_output=True)
+
+    git("init", "-q")
+    git("add", "-A")
+    git("-c", "user.name=bench", "-c", "user.email=b@b", "commit", "-qm", "init")
+
+
+async def child(mode: str, latency: float, started: float) -> dict:
+    """Start one agent and time it up to its first output."""
+    sys.path.insert(0, str(ROOT))
+    import agent.main as agent_main
+
+    imported = time.perf_counter()
+    agent = agent_main.AIdeatorAgent()
+    steps = {}
+
+    def timed(name, step):
+        async def run(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await step(*args, **kwargs)
+            finally:
+                steps[name] = (time.perf_counter() - start) * 1000
+
+        return run
+
+    async def connect_redis():
+        await asyncio.sleep(latency)
+        agent.redis_client = FakeRedis()
+
+    async def connect_database():
+        await asyncio.sleep(latency)
+
+    async def fetch_keys():
+        await asyncio.sleep(latency)
+
+    first_output = {}
+
+    async def generate(codebase_summary):
+        if mode == "litellm":
+            agent_main._litellm()
+        await agent.publish_output("first output")
+        first_output["at"] = time.perf_counter()
+        return "first output"
+
+    agent._init_redis = timed("redis", connect_redis)
+    agent._init_database = timed("database", connect_database)
+    agent._fetch_api_keys = timed("keys", fetch_keys)
+    agent._checkout_workspace = timed("checkout", agent._checkout_workspace)
+    agent._log_cli_version = timed("cli_version", agent._log_cli_version)
+    agent._generate_llm_response = generate
+
+    bootstrap = agent._bootstrap
+
+    async def measured_bootstrap(agent_mode):
+        start = time.perf_counter()
+        result = await bootstrap(agent_mode)
+        steps["bootstrap"] = (time.perf_counter() - start) * 1000
+        return result
+
+    agent._bootstrap = measured_bootstrap
+    await agent.run()
+    await agent.output_sink.close()
+
+    bootstrap_ms = steps.pop("bootstrap")
+    return {
+        "mode": mode,
+        "import_ms": (imported - started) * 1000,
+        "bootstrap_ms": bootstrap_ms,
+        "steps_ms": sum(steps.values()),
+        "first_output_ms": (first_output["at"] - started) * 1000,
+        "litellm_loaded": "litellm" in sys.modules,
+    }
+
+
+def run_mode(mode: str, repo: Path, latency: float) -> dict:
+    with tempfile.TemporaryDirectory(prefix="bench-agent-") as work:
+        env = {
+            **os.environ,
+            "AGENT_MODE": mode,
+            "REPO_URL": f"file://{repo}",
+            "REDIS_URL": "redis://bench",
+            "DATABASE_URL_ASYNC": "postgresql+asyncpg://bench",
+            "JOB_TOKEN": "bench",
+            "OPENAI_API_KEY": "sk-bench-0123456789",
+            "ANTHROPIC_API_KEY": "sk-ant-bench-0123456789",
+            "GEMINI_API_KEY": "AIza-bench-0123456789",
+            "AGENT_SUMMARY_CACHE_TTL": "0",
+            "AGENT_DIFF_WATCH_INTERVAL": "0",
+            "TMPDIR": work,
+        }
+        result = subprocess.run(
+            [sys.executable, __file__, "--child", mode, "--latency", str(latency)],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=env,
+        )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    started = time.perf_counter()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=100, help="ms per service")
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = asyncio.run(child(args.child, args.latency / 1000, started))
+        print(json.dumps(result), file=sys.__stdout__, flush=True)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="bench-repo-") as tmp:
+        repo = Path(tmp)
+        build_repo(repo, args.files)
+        print(
+            f"Service latency: {args.latency:.0f} ms, repository: {args.files} files\n"
+        )
+        print(
+            f"{'mode':<14} {'import':>9} {'bootstrap':>10} {'sequential':>11} "
+            f"{'first output':>13}  litellm"
+        )
+        for mode in args.modes:
+            r = run_mode(mode, repo, args.latency)
+            print(
+                f"{r['mode']:<14} {r['import_ms']:>7.0f}ms {r['bootstrap_ms']:>8.0f}ms "
+                f"{r['steps_ms']:>9.0f}ms {r['first_output_ms']:>11.0f}ms  "
+                f"{'loaded' if r['litellm_loaded'] else 'not loaded'}"
+            )
+
+
+if __name__ == "__main__":
+    main()
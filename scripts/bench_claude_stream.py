@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Replay benchmark for Claude CLI stream-json decoding.
+
+Replays a recorded ``--output-format stream-json`` transcript through the
+previous read loop (1 KB reads, buffer re-split and one progress log per
+read and per line) and through ``ClaudeStreamDecoder`` with 64 KB reads.
+
+Usage:
+    python scripts/bench_claude_stream.py [transcript.jsonl] [--repeat 2000]
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agent.services.claude_stream import STREAM_READ_SIZE, ClaudeStreamDecoder
+
+DEFAULT_TRANSCRIPT = (
+    Path(__file__).resolve().parent.parent
+    / "tests"
+    / "fixtures"
+    / "claude_cli_stream.jsonl"
+)
+LEGACY_READ_SIZE = 1024
+
+
+def legacy_decode(data: bytes) -> tuple[int, int, int]:
+    """Previous loop; progress logs are counted instead of written."""
+    buffer = ""
+    reads = events = progress_logs = 0
+    for i in range(0, len(data), LEGACY_READ_SIZE):
+        chunk = data[i : i + LEGACY_READ_SIZE].decode("utf-8", errors="replace")
+        reads += 1
+        buffer += chunk
+        progress_logs += 1
+        _ = f"Received stdout chunk: {chunk[:100]}..."
+        lines = buffer.split("\n")
+        buffer = lines[-1]
+        for line in lines[:-1]:
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            progress_logs += 1
+            if message.get("type") in ("assistant", "result"):
+                events += 1
+    return reads, events, progress_logs
+
+
+def decoder_decode(data: bytes) -> tuple[int, int, int]:
+    decoder = ClaudeStreamDecoder()
+    reads = events = 0
+    for i in range(0, len(data), STREAM_READ_SIZE):
+        reads += 1
+        events += len(decoder.feed(data[i : i + STREAM_READ_SIZE]))
+    events += len(decoder.close())
+    return reads, events, 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("transcript", nargs="?", type=Path, default=DEFAULT_TRANSCRIPT)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    data = args.transcript.read_bytes() * args.repeat
+    print(
+        f"Transcript: {args.transcript.name} x{args.repeat} = {len(data) / 1024:.0f} KB\n"
+    )
+
+    for label, decode in (("legacy", legacy_decode), ("decoder", decoder_decode)):
+        start = time.perf_counter()
+        reads, events, progress_logs = decode(data)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{label:<8} {reads:>8} reads  {events:>8} events  "
+            f"{progress_logs:>8} progress logs  {elapsed * 1000:>9.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
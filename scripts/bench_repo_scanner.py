@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Benchmark for repository scanning on a large synthetic monorepo.
+
+Builds a git repository with ``--files`` small files spread over nested
+packages (plus an ignored build directory and a vendored ``node_modules``),
+then compares the previous ``_analyze_codebase`` scan (``os.walk`` + stat,
+an ``rglob`` size pass including ``.git`` run twice, one ``glob`` per key
+pattern) with ``scan_repository``.
+
+Usage:
+    python scripts/bench_repo_scanner.py [--files 100000] [--keep DIR]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agent.services.repo_scanner import KEY_FILE_PATTERNS, scan_repository
+
+
+def build_monorepo(root: Path, files: int) -> None:
+    """Write ``files`` tracked files plus ignored and vendored noise."""
+    per_dir = 50
+    for i in range(files):
+        package = root / f"services/svc{i // 5000:03d}/pkg{i // per_dir:05d}"
+        if i % per_dir == 0:
+            package.mkdir(parents=True, exist_ok=True)
+        suffix = (".py", ".ts", ".go", ".md")[i % 4]
+        (package / f"module{i}{suffix}").write_text(f"# module {i}\n" * 4)
+    (root / "README.md").write_text("# Monorepo\n")
+    (root / "package.json").write_text("{}\n")
+    (root / ".gitignore").write_text("build/\n")
+    for directory in ("build", "node_modules/dep"):
+        (root / directory).mkdir(parents=True)
+        for i in range(files // 20):
+            (root / directory / f"artifact{i}.js").write_text("x\n")
+
+    env = {**os.environ, "GIT_AUTHOR_NAME": "bench", "GIT_COMMITTER_NAME": "bench"}
+    env |= {"GIT_AUTHOR_EMAIL": "b@example.com", "GIT_COMMITTER_EMAIL": "b@example.com"}
+    for cmd in (["init", "-q"], ["add", "-A"], ["commit", "-qm", "monorepo"]):
+        subprocess.run(
+            ["git", "-c", "gc.auto=0", "-C", str(root), *cmd], check=True, env=env
+        )
+
+
+def legacy_scan(root: Path) -> int:
+    """Previous scan: walk + stat, rglob size twice, glob per key pattern."""
+    total = 0
+    for current, dirs, files in os.walk(root):
+        dirs[:] = [
+            d
+            for d in dirs
+            if not d.startswith(".")
+            and d not in ["node_modules", "vendor", "__pycache__"]
+        ]
+        for file in files:
+            if not file.startswith("."):
+                (Path(current) / file).stat()
+                total += 1
+    for _ in range(2):  # _clone_repository and _analyze_codebase
+        sum(f.stat().st_size for f in root.rglob("*") if f.is_file())
+    for pattern in KEY_FILE_PATTERNS:
+        list(root.glob(pattern))
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--keep", type=Path, help="Reuse/keep the repo here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = args.keep or Path(tmp) / "monorepo"
+        if not (root / ".git").exists():
+            root.mkdir(parents=True, exist_ok=True)
+            start = time.perf_counter()
+            build_monorepo(root, args.files)
+            print(f"Built {args.files} files in {time.perf_counter() - start:.1f}s\n")
+
+        start = time.perf_counter()
+        legacy_files = legacy_scan(root)
+        legacy_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        manifest = scan_repository(root)
+        scanner_s = time.perf_counter() - start
+
+    print(f"legacy   {legacy_files:>8} files  {legacy_s * 1000:>9.1f} ms")
+    print(
+        f"scanner  {manifest.total_files:>8} files  {scanner_s * 1000:>9.1f} ms"
+        f"  ({manifest.source}, {len(manifest.key_files)} key files)"
+    )
+
+
+if __name__ == "__main__":
+    main()
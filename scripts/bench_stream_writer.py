@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Microbenchmark for agent stdout/stderr line framing.
+
+Pushes a 10 MB burst of output through the previous split-based framing and
+through ``LineFramer``, both as one large write and as many small writes.
+
+Usage:
+    python scripts/bench_stream_writer.py [--megabytes 10]
+"""
+
+import argparse
+import sys
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agent.services.line_framer import LineFramer
+
+
+def legacy_frame(fragments: list[str]) -> int:
+    """Previous DatabaseStreamWriter loop: re-split the buffer per line."""
+    buffer = ""
+    lines = 0
+    for text in fragments:
+        buffer += text
+        while "\n" in buffer:
+            line, buffer = buffer.split("\n", 1)
+            if line.strip():
+                lines += 1
+                datetime.now(UTC)
+    return lines
+
+
+def framer_frame(fragments: list[str]) -> int:
+    """LineFramer with one clock read per write."""
+    framer = LineFramer()
+    lines = 0
+    for text in fragments:
+        complete = framer.feed(text)
+        if complete:
+            lines += sum(1 for line in complete if line.strip())
+            time.monotonic()
+    return lines
+
+
+def run(name: str, fragments: list[str]) -> None:
+    for label, frame in (("legacy", legacy_frame), ("framer", framer_frame)):
+        start = time.perf_counter()
+        lines = frame(fragments)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<22} {label:<7} {lines:>8} lines  {elapsed * 1000:>10.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megabytes", type=float, default=10)
+    args = parser.parse_args()
+
+    line = "x" * 79 + "\n"
+    burst = line * int(args.megabytes * 1024 * 1024 / len(line))
+    print(f"Burst: {len(burst) / 1024 / 1024:.1f} MB, {burst.count(chr(10))} lines\n")
+
+    run("single burst write", [burst])
+    run("4KB writes", [burst[i : i + 4096] for i in range(0, len(burst), 4096)])
+    run("per-line writes", burst.splitlines(keepends=True))
+
+
+if __name__ == "__main__":
+    main()
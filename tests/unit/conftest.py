@@ -0,0 +1,110 @@
+"""Shared fixtures for the unit tests."""
+
+import pytest
+
+
+class FakePipeline:
+    """Queues commands and runs them against the fake on execute."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self):
+        return [
+            await getattr(self.redis, name)(*args, **kwargs)
+            for name, args, kwargs in self.commands
+        ]
+
+
+class FakeRedis:
+    """The stream, string, sorted set and hash commands the agent and caches use.
+
+    Set ``fail`` to make reads and writes raise as if Redis were down.
+    """
+
+    def __init__(self):
+        self.fail = False
+        self.entries = []  # (stream, fields) of every XADD, in order
+        self.values = {}
+        self.ttls = {}
+        self.zsets = {}
+        self.hashes = {}
+
+    def _check(self):
+        if self.fail:
+            raise ConnectionError("Redis connection failed")
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def close(self):
+        pass
+
+    async def xadd(self, name, fields):
+        self._check()
+        self.entries.append((name, dict(fields)))
+        return f"{len(self.entries)}-0"
+
+    async def get(self, key):
+        self._check()
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None):
+        self._check()
+        self.values[key] = value
+        self.ttls[key] = ex
+
+    async def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    async def zadd(self, name, mapping):
+        self.zsets.setdefault(name, {}).update(mapping)
+
+    async def zrem(self, name, member):
+        self.zsets.get(name, {}).pop(member, None)
+
+    async def zremrangebyscore(self, name, low, high):
+        zset = self.zsets.get(name, {})
+        for member in [m for m, score in zset.items() if score <= high]:
+            del zset[member]
+
+    async def zcard(self, name):
+        return len(self.zsets.get(name, {}))
+
+    async def zpopmin(self, name, count):
+        zset = self.zsets.get(name, {})
+        popped = sorted(zset.items(), key=lambda item: item[1])[:count]
+        for member, _ in popped:
+            del zset[member]
+        return popped
+
+    async def hincrby(self, name, key, amount):
+        counters = self.hashes.setdefault(name, {})
+        counters[key] = str(int(counters.get(key, 0)) + amount)
+
+    async def hgetall(self, name):
+        return dict(self.hashes.get(name, {}))
+
+
+@pytest.fixture
+def fake_redis():
+    """An in-memory stand-in for a ``redis.asyncio`` client."""
+    return FakeRedis()
@@ -0,0 +1,95 @@
+"""Tests for the agent's concurrent bootstrap stage."""
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+ENV = {
+    "REDIS_URL": "redis://test",
+    "DATABASE_URL_ASYNC": "postgresql://test",
+    "RUN_ID": "test-run-bootstrap",
+    "VARIATION_ID": "0",
+}
+
+
+@pytest.fixture
+def agent(tmp_path):
+    with (
+        patch.dict(os.environ, ENV),
+        patch("agent.main.AIdeatorAgent._setup_file_logging"),
+        patch("agent.main.AIdeatorAgent._check_available_api_keys", return_value={}),
+        patch("tempfile.mkdtemp", return_value=str(tmp_path)),
+    ):
+        from agent.main import AIdeatorAgent
+
+        agent = AIdeatorAgent()
+    agent.log = MagicMock()
+    return agent
+
+
+def slow_step(result=None, error=None, finished=None):
+    async def step(*args, **kwargs):
+        await asyncio.sleep(0.2)
+        if finished is not None:
+            finished.append(step)
+        if error:
+            raise error
+        return result
+
+    return step
+
+
+@pytest.mark.asyncio
+async def test_bootstrap_runs_steps_concurrently(agent):
+    with (
+        patch.object(agent, "_init_redis", slow_step()),
+        patch.object(agent, "_init_summary_cache", slow_step()),
+        patch.object(agent, "_init_database", slow_step()),
+        patch.object(agent, "_fetch_api_keys", slow_step()),
+        patch.object(agent, "_checkout_workspace", slow_step("summary")),
+        patch.object(agent, "_log_cli_version", slow_step()),
+    ):
+        start = time.monotonic()
+        summary = await agent._bootstrap("claude-cli")
+        elapsed = time.monotonic() - start
+
+    assert summary == "summary"
+    assert elapsed < 0.6  # Six 0.2 s steps, not one after another
+
+
+@pytest.mark.asyncio
+async def test_bootstrap_failure_waits_for_every_step(agent):
+    finished = []
+    agent.session_workspace = MagicMock()
+    with (
+        patch.object(agent, "_init_redis", slow_step(error=RuntimeError("no redis"))),
+        patch.object(agent, "_init_database", slow_step(finished=finished)),
+        patch.object(agent, "_fetch_api_keys", slow_step(finished=finished)),
+        patch.object(agent, "_checkout_workspace", slow_step(finished=finished)),
+        patch.object(agent, "_log_cli_version", slow_step(finished=finished)),
+        pytest.raises(RuntimeError, match="no redis"),
+    ):
+        await agent._bootstrap("gemini-cli")
+
+    assert len(finished) == 4
+    agent.session_workspace.release.assert_called_once()
+
+
+def test_importing_the_agent_skips_heavy_dependencies():
+    code = (
+        "import sys, agent.main; print(sorted({'litellm', 'git'} & set(sys.modules)))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=Path(__file__).resolve().parents[2],
+    )
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,96 @@
+"""Tests for the Claude CLI stream-json decoder."""
+
+from pathlib import Path
+
+from agent.services.claude_stream import (
+    ClaudeDecodeError,
+    ClaudeResult,
+    ClaudeStreamDecoder,
+    ClaudeText,
+    ClaudeToolUse,
+)
+
+TRANSCRIPT = Path(__file__).parent.parent / "fixtures" / "claude_cli_stream.jsonl"
+
+
+def _replay(data: bytes, read_size: int) -> tuple[ClaudeStreamDecoder, list]:
+    decoder = ClaudeStreamDecoder()
+    events = []
+    for i in range(0, len(data), read_size):
+        events.extend(decoder.feed(data[i : i + read_size]))
+    events.extend(decoder.close())
+    return decoder, events
+
+
+def test_transcript_events_independent_of_read_size():
+    """Test the same events come out whether reads split lines or not."""
+    data = TRANSCRIPT.read_bytes()
+
+    decoder, events = _replay(data, 64 * 1024)
+    _, small_read_events = _replay(data, 7)
+
+    assert events == small_read_events
+    assert [type(event) for event in events] == [
+        ClaudeText,
+        ClaudeToolUse,
+        ClaudeToolUse,
+        ClaudeText,
+        ClaudeResult,
+    ]
+    assert events[1] == ClaudeToolUse("LS", "toolu_01", {"path": "/workspace/repo"})
+    assert events[3].text.startswith("This is a small Python project.")
+
+    result = events[-1]
+    assert result.subtype == "success"
+    assert not result.is_error
+    assert result.num_turns == 5
+    assert result.total_cost_usd == 0.01873
+    assert result.usage["output_tokens"] == 219
+
+    assert decoder.stats == {
+        "bytes": len(data),
+        "lines": 8,
+        "events": 5,
+        "decode_errors": 0,
+    }
+    assert decoder.message_types == {
+        "system": 1,
+        "assistant": 4,
+        "user": 2,
+        "result": 1,
+    }
+
+
+def test_partial_line_waits_for_newline():
+    """Test nothing is parsed until the line is complete."""
+    decoder = ClaudeStreamDecoder()
+    line = b'{"type":"assistant","message":{"content":[{"type":"text","text":"hi"}]}}'
+
+    assert decoder.feed(line[:20]) == []
+    assert decoder.feed(line[20:]) == []
+    assert decoder.feed(b"\n") == [ClaudeText("hi")]
+    assert decoder.close() == []
+
+
+def test_close_parses_unterminated_tail():
+    """Test a final line without a newline is still decoded."""
+    decoder = ClaudeStreamDecoder()
+
+    assert decoder.feed(b'{"type":"result","is_error":true}') == []
+    assert decoder.close() == [ClaudeResult(is_error=True)]
+
+
+def test_invalid_lines_become_decode_errors():
+    """Test non-JSON output is reported without stopping the stream."""
+    decoder = ClaudeStreamDecoder()
+
+    events = decoder.feed(
+        b"Error: not json\n\n"
+        b'{"type":"assistant","message":{"content":[{"type":"text","text":"ok"}]}}\n'
+    )
+
+    assert isinstance(events[0], ClaudeDecodeError)
+    assert events[0].line == "Error: not json"
+    assert events[1] == ClaudeText("ok")
+    assert decoder.stats["lines"] == 2
+    assert decoder.stats["decode_errors"] == 1
@@ -0,0 +1,85 @@
+"""Tests for the token-budgeted codebase context builder."""
+
+import pytest
+
+from agent.services.context_builder import (
+    DEFAULT_MAX_CONTEXT_TOKENS,
+    build_context,
+    context_budget,
+    estimate_tokens,
+    rank_files,
+    trim_to_budget,
+)
+from agent.services.repo_scanner import scan_repository
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    files = {
+        "README.md": "# Shop\n",
+        "src/auth/login_handler.py": "def login(user):\n    return True\n" * 60,
+        "src/auth/session.py": "SESSION_TTL = 60\n",
+        "src/billing/invoice.py": "def invoice():\n    pass\n",
+        "docs/oauth.md": "OAuth notes\n",
+        "assets/logo.png": "fake-png",
+    }
+    for path, content in files.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(content)
+    return scan_repository(tmp_path)
+
+
+def test_files_are_ranked_against_the_prompt(workspace):
+    """Test key files lead, then path matches; unrelated and binary files drop."""
+    ranked = [entry.path for entry in rank_files(workspace, "Fix the login in auth")]
+
+    assert ranked == [
+        "README.md",
+        "src/auth/login_handler.py",
+        "src/auth/session.py",
+        "docs/oauth.md",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_context_is_packed_into_the_budget(workspace):
+    """Test the most relevant files fit whole, the next one as an excerpt."""
+    roomy = await build_context(workspace, "login auth", 10_000, header="Repo")
+    tight = await build_context(workspace, "login auth", 250, header="Repo")
+
+    assert roomy.files == [
+        "README.md",
+        "src/auth/login_handler.py",
+        "src/auth/session.py",
+        "docs/oauth.md",
+    ]
+    assert roomy.excerpts == []
+    assert roomy.text.startswith("Repo\n")
+    assert "--- src/auth/session.py ---\nSESSION_TTL = 60\n" in roomy.text
+
+    assert tight.files == ["README.md", "src/auth/login_handler.py"]
+    assert tight.excerpts == ["src/auth/login_handler.py"]
+    assert tight.used_tokens <= 250
+
+
+def test_budget_follows_the_model_window():
+    """Test small windows shrink the budget and large ones are capped."""
+    small = context_budget(8192, max_output_tokens=4000, prompt="Explain")
+    large = context_budget(200_000, max_output_tokens=4000, prompt="Explain")
+
+    assert 3000 < small < 4000
+    assert large == DEFAULT_MAX_CONTEXT_TOKENS
+    assert context_budget(None, max_output_tokens=4000, prompt="Explain") == small
+    assert context_budget(4096, max_output_tokens=4000, prompt="Explain") == 0
+
+
+def test_trim_drops_least_relevant_sections():
+    """Test trimming keeps the header and the leading sections only."""
+    summary = "Header\n\n--- a.py ---\n" + "a" * 300 + "\n\n--- b.py ---\n" + "b" * 300
+
+    trimmed = trim_to_budget(summary, 120)
+
+    assert trimmed.startswith("Header\n\n--- a.py ---")
+    assert "b.py" not in trimmed
+    assert estimate_tokens(trimmed) <= 120
+    assert trim_to_budget(summary, 10_000) == summary
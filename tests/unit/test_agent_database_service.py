@@ -0,0 +1,264 @@
+"""Tests for the agent database service bulk ingest and write queue."""
+
+import asyncio
+import os
+from datetime import UTC, datetime
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlmodel import SQLModel, select
+
+from agent.services.database_service import (
+    AGENT_OUTPUT_COLUMNS,
+    AgentDatabaseService,
+    parse_queue_policies,
+)
+from app.models.run import AgentOutput, Run
+
+
+@pytest.fixture
+async def db_service(tmp_path):
+    """Agent database service backed by a throwaway SQLite file."""
+    url = f"sqlite+aiosqlite:///{tmp_path / 'agent.db'}"
+    with patch.dict(os.environ, {"DATABASE_URL_ASYNC": url}):
+        service = AgentDatabaseService(spool_dir=tmp_path / "spool")
+
+    async with service.engine.begin() as conn:
+        await conn.run_sync(
+            SQLModel.metadata.create_all,
+            tables=[Run.__table__, AgentOutput.__table__],
+        )
+    async with service.async_session_maker() as session:
+        session.add(
+            Run(
+                id="run-1",
+                github_url="https://github.com/a/b",
+                prompt="p",
+                variations=1,
+            )
+        )
+        await session.commit()
+
+    yield service
+    await service.engine.dispose()
+
+
+def _item(i, metadata=None, output_type="llm"):
+    return {
+        "run_id": "run-1",
+        "variation_id": 0,
+        "content": f"line {i}",
+        "output_type": output_type,
+        "timestamp": datetime.utcnow(),
+        "metadata": metadata,
+    }
+
+
+@pytest.mark.asyncio
+async def test_insert_mode_persists_rows_and_metadata(db_service):
+    """Test the multi-row INSERT path stores every row with its metadata."""
+    assert db_service._ingest_mode == "insert"
+
+    await db_service._write_batch(
+        [_item(0, {"source": "test", "at": datetime(2025, 1, 1, tzinfo=UTC)}), _item(1)]
+    )
+
+    async with db_service.async_session_maker() as session:
+        rows = (
+            (await session.execute(select(AgentOutput).order_by(AgentOutput.id)))
+            .scalars()
+            .all()
+        )
+
+    assert [row.content for row in rows] == ["line 0", "line 1"]
+    assert rows[0].output_metadata == {
+        "source": "test",
+        "at": "2025-01-01 00:00:00+00:00",
+    }
+    assert rows[1].output_metadata is None
+
+
+@pytest.mark.asyncio
+async def test_copy_mode_uses_copy_records(db_service):
+    """Test COPY mode sends tuples in column order and skips INSERT."""
+    db_service._ingest_mode = "copy"
+    db_service._copy_rows = AsyncMock()
+    db_service._insert_rows = AsyncMock()
+
+    await db_service._write_batch([_item(0, {"k": "v"})])
+
+    db_service._copy_rows.assert_awaited_once()
+    rows = db_service._copy_rows.await_args.args[0]
+    assert set(rows[0]) == set(AGENT_OUTPUT_COLUMNS)
+    db_service._insert_rows.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_copy_failure_falls_back_to_insert(db_service):
+    """Test a failing COPY still persists the batch via INSERT."""
+    db_service._ingest_mode = "copy"
+    db_service._copy_rows = AsyncMock(side_effect=RuntimeError("no copy"))
+
+    await db_service._write_batch([_item(0)])
+
+    async with db_service.async_session_maker() as session:
+        rows = (await session.execute(select(AgentOutput))).scalars().all()
+    assert len(rows) == 1
+
+
+@pytest.mark.asyncio
+async def test_full_batch_wakes_writer_before_interval(db_service):
+    """Test a full batch is drained without waiting for the interval."""
+    db_service._batch_size = 10
+    db_service._batch_interval = 60
+    db_service._write_batch = AsyncMock()
+
+    await db_service.write_agent_outputs([_item(i) for i in range(25)])
+    for _ in range(20):
+        if db_service._write_batch.await_count >= 2:
+            break
+        await asyncio.sleep(0.01)
+
+    sizes = [len(call.args[0]) for call in db_service._write_batch.await_args_list]
+    assert sizes[:2] == [10, 10]
+
+    db_service._shutdown = True
+    db_service._batch_task.cancel()
+
+
+async def _stored_contents(db_service):
+    async with db_service.async_session_maker() as session:
+        rows = (
+            (await session.execute(select(AgentOutput).order_by(AgentOutput.id)))
+            .scalars()
+            .all()
+        )
+    return [row.content for row in rows]
+
+
+def _stall_writer(db_service):
+    """Pretend the batch writer is stuck on a slow database."""
+    db_service._batch_task = asyncio.create_task(asyncio.sleep(3600))
+
+
+def test_parse_queue_policies():
+    """Test policy overrides merge over defaults and reject unknown values."""
+    assert parse_queue_policies(None) == {"logging": "sample"}
+    assert parse_queue_policies("llm=block, logging=drop,stdout=bogus") == {
+        "llm": "block",
+        "logging": "drop",
+        "stdout": "block",
+    }
+
+
+@pytest.mark.asyncio
+async def test_full_queue_samples_logging(db_service):
+    """Test logging is sampled when the queue is full and survivors spill."""
+    _stall_writer(db_service)
+    db_service._max_queue_size = 3
+    db_service._block_timeout = 0.01
+
+    await db_service.write_agent_outputs([_item(i) for i in range(3)])
+    await db_service.write_agent_outputs(
+        [_item(i, output_type="logging") for i in range(20)]
+    )
+
+    assert len(db_service._write_queue) == 3
+    assert db_service.queue_stats["sampled_out"] == 18
+    assert db_service.queue_stats["spilled"] == 2
+    db_service._batch_task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drop_policy(db_service):
+    """Test the drop policy discards items instead of waiting."""
+    _stall_writer(db_service)
+    db_service._max_queue_size = 2
+    db_service._queue_policies["stdout"] = "drop"
+
+    await db_service.write_agent_outputs(
+        [_item(i, output_type="stdout") for i in range(5)]
+    )
+
+    assert len(db_service._write_queue) == 2
+    assert db_service.queue_stats["dropped"] == 3
+    db_service._batch_task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_blocked_llm_spills_and_replays(db_service):
+    """Test blocked llm output spills to disk and is replayed in full."""
+    _stall_writer(db_service)
+    db_service._max_queue_size = 2
+    db_service._block_timeout = 0.01
+
+    await db_service.write_agent_outputs([_item(i) for i in range(5)])
+
+    assert [item["content"] for item in db_service._write_queue] == [
+        "line 0",
+        "line 1",
+    ]
+    assert db_service.queue_stats["blocked"] == 3
+    assert len(db_service.spool) == 1
+    db_service._batch_task.cancel()
+
+    await db_service._replay_spool()
+
+    assert len(db_service.spool) == 0
+    assert await _stored_contents(db_service) == ["line 2", "line 3", "line 4"]
+
+
+@pytest.mark.asyncio
+async def test_blocked_producer_resumes_when_writer_drains(db_service):
+    """Test a blocked producer continues once the writer makes room."""
+    db_service._max_queue_size = 2
+    db_service._batch_size = 2
+    db_service._batch_interval = 60
+    db_service._block_timeout = 5
+
+    await asyncio.wait_for(
+        db_service.write_agent_outputs([_item(i) for i in range(6)]), timeout=2
+    )
+    for _ in range(50):
+        if not db_service._write_queue:
+            break
+        await asyncio.sleep(0.01)
+
+    assert db_service.queue_stats["spilled"] == 0
+    assert await _stored_contents(db_service) == [f"line {i}" for i in range(6)]
+
+    db_service._shutdown = True
+    db_service._batch_task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_spills_and_disconnect_replays(db_service):
+    """Test a batch rejected by the database is kept on disk and replayed."""
+    original_insert = db_service._insert_rows
+    db_service._insert_rows = AsyncMock(side_effect=RuntimeError("db down"))
+
+    assert not await db_service._write_or_spill([_item(0), _item(1)])
+    assert len(db_service.spool) == 1
+
+    db_service._insert_rows = original_insert
+    await db_service.disconnect()
+
+    assert len(db_service.spool) == 0
+    assert db_service.queue_stats["replayed"] == 2
+    assert await _stored_contents(db_service) == ["line 0", "line 1"]
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_queue_and_reports_completion(db_service):
+    """Test flush() acknowledges every queued row before returning."""
+    db_service._batch_size = 2
+    db_service._batch_interval = 60
+
+    await db_service.write_agent_outputs([_item(i) for i in range(5)])
+
+    assert await db_service.flush()
+    assert db_service.pending == 0
+    assert await _stored_contents(db_service) == [f"line {i}" for i in range(5)]
+
+    db_service._shutdown = True
+    db_service._batch_task.cancel()
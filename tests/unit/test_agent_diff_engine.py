@@ -0,0 +1,87 @@
+"""Tests for single-pass workspace diffs."""
+
+import subprocess
+
+import pytest
+
+from agent.services.diff_engine import collect_diffs
+
+
+def git(repo, *args):
+    subprocess.run(["git", "-C", str(repo), *args], check=True, capture_output=True)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    git(tmp_path, "init", "-q")
+    files = {
+        "app.py": "def main():\n    return 1\n",
+        "old_name.py": "".join(f"line {i}\n" for i in range(20)),
+        "obsolete.txt": "bye\n",
+        "big.txt": "small\n",
+        ".gitignore": "*.log\n",
+    }
+    for path, content in files.items():
+        (tmp_path / path).write_text(content)
+    git(tmp_path, "add", "-A")
+    git(tmp_path, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "i")
+    return tmp_path
+
+
+def test_all_kinds_of_changes_in_one_pass(repo):
+    """Test modified, deleted, renamed, untracked and binary files."""
+    (repo / "app.py").write_text("def main():\n    return 2\n")
+    (repo / "obsolete.txt").unlink()
+    git(repo, "mv", "old_name.py", "new_name.py")
+    (repo / "src").mkdir()
+    (repo / "src" / "new.py").write_text("x = 1\ny = 2\n")
+    (repo / "logo.bin").write_bytes(b"\0\1\2")
+    (repo / "debug.log").write_text("ignored\n")
+
+    diffs = {diff.path: diff for diff in collect_diffs(repo)}
+
+    assert sorted(diffs) == [
+        "app.py",
+        "logo.bin",
+        "new_name.py",
+        "obsolete.txt",
+        "src/new.py",
+    ]
+    assert diffs["app.py"].status == "modified"
+    assert (diffs["app.py"].additions, diffs["app.py"].deletions) == (1, 1)
+    assert "-    return 1\n+    return 2\n" in diffs["app.py"].patch
+    assert diffs["obsolete.txt"].status == "deleted"
+    assert diffs["new_name.py"].status == "renamed"
+    assert diffs["new_name.py"].old_path == "old_name.py"
+    assert diffs["src/new.py"].status == "added"
+    assert diffs["src/new.py"].additions == 2
+    assert diffs["logo.bin"].binary
+
+    # The workspace's own index is left alone
+    status = subprocess.run(
+        ["git", "-C", str(repo), "status", "--porcelain"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    assert "?? src/" in status
+
+
+def test_large_patches_keep_header_and_stats(repo):
+    """Test a patch over the cap is truncated but still counted."""
+    (repo / "big.txt").write_text("x" * 100 + "\n" * 500)
+
+    (diff,) = collect_diffs(repo, max_file_bytes=1000)
+
+    assert diff.truncated
+    assert diff.additions == 500
+    assert diff.patch.startswith("diff --git a/big.txt b/big.txt\n")
+    assert "diff truncated" in diff.patch
+    output = diff.to_output()
+    assert output["oldFile"] == {"name": "big.txt", "content": ""}
+    assert output["hunks"] == [diff.patch]
+
+
+def test_clean_workspace_has_no_diffs(repo):
+    """Test nothing is reported without changes."""
+    assert collect_diffs(repo) == []
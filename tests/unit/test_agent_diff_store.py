@@ -0,0 +1,111 @@
+"""Tests for content-addressed diff storage."""
+
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import SQLModel
+
+from agent.services.database_service import AgentDatabaseService
+from agent.services.diff_engine import FileDiff
+from agent.services.diff_store import build_manifest, encode_blob
+from app.api.v1.runs import get_run_diff_blob, get_run_diffs
+from app.models.run import AgentOutput, DiffBlob, Run
+from app.services.diff_store import decode_blob
+
+PATCH = "diff --git a/app.py b/app.py\n@@ -1 +1 @@\n-x = 1\n+x = 2\n"
+
+
+def _diff(path, patch=PATCH):
+    return FileDiff(
+        path=path,
+        old_path=path,
+        status="modified",
+        additions=1,
+        deletions=1,
+        patch=patch,
+    )
+
+
+@pytest.fixture
+async def db_service(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'agent.db'}"
+    with patch.dict(os.environ, {"DATABASE_URL_ASYNC": url}):
+        service = AgentDatabaseService()
+
+    async with service.engine.begin() as conn:
+        await conn.run_sync(
+            SQLModel.metadata.create_all,
+            tables=[Run.__table__, AgentOutput.__table__, DiffBlob.__table__],
+        )
+    async with service.async_session_maker() as session:
+        session.add(
+            Run(
+                id="run-1",
+                github_url="https://github.com/a/b",
+                prompt="p",
+                variations=2,
+            )
+        )
+        await session.commit()
+
+    yield service
+    await service.engine.dispose()
+
+
+def test_identical_diffs_share_one_blob():
+    """Test manifests reference blobs by hash and duplicates collapse."""
+    entries, blobs = build_manifest(
+        [_diff("a.py"), _diff("b.py"), _diff("c.py", patch="")]
+    )
+
+    (blob,) = blobs.values()
+    assert [entry["blob"] for entry in entries] == [blob.hash, blob.hash, None]
+    assert "hunks" not in entries[0]
+    assert entries[0]["newFile"] == {"name": "a.py", "content": ""}
+    assert blob.size == len(PATCH)
+    assert decode_blob(blob.codec, blob.data) == PATCH
+    assert encode_blob(PATCH).hash == blob.hash
+
+
+@pytest.mark.asyncio
+async def test_blobs_are_stored_once_and_served_from_manifests(db_service):
+    """Test a second variation uploads nothing new and the API inlines hunks."""
+    entries, blobs = build_manifest([_diff("app.py")])
+    assert await db_service.write_diff_blobs(list(blobs.values())) == 1
+    assert await db_service.write_diff_blobs(list(blobs.values())) == 0
+
+    (blob_hash,) = blobs
+    async with db_service.async_session_maker() as session:
+        session.add(
+            AgentOutput(
+                run_id="run-1",
+                variation_id=0,
+                content=json.dumps(entries),  # Any JSON spacing
+                output_type="diffs",
+            )
+        )
+        await session.commit()
+
+        (listed,) = await get_run_diffs(
+            "run-1", variation_id=0, hunks=False, db=session, current_user=None
+        )
+        (full,) = await get_run_diffs(
+            "run-1", variation_id=0, hunks=True, db=session, current_user=None
+        )
+        single = await get_run_diff_blob(
+            "run-1", blob_hash, db=session, current_user=None
+        )
+        with pytest.raises(HTTPException) as missing:
+            await get_run_diff_blob("run-1", "0" * 64, db=session, current_user=None)
+        with pytest.raises(HTTPException) as invalid:
+            await get_run_diff_blob("run-1", "%", db=session, current_user=None)
+
+    assert listed["blob"] == blob_hash
+    assert "hunks" not in listed
+    assert full["hunks"] == [PATCH]
+    assert single == {"blob": blob_hash, "hunks": [PATCH]}
+    assert missing.value.status_code == 404
+    assert invalid.value.status_code == 400
@@ -0,0 +1,88 @@
+"""Tests for progressive workspace diffs."""
+
+import asyncio
+import subprocess
+
+import pytest
+
+from agent.services.diff_engine import collect_diffs
+from agent.services.diff_watcher import DiffWatcher
+
+
+def git(repo, *args):
+    subprocess.run(["git", "-C", str(repo), *args], check=True, capture_output=True)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    git(tmp_path, "init", "-q")
+    (tmp_path / "app.py").write_text("x = 1\n")
+    (tmp_path / "util.py").write_text("y = 1\n")
+    git(tmp_path, "add", "-A")
+    git(tmp_path, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "i")
+    return tmp_path
+
+
+@pytest.fixture
+def updates():
+    return []
+
+
+@pytest.fixture
+def watcher(repo, updates):
+    async def publish(changed, removed):
+        updates.append(([diff.path for diff in changed], removed))
+
+    return DiffWatcher(repo, publish, interval=0.05)
+
+
+@pytest.mark.asyncio
+async def test_files_are_diffed_once_settled(repo, watcher, updates):
+    """Test a change is published after one stable poll and never re-diffed."""
+    (repo / "app.py").write_text("x = 2\n")
+
+    assert not await watcher.poll()  # Just seen
+    assert await watcher.poll()  # Unchanged since: settled
+    assert not await watcher.poll()  # Nothing new
+
+    assert updates == [(["app.py"], [])]
+    assert watcher.stats["files_diffed"] == 1
+    assert "+x = 2" in watcher.diffs[0].patch
+
+
+@pytest.mark.asyncio
+async def test_final_poll_matches_a_full_diff(repo, watcher, updates):
+    """Test reverted files are removed and the snapshot ends up complete."""
+    (repo / "app.py").write_text("x = 2\n")
+    await watcher.poll()
+    await watcher.poll()
+
+    git(repo, "checkout", "app.py")
+    (repo / "util.py").write_text("y = 2\n")
+    (repo / "new.py").write_text("z = 1\n")
+    await watcher.poll(settle=False)
+
+    changed, removed = updates[-1]
+    assert (sorted(changed), removed) == (["new.py", "util.py"], ["app.py"])
+    assert watcher.diffs == collect_diffs(repo)
+
+
+@pytest.mark.asyncio
+async def test_background_polling(repo, watcher, updates):
+    """Test the watcher publishes on its own until stopped."""
+    published = asyncio.Event()
+    record = watcher.publish
+
+    async def publish(changed, removed):
+        await record(changed, removed)
+        published.set()
+
+    watcher.publish = publish
+    watcher.interval = 0  # Poll back to back; the edit below settles at once
+    (repo / "util.py").write_text("y = 3\n")
+    watcher.start()
+    await asyncio.wait_for(published.wait(), timeout=10)
+    await watcher.stop()
+
+    assert updates == [(["util.py"], [])]
+    assert watcher.stats["polls"] >= 2
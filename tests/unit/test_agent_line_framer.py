@@ -0,0 +1,48 @@
+"""Tests for incremental stdout/stderr line framing."""
+
+import io
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from agent.services.line_framer import LineFramer
+from agent.services.log_policy import LogPolicy
+
+
+def test_framer_joins_fragments_across_writes():
+    """Test partial lines are carried over until their newline arrives."""
+    framer = LineFramer()
+
+    assert framer.feed("hel") == []
+    assert framer.feed("lo\nwor") == ["hello"]
+    assert framer.feed("ld\n\nnext\n") == ["world", "", "next"]
+    assert framer.feed("tail") == []
+    assert framer.drain() == "tail"
+    assert framer.drain() == ""
+
+
+def test_framer_handles_large_multiline_write():
+    """Test one large write is framed in a single pass."""
+    framer = LineFramer()
+    lines = [f"line {i}" for i in range(10_000)]
+
+    assert framer.feed("\n".join(lines) + "\n") == lines
+
+
+def test_stream_writer_feeds_sink_in_batches():
+    """Test DatabaseStreamWriter hands complete lines to the sink in rows."""
+    from agent.main import DatabaseStreamWriter
+
+    sink = MagicMock()
+    agent = SimpleNamespace(output_sink=sink, log_policy=LogPolicy(min_level="INFO"))
+    original = io.StringIO()
+    writer = DatabaseStreamWriter(original, "stdout", agent)
+
+    text = "".join(f"out {i}\n" for i in range(25))
+    writer.write(text + '{"level": "DEBUG", "message": "x"}\npartial')
+    writer.flush()
+
+    assert original.getvalue().endswith("partial")
+    rows = [call.args for call in sink.record.call_args_list]
+    assert [len(content.split("\n")) for _, content in rows] == [10, 10, 5, 1]
+    assert rows[-1] == ("stdout", "partial")
+    assert all(stream == "stdout" for stream, _ in rows)
@@ -0,0 +1,68 @@
+"""Tests for the agent log verbosity policy."""
+
+import os
+from unittest.mock import patch
+
+from agent.services.log_policy import LogPolicy, parse_rate_limits
+
+
+def test_min_level_gates_messages():
+    """Test messages below the minimum level are not persisted."""
+    policy = LogPolicy(min_level="INFO", rate_limits={})
+
+    assert not policy.enabled("DEBUG")
+    assert policy.enabled("WARNING")
+    assert not policy.allow("DEBUG", "🔧 chunk")
+    assert policy.allow("INFO", "hello")
+    assert policy.stats == {"allowed": 1, "below_level": 1, "rate_limited": 0}
+
+
+def test_rate_cap_is_per_kind_and_samples_overflow():
+    """Test each message kind has its own bucket and overflow is sampled."""
+    policy = LogPolicy(min_level="DEBUG", rate_limits={"DEBUG": 1}, sample_rate=5)
+
+    with patch("agent.services.log_policy.time.monotonic", return_value=100.0):
+        allowed = [policy.allow("DEBUG", f"[CHUNK] #{i}") for i in range(12)]
+        # A different kind still has its full burst
+        assert policy.allow("DEBUG", "[OTHER] x")
+
+    # Burst of 2, then one in five of the remaining ten
+    assert allowed == [True, True] + [True, False, False, False, False] * 2
+    assert policy.stats["rate_limited"] == 8
+
+
+def test_unlimited_levels_are_not_rate_capped():
+    """Test levels without a rate limit always pass once enabled."""
+    policy = LogPolicy(min_level="INFO", rate_limits={"INFO": 1})
+
+    assert all(policy.allow("ERROR", "[DB] failed") for _ in range(100))
+
+
+def test_allow_line_filters_structured_debug_prints():
+    """Test captured JSON debug lines are dropped, plain output is kept."""
+    policy = LogPolicy(min_level="INFO")
+
+    assert not policy.allow_line('{"level": "DEBUG", "message": "🔧 About to"}')
+    assert policy.allow_line('{"level": "INFO", "message": "ok"}')
+    assert policy.allow_line("plain print output")
+    assert LogPolicy(min_level="DEBUG").allow_line('{"level": "DEBUG"}')
+
+
+def test_from_env_reads_job_settings():
+    """Test the policy is built from LOG_LEVEL and the rate/sample knobs."""
+    env = {
+        "LOG_LEVEL": "warning",
+        "AGENT_LOG_RATE_LIMITS": "INFO=5, bogus=1",
+        "AGENT_LOG_SAMPLE_RATE": "3",
+    }
+    with patch.dict(os.environ, env):
+        os.environ.pop("DEBUG", None)
+        policy = LogPolicy.from_env()
+
+    assert policy.min_level == "WARNING"
+    assert policy.rate_limits == {"DEBUG": 10.0, "INFO": 5.0}
+    assert policy.sample_rate == 3
+    assert parse_rate_limits(None) == {"DEBUG": 10.0, "INFO": 50.0}
+
+    with patch.dict(os.environ, {"LOG_LEVEL": "INFO", "DEBUG": "true"}):
+        assert LogPolicy.from_env().min_level == "DEBUG"
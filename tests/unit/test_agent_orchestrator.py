@@ -21,10 +21,9 @@ class TestAgentOrchestrator:
         """Create a mock Kubernetes service."""
         service = Mock(spec=KubernetesService)
         service.create_agent_job = AsyncMock(
-            side_effect=lambda run_id,
-            variation_id,
-            *_args,
-            **_kwargs: f"agent-job-{run_id}-{variation_id}"
+            side_effect=lambda run_id, variation_id, *_args, **_kwargs: (
+                f"agent-job-{run_id}-{variation_id}"
+            )
         )
         service.get_job_status = AsyncMock(
             return_value={"status": "running", "phase": "Running"}
@@ -466,6 +465,274 @@ class TestAgentOrchestrator:
         ]
         assert len(status_calls) >= 1
 
+    @pytest.mark.asyncio
+    async def test_code_mode_variations_share_prep_snapshot(
+        self, orchestrator, mock_kubernetes_service, mock_settings
+    ):
+        """Test code-mode runs pin one commit and start the prep job alongside."""
+        run_id = "test-run-prep"
+        orchestrator.active_runs[run_id] = {"status": "starting", "jobs": []}
+        mock_settings.agent_snapshot_dir = "/shared/snapshots"
+        mock_settings.agent_snapshot_wait = 60
+        mock_kubernetes_service.create_prep_job = AsyncMock(
+            return_value=f"agent-{run_id}-prep"
+        )
+        mock_kubernetes_service.get_job_status.return_value = {"status": "running"}
+
+        with (
+            patch.object(
+                orchestrator, "_resolve_repo_sha", new=AsyncMock(return_value="abc")
+            ),
+            patch.object(orchestrator, "_wait_for_jobs_completion", new=AsyncMock()),
+        ):
+            await orchestrator._execute_individual_jobs(
+                run_id,
+                "https://github.com/test/repo",
+                "Test prompt",
+                2,
+                user_id="test-user",
+                agent_mode="claude-cli",
+            )
+
+        mock_kubernetes_service.create_prep_job.assert_called_once_with(
+            run_id, "https://github.com/test/repo", "abc", prompt="Test prompt"
+        )
+        for call in mock_kubernetes_service.create_agent_job.call_args_list:
+            assert call.kwargs["repo_sha"] == "abc"
+            assert call.kwargs["snapshot_wait"] == 60
+        assert orchestrator.active_runs[run_id]["jobs"][0] == f"agent-{run_id}-prep"
+        # Not polled before the variations started; removed once they finished
+        mock_kubernetes_service.get_job_status.assert_called_once_with(
+            f"agent-{run_id}-prep"
+        )
+        mock_kubernetes_service.delete_job.assert_called_once_with(
+            f"agent-{run_id}-prep"
+        )
+
+    @pytest.mark.asyncio
+    async def test_failed_prep_falls_back_to_pinned_clones(
+        self, orchestrator, mock_kubernetes_service, mock_settings
+    ):
+        """Test variations don't wait for a prep job that could not be created."""
+        run_id = "test-run-prep-failed"
+        orchestrator.active_runs[run_id] = {"status": "starting", "jobs": []}
+        mock_settings.agent_snapshot_dir = "/shared/snapshots"
+        mock_settings.agent_snapshot_wait = 60
+        mock_kubernetes_service.create_prep_job = AsyncMock(
+            side_effect=RuntimeError("quota exceeded")
+        )
+
+        with (
+            patch.object(
+                orchestrator, "_resolve_repo_sha", new=AsyncMock(return_value="abc")
+            ),
+            patch.object(orchestrator, "_wait_for_jobs_completion", new=AsyncMock()),
+        ):
+            await orchestrator._execute_individual_jobs(
+                run_id,
+                "https://github.com/test/repo",
+                "Test prompt",
+                2,
+                user_id="test-user",
+                agent_mode="claude-cli",
+            )
+
+        for call in mock_kubernetes_service.create_agent_job.call_args_list:
+            assert call.kwargs["repo_sha"] == "abc"
+            assert call.kwargs["snapshot_wait"] == 0
+        assert orchestrator.active_runs[run_id]["jobs"] == [
+            f"agent-job-{run_id}-{i}" for i in range(2)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_chat_mode_skips_repository_prep(
+        self, orchestrator, mock_kubernetes_service
+    ):
+        """Test runs without code-mode variations don't resolve the commit."""
+        run_id = "test-run-chat"
+        orchestrator.active_runs[run_id] = {"status": "starting", "jobs": []}
+
+        with (
+            patch.object(orchestrator, "_resolve_repo_sha", new=AsyncMock()) as resolve,
+            patch.object(orchestrator, "_wait_for_jobs_completion", new=AsyncMock()),
+        ):
+            await orchestrator._execute_individual_jobs(
+                run_id, "https://github.com/test/repo", "Hi", 1, user_id="test-user"
+            )
+
+        resolve.assert_not_called()
+        call = mock_kubernetes_service.create_agent_job.call_args
+        assert call.kwargs["repo_sha"] is None
+
+    @pytest.mark.asyncio
+    async def test_chat_repo_context_pins_the_commit_once(
+        self, orchestrator, mock_kubernetes_service, mock_settings
+    ):
+        """Test opted-in chat runs get the commit from the orchestrator, no prep."""
+        run_id = "test-run-chat-context"
+        orchestrator.active_runs[run_id] = {"status": "starting", "jobs": []}
+        mock_settings.agent_chat_repo_context = True
+        mock_settings.agent_batch_chat_variations = False
+        mock_settings.agent_snapshot_dir = "/shared/snapshots"
+        mock_kubernetes_service.create_prep_job = AsyncMock()
+
+        with (
+            patch.object(
+                orchestrator, "_resolve_repo_sha", new=AsyncMock(return_value="abc")
+            ) as resolve,
+            patch.object(orchestrator, "_wait_for_jobs_completion", new=AsyncMock()),
+        ):
+            await orchestrator._execute_individual_jobs(
+                run_id, "https://github.com/test/repo", "Hi", 2, user_id="test-user"
+            )
+
+        resolve.assert_awaited_once()
+        mock_kubernetes_service.create_prep_job.assert_not_called()
+        for call in mock_kubernetes_service.create_agent_job.call_args_list:
+            assert call.kwargs["repo_sha"] == "abc"
+
+    @pytest.mark.asyncio
+    async def test_chat_variations_share_a_batch_job(
+        self, orchestrator, mock_kubernetes_service, mock_settings
+    ):
+        """Test opted-in chat-mode variations run in one job, code modes alone."""
+        run_id = "test-run-batch"
+        orchestrator.active_runs[run_id] = {"status": "starting", "jobs": []}
+        mock_settings.agent_batch_chat_variations = True
+        mock_settings.agent_snapshot_dir = None
+        mock_kubernetes_service.create_batch_job = AsyncMock(
+            return_value=f"agent-{run_id}-batch"
+        )
+        db_session = AsyncMock()
+        db_session.get.return_value = Run(
+            id=run_id,
+            github_url="https://github.com/test/repo",
+            prompt="Hi",
+            variations=3,
+            agent_config={
+                "model_variants": [
+                    {"model_definition_id": "gpt-4o", "agent_mode": "litellm"},
+                    {"model_definition_id": "claude", "agent_mode": "claude-cli"},
+                    {"model_definition_id": "gpt-4o-mini", "agent_mode": "litellm"},
+                ]
+            },
+        )
+
+        with (
+            patch.object(
+                orchestrator, "_resolve_repo_sha", new=AsyncMock(return_value=None)
+            ),
+            patch.object(orchestrator, "_wait_for_jobs_completion", new=AsyncMock()),
+        ):
+            await orchestrator._execute_individual_jobs(
+                run_id,
+                "https://github.com/test/repo",
+                "Hi",
+                3,
+                user_id="test-user",
+                db_session=db_session,
+            )
+
+        call = mock_kubernetes_service.create_agent_job.call_args
+        assert mock_kubernetes_service.create_agent_job.call_count == 1
+        assert call.kwargs["variation_id"] == 1
+        batch = mock_kubernetes_service.create_batch_job.call_args.kwargs
+        assert [v["variation_id"] for v in batch["variations"]] == [0, 2]
+        assert [v["model"] for v in batch["variations"]] == ["gpt-4o", "gpt-4o-mini"]
+        assert all(v["job_token"] for v in batch["variations"])
+        assert orchestrator.active_runs[run_id]["jobs"] == [
+            "agent-job-test-run-batch-1",
+            f"agent-{run_id}-batch",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_chat_variations_run_in_process(
+        self, orchestrator, mock_kubernetes_service, mock_settings
+    ):
+        """Test chat-mode variations skip Kubernetes with the chat executor."""
+        run_id = "test-run-inprocess"
+        orchestrator.active_runs[run_id] = {"status": "starting", "jobs": []}
+        orchestrator.chat_executor = Mock()
+        orchestrator.chat_executor.run_variation = AsyncMock(return_value=True)
+        mock_settings.agent_batch_chat_variations = True
+        mock_settings.agent_snapshot_dir = None
+        db_session = AsyncMock()
+        db_session.get.return_value = Run(
+            id=run_id,
+            github_url="https://github.com/test/repo",
+            prompt="Hi",
+            variations=3,
+            agent_config={
+                "model_variants": [
+                    {"model_definition_id": "gpt-4o", "agent_mode": "litellm"},
+                    {"model_definition_id": "claude", "agent_mode": "claude-cli"},
+                    {"model_definition_id": "gpt-4o-mini", "agent_mode": "litellm"},
+                ]
+            },
+        )
+
+        with (
+            patch.object(
+                orchestrator, "_resolve_repo_sha", new=AsyncMock(return_value=None)
+            ),
+            patch.object(orchestrator, "_wait_for_jobs_completion", new=AsyncMock()),
+        ):
+            await orchestrator._execute_individual_jobs(
+                run_id,
+                "https://github.com/test/repo",
+                "Hi",
+                3,
+                user_id="test-user",
+                db_session=db_session,
+            )
+
+        assert mock_kubernetes_service.create_agent_job.call_count == 1
+        call = mock_kubernetes_service.create_agent_job.call_args
+        assert call.kwargs["variation_id"] == 1
+        calls = orchestrator.chat_executor.run_variation.await_args_list
+        assert [call.args[1] for call in calls] == [0, 2]
+        assert [call.kwargs["model"] for call in calls] == ["gpt-4o", "gpt-4o-mini"]
+        assert orchestrator.active_runs[run_id]["jobs"] == [
+            "agent-job-test-run-inprocess-1"
+        ]
+        assert run_id not in orchestrator._chat_tasks
+
+    def test_session_workspace_is_opt_in(self, orchestrator, mock_settings):
+        """Test only opted-in session runs get a persistent workspace."""
+        mock_settings.agent_session_workspace_dir = "/shared/sessions/"
+        run = Run(
+            id="r",
+            github_url="https://github.com/test/repo",
+            prompt="p",
+            variations=1,
+            session_id="s-1",
+            agent_config={"persist_workspace": True},
+        )
+
+        assert orchestrator._session_workspace(run) == "/shared/sessions/s-1"
+        run.agent_config = {}
+        assert orchestrator._session_workspace(run) is None
+        run.agent_config = {"persist_workspace": True}
+        mock_settings.agent_session_workspace_dir = None
+        assert orchestrator._session_workspace(run) is None
+
+    @pytest.mark.asyncio
+    async def test_resolve_repo_sha(self, orchestrator, tmp_path):
+        """Test the remote HEAD is resolved with git ls-remote."""
+        import git
+
+        repo = git.Repo.init(tmp_path / "repo", initial_branch="main")
+        with repo.config_writer() as config:
+            config.set_value("user", "name", "Test")
+            config.set_value("user", "email", "test@example.com")
+        repo.index.commit("Initial commit")
+
+        sha = await orchestrator._resolve_repo_sha(str(tmp_path / "repo"))
+        missing = await orchestrator._resolve_repo_sha(str(tmp_path / "missing"))
+
+        assert sha == repo.head.commit.hexsha
+        assert missing is None
+
     @pytest.mark.asyncio
     async def test_execute_variations_redis_not_healthy(
         self, orchestrator, mock_redis_service
@@ -0,0 +1,91 @@
+"""Tests for the bounded subprocess output fan-out."""
+
+import asyncio
+
+import pytest
+
+from agent.services.process_fanout import ProcessFanOut
+
+
+def make_stream(*chunks: bytes) -> asyncio.StreamReader:
+    stream = asyncio.StreamReader()
+    for chunk in chunks:
+        stream.feed_data(chunk)
+    stream.feed_eof()
+    return stream
+
+
+@pytest.mark.asyncio
+async def test_lines_are_framed_and_batched_per_stream():
+    """Test split reads, blank lines and the unterminated tail are handled."""
+    handled = []
+
+    async def handler(lines):
+        handled.append(lines)
+
+    fan_out = ProcessFanOut({"stdout": handler})
+    await fan_out.run(
+        {"stdout": make_stream(b"one\ntw", b"o\n\n  \nth\xc3", b"\xa9 tail")}
+    )
+
+    assert [line for batch in handled for line in batch] == ["one", "two", "thé tail"]
+    assert fan_out.stats["lines"] == 3
+    assert fan_out.stats["batches"] == len(handled)
+
+
+@pytest.mark.asyncio
+async def test_slow_handler_does_not_block_readers_until_queue_is_full():
+    """Test readers keep draining the pipe while the consumer is slow."""
+    release = asyncio.Event()
+    handled = []
+
+    async def slow_handler(lines):
+        await release.wait()
+        handled.extend(lines)
+
+    stream = make_stream(b"".join(b"line %d\n" % i for i in range(50)))
+    fan_out = ProcessFanOut({"stdout": slow_handler}, max_queued_lines=100)
+    task = asyncio.create_task(fan_out.run({"stdout": stream}))
+
+    await asyncio.sleep(0.05)
+    # The whole pipe was read even though no batch has been handled yet
+    assert stream.at_eof()
+    assert handled == []
+
+    release.set()
+    await task
+    assert handled == [f"line {i}" for i in range(50)]
+    assert fan_out.stats["reader_waits"] == 0
+    assert fan_out.stats["batches"] == 1
+
+
+@pytest.mark.asyncio
+async def test_full_queue_applies_backpressure_and_keeps_order():
+    """Test a small queue makes readers wait without losing lines."""
+    stdout, stderr = [], []
+
+    async def on_stdout(lines):
+        await asyncio.sleep(0)
+        stdout.extend(lines)
+
+    async def on_stderr(lines):
+        stderr.extend(lines)
+        raise RuntimeError("log sink down")
+
+    fan_out = ProcessFanOut(
+        {"stdout": on_stdout, "stderr": on_stderr},
+        max_queued_lines=4,
+        max_batch_lines=3,
+    )
+    await fan_out.run(
+        {
+            "stdout": make_stream(b"".join(b"out %d\n" % i for i in range(20))),
+            "stderr": make_stream(b"err\n"),
+        }
+    )
+
+    assert stdout == [f"out {i}" for i in range(20)]
+    assert stderr == ["err"]
+    assert fan_out.stats["reader_waits"] > 0
+    assert fan_out.stats["max_queued"] <= 4
+    assert fan_out.stats["handler_errors"] == 1
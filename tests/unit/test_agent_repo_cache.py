@@ -0,0 +1,103 @@
+"""Tests for the shared bare-mirror repository cache."""
+
+import git
+import pytest
+
+from agent.services.repo_cache import RepoCache
+
+
+@pytest.fixture
+def origin(tmp_path):
+    """Bare origin repository with one commit, plus a clone to push from."""
+    bare = tmp_path / "origin.git"
+    git.Repo.init(bare, bare=True, initial_branch="main")
+
+    source = git.Repo.init(tmp_path / "source", initial_branch="main")
+    with source.config_writer() as config:
+        config.set_value("user", "name", "Test")
+        config.set_value("user", "email", "test@example.com")
+    (tmp_path / "source" / "README.md").write_text("v1\n")
+    source.index.add(["README.md"])
+    source.index.commit("Initial commit")
+    source.create_remote("origin", str(bare)).push("main")
+    return bare, source
+
+
+def _push_change(source, text):
+    path = source.working_tree_dir + "/README.md"
+    with open(path, "w") as handle:
+        handle.write(text)
+    source.index.add(["README.md"])
+    source.index.commit(f"Update to {text.strip()}")
+    source.remotes.origin.push("main")
+
+
+@pytest.mark.asyncio
+async def test_miss_then_hit_shares_one_mirror(origin, tmp_path):
+    """Test the first checkout creates the mirror and later ones reuse it."""
+    bare, _ = origin
+    cache = RepoCache(tmp_path / "cache", max_age=3600)
+
+    first = await cache.checkout(str(bare), tmp_path / "ws1")
+    second = await cache.checkout(str(bare), tmp_path / "ws2")
+
+    assert first["cache"] == "miss"
+    assert second["cache"] == "hit"
+    assert second["fetched"] is False  # Refreshed moments ago
+    assert second["hit_rate"] == 0.5
+    assert cache.stats()["hits"] == 1
+    assert (tmp_path / "ws2" / "README.md").read_text() == "v1\n"
+
+    # Workspaces borrow objects from the mirror and point at the real remote
+    workspace = git.Repo(tmp_path / "ws2")
+    alternates = tmp_path / "ws2" / ".git" / "objects" / "info" / "alternates"
+    assert str(cache.mirror_path(str(bare))) in alternates.read_text()
+    assert workspace.remotes.origin.url == str(bare)
+    assert list(cache.root.glob("*.git")) == [cache.mirror_path(str(bare))]
+
+
+@pytest.mark.asyncio
+async def test_stale_mirror_is_fetched(origin, tmp_path):
+    """Test a hit on a stale mirror picks up new upstream commits."""
+    bare, source = origin
+    cache = RepoCache(tmp_path / "cache", max_age=0)
+
+    await cache.checkout(str(bare), tmp_path / "ws1")
+    _push_change(source, "v2\n")
+    metrics = await cache.checkout(str(bare), tmp_path / "ws1")
+
+    assert metrics["cache"] == "hit"
+    assert metrics["fetched"] is True
+    assert (tmp_path / "ws1" / "README.md").read_text() == "v2\n"
+
+
+@pytest.mark.asyncio
+async def test_disabled_cache_clones_shallow(origin, tmp_path):
+    """Test checkouts without a cache directory are plain shallow clones."""
+    bare, source = origin
+    _push_change(source, "v2\n")
+    cache = RepoCache(None)
+
+    metrics = await cache.checkout(f"file://{bare}", tmp_path / "ws")
+
+    assert metrics["cache"] == "disabled"
+    assert len(list(git.Repo(tmp_path / "ws").iter_commits())) == 1
+    assert cache.stats()["hit_rate"] is None
+
+
+@pytest.mark.asyncio
+async def test_checkout_pins_commit(origin, tmp_path):
+    """Test every workspace is detached at the requested commit."""
+    bare, source = origin
+    pinned = source.head.commit.hexsha
+    _push_change(source, "v2\n")
+    cache = RepoCache(tmp_path / "cache", max_age=3600)
+
+    cached = await cache.checkout(str(bare), tmp_path / "ws1", commit=pinned)
+    direct = await RepoCache(None).checkout(
+        f"file://{bare}", tmp_path / "ws2", commit=pinned
+    )
+
+    assert cached["commit"] == direct["commit"] == pinned
+    assert (tmp_path / "ws1" / "README.md").read_text() == "v1\n"
+    assert (tmp_path / "ws2" / "README.md").read_text() == "v1\n"
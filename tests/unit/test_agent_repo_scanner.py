@@ -0,0 +1,77 @@
+"""Tests for the single-pass repository scanner."""
+
+import git
+import pytest
+
+from agent.services.repo_scanner import classify_key_file, scan_repository
+
+
+def _write(root, files):
+    for path, content in files.items():
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text(content)
+
+
+@pytest.fixture
+def files():
+    return {
+        "README.md": "# Project\n",
+        "pyproject.toml": "[project]\n",
+        "src/app.py": "print('hi')\n",
+        "src/util.PY": "x = 1\n",
+        ".github/workflows/ci.yml": "on: push\n",
+        ".env": "SECRET=1\n",
+        "node_modules/lib/index.js": "module.exports = {}\n",
+        "build/out.js": "compiled\n",
+        "Makefile": "all:\n",
+    }
+
+
+def test_git_checkout_respects_gitignore(tmp_path, files):
+    """Test ignored, hidden and vendored files are left out of a git scan."""
+    _write(tmp_path, {**files, ".gitignore": "build/\n"})
+    repo = git.Repo.init(tmp_path)
+    repo.index.add(["README.md", "src/app.py"])  # The rest is untracked
+
+    manifest = scan_repository(tmp_path)
+
+    assert manifest.source == "git"
+    assert sorted(entry.path for entry in manifest.files) == [
+        ".github/workflows/ci.yml",
+        "Makefile",
+        "README.md",
+        "pyproject.toml",
+        "src/app.py",
+        "src/util.PY",
+    ]
+    assert manifest.languages == {".py": 2, ".md": 1, ".toml": 1, ".yml": 1}
+    assert manifest.total_bytes == sum(
+        len(files[entry.path]) for entry in manifest.files
+    )
+    assert [entry.path for entry in manifest.key_files] == [
+        "README.md",
+        "pyproject.toml",
+        ".github/workflows/ci.yml",
+    ]
+
+
+def test_plain_directory_is_walked(tmp_path, files):
+    """Test a directory outside git is walked with the same skip rules."""
+    _write(tmp_path, files)
+
+    manifest = scan_repository(tmp_path)
+
+    assert manifest.source == "walk"
+    assert "build/out.js" in {entry.path for entry in manifest.files}
+    assert ".env" not in {entry.path for entry in manifest.files}
+    assert "node_modules/lib/index.js" not in {entry.path for entry in manifest.files}
+    assert manifest.total_files == 7
+
+
+def test_key_files_are_anchored_at_root():
+    """Test key-file patterns only match at the repository root."""
+    assert classify_key_file("README.md") == 0
+    assert classify_key_file("docs/README.md") is None
+    assert classify_key_file("src/main.py") is None
+    assert classify_key_file("main.py") is not None
+    assert classify_key_file(".github/workflows/ci.yml") is not None
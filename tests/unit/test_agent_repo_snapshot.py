@@ -0,0 +1,66 @@
+"""Tests for per-run workspace snapshots."""
+
+import asyncio
+from pathlib import Path
+
+import git
+import pytest
+
+from agent.services.repo_cache import RepoCache
+from agent.services.repo_snapshot import RepoSnapshot
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    """Mirror-backed workspace (objects borrowed via alternates)."""
+    source = git.Repo.init(tmp_path / "source", initial_branch="main")
+    with source.config_writer() as config:
+        config.set_value("user", "name", "Test")
+        config.set_value("user", "email", "test@example.com")
+    for version in ("v1", "v2"):
+        (tmp_path / "source" / "app.py").write_text(f"VERSION = {version!r}\n")
+        source.index.add(["app.py"])
+        source.index.commit(version)
+
+    cache = RepoCache(tmp_path / "cache")
+    asyncio.run(cache.checkout(str(tmp_path / "source"), tmp_path / "ws"))
+    return tmp_path / "ws", source.head.commit.hexsha
+
+
+def test_publish_and_restore_round_trip(workspace, tmp_path):
+    """Test variations get the same commit, files and summary as the prep job."""
+    repo_dir, commit = workspace
+    snapshot = RepoSnapshot(tmp_path / "snapshots", "run-1")
+    assert not snapshot.ready
+
+    published = snapshot.publish(
+        repo_dir, repo_url="https://github.com/test/repo", summary="# Summary"
+    )
+    assert snapshot.ready
+    assert published["commit"] == commit
+
+    manifest, summary = snapshot.restore(tmp_path / "variation" / "repo")
+
+    restored = git.Repo(tmp_path / "variation" / "repo")
+    assert summary == "# Summary"
+    assert manifest["commit"] == restored.head.commit.hexsha == commit
+    assert restored.remotes.origin.url == "https://github.com/test/repo"
+    assert (tmp_path / "variation" / "repo" / "app.py").read_text() == (
+        "VERSION = 'v2'\n"
+    )
+    # Self-contained: no borrowed objects and no history beyond the commit
+    assert (repo_dir / ".git" / "objects" / "info" / "alternates").exists()
+    assert not Path(restored.git_dir, "objects", "info", "alternates").exists()
+    assert len(list(restored.iter_commits())) == 1
+    assert not restored.is_dirty()
+
+
+def test_failed_prep_is_visible_to_variations(tmp_path):
+    """Test variations can tell a failed prep job from one still running."""
+    snapshot = RepoSnapshot(tmp_path / "snapshots", "run-1")
+    assert not snapshot.failed
+
+    snapshot.mark_failed("clone failed")
+
+    assert snapshot.failed
+    assert not snapshot.ready
@@ -0,0 +1,153 @@
+"""Tests for LLM generation retries."""
+
+import os
+import time
+from email.utils import formatdate
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from tenacity import RetryCallState
+
+from agent.services.output_sink import OutputSink
+from app.core.retry_policy import RetryWait, retry_after
+
+ENV = {
+    "REDIS_URL": "redis://test",
+    "DATABASE_URL_ASYNC": "postgresql://test",
+    "RUN_ID": "test-run-retry",
+    "VARIATION_ID": "0",
+    "AGENT_MODE": "litellm",
+    "PROMPT": "Explain the event loop",
+    "OPENAI_API_KEY": "sk-test-0123456789",
+}
+
+
+def rate_limited(headers=None, **attributes):
+    """A provider error as LiteLLM raises it, wrapped like the agent does."""
+    error = Exception("rate limit")
+    error.response = SimpleNamespace(headers=headers or {})
+    for name, value in attributes.items():
+        setattr(error, name, value)
+    try:
+        raise error
+    except Exception:
+        try:
+            raise RuntimeError("Rate limit exceeded for openai")
+        except RuntimeError as wrapped:
+            return wrapped
+
+
+def test_retry_after_reads_headers_attributes_and_dates():
+    """Test the provider's requested delay is found in any of its forms."""
+    assert retry_after(rate_limited({"Retry-After": "7"})) == 7
+    assert retry_after(rate_limited({"retry-after-ms": "1500"})) == 1.5
+    assert retry_after(rate_limited(retry_after=3)) == 3
+    http_date = formatdate(time.time() + 30, usegmt=True)
+    assert 25 < retry_after(rate_limited({"Retry-After": http_date})) <= 30
+    assert retry_after(rate_limited()) is None
+    assert retry_after(RuntimeError("boom")) is None
+
+
+def test_retry_wait_is_jittered_and_honours_retry_after():
+    """Test waits vary within bounds but never undercut Retry-After."""
+
+    def state(error):
+        retry_state = Mock(spec=RetryCallState)
+        retry_state.attempt_number = 1
+        retry_state.outcome = Mock(exception=Mock(return_value=error))
+        return retry_state
+
+    wait = RetryWait(min_wait=1, max_wait=4, max_retry_after=20)
+    waits = {wait(state(RuntimeError("boom"))) for _ in range(20)}
+    assert all(1 <= w <= 4 for w in waits)
+    assert len(waits) > 1
+
+    assert wait(state(rate_limited({"Retry-After": "12"}))) == 12
+    assert wait(state(rate_limited({"Retry-After": "600"}))) == 20
+
+
+def stream(*pieces, fail=False):
+    """A LiteLLM-style stream that may drop after its pieces."""
+    usage = SimpleNamespace(total_tokens=8, prompt_tokens=3, completion_tokens=5)
+
+    async def chunks():
+        for text in pieces:
+            delta = SimpleNamespace(content=text)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+        if fail:
+            raise ConnectionError("connection reset")
+        yield SimpleNamespace(choices=[], usage=usage)
+
+    return chunks()
+
+
+async def generate(redis, model, *streams):
+    """Run the agent's generation over ``streams``, one per attempt."""
+    from agent.main import AIdeatorAgent
+
+    with patch.dict(os.environ, {**ENV, "MODEL": model}):
+        agent = AIdeatorAgent()
+    agent.db_service = AsyncMock()
+    agent.output_sink = OutputSink(
+        agent.run_id, agent.variation_id, redis, agent.db_service
+    )
+    with (
+        patch("agent.main.acompletion", side_effect=streams) as call,
+        patch("agent.main.completion_cost", return_value=0.01),
+        patch("agent.main.RETRY_MIN_WAIT", 0),
+        patch("agent.main.RETRY_MAX_WAIT", 0),
+    ):
+        text = await agent._generate_llm_response(None)
+    await agent.output_sink.flush()
+
+    rows = [
+        row
+        for batch in agent.db_service.write_agent_outputs.await_args_list
+        for row in batch.args[0]
+    ]
+    return text, call, rows
+
+
+@pytest.mark.asyncio
+async def test_retry_continues_the_partial_response(fake_redis):
+    """Test a prefill-capable model resumes instead of re-streaming."""
+    text, call, rows = await generate(
+        fake_redis,
+        "claude-3-5-sonnet",
+        stream("Hello ", fail=True),
+        stream(" world"),  # Repeats the space stripped from the prefix
+    )
+
+    assert text == "Hello world"
+    messages = call.call_args.kwargs["messages"]
+    assert messages[-1] == {"role": "assistant", "content": "Hello"}
+    assert [
+        (row["content"], row["metadata"]["attempt"], row["metadata"]["seq"])
+        for row in rows
+        if row["output_type"] == "llm"
+    ] == [("Hello ", 1, 0), ("world", 2, 0)]
+    assert not [row for row in rows if row["output_type"] == "status"]
+
+
+@pytest.mark.asyncio
+async def test_retry_supersedes_the_failed_attempt(fake_redis):
+    """Test other models restart and mark the failed attempt superseded."""
+    text, call, rows = await generate(
+        fake_redis,
+        "gpt-4o",
+        stream("Hel", fail=True),
+        stream("Hello world"),
+    )
+
+    assert text == "Hello world"
+    assert [m["role"] for m in call.call_args.kwargs["messages"]] == ["user"]
+    superseded = [row for row in rows if row["output_type"] == "status"]
+    assert [row["metadata"] for row in superseded] == [
+        {"variation_id": 0, "attempts": [1]}
+    ]
+    assert [
+        (row["content"], row["metadata"]["attempt"])
+        for row in rows
+        if row["output_type"] == "llm"
+    ] == [("Hel", 1), ("Hello world", 2)]
@@ -0,0 +1,88 @@
+"""Tests for the in-agent BM25 search index."""
+
+import pytest
+
+from agent.services.context_builder import build_context
+from agent.services.repo_scanner import scan_repository
+from agent.services.search_index import (
+    CHUNK_LINES,
+    SearchIndex,
+    identifier_terms,
+    query_terms,
+)
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    filler = "".join(f"value_{i} = {i}\n" for i in range(CHUNK_LINES))
+    files = {
+        "README.md": "# Shop\n",
+        "app/sessions.py": filler
+        + "class UserSession:\n    def refresh_timeout(self):\n        pass\n",
+        "app/billing.py": "def charge_card(amount):\n    return amount\n",
+        "app/users.py": "def get_user(user_id):\n    return user_id\n",
+        "static/logo.png": "not text",
+    }
+    for path, content in files.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(content)
+    return scan_repository(tmp_path)
+
+
+def test_identifiers_are_split_on_case_and_underscores():
+    """Test identifiers are indexed whole and by their parts."""
+    assert identifier_terms("UserSession.refresh_timeout()") == [
+        "usersession",
+        "user",
+        "session",
+        "refresh_timeout",
+        "refresh",
+        "timeout",
+    ]
+    assert query_terms("Please fix the session timeout") == {
+        "fix",
+        "session",
+        "timeout",
+    }
+
+
+def test_search_ranks_the_matching_chunk_first(manifest):
+    """Test BM25 finds the chunk defining the identifiers the query mentions."""
+    index = SearchIndex.build(manifest, workers=2, batch_files=1)
+
+    results = index.search("Why does the user session timeout never refresh?", k=3)
+
+    best, _ = results[0]
+    assert (best.path, best.start, best.end) == (
+        "app/sessions.py",
+        CHUNK_LINES + 1,
+        CHUNK_LINES + 3,
+    )
+    assert index.stats["files"] == 4  # The logo is not indexed
+    assert index.search("nonexistent gibberish") == []
+
+
+def test_saved_index_round_trips(manifest, tmp_path):
+    """Test a loaded index returns the same results as the built one."""
+    index = SearchIndex.build(manifest)
+    index.save(tmp_path / "indexes" / "abc.json.gz")
+
+    loaded = SearchIndex.load(tmp_path / "indexes" / "abc.json.gz")
+
+    query = "charge the card"
+    assert loaded.search(query) == index.search(query)
+    assert loaded.stats["chunks"] == index.stats["chunks"]
+
+
+@pytest.mark.asyncio
+async def test_context_includes_index_snippets(manifest):
+    """Test the context builder adds the best snippets after key files."""
+    index = SearchIndex.build(manifest)
+
+    context = await build_context(manifest, "user session timeout", 10_000, index=index)
+
+    snippet = f"app/sessions.py:{CHUNK_LINES + 1}-{CHUNK_LINES + 3}"
+    assert context.files[:2] == ["README.md", snippet]
+    assert context.snippets >= 1
+    assert f"--- {snippet} ---\nclass UserSession:" in context.text
+    assert "value_0 = 0" not in context.text  # Only the matching chunk
@@ -0,0 +1,75 @@
+"""Tests for session workspaces kept between turns."""
+
+import subprocess
+
+import pytest
+
+from agent.services.diff_engine import collect_diffs
+from agent.services.session_workspace import SessionWorkspace
+
+REPO_URL = "https://github.com/test/repo"
+
+
+def git(repo, *args):
+    subprocess.run(["git", "-C", str(repo), *args], check=True, capture_output=True)
+
+
+@pytest.fixture
+def origin(tmp_path):
+    origin = tmp_path / "origin"
+    origin.mkdir()
+    git(origin, "init", "-q")
+    (origin / "app.py").write_text("x = 1\n")
+    git(origin, "add", "-A")
+    git(origin, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "i")
+    return origin
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    workspace = SessionWorkspace(tmp_path / "sessions" / "session-1", 0)
+    assert workspace.acquire()
+    yield workspace
+    workspace.release()
+
+
+def test_follow_up_turn_resumes_the_checkpoint(workspace, origin):
+    """Test a turn's edits survive and the next turn diffs only its own."""
+    assert workspace.resume(REPO_URL) is None
+    # Mirror-backed checkouts borrow objects, like RepoCache workspaces
+    git(origin.parent, "clone", "-q", "--shared", str(origin), str(workspace.repo_dir))
+    (workspace.repo_dir / "app.py").write_text("x = 2\n")
+
+    first = workspace.checkpoint(repo_url=REPO_URL, run_id="run-1", summary="Repo")
+
+    assert first["turns"] == 1
+    assert first["changed"]
+    assert not (workspace.repo_dir / ".git/objects/info/alternates").exists()
+    manifest, summary = workspace.resume(REPO_URL)
+    assert (manifest["commit"], summary) == (first["commit"], "Repo")
+    assert (workspace.repo_dir / "app.py").read_text() == "x = 2\n"
+
+    (workspace.repo_dir / "new.py").write_text("y = 1\n")
+    assert [diff.path for diff in collect_diffs(workspace.repo_dir)] == ["new.py"]
+    second = workspace.checkpoint(repo_url=REPO_URL, run_id="run-2")
+    assert second["turns"] == 2
+    assert workspace.resume(REPO_URL)[1] == "Repo"
+
+
+def test_other_repository_starts_fresh(workspace, origin):
+    """Test a workspace for another repository is discarded."""
+    git(origin.parent, "clone", "-q", str(origin), str(workspace.repo_dir))
+    workspace.checkpoint(repo_url=REPO_URL, run_id="run-1")
+
+    assert workspace.resume("https://github.com/test/other") is None
+    assert not workspace.repo_dir.exists()
+
+
+def test_concurrent_turns_do_not_share_a_workspace(workspace, tmp_path):
+    """Test a second turn cannot take a workspace that is in use."""
+    other = SessionWorkspace(tmp_path / "sessions" / "session-1", 0)
+
+    assert not other.acquire()
+    workspace.release()
+    assert other.acquire()
+    other.release()
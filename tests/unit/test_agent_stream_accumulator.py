@@ -0,0 +1,62 @@
+"""Tests for the streamed completion accumulator."""
+
+import gc
+import weakref
+from types import SimpleNamespace
+
+from agent.services.stream_accumulator import StreamAccumulator
+
+
+class Chunk:
+    """Minimal LiteLLM stream chunk (weak-referenceable)."""
+
+    def __init__(self, text=None, usage=None):
+        delta = SimpleNamespace(content=text)
+        self.choices = [SimpleNamespace(delta=delta)] if text is not None else []
+        self.usage = usage
+
+
+def test_accumulator_keeps_text_usage_and_no_chunks():
+    """Test text is joined once, usage is kept and chunks are released."""
+    accumulator = StreamAccumulator()
+    refs = []
+    deltas = []
+
+    for text in ["Hello", " world", "\n", "bye"]:
+        chunk = Chunk(text)
+        refs.append(weakref.ref(chunk))
+        deltas.append(accumulator.add(chunk))
+        del chunk
+    usage = SimpleNamespace(total_tokens=12, prompt_tokens=8, completion_tokens=4)
+    accumulator.add(Chunk(usage=usage))
+    gc.collect()
+
+    assert all(ref() is None for ref in refs)
+    assert deltas == ["Hello", " world", "\n", "bye"]
+    assert accumulator.text == "Hello world\nbye"
+    assert accumulator.chunk_count == 4
+    assert accumulator.length == len("Hello world\nbye")
+    assert accumulator.usage is usage
+
+
+def test_accumulator_ignores_empty_deltas():
+    """Test role-only and empty chunks don't count as content."""
+    accumulator = StreamAccumulator()
+
+    assert accumulator.add(Chunk("")) == ""
+    assert accumulator.add(Chunk()) == ""
+    assert accumulator.chunk_count == 0
+    assert accumulator.text == ""
+
+
+def test_accumulator_drops_a_repeat_of_published_whitespace():
+    """Test a resumed completion doesn't repeat whitespace stripped from its prefix."""
+    stream = StreamAccumulator(skip_leading="\n\n")
+    assert stream.add(Chunk("\n")) == ""
+    assert stream.add(Chunk("\nNext")) == "Next"
+    assert stream.add(Chunk("\n")) == "\n"
+    assert stream.text == "Next\n"
+
+    stream = StreamAccumulator(skip_leading=" ")
+    assert stream.add(Chunk("world")) == "world"
+    assert stream.add(Chunk(" again")) == " again"
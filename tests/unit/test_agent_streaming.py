@@ -1,14 +1,18 @@
 """Tests for agent streaming functionality."""
 
+import asyncio
+import json
 import os
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+from agent.services.output_sink import OutputSink
+
 
 @pytest.mark.asyncio
-async def test_publish_output_dual_write_success():
-    """Test successful dual write to both Redis and database."""
+async def test_publish_output_dual_write_success(fake_redis):
+    """Test publish_output writes one Redis entry and one database row."""
     # Set up environment
     env_vars = {
         "REDIS_URL": "redis://test",
@@ -35,41 +39,48 @@ async def test_publish_output_dual_write_success():
             assert agent.variation_id == 0
 
             # Mock connections
-            agent.redis_client = AsyncMock()
+            agent.redis_client = fake_redis
             agent.db_service = AsyncMock()
             agent.log = MagicMock()
-
-            # Mock successful Redis and DB writes
-            agent.redis_client.xadd.return_value = "test-message-id"
-            agent.db_service.write_agent_output = AsyncMock()
+            agent.output_sink = OutputSink(
+                run_id=agent.run_id,
+                variation_id=agent.variation_id,
+                redis_client=agent.redis_client,
+                db_service=agent.db_service,
+            )
 
             # Test content
             test_content = "This is a test LLM output"
 
-            # Call the method
+            # Call the method and drain the sink
             await agent.publish_output(test_content)
+            await agent.output_sink.flush()
 
-            # Verify Redis write
-            agent.redis_client.xadd.assert_called_once()
-            call_args = agent.redis_client.xadd.call_args
-            assert call_args[0][0] == "run:test-run-123:llm"
-            fields = call_args[0][1]
+            # Verify Redis write (one pipelined XADD)
+            assert len(agent.redis_client.entries) == 1
+            stream_name, fields = agent.redis_client.entries[0]
+            assert stream_name == "run:test-run-123:llm"
             assert fields["variation_id"] == "0"
             assert fields["content"] == test_content
             assert "timestamp" in fields
 
-            # Verify database write
-            agent.db_service.write_agent_output.assert_called_once_with(
-                run_id="test-run-123",
-                variation_id=0,
-                content=test_content,
-                output_type="llm",
-                metadata={"content_length": len(test_content)},
-            )
+            # Verify exactly one database row
+            agent.db_service.write_agent_outputs.assert_called_once()
+            records = agent.db_service.write_agent_outputs.call_args[0][0]
+            assert len(records) == 1
+            assert records[0]["run_id"] == "test-run-123"
+            assert records[0]["variation_id"] == 0
+            assert records[0]["content"] == test_content
+            assert records[0]["output_type"] == "llm"
+            assert records[0]["metadata"] == {
+                "content_length": len(test_content),
+                "attempt": 1,
+                "seq": 0,
+            }
 
 
 @pytest.mark.asyncio
-async def test_publish_output_redis_fails_db_succeeds():
+async def test_publish_output_redis_fails_db_succeeds(fake_redis):
     """Test case where Redis fails but database succeeds."""
     env_vars = {
         "REDIS_URL": "redis://test",
@@ -89,25 +100,225 @@ async def test_publish_output_redis_fails_db_succeeds():
             from agent.main import AIdeatorAgent
 
             agent = AIdeatorAgent()
-            agent.redis_client = AsyncMock()
+            fake_redis.fail = True
+            agent.redis_client = fake_redis
             agent.db_service = AsyncMock()
             agent.log = MagicMock()
-
-            # Mock Redis failure
-            agent.redis_client.xadd.side_effect = Exception("Redis connection failed")
-            # Mock DB success
-            agent.db_service.write_agent_output = AsyncMock()
+            agent.output_sink = OutputSink(
+                run_id=agent.run_id,
+                variation_id=agent.variation_id,
+                redis_client=agent.redis_client,
+                db_service=agent.db_service,
+            )
 
             test_content = "Test content"
 
             # Should not raise exception
             await agent.publish_output(test_content)
+            await agent.output_sink.flush()
 
             # Verify DB write still happened
-            agent.db_service.write_agent_output.assert_called_once()
+            agent.db_service.write_agent_outputs.assert_called_once()
 
-            # Verify warning was logged
-            agent.log.assert_any_call(
-                "[DUAL-WRITE] LLM output written to DB only (Redis failed)",
-                "WARNING",
-            )
+            # Verify the Redis failure was counted
+            assert agent.output_sink.stats["redis_errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_output_sink_pipelines_batches_in_order(fake_redis):
+    """Test the sink coalesces events into one pipeline per batch, in order."""
+    db_service = AsyncMock()
+    sink = OutputSink("run-1", 2, fake_redis, db_service, max_batch_size=3)
+
+    for i in range(5):
+        sink.llm(f"chunk-{i}")
+    sink.log("hello", "INFO", metadata={"step": "x"}, publish=True)
+    sink.record("stderr", "boom")
+
+    await sink.flush()
+
+    assert [fields["content"] for _, fields in fake_redis.entries[:5]] == [
+        f"chunk-{i}" for i in range(5)
+    ]
+    assert fake_redis.entries[5][0] == "run:run-1:stdout"
+    # 7 events in batches of 3 -> 3 DB batches, 7 rows, no duplicates
+    assert db_service.write_agent_outputs.await_count == 3
+    rows = [
+        row
+        for call in db_service.write_agent_outputs.await_args_list
+        for row in call.args[0]
+    ]
+    assert [row["output_type"] for row in rows] == ["llm"] * 5 + [
+        "logging",
+        "stderr",
+    ]
+    assert rows[5]["metadata"] == {"level": "INFO", "step": "x"}
+    assert sink.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_database_does_not_hold_up_redis(fake_redis):
+    """Test output keeps reaching Redis while a database write is blocked."""
+    release = asyncio.Event()
+
+    async def blocked_write(rows):
+        await release.wait()
+
+    db_service = AsyncMock()
+    db_service.write_agent_outputs.side_effect = blocked_write
+    sink = OutputSink("run-1", 0, fake_redis, db_service, flush_interval=0.01)
+    await sink.start()
+
+    async def published(count):
+        while len(fake_redis.entries) < count:
+            await asyncio.sleep(0.01)
+
+    sink.llm("first")
+    await asyncio.wait_for(published(1), timeout=5)
+    while not db_service.write_agent_outputs.await_count:
+        await asyncio.sleep(0.01)
+    sink.llm("second")
+    sink.status("variation_completed")
+    await asyncio.wait_for(published(3), timeout=5)
+
+    assert db_service.write_agent_outputs.await_count == 1
+    assert sink.pending == 1  # "second" waits for the database flusher
+    release.set()
+    await sink.close()
+
+    rows = [
+        row
+        for call in db_service.write_agent_outputs.await_args_list
+        for row in call.args[0]
+    ]
+    assert [row["content"] for row in rows] == ["first", "second"]
+    assert sink.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_output_sink_status_is_redis_only_and_close_drains(fake_redis):
+    """Test status events skip the database and close() flushes the queue."""
+    db_service = AsyncMock()
+    sink = OutputSink("run-1", 0, fake_redis, db_service, flush_interval=10)
+    await sink.start()
+
+    sink.status("variation_completed", {"success": True})
+    sink.llm("tail")
+    await sink.close()
+
+    assert [name for name, _ in fake_redis.entries] == [
+        "run:run-1:status",
+        "run:run-1:llm",
+    ]
+    rows = [
+        row
+        for call in db_service.write_agent_outputs.await_args_list
+        for row in call.args[0]
+    ]
+    assert [row["output_type"] for row in rows] == ["llm"]
+
+
+@pytest.mark.asyncio
+async def test_bound_sinks_share_one_queue(fake_redis):
+    """Test variations bound to one sink are flushed together under their IDs."""
+    db_service = AsyncMock()
+    sink = OutputSink("run-1", 0, fake_redis, db_service, flush_interval=10)
+    views = [sink.bind(0), sink.bind(1)]
+    await sink.start()
+
+    views[1].llm("second")
+    views[0].llm("first")
+    await sink.close()
+
+    assert [fields["variation_id"] for _, fields in fake_redis.entries] == ["1", "0"]
+    rows = [
+        row
+        for call in db_service.write_agent_outputs.await_args_list
+        for row in call.args[0]
+    ]
+    assert [(row["variation_id"], row["content"]) for row in rows] == [
+        (1, "second"),
+        (0, "first"),
+    ]
+    assert sink.stats["events"] == 2
+
+
+@pytest.mark.asyncio
+async def test_bound_sinks_follow_the_sink_they_were_bound_from(fake_redis):
+    """Test views bound before the sink is connected or closed see both."""
+    sink = OutputSink("run-1", 0, flush_interval=10, max_pending=1)
+    view = sink.bind(1)
+    sink.redis_client = fake_redis
+    sink.db_service = AsyncMock()
+    await sink.start()
+
+    view.llm("queued")
+    assert view.pending == sink.pending == 1
+    waiting = asyncio.create_task(view.wait_for_capacity())
+    await sink.close()
+    await asyncio.wait_for(waiting, timeout=5)
+
+    assert [fields["content"] for _, fields in fake_redis.entries] == ["queued"]
+    assert view.stats is sink.stats
+    assert view.db_service is sink.db_service
+
+
+@pytest.mark.asyncio
+async def test_llm_output_is_numbered_per_attempt(fake_redis):
+    """Test llm output carries its attempt and a sequence restarting with it."""
+    sink = OutputSink("run-1", 0, fake_redis, AsyncMock())
+    view = sink.bind(1)
+
+    sink.llm("a")
+    sink.llm("b")
+    sink.begin_attempt(2)
+    sink.llm("c")
+    view.llm("d")
+    await sink.flush()
+
+    numbering = [
+        (fields["variation_id"], meta["attempt"], meta["seq"])
+        for _, fields in fake_redis.entries
+        for meta in [json.loads(fields["metadata"])]
+    ]
+    assert numbering == [("0", 1, 0), ("0", 1, 1), ("0", 2, 0), ("1", 1, 0)]
+
+
+@pytest.mark.asyncio
+async def test_output_sink_drain_waits_for_database_flush(fake_redis):
+    """Test the flush barrier drains the sink and the DB queue behind it."""
+    db_service = AsyncMock()
+    db_service.pending = 4
+    db_service.flush.return_value = True
+    sink = OutputSink("run-1", 0, fake_redis, db_service, flush_interval=10)
+    await sink.start()
+
+    sink.llm("a")
+    sink.llm("b")
+    metrics = await sink.drain(timeout=5)
+
+    assert len(fake_redis.entries) == 2
+    db_service.flush.assert_awaited_once()
+    assert metrics["drained"] is True
+    assert metrics["timed_out"] is False
+    assert metrics["pending_events"] == 2
+    assert metrics["pending_rows"] == 4
+    assert metrics["drain_ms"] >= 0
+
+
+@pytest.mark.asyncio
+async def test_output_sink_drain_respects_hard_timeout(fake_redis):
+    """Test a stuck database cannot hold the flush barrier past its timeout."""
+
+    async def never_flushes():
+        await asyncio.sleep(60)
+
+    db_service = AsyncMock()
+    db_service.pending = 0
+    db_service.flush.side_effect = never_flushes
+    sink = OutputSink("run-1", 0, fake_redis, db_service)
+
+    metrics = await sink.drain(timeout=0.05)
+
+    assert metrics["drained"] is False
+    assert metrics["timed_out"] is True
@@ -0,0 +1,58 @@
+"""Tests for the commit-addressed codebase summary cache."""
+
+import pytest
+
+from agent.services.summary_cache import SummaryCache
+
+
+@pytest.mark.asyncio
+async def test_summary_round_trip_by_commit_and_prompt(fake_redis):
+    """Test a stored summary is served for the same repository, commit and prompt."""
+    cache = SummaryCache(fake_redis, ttl=60)
+    url = "https://github.com/test/repo"
+
+    assert await cache.get(url, "abc", "Fix the parser") is None
+    assert await cache.put(url, "abc", "Fix the parser", "summary at abc")
+
+    assert await cache.get(f"{url}.git", "abc", "Fix the parser\n") == "summary at abc"
+    assert await cache.get(url, "def", "Fix the parser") is None
+    assert await cache.get(url, "abc", "Add a lexer") is None
+    assert (
+        await cache.get("https://github.com/test/other", "abc", "Fix the parser")
+        is None
+    )
+    assert fake_redis.ttls[cache.key(url, "abc", "Fix the parser")] == 60
+    assert await cache.stats() == {
+        "hits": 1,
+        "misses": 4,
+        "hit_rate": 0.2,
+        "entries": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_entries_are_evicted(fake_redis):
+    """Test the index keeps max_entries summaries, dropping the coldest."""
+    cache = SummaryCache(fake_redis, max_entries=2)
+    url = "https://github.com/test/repo"
+
+    await cache.put(url, "a", "p", "A")
+    await cache.put(url, "b", "p", "B")
+    await cache.get(url, "a", "p")  # "b" is now the least recently used
+    await cache.put(url, "c", "p", "C")
+
+    assert await cache.get(url, "b", "p") is None
+    assert await cache.get(url, "a", "p") == "A"
+    assert await cache.get(url, "c", "p") == "C"
+    assert len(fake_redis.zsets[cache.store.index_key]) == 2
+
+
+@pytest.mark.asyncio
+async def test_oversized_summaries_and_redis_errors_are_misses(fake_redis):
+    """Test the cache never stores huge summaries nor raises on Redis errors."""
+    cache = SummaryCache(fake_redis, max_bytes=10)
+    assert not await cache.put("https://github.com/test/repo", "abc", "p", "x" * 11)
+
+    fake_redis.fail = True
+    assert await cache.get("https://github.com/test/repo", "abc", "p") is None
+    assert not await cache.put("https://github.com/test/repo", "abc", "p", "summary")
@@ -0,0 +1,101 @@
+"""Tests for chat-mode variations run together by one agent process."""
+
+import json
+import os
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from agent.services.variation_batch import VariationSpec, parse_variations
+
+ENV = {
+    "REDIS_URL": "redis://test",
+    "DATABASE_URL_ASYNC": "postgresql://test",
+    "RUN_ID": "test-run-batch",
+    "VARIATION_ID": "0",
+    "AGENT_MODE": "litellm",
+    "AGENT_TASK": "batch",
+}
+
+
+def test_parse_variations():
+    raw = json.dumps(
+        [
+            {"variation_id": 0, "model": "gpt-4o", "job_token": "t0"},
+            {"variation_id": 1, "model": "claude-3", "temperature": 0.2},
+        ]
+    )
+
+    assert parse_variations(raw) == [
+        VariationSpec(variation_id=0, model="gpt-4o", job_token="t0"),
+        VariationSpec(variation_id=1, model="claude-3", temperature=0.2),
+    ]
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        "",
+        "[]",
+        '[{"model": "gpt-4o"}]',
+        '[{"variation_id": 0, "model": "a"}, {"variation_id": 0, "model": "b"}]',
+    ],
+)
+def test_parse_variations_rejects_invalid_lists(raw):
+    with pytest.raises(ValueError, match="AGENT_VARIATIONS"):
+        parse_variations(raw)
+
+
+@pytest.mark.asyncio
+async def test_batch_variations_share_connections_but_not_keys(fake_redis):
+    from agent.main import AIdeatorAgent, run_batch
+
+    db_service = AsyncMock()
+    db_service.flush.return_value = True
+    db_service.pending = 0
+
+    async def bootstrap(self, agent_mode):
+        self.redis_client = fake_redis
+        self.db_service = db_service
+        await self._fetch_api_keys()
+
+    async def fetch_api_keys(self):
+        self.api_keys = {"OPENAI_API_KEY": f"sk-{self.job_token}-0123456789"}
+        self.available_api_keys = self._check_available_api_keys()
+
+    async def generate(self, codebase_summary):
+        text = f"{self.config['model']} {self._api_key('OPENAI_API_KEY')}"
+        await self.publish_output(text)
+        return text
+
+    specs = [
+        VariationSpec(variation_id=0, model="gpt-4o", job_token="zero"),
+        VariationSpec(variation_id=1, model="gpt-4o-mini", job_token="one"),
+    ]
+    with (
+        patch.dict(os.environ, ENV),
+        patch.object(AIdeatorAgent, "_bootstrap", bootstrap),
+        patch.object(AIdeatorAgent, "_fetch_api_keys", fetch_api_keys),
+        patch.object(AIdeatorAgent, "_generate_llm_response", generate),
+    ):
+        os.environ.pop("OPENAI_API_KEY", None)
+        assert await run_batch(specs) is True
+        assert "OPENAI_API_KEY" not in os.environ
+
+    llm = [
+        (row["variation_id"], row["content"])
+        for call in db_service.write_agent_outputs.await_args_list
+        for row in call.args[0]
+        if row["output_type"] == "llm"
+    ]
+    assert sorted(llm) == [
+        (0, "gpt-4o sk-zero-0123456789"),
+        (1, "gpt-4o-mini sk-one-0123456789"),
+    ]
+    completed = [
+        json.loads(fields["metadata"])["variation_id"]
+        for name, fields in fake_redis.entries
+        if name == "run:test-run-batch:status"
+    ]
+    assert sorted(completed) == [0, 1]
+    db_service.disconnect.assert_awaited_once()
@@ -0,0 +1,229 @@
+"""Tests for the in-process chat executor."""
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import ANY, AsyncMock, Mock, patch
+
+import pytest
+
+from app.schemas.runs import AgentConfig
+from app.services.chat_executor import ChatExecutor
+
+
+def chunk(text=None, usage=None):
+    """A LiteLLM-style stream chunk."""
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=text))] if text else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class TestChatExecutor:
+    """Test chat-mode variations streamed by the API."""
+
+    @pytest.fixture
+    def executor(self):
+        """Create an executor with Redis, keys and persistence mocked."""
+        executor = ChatExecutor(workers=2)
+        executor.redis = Mock()
+        executor.redis.add_llm_output = AsyncMock()
+        executor.redis.add_status_update = AsyncMock()
+        executor._provider_key = AsyncMock(return_value="sk-user-key")
+        executor._persist = AsyncMock()
+        with (
+            patch("app.services.chat_executor.RETRY_MIN_WAIT", 0),
+            patch("app.services.chat_executor.RETRY_MAX_WAIT", 0),
+        ):
+            yield executor
+
+    @pytest.fixture
+    def litellm(self):
+        """Mock LiteLLM streaming a three-chunk completion."""
+        usage = SimpleNamespace(total_tokens=12, prompt_tokens=4, completion_tokens=8)
+
+        async def stream():
+            for item in (
+                chunk("Hello"),
+                chunk(" world"),
+                chunk("!"),
+                chunk(None, usage),
+            ):
+                yield item
+
+        litellm = Mock()
+        litellm.acompletion = AsyncMock(side_effect=lambda **_kwargs: stream())
+        litellm.cost_per_token.return_value = (0.001, 0.002)
+        with patch("app.services.chat_executor._litellm", return_value=litellm):
+            yield litellm
+
+    @pytest.mark.asyncio
+    async def test_run_variation_streams_like_an_agent(self, executor, litellm):
+        """Test output is coalesced onto the llm stream and persisted."""
+        config = AgentConfig(model="gpt-4o", stream_flush_ms=5000, stream_flush_bytes=8)
+
+        success = await executor.run_variation(
+            "run-1", 0, "user-1", "Hi", model="gpt-4o-mini", agent_config=config
+        )
+
+        assert success is True
+        kwargs = litellm.acompletion.call_args.kwargs
+        assert kwargs["model"] == "gpt-4o-mini"
+        assert kwargs["stream"] is True
+        assert kwargs["extra_body"] == {"api_key": "sk-user-key"}
+        published = [
+            call.args[2] for call in executor.redis.add_llm_output.await_args_list
+        ]
+        # The first text goes out at once, the rest within the budget
+        assert published == ["Hello", " world!"]
+        assert executor.redis.add_llm_output.await_args.args[1] == "0"
+        assert [
+            call.kwargs["metadata"]["seq"]
+            for call in executor.redis.add_llm_output.await_args_list
+        ] == [0, 1]
+        executor._persist.assert_awaited_once_with(
+            "run-1",
+            0,
+            ["Hello", " world!"],
+            12,
+            pytest.approx(0.003),
+            attempt=1,
+            superseded=[],
+            analytics=ANY,
+        )
+        executor.redis.add_status_update.assert_awaited_once_with(
+            "run-1", "variation_completed", {"variation_id": 0, "success": True}
+        )
+
+    @pytest.mark.asyncio
+    async def test_run_variation_reports_failures(self, executor, litellm):
+        """Test a failing completion is reported on the status stream."""
+        litellm.acompletion.side_effect = RuntimeError("gateway down")
+
+        success = await executor.run_variation("run-1", 1, "user-1", "Hi")
+
+        assert success is False
+        assert litellm.acompletion.await_count == 3
+        executor.redis.add_status_update.assert_awaited_once_with(
+            "run-1",
+            "variation_completed",
+            {"variation_id": 1, "success": False, "error": "gateway down"},
+        )
+        executor._persist.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_missing_provider_key_fails_without_calling_litellm(
+        self, executor, litellm
+    ):
+        """Test a variation without a key for its provider fails up front."""
+        executor._provider_key.return_value = None
+
+        success = await executor.run_variation("run-1", 0, "user-1", "Hi")
+
+        assert success is False
+        litellm.acompletion.assert_not_awaited()
+        executor.redis.add_status_update.assert_awaited_once_with(
+            "run-1",
+            "variation_completed",
+            {
+                "variation_id": 0,
+                "success": False,
+                "error": "Missing API key for model gpt-4o-mini",
+            },
+        )
+
+    @pytest.mark.asyncio
+    async def test_retry_supersedes_the_failed_attempt(self, executor, litellm):
+        """Test a dropped stream is retried and its output marked superseded."""
+
+        async def dropped():
+            yield chunk("Hel")
+            raise ConnectionError("connection reset")
+
+        async def complete():
+            yield chunk("Hello world")
+
+        litellm.acompletion.side_effect = [dropped(), complete()]
+
+        success = await executor.run_variation(
+            "run-1", 0, "user-1", "Hi", model="gpt-4o"
+        )
+
+        assert success is True
+        assert [
+            (call.args[2], call.kwargs["metadata"]["attempt"])
+            for call in executor.redis.add_llm_output.await_args_list
+        ] == [("Hel", 1), ("Hello world", 2)]
+        superseded = {"variation_id": 0, "attempts": [1]}
+        assert executor.redis.add_status_update.await_args_list[0].args == (
+            "run-1",
+            "attempt_superseded",
+            superseded,
+        )
+        persisted = executor._persist.await_args
+        assert persisted.args[2] == ["Hello world"]
+        assert persisted.kwargs["attempt"] == 2
+        assert persisted.kwargs["superseded"] == [superseded]
+        assert persisted.kwargs["analytics"].litellm_metadata["attempts"] == 2
+
+    @pytest.mark.asyncio
+    async def test_completions_are_recorded_in_the_analytics(self, executor, litellm):
+        """Test a completion from the provider writes a success analytics row."""
+        config = AgentConfig(model="gpt-4o", temperature=0.3, max_tokens=500)
+
+        await executor.run_variation(
+            "run-1", 2, "user-1", "Hi", model="gpt-4o-mini", agent_config=config
+        )
+
+        analytics = executor._persist.await_args.kwargs["analytics"]
+        assert analytics.run_id == "run-1"
+        assert analytics.variation_id == 2
+        assert analytics.model == "gpt-4o-mini"
+        assert analytics.provider == "openai"
+        assert analytics.status == "success"
+        assert (analytics.prompt_tokens, analytics.completion_tokens) == (4, 8)
+        assert analytics.total_tokens == 12
+        assert analytics.cost_usd == pytest.approx(0.003)
+        assert analytics.temperature == 0.3
+        assert analytics.max_tokens == 500
+        assert analytics.response_time_ms >= 0
+        assert analytics.request_end_time >= analytics.request_start_time
+        assert analytics.litellm_metadata["executor"] == "inprocess"
+
+    @pytest.mark.asyncio
+    async def test_workers_bound_concurrent_variations(self, executor):
+        """Test no more variations run at once than there are workers."""
+        running = 0
+        peak = 0
+
+        async def run(*args, **kwargs):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        with patch.object(executor, "_run", side_effect=run):
+            results = await asyncio.gather(
+                *(executor.run_variation("run-1", i, "user-1", "Hi") for i in range(5))
+            )
+
+        assert results == [True] * 5
+        assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_cached_responses_are_replayed(self, executor, litellm, fake_redis):
+        """Test a request answered before is replayed without calling LiteLLM."""
+        executor.redis.client = fake_redis
+        with patch("app.services.chat_executor.settings") as mock_settings:
+            mock_settings.agent_response_cache_ttl = 60
+            mock_settings.agent_response_cache_max_entries = 10
+            mock_settings.agent_response_replay_speed = 0
+            assert await executor.run_variation("run-1", 0, "user-1", "Hi")
+            assert await executor.run_variation("run-2", 0, "user-1", " Hi\n")
+
+        assert litellm.acompletion.await_count == 1
+        first, replayed = executor._persist.await_args_list
+        assert replayed.args[2] == first.args[2] == ["Hello", " world!"]
+        analytics = replayed.kwargs["analytics"]
+        assert analytics.run_id == "run-2"
+        assert analytics.status == "cache_hit"
+        assert analytics.total_tokens == 12
+        assert analytics.litellm_metadata["saved_cost_usd"] == pytest.approx(0.003)
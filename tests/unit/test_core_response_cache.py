@@ -0,0 +1,151 @@
+"""Tests for the exact-match LLM response cache."""
+
+import os
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.core.response_cache import (
+    CachedResponse,
+    ResponseCache,
+    TranscriptRecorder,
+    replay,
+)
+
+ENV = {
+    "REDIS_URL": "redis://test",
+    "DATABASE_URL_ASYNC": "postgresql://test",
+    "RUN_ID": "test-run-cache",
+    "VARIATION_ID": "0",
+    "AGENT_MODE": "litellm",
+    "MODEL": "gpt-4o",
+    "PROMPT": "Explain the event loop",
+    "OPENAI_API_KEY": "sk-test-0123456789",
+}
+
+
+def response(*pieces):
+    return CachedResponse(
+        pieces=list(pieces),
+        offsets_ms=[i * 10 for i in range(len(pieces))],
+        usage={"prompt_tokens": 3, "completion_tokens": 5, "total_tokens": 8},
+        cost_usd=0.01,
+    )
+
+
+def test_key_covers_model_params_prompt_and_context():
+    """Test equivalent requests share a key and any real difference does not."""
+    key = ResponseCache.key("gpt-4o", 0.7, 1024, "Explain\r\nthis  \n", "ctx")
+
+    assert key == ResponseCache.key("gpt-4o", 0.7, 1024, "  Explain\nthis\n", "ctx")
+    assert key != ResponseCache.key("gpt-4o-mini", 0.7, 1024, "Explain\nthis", "ctx")
+    assert key != ResponseCache.key("gpt-4o", 0.2, 1024, "Explain\nthis", "ctx")
+    assert key != ResponseCache.key("gpt-4o", 0.7, 512, "Explain\nthis", "ctx")
+    assert key != ResponseCache.key("gpt-4o", 0.7, 1024, "Explain that", "ctx")
+    assert key != ResponseCache.key("gpt-4o", 0.7, 1024, "Explain\nthis", "other")
+    assert ResponseCache.key("m", 1, 10, "p") == ResponseCache.key("m", 1.0, 10, "p")
+
+
+@pytest.mark.asyncio
+async def test_response_round_trip_and_eviction(fake_redis):
+    """Test stored transcripts come back whole and the coldest are evicted."""
+    cache = ResponseCache(fake_redis, ttl=60, max_entries=2)
+
+    assert await cache.get("a") is None
+    assert await cache.put("a", response("Hel", "lo"))
+    await cache.put("b", response("B"))
+    assert (await cache.get("a")).text == "Hello"  # "b" is now the coldest
+    await cache.put("c", response("C"))
+
+    assert await cache.get("b") is None
+    assert (await cache.get("a")).pieces == ["Hel", "lo"]
+    assert fake_redis.ttls["a"] == 60
+    assert len(fake_redis.zsets[cache.store.index_key]) == 2
+    assert (await cache.stats())["hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_oversized_or_empty_responses_and_redis_errors_are_misses(fake_redis):
+    """Test the cache skips what it shouldn't store and never raises."""
+    cache = ResponseCache(fake_redis, ttl=60, max_bytes=200)
+    assert not await cache.put("a", response("x" * 200))
+    assert not await cache.put("a", response())
+
+    fake_redis.fail = True
+    assert await cache.get("a") is None
+    assert not await cache.put("a", response("x"))
+
+
+@pytest.mark.asyncio
+async def test_replay_paces_pieces_by_speed():
+    """Test replay keeps the recorded pace scaled by speed, or none at 0."""
+    clock = iter([0.0, 0.0, 0.2])
+    recorder = TranscriptRecorder(clock=lambda: next(clock))
+    recorder.add("a")
+    recorder.add("b")
+    cached = recorder.response(None, None)
+    assert cached.offsets_ms == [0, 200]
+
+    published = []
+
+    async def publish(text):
+        published.append(text)
+
+    start = time.monotonic()
+    await replay(cached, publish, speed=0)
+    assert time.monotonic() - start < 0.05
+
+    start = time.monotonic()
+    await replay(cached, publish, speed=2)
+    assert 0.09 <= time.monotonic() - start < 0.3
+    assert published == ["a", "b", "a", "b"]
+
+
+def stream(*pieces, usage=None):
+    """A LiteLLM-style stream of text chunks and a final usage chunk."""
+
+    async def chunks():
+        for text in pieces:
+            delta = SimpleNamespace(content=text)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+    return chunks()
+
+
+@pytest.mark.asyncio
+async def test_agent_replays_a_cached_completion(fake_redis):
+    """Test a repeated LiteLLM request is served from the cache, not the provider."""
+    from agent.main import AIdeatorAgent
+
+    usage = SimpleNamespace(total_tokens=8, prompt_tokens=3, completion_tokens=5)
+
+    async def answer(cached_stream):
+        with patch.dict(os.environ, {**ENV, "AGENT_RESPONSE_CACHE_TTL": "60"}):
+            agent = AIdeatorAgent()
+        agent.redis_client = fake_redis
+        agent.db_service = AsyncMock()
+        agent._init_response_cache()
+        agent._publish_stream_text = AsyncMock()
+        with (
+            patch("agent.main.acompletion", return_value=cached_stream) as call,
+            patch("agent.main.completion_cost", return_value=0.01),
+        ):
+            text = await agent._generate_litellm_response(None)
+        published = [c.args[0] for c in agent._publish_stream_text.await_args_list]
+        return text, published, call, agent.db_service
+
+    text, published, call, _ = await answer(stream("Hello", " world", usage=usage))
+    assert call.await_count == 1
+
+    replayed, replayed_pieces, call, db_service = await answer(stream("other"))
+    assert call.await_count == 0
+    assert replayed == text == "Hello world"
+    assert replayed_pieces == published
+    analytics = db_service.write_litellm_analytics.await_args.kwargs["analytics_data"]
+    assert analytics["status"] == "cache_hit"
+    assert analytics["cost_usd"] == 0.0
+    assert analytics["total_tokens"] == 8
+    assert analytics["metadata"]["saved_cost_usd"] == 0.01
@@ -0,0 +1,104 @@
+"""Tests for latency-budgeted coalescing of streamed output."""
+
+import asyncio
+
+import pytest
+
+from app.core.stream_coalescer import StreamCoalescer
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_coalescer(**kwargs):
+    published = []
+
+    async def publish(text):
+        published.append(text)
+
+    clock = FakeClock()
+    coalescer = StreamCoalescer(publish, clock=clock, **kwargs)
+    return coalescer, published, clock
+
+
+@pytest.mark.asyncio
+async def test_first_text_is_published_immediately():
+    """Test the first token is not held back by the latency budget."""
+    coalescer, published, _ = make_coalescer(max_latency_ms=1000)
+
+    await coalescer.write("Hi")
+
+    assert published == ["Hi"]
+    await coalescer.close()
+
+
+@pytest.mark.asyncio
+async def test_fast_stream_is_coalesced_up_to_max_bytes():
+    """Test a fast model produces few entries capped at max_bytes."""
+    coalescer, published, clock = make_coalescer(
+        max_latency_ms=100, max_bytes=64, min_bytes=8
+    )
+
+    for _ in range(200):
+        clock.now += 0.001  # 4 chars per ms, far above 64 bytes per budget
+        await coalescer.write("abcd")
+    await coalescer.close()
+
+    assert "".join(published) == "abcd" * 200
+    assert len(published) < 20
+    assert max(len(piece) for piece in published[1:-1]) == 64
+
+
+@pytest.mark.asyncio
+async def test_slow_stream_flushes_small_pieces():
+    """Test a slow model's byte target drops so tokens appear promptly."""
+    coalescer, published, clock = make_coalescer(
+        max_latency_ms=100, max_bytes=4096, min_bytes=4
+    )
+
+    for _ in range(10):
+        clock.now += 0.5  # one token every 500 ms
+        await coalescer.write("tok ")
+
+    assert coalescer.target_bytes == 4
+    assert published == ["tok "] * 10
+    await coalescer.close()
+
+
+@pytest.mark.asyncio
+async def test_pending_text_is_flushed_when_budget_expires():
+    """Test a stalled stream still publishes within the latency budget."""
+    published = []
+
+    async def publish(text):
+        published.append(text)
+
+    coalescer = StreamCoalescer(publish, max_latency_ms=20, min_bytes=1000)
+    await coalescer.write("first")
+    await coalescer.write(" held")
+    assert published == ["first"]
+
+    await asyncio.sleep(0.1)
+
+    assert published == ["first", " held"]
+    assert coalescer.stats == {"writes": 2, "entries": 2, "chars": 10}
+    await coalescer.close()
+
+
+@pytest.mark.asyncio
+async def test_close_publishes_remaining_text():
+    """Test close() flushes pending text and cancels the timer."""
+    coalescer, published, _ = make_coalescer(max_latency_ms=10_000, min_bytes=1000)
+
+    await coalescer.write("a")
+    await coalescer.write("b")
+    await coalescer.close()
+
+    assert published == ["a", "b"]
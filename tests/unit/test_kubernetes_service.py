@@ -124,6 +124,124 @@ class TestKubernetesService:
 
         assert job_name == "agent-test-0"
 
+    @pytest.mark.asyncio
+    async def test_create_agent_job_renders_stream_settings(
+        self, service, mock_subprocess_result
+    ):
+        """Test streaming knobs and the context window reach the job environment."""
+        manifests = []
+
+        async def capture_manifest(cmd):
+            manifests.append(Path(cmd[3]).read_text())
+            return mock_subprocess_result
+
+        with patch.object(service, "_run_kubectl_command", new=capture_manifest):
+            await service.create_agent_job(
+                run_id="test",
+                variation_id=0,
+                repo_url="https://github.com/test/repo",
+                prompt="test",
+                job_token="test-token",
+                model="gpt-4",
+                agent_config={"stream_flush_ms": 250},
+                context_window=128000,
+            )
+            await service.create_agent_job(
+                run_id="test",
+                variation_id=1,
+                repo_url="https://github.com/test/repo",
+                prompt="test",
+                job_token="test-token",
+                model="gpt-4",
+            )
+
+        assert '- name: STREAM_FLUSH_MS\n              value: "250"' in manifests[0]
+        assert '- name: STREAM_FLUSH_BYTES\n              value: ""' in manifests[0]
+        assert '- name: STREAM_FLUSH_MS\n              value: ""' in manifests[1]
+        window = '- name: MODEL_CONTEXT_WINDOW\n              value: "128000"'
+        assert window in manifests[0]
+        assert '- name: MODEL_CONTEXT_WINDOW\n              value: ""' in manifests[1]
+
+    @pytest.mark.asyncio
+    async def test_create_prep_job_renders_snapshot_settings(
+        self, service, mock_subprocess_result
+    ):
+        """Test the prep job and variations share the pinned commit and snapshot dir."""
+        manifests = []
+
+        async def capture_manifest(cmd):
+            manifests.append(Path(cmd[3]).read_text())
+            return mock_subprocess_result
+
+        with (
+            patch.object(service, "_run_kubectl_command", new=capture_manifest),
+            patch(
+                "app.services.kubernetes_service.settings.agent_snapshot_dir",
+                "/shared/snapshots",
+            ),
+        ):
+            prep_job = await service.create_prep_job(
+                "test", "https://github.com/test/repo", "abc123"
+            )
+            await service.create_agent_job(
+                run_id="test",
+                variation_id=0,
+                repo_url="https://github.com/test/repo",
+                prompt="test",
+                job_token="test-token",
+                model="gpt-4",
+                repo_sha="abc123",
+                snapshot_wait=60,
+            )
+
+        assert prep_job == "agent-test-prep"
+        assert 'name: "agent-test-prep"' in manifests[0]
+        assert '- name: AGENT_TASK\n              value: "prep"' in manifests[0]
+        assert 'name: "agent-test-0"' in manifests[1]
+        assert '- name: AGENT_TASK\n              value: "variation"' in manifests[1]
+        assert '- name: AGENT_SNAPSHOT_WAIT\n              value: "0"' in manifests[0]
+        assert '- name: AGENT_SNAPSHOT_WAIT\n              value: "60"' in manifests[1]
+        for manifest in manifests:
+            assert '- name: REPO_SHA\n              value: "abc123"' in manifest
+            assert (
+                '- name: AGENT_SNAPSHOT_DIR\n              value: "/shared/snapshots"'
+                in manifest
+            )
+
+    @pytest.mark.asyncio
+    async def test_create_batch_job_renders_variations(
+        self, service, mock_subprocess_result
+    ):
+        """Test a batch job carries its variations and each one's job token."""
+        manifests = []
+
+        async def capture_manifest(cmd):
+            manifests.append(Path(cmd[3]).read_text())
+            return mock_subprocess_result
+
+        variations = [
+            {"variation_id": 0, "model": "gpt-4o", "job_token": "t0"},
+            {"variation_id": 2, "model": "gpt-4o-mini", "job_token": "t2"},
+        ]
+        with patch.object(service, "_run_kubectl_command", new=capture_manifest):
+            job_name = await service.create_batch_job(
+                "test", "https://github.com/test/repo", "Hi", variations
+            )
+            await service.create_agent_job(
+                run_id="test",
+                variation_id=1,
+                repo_url="https://github.com/test/repo",
+                prompt="test",
+                job_token="test-token",
+                model="gpt-4",
+            )
+
+        assert job_name == "agent-test-batch"
+        assert '- name: AGENT_TASK\n              value: "batch"' in manifests[0]
+        rendered = manifests[0].split("- name: AGENT_VARIATIONS\n              value: ")
+        assert json.loads(json.loads(rendered[1].split("\n")[0])) == variations
+        assert '- name: AGENT_VARIATIONS\n              value: ""' in manifests[1]
+
     @pytest.mark.asyncio
     async def test_create_agent_job_kubectl_error(self, service):
         """Test agent job creation when kubectl fails."""
@@ -315,6 +315,37 @@ class TestProviderKeyService:
             # Note: service doesn't commit - session manager handles it
             mock_db_session.commit.assert_not_called()
 
+    @pytest.mark.asyncio
+    async def test_get_job_keys_prefers_the_model_key(
+        self, service, mock_user, mock_db_session
+    ):
+        """Test job keys are named by provider, the model's own key winning."""
+
+        def key(key_id, provider, is_active=True):
+            provider_key = Mock(spec=ProviderAPIKeyDB)
+            provider_key.id = key_id
+            provider_key.provider = provider
+            provider_key.is_active = is_active
+            return provider_key
+
+        provider_keys = [key("openai_key", "openai"), key("broken", "anthropic")]
+
+        async def decrypt(session, user, key_id):
+            if key_id == "broken":
+                raise ValueError("bad ciphertext")
+            return f"sk-{key_id}"
+
+        with (
+            patch.object(service, "list_user_keys", return_value=provider_keys),
+            patch.object(
+                service, "get_key_for_model", return_value=key("gpt4_key", "openai")
+            ),
+            patch.object(service, "decrypt_api_key", side_effect=decrypt),
+        ):
+            keys = await service.get_job_keys(mock_db_session, mock_user, "gpt-4")
+
+        assert keys == {"OPENAI_API_KEY": "sk-gpt4_key"}
+
     @pytest.mark.asyncio
     async def test_validate_provider_key(self, service, mock_user, mock_db_session):
         """Test validating a provider key by ID."""
@@ -655,7 +686,7 @@ class TestProviderKeyService:
         ]
 
         for model in test_cases:
-            result = service._infer_provider_from_model(model)
+            result = service.infer_provider_from_model(model)
             assert result == "openai", f"Failed for model: {model}"
 
     def test_infer_provider_from_model_anthropic(self, service):
@@ -668,7 +699,7 @@ class TestProviderKeyService:
         ]
 
         for model in test_cases:
-            result = service._infer_provider_from_model(model)
+            result = service.infer_provider_from_model(model)
             assert result == "anthropic", f"Failed for model: {model}"
 
     def test_infer_provider_from_model_google(self, service):
@@ -676,7 +707,7 @@ class TestProviderKeyService:
         test_cases = ["gemini-pro", "palm-2", "text-bison-001", "chat-bison"]
 
         for model in test_cases:
-            result = service._infer_provider_from_model(model)
+            result = service.infer_provider_from_model(model)
             assert result == "google", f"Failed for model: {model}"
 
     def test_infer_provider_from_model_other_providers(self, service):
@@ -697,7 +728,7 @@ class TestProviderKeyService:
         ]
 
         for model, expected_provider in test_cases:
-            result = service._infer_provider_from_model(model)
+            result = service.infer_provider_from_model(model)
             assert result == expected_provider, f"Failed for model: {model}"
 
     def test_infer_provider_from_model_unknown_defaults_to_openai(self, service):
@@ -705,7 +736,7 @@ class TestProviderKeyService:
         unknown_models = ["unknown-model", "custom-llm", "some-random-name"]
 
         for model in unknown_models:
-            result = service._infer_provider_from_model(model)
+            result = service.infer_provider_from_model(model)
             assert result == "openai", f"Failed for model: {model}"
 
     @pytest.mark.asyncio
@@ -470,6 +470,52 @@ class TestRunsEndpoints:
         assert len(result) == 1
         assert result[0]["variation_id"] == 1
 
+    @pytest.mark.asyncio
+    async def test_get_run_outputs_drops_superseded_attempts(self, mock_db, mock_user):
+        """Test llm output of attempts a retry superseded is left out."""
+
+        def output(variation_id, attempt, content, output_type="llm"):
+            return Mock(
+                id=content,
+                run_id="test-run-123",
+                variation_id=variation_id,
+                content=content,
+                output_type=output_type,
+                output_metadata={"attempt": attempt, "seq": 0},
+                timestamp=datetime.utcnow(),
+            )
+
+        superseded = Mock(
+            variation_id=0, output_metadata={"variation_id": 0, "attempts": [1]}
+        )
+        outputs = [
+            output(0, 1, "Hel"),
+            output(1, 1, "Other variation"),
+            output(0, 2, "Hello world"),
+        ]
+        mock_db.execute.side_effect = [
+            Mock(scalar_one_or_none=Mock(return_value=Mock())),  # run exists
+            Mock(scalars=Mock(return_value=Mock(all=Mock(return_value=outputs)))),
+            Mock(scalars=Mock(return_value=Mock(all=Mock(return_value=[superseded])))),
+        ]
+
+        from app.api.v1.runs import get_agent_outputs
+
+        result = await get_agent_outputs(
+            run_id="test-run-123",
+            since=None,
+            variation_id=None,
+            output_type="llm",
+            limit=100,
+            current_user=mock_user,
+            db=mock_db,
+        )
+
+        assert [output["content"] for output in result] == [
+            "Other variation",
+            "Hello world",
+        ]
+
     def test_router_exists(self):
         """Test that router is properly configured."""
         assert router is not None